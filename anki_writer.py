@@ -0,0 +1,280 @@
+import os
+import json
+import shutil
+import sqlite3
+import hashlib
+import tempfile
+import time
+import zipfile
+from dataclasses import dataclass
+from itertools import islice
+from pathlib import Path
+from typing import Dict, FrozenSet, Iterable, List
+
+import numpy as np
+import genanki
+from genanki.apkg_col import APKG_COL
+from genanki.apkg_schema import APKG_SCHEMA
+from genanki.util import BASE91_TABLE
+
+# Local Imports
+from config import ANKI_MODEL, get_deterministic_id
+from utils import sanitize_filename, get_audio_filename
+
+_BASE91 = np.frombuffer("".join(BASE91_TABLE).encode("ascii"), dtype=np.uint8)
+GUID_DIGITS = 10 # 91**10 > 2**64
+NOTE_BATCH = 4096
+
+def bulk_guids(keys: List[str]) -> List[str]:
+    """genanki.guid_for(key) for many keys: one SHA-256 each, then the base-91 conversion for all of them at once in numpy."""
+    if not keys: return []
+    sha256 = hashlib.sha256
+    values = np.frombuffer(b"".join(sha256(key.encode("utf-8")).digest()[:8] for key in keys), dtype=">u8").astype(np.uint64)
+    digits = np.empty((len(keys), GUID_DIGITS), dtype=np.uint8)
+    base = np.uint64(len(BASE91_TABLE))
+    for col in range(GUID_DIGITS - 1, -1, -1):
+        digits[:, col] = _BASE91[values % base]
+        values //= base
+    text = digits.tobytes().decode("ascii")
+    # guid_for drops leading zero digits, and the zero digit is 'a'
+    return [text[i:i + GUID_DIGITS].lstrip("a") for i in range(0, len(text), GUID_DIGITS)]
+
+def chapter_guids(novel_name: str, chapter_number: int, start: int, count: int) -> List[str]:
+    """GUIDs of lines start..start+count of a chapter; same values as the per-note genanki.guid_for calls they replace."""
+    prefix = f"{novel_name}_Ch_{chapter_number:03d}_L"
+    return bulk_guids([f"{prefix}{i:04d}" for i in range(start, start + count)])
+
+@dataclass
+class AnkiChapter:
+    """
+    One chapter's subdeck. Notes are built from `lines` (any re-iterable of line dicts) when a package is written.
+    Lines in `no_audio` (synthesis failed, no clip) get an empty Audio field instead of a dangling [sound:] tag.
+    """
+    novel_name: str
+    chapter_number: int
+    lines: Iterable
+    no_audio: FrozenSet[int] = frozenset()
+
+    @property
+    def deck_id(self) -> int:
+        return get_deterministic_id(f"{self.novel_name}_Ch_{self.chapter_number}")
+
+    @property
+    def deck_name(self) -> str:
+        return f"{sanitize_filename(self.novel_name).replace('_', ' ')}::Ch {self.chapter_number:03d}"
+
+    def deck_json(self) -> dict:
+        return genanki.Deck(self.deck_id, self.deck_name).to_json()
+
+def note_fields(line: dict, chapter_number: int, line_idx: int, has_audio: bool = True) -> List[str]:
+    sound = f"[sound:{get_audio_filename(chapter_number, line_idx)}]" if has_audio else ""
+    return [line["cn"], line["py"], line["lit"], line["nat"], sound]
+
+class AnkiCollection:
+    """
+    The collection.anki2 database of an .apkg, written with plain SQL: a chapter's notes and cards go in
+    with executemany inside one transaction instead of one genanki Note/Card object and INSERT each.
+    """
+    def __init__(self, db_path: Path, timestamp: float = None):
+        self.db_path = Path(db_path)
+        self.timestamp = time.time() if timestamp is None else timestamp
+        is_new = not self.db_path.exists() or self.db_path.stat().st_size == 0
+        self._conn = sqlite3.connect(str(self.db_path), isolation_level=None)
+        if is_new:
+            self._conn.executescript(APKG_SCHEMA)
+            self._conn.executescript(APKG_COL)
+        last_id = self._conn.execute("SELECT MAX(m) FROM (SELECT MAX(id) AS m FROM notes UNION ALL SELECT MAX(id) FROM cards)").fetchone()[0]
+        self._next_id = max(int(self.timestamp * 1000), (last_id or 0) + 1)
+        # Card templates whose front needs one of these fields (genanki's Model._req)
+        self._card_reqs = [(card_ord, any if mode == "any" else all, fields) for card_ord, mode, fields in ANKI_MODEL._req]
+
+    def close(self):
+        self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _update_col(self, chapters: List[AnkiChapter]):
+        decks_json, models_json = self._conn.execute("SELECT decks, models FROM col").fetchone()
+        decks, models = json.loads(decks_json), json.loads(models_json)
+        for chapter in chapters:
+            decks[str(chapter.deck_id)] = chapter.deck_json()
+        if chapters and str(ANKI_MODEL.model_id) not in models:
+            models[str(ANKI_MODEL.model_id)] = ANKI_MODEL.to_json(self.timestamp, chapters[0].deck_id)
+        self._conn.execute("UPDATE col SET decks = ?, models = ?", (json.dumps(decks), json.dumps(models)))
+
+    def _remove_deck(self, deck_id: int):
+        self._conn.execute("DELETE FROM notes WHERE id IN (SELECT nid FROM cards WHERE did = ?)", (deck_id,))
+        self._conn.execute("DELETE FROM cards WHERE did = ?", (deck_id,))
+
+    def _insert_chapter(self, chapter: AnkiChapter) -> int:
+        self._remove_deck(chapter.deck_id) # A re-exported chapter replaces its old notes
+        mod, model_id, tags = int(self.timestamp), ANKI_MODEL.model_id, f" {chapter.novel_name} Ch_{chapter.chapter_number:03d} "
+        lines, start = iter(chapter.lines), 0
+        while True:
+            batch = list(islice(lines, NOTE_BATCH))
+            if not batch: return start
+            guids = chapter_guids(chapter.novel_name, chapter.chapter_number, start, len(batch))
+            notes, cards = [], []
+            for offset, (line, guid) in enumerate(zip(batch, guids)):
+                fields = note_fields(line, chapter.chapter_number, start + offset, start + offset not in chapter.no_audio)
+                note_id = self._next_id
+                notes.append((note_id, guid, model_id, mod, -1, tags, "\x1f".join(fields), fields[0], 0, 0, ""))
+                self._next_id += 1
+                for card_ord, check, required in self._card_reqs:
+                    if check(fields[i] for i in required):
+                        cards.append((self._next_id, note_id, chapter.deck_id, card_ord, mod, -1, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, ""))
+                        self._next_id += 1
+            self._conn.executemany("INSERT INTO notes VALUES (?,?,?,?,?,?,?,?,?,?,?)", notes)
+            self._conn.executemany("INSERT INTO cards VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)", cards)
+            start += len(batch)
+
+    def add_chapters(self, chapters: List[AnkiChapter]) -> int:
+        """Adds the chapters' decks and notes in a single transaction. Returns the number of notes added."""
+        self._conn.execute("BEGIN")
+        try:
+            self._update_col(chapters)
+            added = sum(self._insert_chapter(chapter) for chapter in chapters)
+            self._conn.execute("COMMIT")
+        except Exception:
+            self._conn.execute("ROLLBACK")
+            raise
+        return added
+
+def _write_zip(output_path: Path, db_path: Path, media_files: List[str]):
+    """
+    The .apkg zip: media first and stored (Opus is already compressed), then the deflated collection and
+    the media map, so an update can cut the last two off and append. Written next to the target and swapped in.
+    """
+    output_path = Path(output_path)
+    tmp_path = output_path.with_name(output_path.name + ".tmp")
+    with zipfile.ZipFile(tmp_path, "w", zipfile.ZIP_STORED) as outzip:
+        for idx, path in enumerate(media_files):
+            outzip.write(path, str(idx))
+        outzip.write(db_path, "collection.anki2", compress_type=zipfile.ZIP_DEFLATED)
+        outzip.writestr("media", json.dumps({idx: os.path.basename(path) for idx, path in enumerate(media_files)}))
+    os.replace(tmp_path, output_path)
+
+def _append_zip(output_path: Path, db_path: Path, media_files: List[str]) -> bool:
+    """
+    Updates an .apkg written by _write_zip: drops its trailing collection and media map, appends the media it
+    doesn't have yet, then the new collection and map. The append goes into a copy next to the target that is
+    swapped in when complete, so an interrupted export never leaves a broken master deck. Returns False when
+    the archive can't be extended (missing, foreign layout, or its media differ from media_files).
+    """
+    output_path = Path(output_path)
+    if not zipfile.is_zipfile(output_path): return False
+    tmp_path = output_path.with_name(output_path.name + ".tmp")
+    shutil.copyfile(output_path, tmp_path) # A plain file copy; nothing is recompressed
+    try:
+        extended = _extend_zip(tmp_path, db_path, media_files)
+        if extended: os.replace(tmp_path, output_path)
+        return extended
+    finally:
+        if tmp_path.exists(): tmp_path.unlink()
+
+def _extend_zip(zip_path: Path, db_path: Path, media_files: List[str]) -> bool:
+    names = {str(idx): os.path.basename(path) for idx, path in enumerate(media_files)}
+    with zipfile.ZipFile(zip_path, "a") as outzip:
+        try:
+            packed = json.loads(outzip.read("media"))
+            tail = [outzip.getinfo("collection.anki2"), outzip.getinfo("media")]
+        except (KeyError, ValueError):
+            return False
+        body = [info for info in outzip.filelist if info not in tail]
+        if any(names.get(idx) != name for idx, name in packed.items()) or len(body) != len(packed): return False
+        if body and max(info.header_offset for info in body) > min(info.header_offset for info in tail): return False
+        # New entries are written from start_dir on and the central directory is rewritten on close
+        outzip.start_dir = min(info.header_offset for info in tail)
+        for info in tail:
+            outzip.filelist.remove(info)
+            del outzip.NameToInfo[info.filename]
+        for idx, path in enumerate(media_files):
+            if str(idx) not in packed: outzip.write(path, str(idx))
+        outzip.write(db_path, "collection.anki2", compress_type=zipfile.ZIP_DEFLATED)
+        outzip.writestr("media", json.dumps(names))
+    return True
+
+def write_apkg(chapters, media_files, output_path: Path, timestamp: float = None) -> Path:
+    """Writes one or more AnkiChapters plus their media into a single .apkg file (same contents as genanki.Package)."""
+    chapters = [chapters] if isinstance(chapters, AnkiChapter) else list(chapters)
+    fd, db_name = tempfile.mkstemp(suffix=".anki2")
+    os.close(fd)
+    try:
+        with AnkiCollection(db_name, timestamp) as collection:
+            collection.add_chapters(chapters)
+        _write_zip(output_path, db_name, list(media_files))
+    finally:
+        os.unlink(db_name)
+    return output_path
+
+class IncrementalPackage:
+    """
+    A deck that grows across runs (the novel's master deck). The collection database and a manifest of its
+    media stay on disk, so each export only inserts the new chapters' notes and appends their media to the
+    existing .apkg: O(new chapter) plus a file copy and re-deflating the collection, instead of rebuilding the whole novel.
+    """
+    def __init__(self, collection_path: Path, manifest_path: Path):
+        self.collection_path = Path(collection_path)
+        self.manifest_path = Path(manifest_path)
+        self._manifest = self._load_manifest()
+
+    def _load_manifest(self) -> Dict:
+        manifest = {"files": [], "rewrite": False} # files: [basename, path, size, mtime_ns] in zip order
+        if self.manifest_path.exists():
+            try:
+                manifest.update(json.loads(self.manifest_path.read_text(encoding='utf-8')))
+            except json.JSONDecodeError:
+                print("[!] Anki media manifest corrupted. The next package is rebuilt with the media registered from now on.")
+                manifest["rewrite"] = True
+        return manifest
+
+    def _save_manifest(self):
+        tmp_path = self.manifest_path.with_name(self.manifest_path.name + ".tmp")
+        tmp_path.write_text(json.dumps(self._manifest, ensure_ascii=False), encoding='utf-8')
+        os.replace(tmp_path, self.manifest_path)
+
+    @property
+    def media_files(self) -> List[str]:
+        return [entry[1] for entry in self._manifest["files"]]
+
+    def add_media(self, media_files) -> int:
+        """Registers media by basename (Anki's key). A changed file keeps its slot but forces a full zip rewrite. Returns the number added."""
+        files = self._manifest["files"]
+        known = {entry[0]: entry for entry in files}
+        added = 0
+        for path in media_files:
+            stat = os.stat(path)
+            name = os.path.basename(path)
+            entry = known.get(name)
+            if entry is None:
+                entry = [name, str(path), stat.st_size, stat.st_mtime_ns]
+                files.append(entry)
+                known[name] = entry
+                added += 1
+            elif entry[2:] != [stat.st_size, stat.st_mtime_ns]:
+                entry[1:] = [str(path), stat.st_size, stat.st_mtime_ns]
+                self._manifest["rewrite"] = True
+        return added
+
+    def add_chapters(self, chapters, media_files, timestamp: float = None) -> int:
+        """Inserts (or replaces) the chapters' notes and registers their media. Returns the number of notes added."""
+        chapters = [chapters] if isinstance(chapters, AnkiChapter) else list(chapters)
+        with AnkiCollection(self.collection_path, timestamp) as collection:
+            added = collection.add_chapters(chapters)
+        self.add_media(media_files)
+        self._save_manifest()
+        return added
+
+    def write(self, output_path: Path) -> bool:
+        """Brings the .apkg up to date. Returns True when it was extended, False when it was rewritten."""
+        media_files = self.media_files
+        appended = not self._manifest["rewrite"] and _append_zip(output_path, self.collection_path, media_files)
+        if not appended:
+            _write_zip(output_path, self.collection_path, media_files)
+            self._manifest["rewrite"] = False
+            self._save_manifest()
+        return appended
@@ -0,0 +1,164 @@
+import os
+import json
+import shutil
+import tempfile
+import subprocess
+import numpy as np
+import soundfile as sf
+from pathlib import Path
+
+# Local Imports
+from config import (
+    OPUS_ENCODER, OPUS_BITRATE_KBPS, OPUS_VBR, OPUS_COMPLEXITY,
+    AUDIO_TRIM_SILENCE, AUDIO_SILENCE_THRESHOLD_DB, AUDIO_SILENCE_PAD_MS,
+    AUDIO_TARGET_RMS_DB, AUDIO_PEAK_CEILING_DB, AUDIO_TARGET_SAMPLE_RATE,
+)
+
+OPUS_SAMPLE_RATES = (8000, 12000, 16000, 24000, 48000)
+FRAME_MS = 10
+# libsndfile maps compression_level 0.0 -> 256 kbps and 1.0 -> 6 kbps (mono), linearly.
+LIBSNDFILE_OPUS_KBPS_RANGE = (6.0, 256.0)
+
+def _db_to_amp(db: float) -> float:
+    return 10.0 ** (db / 20.0)
+
+def frame_rms(audio: np.ndarray, sr: int, frame_ms: int = FRAME_MS) -> np.ndarray:
+    """RMS per fixed-size frame, computed with one reshape (the tail is zero-padded)."""
+    frame = max(1, int(sr * frame_ms / 1000))
+    n_frames = -(-audio.size // frame)
+    padded = np.zeros(n_frames * frame, dtype=np.float32)
+    padded[:audio.size] = audio
+    return np.sqrt(np.mean(np.square(padded.reshape(n_frames, frame)), axis=1))
+
+def trim_silence(audio: np.ndarray, sr: int, threshold_db: float = AUDIO_SILENCE_THRESHOLD_DB, pad_ms: int = AUDIO_SILENCE_PAD_MS) -> np.ndarray:
+    """Cuts leading/trailing frames below threshold_db, keeping pad_ms of context. Silent clips are returned untouched."""
+    if audio.size == 0: return audio
+    voiced = np.flatnonzero(frame_rms(audio, sr) >= _db_to_amp(threshold_db))
+    if voiced.size == 0: return audio
+
+    frame = max(1, int(sr * FRAME_MS / 1000))
+    pad = int(sr * pad_ms / 1000)
+    start = max(0, voiced[0] * frame - pad)
+    end = min(audio.size, (voiced[-1] + 1) * frame + pad)
+    return audio[start:end]
+
+def normalize_loudness(audio: np.ndarray, sr: int, target_rms_db: float = AUDIO_TARGET_RMS_DB, peak_ceiling_db: float = AUDIO_PEAK_CEILING_DB, threshold_db: float = AUDIO_SILENCE_THRESHOLD_DB) -> np.ndarray:
+    """Scales the clip so its speech frames hit target_rms_db, without pushing the peak over peak_ceiling_db."""
+    if audio.size == 0 or target_rms_db is None: return audio
+    rms = frame_rms(audio, sr)
+    speech = rms[rms >= _db_to_amp(threshold_db)]
+    peak = float(np.max(np.abs(audio)))
+    if speech.size == 0 or peak == 0.0: return audio
+
+    speech_rms = float(np.sqrt(np.mean(np.square(speech))))
+    gain = min(_db_to_amp(target_rms_db) / speech_rms, _db_to_amp(peak_ceiling_db) / peak)
+    return (audio * gain).astype(np.float32)
+
+def resample(audio: np.ndarray, sr_in: int, sr_out: int) -> np.ndarray:
+    """Vectorized resampling: windowed-sinc low-pass when downsampling, then linear interpolation."""
+    if sr_in == sr_out or audio.size == 0: return audio
+    if sr_out < sr_in:
+        cutoff = 0.5 * sr_out / sr_in
+        taps = np.arange(-32, 33)
+        kernel = 2 * cutoff * np.sinc(2 * cutoff * taps) * np.hamming(taps.size)
+        audio = np.convolve(audio, kernel / kernel.sum(), mode="same")
+    n_out = int(round(audio.size * sr_out / sr_in))
+    positions = np.arange(n_out) * (sr_in / sr_out)
+    return np.interp(positions, np.arange(audio.size), audio).astype(np.float32)
+
+def pick_opus_rate(sr: int, target: int = AUDIO_TARGET_SAMPLE_RATE) -> int:
+    """Opus only encodes at 8/12/16/24/48 kHz: use the target if set, else the nearest rate not below the input."""
+    if target: return target
+    return next((rate for rate in OPUS_SAMPLE_RATES if rate >= sr), OPUS_SAMPLE_RATES[-1])
+
+def process_clip(audio: np.ndarray, sr: int, trim: bool = AUDIO_TRIM_SILENCE):
+    """Full post-processing chain for one generated clip. Returns (audio, sample_rate)."""
+    audio = np.asarray(audio, dtype=np.float32).reshape(-1)
+    if trim: audio = trim_silence(audio, sr)
+    audio = normalize_loudness(audio, sr)
+    out_sr = pick_opus_rate(sr)
+    return resample(audio, sr, out_sr), out_sr
+
+# ==========================
+# OPUS ENCODING
+# ==========================
+def resolve_encoder(encoder: str = OPUS_ENCODER) -> str:
+    if encoder == "auto":
+        return "ffmpeg" if shutil.which("ffmpeg") else "soundfile"
+    return encoder
+
+def _bitrate_to_compression_level(kbps: float) -> float:
+    low, high = LIBSNDFILE_OPUS_KBPS_RANGE
+    return float(np.clip((high - kbps) / (high - low), 0.0, 1.0))
+
+def write_opus(path, audio: np.ndarray, sr: int, bitrate_kbps: float = OPUS_BITRATE_KBPS, vbr: bool = OPUS_VBR, complexity: int = OPUS_COMPLEXITY, encoder: str = OPUS_ENCODER):
+    """
+    Encodes mono float audio to OGG/Opus. The ffmpeg backend (libopus) honours bitrate, VBR and
+    complexity; the soundfile backend maps the bitrate onto libsndfile's compression level.
+    The file is encoded next to the target and moved into place, so a clip on disk is always complete.
+    """
+    path = Path(path)
+    tmp_path = path.with_name(path.name + ".tmp")
+    if resolve_encoder(encoder) == "ffmpeg":
+        cmd = [
+            "ffmpeg", "-y", "-loglevel", "error", "-f", "f32le", "-ar", str(sr), "-ac", "1", "-i", "pipe:0",
+            "-c:a", "libopus", "-b:a", f"{bitrate_kbps}k", "-vbr", "on" if vbr else "off",
+            "-compression_level", str(complexity), "-application", "voip", "-f", "ogg", str(tmp_path),
+        ]
+        subprocess.run(cmd, input=np.asarray(audio, dtype="<f4").tobytes(), check=True, capture_output=True)
+    else:
+        sf.write(str(tmp_path), audio, sr, format='OGG', subtype='OPUS', compression_level=_bitrate_to_compression_level(bitrate_kbps))
+    os.replace(tmp_path, path)
+
+# ==========================
+# CORPUS RE-ENCODING REPORT
+# ==========================
+def recompress_media(media_dir: Path, dry_run: bool = False, stop_event=None) -> dict:
+    """
+    Re-runs post-processing and encoding over every opus file under media_dir and replaces
+    files that get smaller. Writes media_dir/encoding_report.json with the bytes saved.
+    """
+    media_dir = Path(media_dir)
+    report = {"files": 0, "replaced": 0, "bytes_before": 0, "bytes_after": 0, "seconds_before": 0.0, "seconds_after": 0.0, "errors": 0}
+
+    for audio_path in sorted(media_dir.rglob("*.opus")):
+        if stop_event is not None and stop_event.is_set(): break
+        before = audio_path.stat().st_size
+        report["files"] += 1
+        report["bytes_before"] += before
+        try:
+            audio, sr = sf.read(str(audio_path), dtype="float32")
+            if audio.ndim > 1: audio = audio.mean(axis=1)
+            processed, out_sr = process_clip(audio, sr)
+
+            fd, tmp_name = tempfile.mkstemp(suffix=".opus", dir=str(audio_path.parent))
+            os.close(fd)
+            write_opus(tmp_name, processed, out_sr)
+            after = os.path.getsize(tmp_name)
+        except Exception as e:
+            print(f"    [!] Could not re-encode {audio_path.name}: {e}")
+            report["errors"] += 1
+            report["bytes_after"] += before
+            continue
+
+        report["seconds_before"] += audio.size / sr
+        if after < before and not dry_run:
+            os.replace(tmp_name, audio_path)
+            report["replaced"] += 1
+            report["bytes_after"] += after
+            report["seconds_after"] += processed.size / out_sr
+        else:
+            os.unlink(tmp_name)
+            report["bytes_after"] += min(after, before) if dry_run else before
+            report["seconds_after"] += processed.size / out_sr if dry_run else audio.size / sr
+
+    report["bytes_saved"] = report["bytes_before"] - report["bytes_after"]
+    report["percent_saved"] = round(100.0 * report["bytes_saved"] / report["bytes_before"], 2) if report["bytes_before"] else 0.0
+    report["settings"] = {
+        "encoder": resolve_encoder(), "bitrate_kbps": OPUS_BITRATE_KBPS, "vbr": OPUS_VBR, "complexity": OPUS_COMPLEXITY,
+        "trim_silence": AUDIO_TRIM_SILENCE, "target_rms_db": AUDIO_TARGET_RMS_DB, "target_sample_rate": AUDIO_TARGET_SAMPLE_RATE,
+    }
+    report["dry_run"] = dry_run
+
+    (media_dir / "encoding_report.json").write_text(json.dumps(report, indent=4), encoding='utf-8')
+    return report
@@ -0,0 +1,1051 @@
+"""
+Offline benchmarks for the pipeline's hot paths.
+Everything runs against stub models and synthetic data: no GPU, no Ollama.
+
+Usage:
+    python bench.py tts-schedule
+    python bench.py ingest --mb 100
+    python bench.py prompt-cache
+    python bench.py draft-tiers
+    python bench.py translation-memory
+    python bench.py pinyin
+    python bench.py stream --lines 20000
+    python bench.py parallel-text --replicas 4
+    python bench.py anki --lines 200000
+    python bench.py anki-append --chapters 100
+    python bench.py plan --chapters 2000
+    python bench.py boilerplate --chapters 500
+    python bench.py epub --chapters 200
+    python bench.py glossary --chapters 300
+    python bench.py normalize --lines 200000
+    python bench.py clip-quality --clips 2000
+"""
+import io
+import os
+import time
+import shutil
+import random
+import argparse
+import tempfile
+import threading
+import contextlib
+from pathlib import Path
+
+import numpy as np
+
+def make_synthetic_lines(count: int, seed: int = 0):
+    """Chapter-like lines: mostly short dialogue, some long narration, skewed emotion tags."""
+    rng = random.Random(seed)
+    emotions = ["Calm narrative"] * 12 + ["Suspenseful narrative"] * 3 + ["Angry shouting", "Happy", "Whispering", "Surprised", "Sad"]
+    lines = []
+    for _ in range(count):
+        length = rng.choice([rng.randint(2, 15), rng.randint(2, 15), rng.randint(15, 60), rng.randint(60, 200)])
+        lines.append(("字" * length, rng.choice(emotions)))
+    return lines
+
+# ==========================
+# TTS SCHEDULING
+# ==========================
+class PaddingCostModel:
+    """
+    Stub TTS whose cost grows with batch size x longest text, like a padded batched
+    generate call. Sleeps the simulated cost scaled down by time_scale. Returns a tone
+    of SECONDS_PER_CHAR per character, which passes the audio quality gate, so no line
+    is retaken and both schedules synthesize each line once.
+    """
+    SR, SECONDS_PER_CHAR = 24000, 0.1
+
+    def __init__(self, per_call=0.05, per_char=0.004, time_scale=0.01):
+        self.per_call, self.per_char, self.time_scale = per_call, per_char, time_scale
+        self.calls = 0
+        self.simulated_seconds = 0.0
+        self.padded_chars = 0
+        self.useful_chars = 0
+
+    def generate_custom_voice(self, text, language, speaker, instruct):
+        texts = text if isinstance(text, list) else [text]
+        longest = max(len(t) for t in texts)
+        cost = self.per_call + self.per_char * longest * len(texts) ** 0.5
+        self.simulated_seconds += cost
+        self.padded_chars += longest * len(texts)
+        self.useful_chars += sum(len(t) for t in texts)
+        self.calls += len(texts)
+        time.sleep(cost * self.time_scale)
+        return [self.tone(len(t)) for t in texts], self.SR
+
+    @classmethod
+    def tone(cls, chars):
+        t = np.arange(int(cls.SR * cls.SECONDS_PER_CHAR * chars)) / cls.SR
+        return (0.1 * np.sin(2 * np.pi * 220 * t)).astype(np.float32)
+
+def bench_tts_schedule(args):
+    from tts_queue import TTSJobQueue, TTSJob
+    from tts_engine import run_tts_worker, synthesize_batch
+    from utils import canonicalize_emotion
+
+    lines = make_synthetic_lines(args.lines, args.seed)
+    work_dir = Path(tempfile.mkdtemp(prefix="bench_tts_"))
+    results = {}
+    try:
+        # A. Document order: consecutive lines batched together, each with its own instruction.
+        model = PaddingCostModel(time_scale=args.time_scale)
+        jobs = [TTSJob(1, i, text, canonicalize_emotion(emo), str(work_dir / f"inorder_{i:05d}.opus")) for i, (text, emo) in enumerate(lines)]
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()): # Per-line [Audio] logs would dominate the wall time
+            for i in range(0, len(jobs), args.batch):
+                synthesize_batch(model, jobs[i:i + args.batch])
+        results["in-order"] = (model, time.perf_counter() - start)
+
+        # B. Queue order: grouped by canonical instruction, shortest first.
+        model = PaddingCostModel(time_scale=args.time_scale)
+        with TTSJobQueue(work_dir / "tts_queue.sqlite") as queue:
+            queue.enqueue_chapter(1, [(i, text, canonicalize_emotion(emo), str(work_dir / f"sorted_{i:05d}.opus"), False) for i, (text, emo) in enumerate(lines)])
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                run_tts_worker(queue, threading.Event(), chapter_number=1, model_loader=lambda: model, batch_size=args.batch)
+        results["length-sorted"] = (model, time.perf_counter() - start)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    print(f"\n{args.lines} lines, batch size {args.batch}")
+    print(f"{'schedule':<15}{'sim. model s':>14}{'lines/s (sim)':>15}{'padding waste':>15}{'takes':>7}{'wall s':>9}")
+    for name, (model, wall) in results.items():
+        waste = 1 - model.useful_chars / model.padded_chars
+        print(f"{name:<15}{model.simulated_seconds:>14.1f}{args.lines / model.simulated_seconds:>15.2f}{waste:>15.1%}{model.calls:>7}{wall:>9.2f}")
+    base, tuned = results["in-order"][0], results["length-sorted"][0]
+    print(f"Speedup (simulated model time): {base.simulated_seconds / tuned.simulated_seconds:.2f}x")
+
+# ==========================
+# RAW NOVEL INGEST
+# ==========================
+def write_synthetic_novel(path: Path, target_mb: float, encoding: str = "gb18030", seed: int = 0):
+    """Streams a GB18030 novel of roughly target_mb to disk: 第N章 headings, indented paragraphs, some blank lines."""
+    rng = random.Random(seed)
+    alphabet = "的一是了我不人在他有这个上们来到时大地为子中你说生国年着就那和要她出也得里后自以会家可下而过天去能对小多然于心学么之都好看起发当没成只如事把还用第样道想作种开美总从无情己面最女但现前些所同日手又行意动方期它头经长儿回位分爱老因很给名法间斯知世什两次使身者被高已亲其进此话常与活正感"
+    target = int(target_mb * 1024 * 1024)
+    written, chapter = 0, 0
+    with open(path, "w", encoding=encoding, newline="\n") as f:
+        f.write("书名：合成小说\n作者：基准\n\n")
+        while written < target:
+            chapter += 1
+            block = [f"第{chapter}章　标题{chapter}", ""]
+            for _ in range(rng.randint(40, 80)):
+                block.append("　　" + "".join(rng.choice(alphabet) for _ in range(rng.randint(20, 120))) + "。")
+                if rng.random() < 0.3: block.append("")
+            text = "\n".join(block) + "\n"
+            f.write(text)
+            written += len(text.encode(encoding))
+    return chapter
+
+def bench_ingest(args):
+    import tracemalloc
+    from ingest import ingest_source
+    from progress import get_rss_mb
+
+    work_dir = Path(tempfile.mkdtemp(prefix="bench_ingest_"))
+    try:
+        source = work_dir / "novel.txt"
+        chapters = write_synthetic_novel(source, args.mb, seed=args.seed)
+        size_mb = source.stat().st_size / 1024**2
+
+        rss_before = get_rss_mb()
+        start = time.perf_counter()
+        report = ingest_source(source, work_dir / "01_Raw_Text")
+        elapsed = time.perf_counter() - start
+        rss_after = get_rss_mb()
+
+        # Second pass under tracemalloc for the peak Python allocation (slower, so not timed).
+        shutil.rmtree(work_dir / "01_Raw_Text")
+        tracemalloc.start()
+        ingest_source(source, work_dir / "01_Raw_Text")
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    print(f"\nInput: {size_mb:.1f} MB {report['encoding']}, {chapters} chapters written by the generator")
+    print(f"Ingested {report['chapters']} chapters in {elapsed:.2f} s ({size_mb / elapsed:.1f} MB/s)")
+    print(f"Peak traced allocation: {peak / 1024**2:.2f} MB | RSS {rss_before:.0f} -> {rss_after:.0f} MB")
+
+# ==========================
+# LLM PROMPT PREFIX CACHE
+# ==========================
+class PrefixCacheClient:
+    """
+    Stub Ollama client with a prefix KV cache over a few server slots, like llama.cpp's.
+    prompt_eval_count counts the prompt characters after the longest cached prefix.
+    """
+    def __init__(self, slots=4):
+        self.slots = slots
+        self.cache = []
+
+    def chat(self, model, messages, keep_alive=None):
+        rendered = "".join(f"<{m['role']}>{m['content']}" for m in messages)
+        cached = 0
+        for old in self.cache:
+            n = 0
+            for x, y in zip(rendered, old):
+                if x != y: break
+                n += 1
+            cached = max(cached, n)
+        self.cache = (self.cache + [rendered])[-self.slots:]
+        return {"message": {"content": "1. ok"}, "prompt_eval_count": len(rendered) - cached, "eval_count": 0, "eval_duration": 0}
+
+def legacy_prompt(kind, sub_glossary):
+    """System prompts as they were before the glossary moved to the user message."""
+    import json
+    from config import TARGET_LANGUAGE
+    head = (f"Translate the NUMBERED Chinese lines to natural {TARGET_LANGUAGE}.\nConvert imperial to metric. \n" if kind == "natural"
+            else "Translate the NUMBERED Chinese lines to EXTREMELY LITERAL word-for-word English.\nPreserve Chinese grammar. \n")
+    return head + f"""CRITICAL: Use these specific English names for these entities: {json.dumps(sub_glossary, ensure_ascii=False)}
+You MUST output the exact same number of lines. Start each line with its number (e.g., "1. ")."""
+
+def bench_prompt_cache(args):
+    import utils
+    from utils import call_llm, get_relevant_glossary, chunk_text_into_numbered_lines, LLM_STATS
+    from prompts import prompt_json, prompt_natural, prompt_literal, prompt_emotion, with_glossary
+
+    rng = random.Random(args.seed)
+    names = [f"名{chr(0x4e00 + i)}{chr(0x4e80 + i)}" for i in range(args.entities)]
+    glossary = {"characters": {n: {"english_name": f"Name{i}", "pronoun": "he"} for i, n in enumerate(names)}, "places": {}, "items": {}, "skills": {}}
+    text = "\n".join("".join(rng.choice("天地人你我他说走看来去") for _ in range(rng.randint(10, 40))) + rng.choice(names) + "。" for _ in range(args.lines))
+    chunks = ["\n".join(f"{idx}. {line}" for idx, line in chunk.items()) for chunk in chunk_text_into_numbered_lines(text)]
+
+    layouts = {
+        "glossary in system": lambda kind, chunk, sub: (legacy_prompt(kind, sub), chunk),
+        "stable system": lambda kind, chunk, sub: ({"natural": prompt_natural, "literal": prompt_literal}[kind](), with_glossary(chunk, sub)),
+    }
+    previous = utils._llm_client
+    results = {}
+    try:
+        for name, layout in layouts.items():
+            utils.set_llm_client(PrefixCacheClient(slots=args.slots))
+            before = LLM_STATS.snapshot()
+            for chunk in chunks:
+                sub = get_relevant_glossary(chunk, glossary)
+                call_llm(prompt_json(), chunk)
+                for kind in ("natural", "literal"):
+                    call_llm(*layout(kind, chunk, sub))
+                call_llm(prompt_emotion(), chunk)
+            after = LLM_STATS.snapshot()
+            results[name] = (after["calls"] - before["calls"], after["prompt_eval_tokens"] - before["prompt_eval_tokens"])
+    finally:
+        utils.set_llm_client(previous)
+
+    print(f"\n{len(chunks)} chunks, {args.entities} glossary entities, {args.slots} server cache slots (prompt size in characters)")
+    print(f"{'layout':<20}{'calls':>8}{'evaluated':>12}{'per call':>10}")
+    for name, (calls, evaluated) in results.items():
+        print(f"{name:<20}{calls:>8}{evaluated:>12}{evaluated / calls:>10.0f}")
+    base, tuned = results["glossary in system"][1], results["stable system"][1]
+    print(f"Prompt prefill saved: {1 - tuned / base:.1%}")
+
+# ==========================
+# DRAFT / VERIFY MODEL TIERS
+# ==========================
+class TieredStubClient:
+    """
+    Stub Ollama client with simulated per-model latency (prefill + generation rates per character).
+    The draft model gets a fraction of lines wrong (Han left in, glossary name dropped, bad emotion tag).
+    """
+    def __init__(self, rates, draft_model, error_rate, glossary, time_scale, seed=0):
+        self.rates, self.draft_model, self.error_rate = rates, draft_model, error_rate
+        self.names = {cn: data["english_name"] for cat in glossary.values() for cn, data in cat.items()}
+        self.time_scale = time_scale
+        self.rng = random.Random(seed)
+        self.simulated_seconds = 0.0
+        self.calls = {}
+
+    def chat(self, model, messages, keep_alive=None):
+        from config import EMOTION_VOCAB
+        system, user = messages[0]["content"], messages[1]["content"]
+        lines = [line.split(". ", 1)[1] for line in user.split("\n\nGLOSSARY")[0].split("\n") if ". " in line]
+        is_draft = model == self.draft_model
+        out = []
+        for idx, source in enumerate(lines, 1):
+            wrong = is_draft and self.rng.random() < self.error_rate
+            if "audiobook director" in system:
+                out.append(f"{idx}. {'calm-ish' if wrong else EMOTION_VOCAB[0]}")
+                continue
+            names = [en for cn, en in self.names.items() if cn in source]
+            words = ["word"] * max(1, len(source) // 2) + ([] if wrong else names)
+            if wrong and not names: words.append(source[:2])
+            out.append(f"{idx}. {' '.join(words)}")
+        content = "\n".join(out)
+
+        prefill_rate, gen_rate = self.rates[model]
+        cost = (len(system) + len(user)) / prefill_rate + len(content) / gen_rate
+        self.simulated_seconds += cost
+        self.calls[model] = self.calls.get(model, 0) + 1
+        time.sleep(cost * self.time_scale)
+        return {"message": {"content": content}, "prompt_eval_count": 0, "eval_count": 0, "eval_duration": 0}
+
+def bench_draft_tiers(args):
+    import utils
+    import llm_tiers
+    from config import LLM_MODEL
+    from utils import get_relevant_glossary, chunk_text_into_numbered_lines
+    from prompts import prompt_json, prompt_natural, prompt_literal, prompt_emotion, with_glossary
+
+    rng = random.Random(args.seed)
+    names = [f"名{chr(0x4e00 + i)}{chr(0x4e80 + i)}" for i in range(20)]
+    glossary = {"characters": {n: {"english_name": f"Name{i}"} for i, n in enumerate(names)}, "places": {}, "items": {}, "skills": {}}
+    text = "\n".join("".join(rng.choice("天地人你我他说走看来去") for _ in range(rng.randint(10, 40))) + (rng.choice(names) if rng.random() < 0.3 else "") + "。" for _ in range(args.lines))
+    chunks = chunk_text_into_numbered_lines(text)
+
+    draft_model = "draft-stub"
+    # (prefill, generation) characters per second; roughly a 14B vs a 3B model on one GPU
+    rates = {LLM_MODEL: (1600.0, 60.0), draft_model: (8000.0, 240.0)}
+    previous = (utils._llm_client, llm_tiers.LLM_DRAFT_MODEL)
+    results = {}
+    try:
+        for name, draft in (("single tier", None), ("draft + verify", draft_model)):
+            client = TieredStubClient(rates, draft_model, args.error_rate, glossary, args.time_scale, args.seed)
+            utils.set_llm_client(client)
+            llm_tiers.LLM_DRAFT_MODEL = draft
+            tiers_before = llm_tiers.TIER_STATS.snapshot()
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                for chunk_dict in chunks:
+                    numbered = "\n".join(f"{idx}. {line}" for idx, line in chunk_dict.items())
+                    sub = get_relevant_glossary(numbered, glossary)
+                    utils.call_llm(prompt_json(), numbered, model=llm_tiers.model_for("json"))
+                    llm_tiers.request_lines("natural", prompt_natural(), with_glossary(numbered, sub), chunk_dict, sub)
+                    llm_tiers.request_lines("literal", prompt_literal(), with_glossary(numbered, sub), chunk_dict, sub)
+                    llm_tiers.request_lines("emotion", prompt_emotion(), numbered, chunk_dict)
+            stats = llm_tiers.TIER_STATS.snapshot()
+            drafted = sum(v[0] for v in stats.values()) - sum(v[0] for v in tiers_before.values())
+            escalated = sum(v[1] for v in stats.values()) - sum(v[1] for v in tiers_before.values())
+            results[name] = (client, drafted, escalated, time.perf_counter() - start)
+    finally:
+        utils.set_llm_client(previous[0])
+        llm_tiers.LLM_DRAFT_MODEL = previous[1]
+
+    print(f"\n{len(chunks)} chunks, draft error rate {args.error_rate:.0%} per line")
+    print(f"{'mode':<16}{'big calls':>10}{'draft calls':>12}{'escalated':>14}{'sim. s':>9}{'wall s':>9}")
+    for name, (client, drafted, escalated, wall) in results.items():
+        share = f"{escalated}/{drafted} ({escalated / drafted:.0%})" if drafted else "-"
+        print(f"{name:<16}{client.calls.get(LLM_MODEL, 0):>10}{client.calls.get(draft_model, 0):>12}{share:>14}{client.simulated_seconds:>9.1f}{wall:>9.2f}")
+    base, tuned = results["single tier"][0].simulated_seconds, results["draft + verify"][0].simulated_seconds
+    print(f"End-to-end speedup (simulated model time): {base / tuned:.2f}x")
+
+# ==========================
+# TRANSLATION MEMORY
+# ==========================
+def bench_translation_memory(args):
+    from translation_memory import TranslationMemory
+    from config import TM_SERVE_THRESHOLD, TM_EXAMPLE_THRESHOLD
+
+    rng = random.Random(args.seed)
+    alphabet = "天地人你我他说走看来去的了是在不有这个上们到时大为子中"
+    def sentence(): return "".join(rng.choice(alphabet) for _ in range(rng.randint(8, 40))) + "。"
+
+    book1 = [sentence() for _ in range(args.lines)]
+    # Sequel: some lines repeated verbatim, some lightly edited, the rest new
+    book2, kinds = [], []
+    for _ in range(args.lines):
+        roll = rng.random()
+        if roll < args.repeat:
+            book2.append(rng.choice(book1)); kinds.append("repeat")
+        elif roll < args.repeat + args.edited:
+            base = list(rng.choice(book1))
+            base[rng.randrange(len(base) - 1)] = rng.choice(alphabet)
+            book2.append("".join(base)); kinds.append("edited")
+        else:
+            book2.append(sentence()); kinds.append("new")
+
+    work_dir = Path(tempfile.mkdtemp(prefix="bench_tm_"))
+    try:
+        with TranslationMemory(work_dir / "tm.sqlite") as tm:
+            start = time.perf_counter()
+            tm.add_many({"cn": cn, "nat": f"en {i}", "lit": f"lit {i}", "emo": "Calm narrative"} for i, cn in enumerate(book1))
+            add_seconds = time.perf_counter() - start
+
+            served = examples = 0
+            start = time.perf_counter()
+            for cn in book2:
+                match = tm.lookup(cn, TM_EXAMPLE_THRESHOLD)
+                if match is None: continue
+                if match.similarity >= TM_SERVE_THRESHOLD: served += 1
+                else: examples += 1
+            lookup_seconds = time.perf_counter() - start
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    print(f"\nBook 1: {args.lines} lines stored in {add_seconds:.2f} s")
+    print(f"Sequel: {kinds.count('repeat')} repeated, {kinds.count('edited')} one-char edits, {kinds.count('new')} new lines")
+    print(f"Lookups: {args.lines / lookup_seconds:.0f} lines/s")
+    print(f"Served without the LLM: {served} ({served / args.lines:.1%}) | passed as examples: {examples}")
+
+# ==========================
+# PINYIN
+# ==========================
+# Proper nouns whose characters pypinyin reads differently out of context (surnames, titles, polyphones)
+PINYIN_NAMES = {
+    "单于": "Shàn Yú", "曾阿牛": "Zēng Ā niú", "解飞": "Xiè Fēi", "仇乐": "Qiú Lè", "朴重": "Piáo Zhòng",
+    "查长乐": "Zhā Cháng lè", "尉迟行": "Yùchí Xíng", "区长风": "Ōu Cháng fēng", "万俟岚": "Mòqí Lán", "盖聂": "Gě Niè",
+}
+
+def bench_pinyin(args):
+    from utils import generate_pinyin
+    from pinyin_engine import GlossaryPinyin, split_name_pinyin
+
+    rng = random.Random(args.seed)
+    alphabet = "天地人你我他说走看来去的了是在不有这个上们到时大为子中长乐行重，。"
+    glossary = {"characters": {name: {"pinyin": reading} for name, reading in PINYIN_NAMES.items()}}
+    lines, mentions = [], []
+    for _ in range(args.lines):
+        names = rng.sample(list(PINYIN_NAMES), rng.randint(0, 2))
+        parts = ["".join(rng.choice(alphabet) for _ in range(rng.randint(4, 20)))]
+        for name in names: parts += [name, "".join(rng.choice(alphabet) for _ in range(rng.randint(2, 10)))]
+        lines.append("".join(parts) + "。")
+        mentions.append(names)
+
+    def accuracy(outputs):
+        hits = sum(" ".join(split_name_pinyin(n, PINYIN_NAMES[n])).lower() in out.lower() for out, names in zip(outputs, mentions) for n in names)
+        return hits / max(1, sum(map(len, mentions)))
+
+    start = time.perf_counter()
+    baseline = [generate_pinyin(line) for line in lines]
+    baseline_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    engine = GlossaryPinyin(glossary)
+    chapter = engine.convert_lines(lines)
+    engine_seconds = time.perf_counter() - start
+
+    print(f"\n{args.lines} lines, {sum(map(len, mentions))} proper-noun mentions")
+    print(f"{'mode':<30}{'seconds':>10}{'lines/s':>12}{'names right':>14}")
+    print(f"{'pypinyin, line by line':<30}{baseline_seconds:>10.2f}{args.lines / baseline_seconds:>12.0f}{accuracy(baseline):>14.1%}")
+    print(f"{'glossary engine, one call':<30}{engine_seconds:>10.2f}{args.lines / engine_seconds:>12.0f}{accuracy(chapter):>14.1%}")
+
+# ==========================
+# CHAPTER STREAMING
+# ==========================
+def legacy_assemble(chapter, chapter_lines, novel_name, paths):
+    """The pre-streaming assembly: whole chapter in a list, text and XHTML built with += and written at the end."""
+    import genanki
+    from config import ANKI_MODEL
+    from utils import get_audio_filename
+
+    deck = genanki.Deck(1, "Bench")
+    full_text_en = ""
+    epub_body = f"<h1>{chapter_lines[0]['nat']}</h1>\n"
+    media_files = []
+    for line_idx, line in enumerate(chapter_lines):
+        audio_filename = get_audio_filename(chapter.chapter_number, line_idx)
+        audio_path = paths["media"] / f"ch_{chapter.chapter_number:04d}" / audio_filename
+        if audio_path.exists(): media_files.append(str(audio_path))
+        deck.add_note(genanki.Note(model=ANKI_MODEL, guid=genanki.guid_for(f"{novel_name}_Ch_{chapter.chapter_number:03d}_L{line_idx:04d}"),
+                                   fields=[line["cn"], line["py"], line["lit"], line["nat"], f"[sound:{audio_filename}]"], tags=[novel_name]))
+        full_text_en += line["nat"] + "\n"
+        epub_body += f"""
+        <div class="study-block">
+            <audio controls preload="none"><source src="media/ch_{chapter.chapter_number:04d}/{audio_filename}" type="audio/ogg"></audio>
+            <p class="cn">{line["cn"]}</p>
+            <p class="py">{line["py"]}</p>
+            <p class="lit">"{line["lit"]}"</p>
+            <p class="en">{line["nat"]}</p>
+        </div>"""
+    (paths["trans"] / chapter.file_name).write_text(full_text_en, encoding='utf-8')
+    (paths["epub"] / chapter.file_name.replace('.txt', '.xhtml')).write_text(f"<html><body>{epub_body}</body></html>", encoding='utf-8')
+    return deck, media_files
+
+def bench_stream(args):
+    import json
+    import tracemalloc
+    from main import setup_directories, assemble_chapter_outputs
+    from line_stream import ChapterLines, write_json_array
+    from utils import Chapter
+
+    work_dir = Path(tempfile.mkdtemp(prefix="bench_stream_"))
+    try:
+        (work_dir / "Bench_Novel").mkdir()
+        paths = setup_directories(work_dir / "Bench_Novel")
+        chapter = Chapter("Bench_Novel", "ch_001.txt", None, 1)
+        json_path = paths["trans"] / "ch_001.json"
+        write_json_array(json_path, ({"cn": cn, "py": "zì " * len(cn), "nat": "word " * (len(cn) // 2 + 3), "lit": "char " * len(cn), "emo": emo}
+                                     for cn, emo in make_synthetic_lines(args.lines, args.seed)))
+        print(f"\nSynthetic chapter: {args.lines} lines, {json_path.stat().st_size / 1024**2:.1f} MB of JSON")
+
+        runs = (
+            ("list + string +=", lambda: legacy_assemble(chapter, json.loads(json_path.read_text(encoding='utf-8')), "Bench", paths)),
+            ("streamed (ChapterLines)", lambda: assemble_chapter_outputs(chapter, ChapterLines(json_path), "Bench", paths)),
+        )
+        print(f"{'assembly':<26}{'seconds':>10}{'peak MB':>10}")
+        for name, run in runs:
+            tracemalloc.start()
+            start = time.perf_counter()
+            result = run()
+            seconds = time.perf_counter() - start
+            peak = tracemalloc.get_traced_memory()[1] / 1024**2
+            tracemalloc.stop()
+            del result
+            print(f"{name:<26}{seconds:>10.2f}{peak:>10.1f}")
+        print("The legacy run also builds the chapter's genanki notes; the streamed run leaves them to the package writer.")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+# ==========================
+# PARALLEL TEXT STAGE
+# ==========================
+class ReplicaStubClient:
+    """
+    Stub Ollama backend with `replicas` parallel slots and a fixed latency per call. The glossary prompt
+    reports each 名X name in the chunk with probability 1 - miss_rate; translations only use a name's
+    English form if the glossary tail has it.
+    """
+    def __init__(self, replicas, latency, miss_rate=0.5, seed=0):
+        import re
+        self.slots = threading.Semaphore(replicas)
+        self.latency = latency
+        self.miss_rate = miss_rate
+        self.rng = random.Random(seed)
+        self.name_pattern = re.compile(r'名.')
+
+    def chat(self, model, messages, keep_alive=None):
+        import json
+        system, user = messages[0]["content"], messages[1]["content"]
+        lines = [line for line in user.split("\n\n")[0].split("\n") if ". " in line]
+        with self.slots:
+            time.sleep(self.latency)
+        if "JSON" in system:
+            names = [n for n in sorted(set(self.name_pattern.findall(user))) if self.rng.random() >= self.miss_rate]
+            content = json.dumps({"characters": {n: {"english_name": f"Name{ord(n[1])}", "pinyin": ""} for n in names}}, ensure_ascii=False)
+        elif "audiobook director" in system:
+            content = "\n".join(f"{i}. Calm narrative" for i in range(1, len(lines) + 1))
+        else:
+            known = [f"Name{ord(n[1])}" for n in self.name_pattern.findall(user.split("GLOSSARY:")[-1])] if "GLOSSARY:" in user else []
+            content = "\n".join(f"{i}. words {' '.join(known)}" for i in range(1, len(lines) + 1))
+        return {"message": {"content": content}, "prompt_eval_count": 0, "eval_count": 0, "eval_duration": 0}
+
+def bench_parallel_text(args):
+    import utils
+    from main import setup_directories, run_text_stage, run_parallel_text_stage
+    from glossary_store import GlossaryStore
+    from utils import Chapter
+
+    alphabet = "天地人你我他说走看来去的了是在不有这个上们到时大为子中"
+    names = [f"名{chr(0x4e00 + i)}" for i in range(12)]
+    previous = utils._llm_client
+    print(f"\n{args.chapters} chapters x {args.lines} lines, {args.replicas} backend slots, {args.latency * 1000:.0f} ms per call")
+    print(f"{'workers':>8}{'seconds':>10}{'chapters/min':>14}{'lines redone':>14}")
+    try:
+        for workers in sorted({1, 2, args.replicas, args.replicas * 2}):
+            work_dir = Path(tempfile.mkdtemp(prefix="bench_parallel_"))
+            try:
+                (work_dir / "Novel").mkdir()
+                paths = setup_directories(work_dir / "Novel")
+                rng, chapters = random.Random(args.seed), []
+                for n in range(1, args.chapters + 1):
+                    # Every few lines mention one of a handful of recurring names (the stub misses half of them per chunk)
+                    text = "\n".join("".join(rng.choice(alphabet) for _ in range(30)) + (rng.choice(names) if i % 5 == 0 else "") + "。" for i in range(args.lines))
+                    path = paths["raw"] / f"ch_{n:03d}.txt"
+                    path.write_text(text, encoding='utf-8')
+                    chapters.append(Chapter("Novel", path.name, None, n, path))
+
+                utils.set_llm_client(ReplicaStubClient(args.replicas, args.latency, seed=args.seed))
+                glossary, stop_event, log = GlossaryStore(paths["glossary"]), threading.Event(), io.StringIO()
+                start = time.perf_counter()
+                with contextlib.redirect_stdout(log):
+                    if workers == 1:
+                        for chapter in chapters: run_text_stage(chapter, paths, glossary, stop_event, False)
+                    else:
+                        run_parallel_text_stage(chapters, paths, glossary, stop_event, False, None, workers)
+                seconds = time.perf_counter() - start
+                redone = sum(int(line.split("Re-translated ")[1].split()[0]) for line in log.getvalue().splitlines() if "Re-translated" in line)
+                print(f"{workers:>8}{seconds:>10.2f}{args.chapters * 60 / seconds:>14.1f}{redone:>14}")
+            finally:
+                shutil.rmtree(work_dir, ignore_errors=True)
+    finally:
+        utils.set_llm_client(previous)
+
+# ==========================
+# ANKI PACKAGE WRITING
+# ==========================
+def bench_anki(args):
+    import genanki
+    from config import ANKI_MODEL
+    from anki_writer import AnkiChapter, write_apkg
+    from utils import get_audio_filename
+
+    per_chapter = max(1, args.lines // args.chapters)
+    rows = [{"cn": cn, "py": "zì " * len(cn), "nat": "word " * (len(cn) // 2 + 3), "lit": "char " * len(cn), "emo": emo}
+            for cn, emo in make_synthetic_lines(per_chapter * args.chapters, args.seed)]
+    chapters = [AnkiChapter("Bench_Novel", n + 1, rows[n * per_chapter:(n + 1) * per_chapter]) for n in range(args.chapters)]
+    work_dir = Path(tempfile.mkdtemp(prefix="bench_anki_"))
+
+    def genanki_package():
+        decks = []
+        for chapter in chapters:
+            deck = genanki.Deck(chapter.deck_id, chapter.deck_name)
+            for line_idx, line in enumerate(chapter.lines):
+                deck.add_note(genanki.Note(
+                    model=ANKI_MODEL, guid=genanki.guid_for(f"{chapter.novel_name}_Ch_{chapter.chapter_number:03d}_L{line_idx:04d}"),
+                    fields=[line["cn"], line["py"], line["lit"], line["nat"], f"[sound:{get_audio_filename(chapter.chapter_number, line_idx)}]"],
+                    tags=[chapter.novel_name, f"Ch_{chapter.chapter_number:03d}"]))
+            decks.append(deck)
+        genanki.Package(decks).write_to_file(str(work_dir / "genanki.apkg"))
+
+    try:
+        print(f"\n{len(rows)} notes in {args.chapters} chapters")
+        print(f"{'writer':<34}{'seconds':>10}{'notes/s':>12}")
+        runs = (
+            ("genanki Note objects + Package", genanki_package),
+            ("bulk GUIDs + one SQL transaction", lambda: write_apkg(chapters, [], work_dir / "bulk.apkg")),
+        )
+        for name, run in runs:
+            start = time.perf_counter()
+            run()
+            seconds = time.perf_counter() - start
+            print(f"{name:<34}{seconds:>10.2f}{len(rows) / seconds:>12.0f}")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+def bench_anki_append(args):
+    from anki_writer import AnkiChapter, IncrementalPackage, write_apkg
+    from utils import get_audio_filename
+
+    rows = [{"cn": cn, "py": "zì " * len(cn), "nat": "word " * (len(cn) // 2 + 3), "lit": "char " * len(cn), "emo": emo}
+            for cn, emo in make_synthetic_lines(args.lines, args.seed)]
+    work_dir = Path(tempfile.mkdtemp(prefix="bench_anki_append_"))
+    try:
+        rng = random.Random(args.seed)
+        chapters, media = [], []
+        for n in range(1, args.chapters + 1):
+            chapters.append(AnkiChapter("Bench_Novel", n, rows))
+            for line_idx in range(args.lines):
+                path = work_dir / get_audio_filename(n, line_idx)
+                path.write_bytes(rng.randbytes(args.clip_kb * 1024)) # Incompressible, like Opus
+                media.append(str(path))
+        print(f"\nMaster deck of {args.chapters} chapters x {args.lines} lines, {len(media) * args.clip_kb / 1024:.0f} MB of clips; exporting the last chapter")
+
+        master = IncrementalPackage(work_dir / "master.anki2", work_dir / "master_media.json")
+        master.add_chapters(chapters[:-1], media[:-args.lines])
+        master.write(work_dir / "incremental.apkg")
+
+        def full_rewrite():
+            write_apkg(chapters, media, work_dir / "full.apkg")
+        def incremental():
+            master.add_chapters(chapters[-1:], media[-args.lines:])
+            assert master.write(work_dir / "incremental.apkg")
+
+        print(f"{'export':<34}{'seconds':>10}")
+        for name, run in (("rebuild the whole .apkg", full_rewrite), ("append the new chapter", incremental)):
+            start = time.perf_counter()
+            run()
+            print(f"{name:<34}{time.perf_counter() - start:>10.2f}")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+# ==========================
+# DRY-RUN PLANNER
+# ==========================
+def bench_plan(args):
+    import sys
+    from planner import plan_novel, format_plan
+
+    work_dir = Path(tempfile.mkdtemp(prefix="bench_plan_"))
+    try:
+        raw_dir = work_dir / "Bench_Novel" / "01_Raw_Text"
+        raw_dir.mkdir(parents=True)
+        lines = [cn for cn, _ in make_synthetic_lines(args.lines * 50, args.seed)]
+        for n in range(1, args.chapters + 1):
+            start = (n * 7919) % (len(lines) - args.lines)
+            (raw_dir / f"ch_{n:04d}.txt").write_text("\n".join(lines[start:start + args.lines]), encoding='utf-8')
+        size = sum(p.stat().st_size for p in raw_dir.iterdir())
+        print(f"\n{args.chapters} chapters x {args.lines} lines, {size / 1024**2:.1f} MB of raw text")
+
+        for label in ("cold (index scan)", "warm (index cached)"):
+            start = time.perf_counter()
+            plan = plan_novel(work_dir / "Bench_Novel")
+            print(f"{label:<22}{time.perf_counter() - start:>8.2f} s")
+        for line in format_plan(plan): print("  " + line)
+        print(f"torch imported: {'torch' in sys.modules}")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+# ==========================
+# BOILERPLATE / REPEATED LINES
+# ==========================
+def bench_boilerplate(args):
+    from boilerplate import LineIndex, format_report
+    from chapter_index import ChapterIndex
+    from utils import chunk_text_into_numbered_lines
+
+    rng = random.Random(args.seed)
+    chars = "林动青阳镇山门长老弟子天地灵气修炼突破剑光大殿少年目光冷笑一声缓缓说道"
+    stock = ["“嗯。”", "“是！”", "“什么？”", "众人一片哗然。"] # Short lines real chapters repeat
+    boilerplate = ["本书首发于起点中文网，请支持正版阅读", "月底了，兄弟们求月票！", "PS：今天还有一更。", "------"]
+    work_dir = Path(tempfile.mkdtemp(prefix="bench_boilerplate_"))
+    try:
+        raw_dir = work_dir / "01_Raw_Text"
+        raw_dir.mkdir()
+        for n in range(1, args.chapters + 1):
+            lines = ["".join(rng.choice(chars) for _ in range(rng.randint(6, 60))) + "。" for _ in range(args.lines)]
+            lines += rng.sample(stock, 2) + [boilerplate[0], boilerplate[3]] + ([rng.choice(boilerplate[1:3])] if rng.random() < 0.3 else [])
+            rng.shuffle(lines)
+            (raw_dir / f"ch_{n:04d}.txt").write_text("\n".join(lines), encoding='utf-8')
+        entries = ChapterIndex(raw_dir, work_dir / "chapter_index.json").refresh().chapters()
+        print(f"\n{args.chapters} chapters x ~{args.lines + 4} lines")
+
+        for label in ("cold (scan)", "warm (cached)"):
+            start = time.perf_counter()
+            index = LineIndex.for_novel(raw_dir, entries, work_dir / "line_index.json")
+            print(f"{label:<16}{time.perf_counter() - start:>8.2f} s")
+
+        texts = [(raw_dir / e.file_name).read_text(encoding='utf-8') for e in entries]
+        total = sum(len(c) for text in texts for c in chunk_text_into_numbered_lines(text))
+        kept = sum(len(c) for text in texts for c in chunk_text_into_numbered_lines(text, skip=index.skip_set("drop")))
+        report = index.report("drop")
+        print(f"chunked lines   {total:>8,} -> {kept:,} after dropping boilerplate, {kept - report['duplicate_lines']:,} sent to the LLM")
+        print(format_report(report))
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+# ==========================
+# EPUB CHAPTER XHTML
+# ==========================
+def legacy_xhtml(path, chapter_number, lines):
+    """The former chapter XHTML: unescaped f-strings, the title left to be parsed back out of <h1>."""
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as out:
+        out.write("<html><head><link rel='stylesheet' href='style/nav.css' type='text/css'/></head><body>")
+        for line_idx, line in enumerate(lines):
+            if line_idx == 0: out.write(f"<h1>{line['nat']}</h1>\n")
+            out.write(f"""
+        <div class="study-block">
+            <audio controls preload="none"><source src="media/ch_{chapter_number:04d}/ch{chapter_number:02d}_L{line_idx:04d}.opus" type="audio/ogg"></audio>
+            <p class="cn">{line["cn"]}</p>
+            <p class="py">{line["py"]}</p>
+            <p class="lit">"{line["lit"]}"</p>
+            <p class="en">{line["nat"]}</p>
+        </div>""")
+        out.write("</body></html>")
+    os.replace(tmp_path, path)
+
+def bench_epub(args):
+    import xml.etree.ElementTree as ET
+    from epub_writer import ChapterXhtmlWriter, record_title, read_titles
+    from exporters import build_final_epub
+    from utils import get_audio_filename
+
+    rng = random.Random(args.seed)
+    lines = [{"cn": cn, "py": "zì " * len(cn), "lit": "char " * len(cn),
+              "nat": ("Q&A <aside> " if rng.random() < args.markup else "") + "word " * (len(cn) // 2 + 3)}
+             for cn, _ in make_synthetic_lines(args.lines, args.seed)]
+    work_dir = Path(tempfile.mkdtemp(prefix="bench_epub_"))
+    try:
+        def well_formed(epub_dir):
+            ok = 0
+            for path in epub_dir.glob("*.xhtml"):
+                try:
+                    ET.parse(path)
+                    ok += 1
+                except ET.ParseError:
+                    pass
+            return ok
+
+        print(f"\n{args.chapters} chapters x {args.lines} lines, {args.markup:.0%} of translations contain '<' or '&'")
+        print(f"{'chapter XHTML':<16}{'write s':>10}{'titles s':>10}{'build s':>10}{'well-formed':>14}")
+        for label in ("f-strings", "template"):
+            epub_dir = work_dir / label / "03_EPUB_Chapters"
+            epub_dir.mkdir(parents=True)
+            start = time.perf_counter()
+            for n in range(1, args.chapters + 1):
+                name = f"ch_{n:04d}.xhtml"
+                if label == "f-strings":
+                    legacy_xhtml(epub_dir / name, n, lines)
+                    continue
+                with ChapterXhtmlWriter(epub_dir / name, n, name) as writer:
+                    for idx, line in enumerate(lines): writer.write(line, get_audio_filename(n, idx))
+                record_title(epub_dir, name, writer.title)
+            written = time.perf_counter() - start
+
+            start = time.perf_counter()
+            if label == "f-strings":
+                titles = {p.name: p.read_text(encoding='utf-8').split("<h1>")[1].split("</h1>")[0] for p in epub_dir.glob("*.xhtml")}
+            else:
+                titles = read_titles(epub_dir)
+            titled = time.perf_counter() - start
+
+            start = time.perf_counter()
+            build_final_epub("Bench", epub_dir.parent, {"title": "Bench"}) # Rebuilt after every exported chapter
+            print(f"{label:<16}{written:>10.2f}{titled:>10.3f}{time.perf_counter() - start:>10.2f}{well_formed(epub_dir):>8}/{args.chapters}")
+        print("f-string chapters are parsed and rebuilt by ebooklib; template chapters are stored as written.")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+# ==========================
+# GLOSSARY COMPACTION
+# ==========================
+def bench_glossary(args):
+    from glossary_store import build_stats, compact_glossary, format_compaction
+    from utils import chunk_text_into_numbered_lines, get_relevant_glossary
+    from prompts import with_glossary
+    from config import GLOSSARY_PROMPT_MAX_ENTRIES
+
+    rng = random.Random(args.seed)
+    name_chars, filler = "林苏萧叶秦云岳韩慕容楚凌风雪霜龙凤玄灵天星月影", "山门长老弟子大殿少年目光冷笑一声缓缓说道走来看去"
+    make_name = lambda length: "".join(rng.choice(name_chars) for _ in range(length))
+    glossary = {"characters": {}, "places": {}, "items": {}, "skills": {}}
+    cast = list(dict.fromkeys(make_name(rng.randint(2, 3)) for _ in range(args.cast)))
+    for i, name in enumerate(cast):
+        glossary["characters"][name] = {"english_name": f"Hero {i}", "gender": "male"}
+        glossary["characters"].setdefault(name[0], {"english_name": f"Surname {name[0]}"}) # Bare surnames, only ever part of a name
+    variants = {name: name[0] + rng.choice(name_chars) + name[2:] for name in cast[:len(cast) // 2]} # Second spelling, first-write-wins kept both
+    for name, variant in variants.items():
+        glossary["characters"].setdefault(variant, {"english_name": glossary["characters"][name]["english_name"]})
+
+    chapters = []
+    weights = [1 / (rank + 1) for rank in range(len(cast))] # Zipf: a few leads, a long tail of side characters
+    for n in range(1, args.chapters + 1):
+        extras = [f"{make_name(3)}{k}号" for k in range(args.one_offs)] # Minor entities named once and never again
+        for k, extra in enumerate(extras): glossary[("items", "skills", "places")[k % 3]][extra] = {"english_name": f"Minor {n}.{k}"}
+        lines = []
+        for _ in range(args.lines):
+            name = rng.choices(cast, weights)[0]
+            if name in variants and rng.random() < 0.05: name = variants[name]
+            lines.append(name + "".join(rng.choice(filler) for _ in range(rng.randint(6, 30))) + "。")
+        for extra in extras: lines.insert(rng.randrange(len(lines)), f"他拿出了{extra}。")
+        chapters.append((n, "\n".join(lines)))
+
+    chunks = [("\n".join(f"{i}. {line}" for i, line in chunk.items())) for _, text in chapters for chunk in chunk_text_into_numbered_lines(text)]
+    print(f"\n{args.chapters} chapters, {len(chunks):,} chunks, glossary of {sum(len(v) for v in glossary.values()):,} entries")
+
+    start = time.perf_counter()
+    stats = build_stats(chapters, glossary)
+    compacted, report = compact_glossary(glossary, stats)
+    stats = build_stats(chapters, compacted)
+    print(f"compaction      {time.perf_counter() - start:>8.2f} s  {format_compaction(report)}")
+
+    # The former lookup: every entry whose name is a substring of the chunk, surnames inside full names included
+    substring = lambda text, entries, *_: {cat: {n: d for n, d in names.items() if n in text} for cat, names in entries.items()}
+    print(f"{'':<28}{'entries/chunk':>14}{'max':>6}{'glossary chars/chunk':>22}{'lookup ms/chunk':>17}")
+    for label, lookup, entries, entity_stats, limit in (
+            ("substring, first-write-wins", substring, glossary, None, None),
+            ("compacted, ranked + capped", get_relevant_glossary, compacted, stats["entities"], GLOSSARY_PROMPT_MAX_ENTRIES)):
+        start, counts, chars = time.perf_counter(), [], 0
+        for chunk in chunks:
+            relevant = lookup(chunk, entries, entity_stats, limit)
+            counts.append(sum(len(v) for v in relevant.values()))
+            chars += len(with_glossary(chunk, relevant)) - len(chunk)
+        elapsed = time.perf_counter() - start
+        print(f"{label:<28}{sum(counts) / len(chunks):>14.1f}{max(counts):>6}{chars / len(chunks):>22,.0f}{elapsed * 1000 / len(chunks):>17.2f}")
+
+# ==========================
+# TEXT NORMALIZATION
+# ==========================
+def legacy_normalizers():
+    """The per-line cleaners as plain re calls (the former re.sub chains), patterns looked up in re's cache on every call."""
+    import re
+    from config import EMOTION_VOCAB, DEFAULT_EMOTION
+    from utils import EMOTION_KEYWORDS
+
+    def clean_for_tts(text):
+        text = re.sub(r'(?i)^(chapter|ch\.?)\s*\d+\s*[-—:]?\s*', '', text) # Inline flag moved to the front: an error from Python 3.11
+        text = re.sub(r'[“”（）《》【】\-—]', '', text)
+        text = re.sub(r'？+', '？', text)
+        text = re.sub(r'！+', '！', text)
+        text = re.sub(r'…+', '…', text)
+        text = re.sub(r'\.+', '.', text)
+        return text.strip()
+
+    lookup = {tag.lower(): tag for tag in EMOTION_VOCAB}
+    def canonicalize_emotion(tag):
+        clean = " ".join(re.sub(r'[^a-zA-Z0-9\s]', '', tag or "").lower().split())
+        if clean in lookup: return lookup[clean]
+        clean = re.sub(r'\b(?:not|never|without) \w+', '', clean)
+        hits = [(match.start(), rank) for rank, (_, stems) in enumerate(EMOTION_KEYWORDS) for match in [re.search(rf'\b(?:{stems})', clean)] if match]
+        return EMOTION_KEYWORDS[min(hits)[1]][0] if hits else DEFAULT_EMOTION
+
+    def sanitize_filename(text):
+        return re.sub(r'[<>:"/\\|?*]', '', text.replace(" ", "_"))
+    return clean_for_tts, canonicalize_emotion, sanitize_filename
+
+def bench_normalize(args):
+    import utils
+
+    rng = random.Random(args.seed)
+    chars = "林动青阳镇山门长老弟子天地灵气修炼突破剑光大殿少年目光冷笑一声缓缓说道"
+    punctuation = ["“", "”", "？？", "！", "……", "，", "。", "（", "）", "——"]
+    tags = ["Calm narrative", "calm narrative.", "Angry, shouting!", "Whispering softly", "Tense", "Happy", "Suspenseful narrative"]
+    lines = [("".join(rng.choice(chars) + (rng.choice(punctuation) if rng.random() < 0.15 else "") for _ in range(rng.randint(4, 60))),
+              rng.choice(tags)) for _ in range(args.lines)]
+    lines[::500] = [(f"Chapter {n} - 第{n}章", "Calm narrative") for n in range(len(lines[::500]))]
+    titles = [f"Villainous Saintess: Vol {n}? (Updated)" for n in range(args.lines // 10)]
+    print(f"\n{len(lines):,} lines, {len(titles):,} titles")
+
+    print(f"{'':<14}{'clean_for_tts':>15}{'emotion':>10}{'filename':>10}   (ms)")
+    results = []
+    for label, (clean, emotion, filename) in (("re.sub chain", legacy_normalizers()),
+                                              ("precompiled", (utils.clean_for_tts, utils.canonicalize_emotion, utils.sanitize_filename))):
+        timings, outputs = [], []
+        for fn, inputs in ((clean, [text for text, _ in lines]), (emotion, [tag for _, tag in lines]), (filename, titles)):
+            start = time.perf_counter()
+            outputs.append([fn(value) for value in inputs])
+            timings.append((time.perf_counter() - start) * 1000)
+        results.append(outputs)
+        print(f"{label:<14}{timings[0]:>15.1f}{timings[1]:>10.1f}{timings[2]:>10.1f}")
+    print(f"identical output: {results[0] == results[1]}")
+
+# ==========================
+# AUDIO QUALITY GATE
+# ==========================
+def bench_clip_quality(args):
+    from clip_quality import assess_clip
+    from audio_post import process_clip, write_opus
+
+    rng = np.random.default_rng(args.seed)
+    sr = 24000
+    def voice(seconds):
+        t = np.arange(int(sr * seconds)) / sr
+        envelope = 0.5 + 0.5 * np.sin(2 * np.pi * 3 * t) ** 2 # Syllable-like loudness changes
+        return (0.1 * envelope * np.sin(2 * np.pi * rng.uniform(120, 260) * t) + 0.005 * rng.standard_normal(t.size)).astype(np.float32)
+    faults = {
+        "truncated": lambda chars: voice(0.03 * chars),
+        "too_long": lambda chars: voice(1.5 * chars),
+        "clipping": lambda chars: np.clip(voice(0.25 * chars) * 20, -1, 1),
+        "gaps": lambda chars: np.concatenate([voice(0.1 * chars), np.zeros(int(sr * 0.6 * chars), np.float32), voice(0.1 * chars)]),
+        "silent": lambda chars: np.zeros(int(sr * 0.25 * chars), np.float32),
+    }
+    clips = []
+    for i in range(args.clips):
+        chars = int(rng.integers(4, 40))
+        kind = rng.choice(list(faults)) if rng.random() < args.bad else "good"
+        audio = voice(rng.uniform(0.18, 0.35) * chars) if kind == "good" else faults[kind](chars)
+        clips.append((kind, audio, "字" * chars))
+    print(f"\n{args.clips} clips, {sum(kind != 'good' for kind, _, _ in clips)} with injected faults")
+
+    start = time.perf_counter()
+    verdicts = [assess_clip(audio, sr, text)[0] for _, audio, text in clips]
+    checked = time.perf_counter() - start
+    work_dir = Path(tempfile.mkdtemp(prefix="bench_clip_quality_"))
+    try:
+        sample = clips[:min(len(clips), 200)]
+        start = time.perf_counter()
+        for i, (_, audio, _) in enumerate(sample): write_opus(work_dir / f"{i}.opus", *process_clip(audio, sr))
+        encoded = (time.perf_counter() - start) / len(sample)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    print(f"validator       {checked * 1000 / len(clips):>8.2f} ms/clip  (post-processing + opus encode: {encoded * 1000:.1f} ms/clip)")
+
+    print(f"{'injected':<12}{'clips':>7}{'flagged':>9}{'as injected':>13}")
+    for kind in ["good"] + list(faults):
+        found = [issues for (k, _, _), issues in zip(clips, verdicts) if k == kind]
+        if not found: continue
+        print(f"{kind:<12}{len(found):>7}{sum(bool(i) for i in found):>9}{sum(kind in i for i in found) if kind != 'good' else 0:>13}")
+
+BENCHMARKS = {
+    "tts-schedule": (bench_tts_schedule, "Length/instruction-sorted TTS batches vs document order."),
+    "ingest": (bench_ingest, "Streaming split of one large GB18030 novel into chapter files."),
+    "draft-tiers": (bench_draft_tiers, "Small-model drafts with big-model escalation vs the big model for every prompt."),
+    "translation-memory": (bench_translation_memory, "Exact/near-match lookups of a sequel against the first book's memory."),
+    "pinyin": (bench_pinyin, "Glossary-aware whole-chapter pinyin vs pypinyin line by line: speed and proper-noun accuracy."),
+    "stream": (bench_stream, "Peak memory of chapter assembly: in-memory list with string += vs streamed lines and incremental writers."),
+    "parallel-text": (bench_parallel_text, "Text stage over several chapters with 1..2K concurrent workers against a K-slot stub backend."),
+    "anki": (bench_anki, "Writing a large .apkg: genanki Note objects vs bulk GUIDs and direct SQLite inserts."),
+    "anki-append": (bench_anki_append, "Exporting one more chapter into a large master deck: full .apkg rebuild vs in-place append."),
+    "plan": (bench_plan, "Dry-run cost estimate over a large novel (chunking every chapter, checking the caches)."),
+    "boilerplate": (bench_boilerplate, "Novel-wide boilerplate/repeated-line index: build time and LLM lines saved."),
+    "epub": (bench_epub, "Chapter XHTML: unescaped f-strings with <h1> title parsing vs escaped templates with a title manifest."),
+    "glossary": (bench_glossary, "Prompt glossary per chunk: every mentioned entry of a first-write-wins glossary vs compacted, ranked and capped."),
+    "normalize": (bench_normalize, "Per-line TTS cleaning, emotion tags and file names: re.sub chains vs precompiled tables."),
+    "clip-quality": (bench_clip_quality, "Audio quality gate: validator cost per clip vs encoding, and which injected faults it catches."),
+    "prompt-cache": (bench_prompt_cache, "Prompt tokens evaluated with the glossary in the system prompt vs the user message tail."),
+}
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline pipeline benchmarks (stub models, synthetic data).")
+    sub = parser.add_subparsers(dest="bench", required=True)
+
+    p = sub.add_parser("tts-schedule", help=BENCHMARKS["tts-schedule"][1])
+    p.add_argument("--lines", type=int, default=2000)
+    p.add_argument("--batch", type=int, default=4)
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--time-scale", type=float, default=0.001, help="Fraction of the simulated model time actually slept.")
+
+    p = sub.add_parser("ingest", help=BENCHMARKS["ingest"][1])
+    p.add_argument("--mb", type=float, default=100)
+    p.add_argument("--seed", type=int, default=0)
+
+    p = sub.add_parser("prompt-cache", help=BENCHMARKS["prompt-cache"][1])
+    p.add_argument("--lines", type=int, default=400)
+    p.add_argument("--entities", type=int, default=40)
+    p.add_argument("--slots", type=int, default=4)
+    p.add_argument("--seed", type=int, default=0)
+
+    p = sub.add_parser("draft-tiers", help=BENCHMARKS["draft-tiers"][1])
+    p.add_argument("--lines", type=int, default=400)
+    p.add_argument("--error-rate", type=float, default=0.02, help="Chance that the draft model gets a line wrong.")
+    p.add_argument("--time-scale", type=float, default=0.001, help="Fraction of the simulated model time actually slept.")
+    p.add_argument("--seed", type=int, default=0)
+
+    p = sub.add_parser("translation-memory", help=BENCHMARKS["translation-memory"][1])
+    p.add_argument("--lines", type=int, default=20000)
+    p.add_argument("--repeat", type=float, default=0.15, help="Share of sequel lines repeated verbatim.")
+    p.add_argument("--edited", type=float, default=0.10, help="Share of sequel lines with a one-character edit.")
+    p.add_argument("--seed", type=int, default=0)
+
+    p = sub.add_parser("pinyin", help=BENCHMARKS["pinyin"][1])
+    p.add_argument("--lines", type=int, default=20000)
+    p.add_argument("--seed", type=int, default=0)
+
+    p = sub.add_parser("stream", help=BENCHMARKS["stream"][1])
+    p.add_argument("--lines", type=int, default=20000)
+    p.add_argument("--seed", type=int, default=0)
+
+    p = sub.add_parser("parallel-text", help=BENCHMARKS["parallel-text"][1])
+    p.add_argument("--chapters", type=int, default=8)
+    p.add_argument("--lines", type=int, default=60)
+    p.add_argument("--replicas", type=int, default=4, help="Concurrent requests the stub backend serves.")
+    p.add_argument("--latency", type=float, default=0.05, help="Seconds per LLM call.")
+    p.add_argument("--seed", type=int, default=0)
+
+    p = sub.add_parser("anki", help=BENCHMARKS["anki"][1])
+    p.add_argument("--lines", type=int, default=200000)
+    p.add_argument("--chapters", type=int, default=200)
+    p.add_argument("--seed", type=int, default=0)
+
+    p = sub.add_parser("anki-append", help=BENCHMARKS["anki-append"][1])
+    p.add_argument("--chapters", type=int, default=100)
+    p.add_argument("--lines", type=int, default=100, help="Lines (and audio clips) per chapter.")
+    p.add_argument("--clip-kb", type=int, default=16)
+    p.add_argument("--seed", type=int, default=0)
+
+    p = sub.add_parser("plan", help=BENCHMARKS["plan"][1])
+    p.add_argument("--chapters", type=int, default=2000)
+    p.add_argument("--lines", type=int, default=120, help="Lines per chapter.")
+    p.add_argument("--seed", type=int, default=0)
+
+    p = sub.add_parser("boilerplate", help=BENCHMARKS["boilerplate"][1])
+    p.add_argument("--chapters", type=int, default=500)
+    p.add_argument("--lines", type=int, default=80, help="Story lines per chapter.")
+    p.add_argument("--seed", type=int, default=0)
+
+    p = sub.add_parser("epub", help=BENCHMARKS["epub"][1])
+    p.add_argument("--chapters", type=int, default=200)
+    p.add_argument("--lines", type=int, default=150)
+    p.add_argument("--markup", type=float, default=0.01, help="Share of translations containing '<' or '&'.")
+    p.add_argument("--seed", type=int, default=0)
+
+    p = sub.add_parser("glossary", help=BENCHMARKS["glossary"][1])
+    p.add_argument("--chapters", type=int, default=300)
+    p.add_argument("--lines", type=int, default=80)
+    p.add_argument("--cast", type=int, default=60, help="Recurring characters.")
+    p.add_argument("--one-offs", type=int, default=3, help="Entities per chapter that never recur.")
+    p.add_argument("--seed", type=int, default=0)
+
+    p = sub.add_parser("normalize", help=BENCHMARKS["normalize"][1])
+    p.add_argument("--lines", type=int, default=200000)
+    p.add_argument("--seed", type=int, default=0)
+
+    p = sub.add_parser("clip-quality", help=BENCHMARKS["clip-quality"][1])
+    p.add_argument("--clips", type=int, default=2000)
+    p.add_argument("--bad", type=float, default=0.05, help="Share of clips with an injected fault.")
+    p.add_argument("--seed", type=int, default=0)
+
+    args = parser.parse_args()
+    BENCHMARKS[args.bench][0](args)
+
+if __name__ == "__main__":
+    main()
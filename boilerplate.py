@@ -0,0 +1,143 @@
+import os
+import re
+import json
+import hashlib
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Iterable, List, Set, Tuple
+
+# Local Imports
+from config import (
+    BOILERPLATE_ACTION, BOILERPLATE_MIN_CHAPTERS, BOILERPLATE_MIN_SHARE, BOILERPLATE_MIN_CHARS, BOILERPLATE_MARKER_MAX_CHARS,
+    PLAN_INPUT_TOKENS_PER_HAN, PLAN_OUTPUT_TOKENS_PER_HAN, TM_ENABLED,
+)
+from utils import chunk_text_into_numbered_lines
+
+INDEX_VERSION = 3
+
+# Lines that are never story text: author notes and separators, anchored to the start of the line
+BOILERPLATE_PATTERNS = [re.compile(p, re.IGNORECASE) for p in (
+    r'^((PS|P\.S\.)[\s:：]|作者有话说|作者的话|作者：|本章完|未完待续)',
+    r'^[-=*~_#.·＝—－～＊\s]{3,}$', # Separators like "------", "***", "＝＝＝" (but not a "……" pause)
+)]
+# Site watermarks/URLs and vote or subscription appeals, which can also turn up inside story text: short lines only
+BOILERPLATE_MARKERS = [re.compile(p, re.IGNORECASE) for p in (
+    r'(https?://|www\.|\.com\b|\.net\b|\.org\b|\.cc\b)',
+    r'(求月票|求推荐|求票|求收藏|求订阅|求打赏|月票|推荐票)',
+)]
+
+def is_boilerplate_text(line: str) -> bool:
+    if any(p.search(line) for p in BOILERPLATE_PATTERNS): return True
+    return len(line) <= BOILERPLATE_MARKER_MAX_CHARS and any(p.search(line) for p in BOILERPLATE_MARKERS)
+
+def iter_text_lines(text: str) -> Iterable[str]:
+    """The lines the chunker keeps: stripped and non-empty."""
+    for line in text.splitlines():
+        line = line.strip()
+        if line: yield line
+
+class LineIndex:
+    """
+    How often each line occurs across the whole novel: in how many chapters (df) and how many times in total.
+    Lines that recur in a large share of chapters or match BOILERPLATE_PATTERNS are boilerplate; other repeated
+    lines are duplicates, translated once and then served from the translation memory. Only repeated lines are
+    kept, cached in .cache/line_index.json until a chapter file changes.
+    """
+    def __init__(self, chapters: int = 0, repeated: Dict[str, Tuple[int, int]] = None, patterned: Dict[str, int] = None):
+        self.chapters = chapters
+        self.repeated = repeated or {}   # line -> (chapters containing it, occurrences, repeats within a chunk), lines seen at least twice
+        self.patterned = patterned or {} # line -> occurrences, single lines matching a boilerplate pattern
+
+    @classmethod
+    def build(cls, texts: Iterable[str]) -> "LineIndex":
+        df, total, in_chunk, chapters = Counter(), Counter(), Counter(), 0
+        for text in texts:
+            chapters += 1
+            lines = list(iter_text_lines(text))
+            total.update(lines)
+            df.update(set(lines))
+            for chunk in chunk_text_into_numbered_lines(text): # Chunked as if nothing were dropped
+                in_chunk.update(chunk.values())
+                in_chunk.subtract(set(chunk.values()))
+        repeated = {line: (df[line], count, in_chunk[line]) for line, count in total.items() if count > 1}
+        patterned = {line: count for line, count in total.items() if count == 1 and is_boilerplate_text(line)}
+        return cls(chapters, repeated, patterned)
+
+    @classmethod
+    def for_novel(cls, raw_dir: Path, entries, cache_path: Path, save: bool = True) -> "LineIndex":
+        """The index of the chapters in a ChapterIndex, rebuilt only when one of their files changed (and cached unless `save` is False)."""
+        signature = hashlib.sha256(json.dumps([(e.file_name, e.mtime_ns, e.size) for e in entries]).encode("utf-8")).hexdigest()
+        try:
+            data = json.loads(Path(cache_path).read_text(encoding='utf-8'))
+            if data.get("version") == INDEX_VERSION and data.get("signature") == signature:
+                return cls(data["chapters"], {line: tuple(v) for line, v in data["repeated"].items()}, data["patterned"])
+        except (OSError, ValueError, KeyError):
+            pass
+        index = cls.build((Path(raw_dir) / e.file_name).read_text(encoding='utf-8') for e in entries)
+        if not save: return index
+        data = {"version": INDEX_VERSION, "signature": signature, "chapters": index.chapters, "repeated": index.repeated, "patterned": index.patterned}
+        tmp_path = Path(cache_path).with_name(Path(cache_path).name + ".tmp")
+        tmp_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path.write_text(json.dumps(data, ensure_ascii=False), encoding='utf-8')
+        os.replace(tmp_path, cache_path)
+        return index
+
+    def is_boilerplate(self, line: str, df: int) -> bool:
+        if is_boilerplate_text(line): return True
+        # Recurring long lines (watermarks, fixed author notes); short repeated dialogue like "“嗯。”" is kept
+        return len(line) >= BOILERPLATE_MIN_CHARS and df >= max(BOILERPLATE_MIN_CHAPTERS, BOILERPLATE_MIN_SHARE * self.chapters)
+
+    def boilerplate(self) -> Set[str]:
+        lines = {line for line, (df, _, _) in self.repeated.items() if self.is_boilerplate(line, df)}
+        return lines | set(self.patterned)
+
+    def skip_set(self, action: str = BOILERPLATE_ACTION) -> Set[str]:
+        """Lines the chunker should leave out: the boilerplate when BOILERPLATE_ACTION is "drop", otherwise none."""
+        return self.boilerplate() if action == "drop" else set()
+
+    def report(self, action: str = BOILERPLATE_ACTION, tm: bool = TM_ENABLED) -> Dict[str, float]:
+        """
+        Lines (and estimated LLM tokens) saved by dropping boilerplate and translating repeated lines once: once per
+        novel with the translation memory (`tm`), otherwise only repeats within the same chunk.
+        """
+        skip = self.skip_set(action)
+        counts = {**{line: n for line, (_, n, _) in self.repeated.items()}, **self.patterned}
+        dropped = {line: n for line, n in counts.items() if line in skip}
+        reused = {line: (n - 1 if tm else in_chunk) for line, (_, n, in_chunk) in self.repeated.items() if line not in skip} # Kept boilerplate included
+        reused = {line: n for line, n in reused.items() if n > 0}
+        per_char = 4 * PLAN_INPUT_TOKENS_PER_HAN + PLAN_OUTPUT_TOKENS_PER_HAN # The line appears in all four prompts
+        chars = sum(len(line) * n for saved in (dropped, reused) for line, n in saved.items())
+        return {
+            "boilerplate_lines": len(self.boilerplate()), "dropped": sum(dropped.values()), "duplicate_lines": sum(reused.values()),
+            "lines_saved": sum(dropped.values()) + sum(reused.values()), "tokens_saved": chars * per_char,
+            "dropped_lines": sorted(dropped.items(), key=lambda item: (-item[1], item[0])),
+        }
+
+def frozen_skip(cache_dir: Path, text: str, skip: Set[str]) -> Set[str]:
+    """
+    The chapter's lines in `skip`, stored in its cache dir (skip.json) on the first call. Later runs reuse the
+    stored set, so the cached chunk files of a partly translated chapter keep their boundaries even when new
+    chapters change what counts as boilerplate. The text stage deletes the file with the chunks.
+    """
+    path = Path(cache_dir) / "skip.json"
+    try:
+        return set(json.loads(path.read_text(encoding='utf-8')))
+    except (OSError, ValueError):
+        pass
+    frozen = sorted({line for line in iter_text_lines(text) if line in skip})
+    tmp_path = path.with_name(path.name + ".tmp")
+    tmp_path.write_text(json.dumps(frozen, ensure_ascii=False), encoding='utf-8')
+    os.replace(tmp_path, path)
+    return set(frozen)
+
+def format_report(report: Dict[str, float]) -> str:
+    return (f"{report['boilerplate_lines']} boilerplate lines ({report['dropped']:,} occurrences dropped), "
+            f"{report['duplicate_lines']:,} repeated lines reuse an earlier translation: "
+            f"{report['lines_saved']:,} fewer LLM lines, ~{report['tokens_saved'] / 1e3:.0f}k tokens")
+
+def format_dropped(report: Dict[str, float], limit: int = 20) -> List[str]:
+    """The dropped lines, most frequent first, so a story line caught by a pattern can be spotted."""
+    dropped = report["dropped_lines"]
+    lines = [f"  dropped {n}x: {line}" for line, n in dropped[:limit]]
+    if len(dropped) > limit: lines.append(f"  ... and {len(dropped) - limit} more")
+    return lines
@@ -0,0 +1,126 @@
+import os
+import re
+import json
+from dataclasses import dataclass, asdict
+from pathlib import Path
+from typing import List, Optional
+
+# Local Imports
+from utils import extract_chapter_number
+
+INDEX_VERSION = 1
+_DIGITS = re.compile(r'(\d+)')
+
+def natural_key(name: str):
+    """'ch_2.txt' < 'ch_10.txt' < 'ch_1000.txt', whether or not the numbers are zero-padded."""
+    return [(0, int(part), "") if part.isdigit() else (1, 0, part.lower()) for part in _DIGITS.split(name) if part]
+
+@dataclass
+class ChapterEntry:
+    file_name: str
+    chapter_number: Optional[int]
+    mtime_ns: int
+    size: int
+
+class ChapterIndex:
+    """
+    Numerically ordered list of the chapter files in 01_Raw_Text, cached as JSON.
+    refresh() skips the directory listing while the folder's mtime is unchanged (no file
+    added or removed) and only stats the known files, since editing a file in place does
+    not touch the folder. Either way only files whose mtime or size moved are re-parsed.
+    """
+    def __init__(self, raw_dir: Path, cache_path: Path):
+        self.raw_dir = Path(raw_dir)
+        self.cache_path = Path(cache_path)
+        self.dir_mtime_ns = None
+        self.entries: List[ChapterEntry] = []
+        self.scanned = False # True if the last refresh() had to list the directory
+        self._load()
+
+    def _load(self):
+        try:
+            data = json.loads(self.cache_path.read_text(encoding='utf-8'))
+            if data.get("version") != INDEX_VERSION: return
+            self.dir_mtime_ns = data["dir_mtime_ns"]
+            self.entries = [ChapterEntry(**e) for e in data["entries"]]
+        except (OSError, ValueError, KeyError, TypeError):
+            self.dir_mtime_ns, self.entries = None, []
+
+    def _save(self):
+        self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+        data = {"version": INDEX_VERSION, "dir_mtime_ns": self.dir_mtime_ns, "entries": [asdict(e) for e in self.entries]}
+        tmp_path = self.cache_path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(data, ensure_ascii=False), encoding='utf-8')
+        os.replace(tmp_path, self.cache_path)
+
+    def refresh(self, save: bool = True) -> "ChapterIndex":
+        """Brings the entries up to date with the folder, and the cache file too unless `save` is False."""
+        self.scanned = False
+        try:
+            dir_mtime_ns = self.raw_dir.stat().st_mtime_ns
+        except FileNotFoundError:
+            self.entries, self.dir_mtime_ns = [], None
+            return self
+        if dir_mtime_ns == self.dir_mtime_ns and self._restat(save): return self
+
+        self.scanned = True
+        known = {e.file_name: e for e in self.entries}
+        entries = []
+        with os.scandir(self.raw_dir) as it:
+            for item in it:
+                if not item.name.endswith(".txt") or not item.is_file(): continue
+                st = item.stat()
+                cached = known.get(item.name)
+                if cached and cached.mtime_ns == st.st_mtime_ns and cached.size == st.st_size:
+                    entries.append(cached)
+                else:
+                    entries.append(ChapterEntry(item.name, extract_chapter_number(item.name), st.st_mtime_ns, st.st_size))
+
+        entries.sort(key=lambda e: (e.chapter_number is None, e.chapter_number or 0, natural_key(e.file_name)))
+        self.entries, self.dir_mtime_ns = entries, dir_mtime_ns
+        if save: self._save()
+        return self
+
+    def _restat(self, save: bool = True) -> bool:
+        """Updates the size and mtime of the cached entries in place. False if one is gone (the folder needs a scan)."""
+        changed = False
+        for i, entry in enumerate(self.entries):
+            try:
+                st = os.stat(self.raw_dir / entry.file_name)
+            except FileNotFoundError:
+                return False
+            if entry.mtime_ns != st.st_mtime_ns or entry.size != st.st_size:
+                self.entries[i] = ChapterEntry(entry.file_name, entry.chapter_number, st.st_mtime_ns, st.st_size)
+                changed = True
+        if changed and save: self._save()
+        return True
+
+    def chapters(self, start_chapter: int = None, end_chapter: int = None) -> List[ChapterEntry]:
+        """Numbered chapters in reading order, optionally only start_chapter..end_chapter (inclusive)."""
+        return [e for e in self.entries if e.chapter_number is not None
+                and (start_chapter is None or e.chapter_number >= start_chapter)
+                and (end_chapter is None or e.chapter_number <= end_chapter)]
+
+    def path(self, entry: ChapterEntry) -> Path:
+        return self.raw_dir / entry.file_name
+
+def shard_entries(entries: List[ChapterEntry], shard: int, shards: int) -> List[ChapterEntry]:
+    """
+    The contiguous run of entries that shard `shard` of `shards` (1-based) processes. The cuts split the raw text
+    size evenly and a chapter goes to the shard its midpoint falls in, so every machine with the same chapter
+    files gets the same, non-overlapping assignment.
+    """
+    if not 1 <= shard <= shards: raise ValueError(f"shard must be between 1 and {shards}")
+    total = sum(max(e.size, 1) for e in entries)
+    selected, done = [], 0
+    for e in entries:
+        size = max(e.size, 1)
+        if 2 * (shard - 1) * total <= (2 * done + size) * shards < 2 * shard * total: selected.append(e)
+        done += size
+    return selected
+
+def sparse_chapter_choices(chapter_numbers: List[int], max_items: int) -> List[int]:
+    """At most max_items evenly spaced chapter numbers (always keeping the first and last) for a dropdown."""
+    if len(chapter_numbers) <= max_items: return list(chapter_numbers)
+    step = (len(chapter_numbers) - 1) / (max_items - 1)
+    return [chapter_numbers[round(i * step)] for i in range(max_items)]
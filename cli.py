@@ -2,11 +2,39 @@ import argparse
 import sys
 import threading
 import signal
+import contextlib
 from pathlib import Path
+from rich.progress import Progress, TextColumn, BarColumn, MofNCompleteColumn, TimeElapsedColumn
 
 # Local Imports
 from config import NOVELS_ROOT_DIR, console
-from main import process_novel
+from audio_post import recompress_media
+from ingest import ingest_source
+from translation_memory import import_glossary
+from progress import bus, drain_events, ProgressState, sparkline
+from planner import plan_novel, format_plan
+from glossary_store import compact_novel_glossary, format_compaction
+
+def chapter_range(text: str):
+    """'100-250', '100-' or '-250' -> (start, end); a missing end means to the last chapter."""
+    start, sep, end = text.partition("-")
+    try:
+        if not sep: raise ValueError
+        start, end = int(start) if start else 1, int(end) if end else None
+    except ValueError:
+        raise argparse.ArgumentTypeError("expected FIRST-LAST, e.g. 100-250, 100- or -250")
+    if end is not None and end < start: raise argparse.ArgumentTypeError("the range ends before it starts")
+    return start, end
+
+def shard_spec(text: str):
+    """'2/3' -> (2, 3): the second of three machines."""
+    index, sep, count = text.partition("/")
+    try:
+        index, count = int(index), int(count)
+    except ValueError:
+        raise argparse.ArgumentTypeError("expected I/N, e.g. 1/2")
+    if not sep or not 1 <= index <= count: raise argparse.ArgumentTypeError("expected I/N with 1 <= I <= N, e.g. 1/2")
+    return index, count
 
 def get_available_novels():
     """Returns a list of valid novel directories."""
@@ -19,12 +47,57 @@ def signal_handler(sig, frame, stop_event):
     console.print("\n[bold red][!] Interrupted by user (Ctrl+C). Stopping safely...[/bold red]")
     stop_event.set()
 
+def render_progress(progress, chapter_task, line_task, events, finished):
+    """Background thread: folds progress events into the rich bars every 100 ms."""
+    state = ProgressState()
+    while True:
+        stopping = finished.wait(0.1)
+        batch = drain_events(events)
+        for event in batch: state.apply(event)
+        if batch:
+            chapter = f"Ch {state.chapter:03d}" if state.chapter is not None else "-"
+            progress.update(chapter_task, completed=state.chapters_done, total=state.chapters_total or None, description=f"Chapters ({chapter})")
+            progress.update(line_task, completed=state.lines_done, total=state.lines_total or None,
+                            description=f"{state.stage.capitalize() or 'Lines'}",
+                            stats=f"{state.summary()} {sparkline(state.history['lines_per_sec'])}")
+        if stopping: break
+
+@contextlib.contextmanager
+def live_progress():
+    """Shows chapter/line bars plus throughput and memory stats for the duration of the block."""
+    events = bus.subscribe()
+    finished = threading.Event()
+    columns = [TextColumn("{task.description:<16}"), BarColumn(), MofNCompleteColumn(), TimeElapsedColumn(), TextColumn("{task.fields[stats]}")]
+    with Progress(*columns, console=console) as progress:
+        chapter_task = progress.add_task("Chapters", total=None, stats="")
+        line_task = progress.add_task("Lines", total=None, stats="")
+        renderer = threading.Thread(target=render_progress, args=(progress, chapter_task, line_task, events, finished), daemon=True)
+        renderer.start()
+        try:
+            yield
+        finally:
+            finished.set()
+            renderer.join()
+            bus.unsubscribe(events)
+
 def run_cli():
     parser = argparse.ArgumentParser(description="NixOS AI: Headless Novel Processing Pipeline")
     parser.add_argument("novel_name", nargs="?", help="The exact folder name of the novel to process.")
     parser.add_argument("--ch", type=int, default=1, help="The chapter number to start from (default: 1).")
+    parser.add_argument("--ch-range", type=chapter_range, metavar="FIRST-LAST", help="Only process chapters FIRST..LAST, e.g. 100-250 (either end may be left open). Overrides --ch.")
+    parser.add_argument("--shard", type=shard_spec, metavar="I/N", help="Process only this machine's share of the chapters: shard I of N contiguous, equally sized parts (same split on every machine).")
+    parser.add_argument("--merge", nargs="+", metavar="SHARD_DIR", help="Fold copies of this novel's folder processed elsewhere (--shard runs) into it, merge the glossaries, then rebuild the master deck and EPUB.")
     parser.add_argument("--list", action="store_true", help="List all available novels.")
     parser.add_argument("--redo-pinyin", action="store_true", help="Regenerate Pinyin, EPUBs, and Anki decks without re-running AI.")
+    parser.add_argument("--recompress-media", action="store_true", help="Trim, normalize and re-encode the novel's existing audio with the current opus settings, then report the bytes saved.")
+    parser.add_argument("--dry-run", action="store_true", help="With --recompress-media or --compact-glossary: only report the savings, keep the files.")
+    parser.add_argument("--tts-worker", action="store_true", help="Only run a TTS worker that drains the novel's queued audio jobs (can run alongside the main pipeline).")
+    parser.add_argument("--ingest", metavar="FILE", help="Split a single-file novel (.txt in any common Chinese encoding, or .epub) into the novel's 01_Raw_Text chapter files, then exit.")
+    parser.add_argument("--import-glossary", metavar="SOURCE_NOVEL", help="Merge another novel's glossary.json into this one (existing entries are kept), e.g. for a sequel.")
+    parser.add_argument("--compact-glossary", action="store_true", help="Fold variant spellings of a name into aliases and prune entries that never recur (backup: glossary.json.bak).")
+    parser.add_argument("--resynth", action="store_true", help="Re-synthesize only the lines the audio quality gate left suspect (or that failed) in the selected chapters, then re-export those chapters.")
+    parser.add_argument("--plan", action="store_true", help="Dry run: count lines, chunks, LLM tokens and audio left from --ch on and project the wall time. Loads no models.")
+    parser.add_argument("--no-progress", action="store_true", help="Plain log output without the live progress bars.")
 
     args = parser.parse_args()
 
@@ -41,22 +114,96 @@ def run_cli():
         parser.print_help()
         sys.exit(1)
 
+    if args.ingest:
+        raw_dir = NOVELS_ROOT_DIR / args.novel_name / "01_Raw_Text"
+        console.print(f"\n[bold green]📥 INGESTING: {args.ingest} -> {raw_dir}[/bold green]")
+        try:
+            report = ingest_source(Path(args.ingest), raw_dir)
+        except (OSError, UnicodeDecodeError) as e:
+            console.print(f"[bold red]Error:[/bold red] {e}")
+            sys.exit(1)
+        console.print(f"Encoding: {report['encoding']} | {report['bytes'] / 1e6:.1f} MB -> {report['chapters']} chapters ({report['chars']:,} characters)")
+        return
+
     if args.novel_name not in available_novels:
         console.print(f"[bold red]Error:[/bold red] Novel '{args.novel_name}' not found.")
         console.print(f"Run 'python cli.py --list' to see available options.")
         sys.exit(1)
 
+    if args.import_glossary:
+        source_path = NOVELS_ROOT_DIR / args.import_glossary / "glossary.json"
+        if not source_path.exists():
+            console.print(f"[bold red]Error:[/bold red] {source_path} not found.")
+            sys.exit(1)
+        added = import_glossary(NOVELS_ROOT_DIR / args.novel_name / "glossary.json", source_path)
+        console.print(f"[bold green]📖 Imported {added} glossary entries from '{args.import_glossary}'.[/bold green]")
+        return
+
+    if args.compact_glossary:
+        console.print(f"\n[bold green]🗜 COMPACTING GLOSSARY: {args.novel_name}{' (dry run)' if args.dry_run else ''}[/bold green]")
+        console.print(format_compaction(compact_novel_glossary(NOVELS_ROOT_DIR / args.novel_name, dry_run=args.dry_run)))
+        return
+
+    start_chapter, end_chapter = args.ch_range or (args.ch, None)
+    selection = f"Ch {start_chapter}-{end_chapter or 'end'}" + (f", shard {args.shard[0]}/{args.shard[1]}" if args.shard else "")
+
+    if args.merge:
+        from shards import merge_shards, format_merge_report
+        missing = [d for d in args.merge if not (Path(d) / "01_Raw_Text").exists()]
+        if missing:
+            console.print(f"[bold red]Error:[/bold red] not a novel folder: {', '.join(missing)}")
+            sys.exit(1)
+        console.print(f"\n[bold green]🔀 MERGING {len(args.merge)} shard(s) into {args.novel_name}[/bold green]")
+        for line in format_merge_report(merge_shards(NOVELS_ROOT_DIR / args.novel_name, [Path(d) for d in args.merge])):
+            console.print(line)
+        return
+
+    if args.plan:
+        console.print(f"\n[bold green]📋 PLAN: {args.novel_name} ({selection})[/bold green]")
+        for line in format_plan(plan_novel(NOVELS_ROOT_DIR / args.novel_name, start_chapter, end_chapter, args.shard)):
+            console.print(line)
+        return
+
+    # The pipeline imports torch and the TTS engine, so it is only loaded once a run actually needs it
+    from main import process_novel, drain_tts_queue, requeue_suspect_lines
+
     # 3. Setup Safe Termination (Ctrl+C)
     stop_event = threading.Event()
     signal.signal(signal.SIGINT, lambda s, f: signal_handler(s, f, stop_event))
 
     # 4. Run Pipeline
     novel_dir = NOVELS_ROOT_DIR / args.novel_name
-    console.print(f"\n[bold green]🚀 STARTING PIPELINE: {args.novel_name} (Starting at Ch {args.ch})[/bold green]")
+    if args.recompress_media:
+        console.print(f"\n[bold green]🎵 RE-ENCODING MEDIA: {args.novel_name}[/bold green]")
+        report = recompress_media(novel_dir / "media", dry_run=args.dry_run, stop_event=stop_event)
+        console.print(f"Files: {report['files']} ({report['replaced']} replaced, {report['errors']} errors)")
+        console.print(f"Size: {report['bytes_before'] / 1e6:.1f} MB -> {report['bytes_after'] / 1e6:.1f} MB "
+                      f"([bold]{report['bytes_saved'] / 1e6:.1f} MB saved, {report['percent_saved']}%[/bold])")
+        console.print(f"Audio: {report['seconds_before'] / 3600:.2f} h -> {report['seconds_after'] / 3600:.2f} h")
+        return
+
+    if args.tts_worker:
+        console.print(f"\n[bold green]🔊 STARTING TTS WORKER: {args.novel_name}[/bold green]")
+        try:
+            with (contextlib.nullcontext() if args.no_progress else live_progress()):
+                drain_tts_queue(novel_dir, stop_event)
+        except Exception as e:
+            console.print(f"[bold red]CRITICAL ERROR:[/bold red] {e}")
+        return
+
+    chapter_numbers = None
+    if args.resynth:
+        requeued = requeue_suspect_lines(novel_dir, start_chapter, end_chapter)
+        chapter_numbers = {chapter for chapter, _, _ in requeued}
+        console.print(f"\n[bold green]🔁 RE-SYNTHESIS: {len(requeued)} suspect lines in {len(chapter_numbers)} chapters ({selection})[/bold green]")
+        if not requeued: return
+
+    console.print(f"\n[bold green]🚀 STARTING PIPELINE: {args.novel_name} ({selection})[/bold green]")
     console.print("[dim]Press Ctrl+C at any time to safely pause and exit.[/dim]\n")
 
     try:
-        process_novel(novel_dir, args.ch, stop_event, redo_pinyin=args.redo_pinyin)
+        with (contextlib.nullcontext() if args.no_progress else live_progress()):
+            process_novel(novel_dir, start_chapter, stop_event, redo_pinyin=args.redo_pinyin, end_chapter=end_chapter, shard=args.shard, chapter_numbers=chapter_numbers)
     except Exception as e:
         console.print(f"[bold red]CRITICAL ERROR:[/bold red] {e}")
 
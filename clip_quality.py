@@ -0,0 +1,107 @@
+import os
+import json
+from pathlib import Path
+from typing import Dict, List, Tuple
+import numpy as np
+
+# Local Imports (numpy only: the report and --resynth run without torch)
+from config import (
+    AUDIO_SILENCE_THRESHOLD_DB, QA_MIN_CHARS, QA_MIN_SECONDS_PER_CHAR, QA_MAX_SECONDS_PER_CHAR,
+    QA_MIN_SPEECH_RMS_DB, QA_CLIP_LEVEL, QA_MAX_CLIP_RATIO, QA_MAX_SILENCE_RATIO,
+)
+from audio_post import frame_rms, _db_to_amp, FRAME_MS
+
+# Issues, roughly from worst to mildest
+INVALID = "invalid"     # The model returned empty/NaN/Inf audio (replaced by a short silence)
+SILENT = "silent"       # No frame above the silence threshold
+TRUNCATED = "truncated" # Far too short for the text: words were dropped
+TOO_LONG = "too_long"   # Far too long for the text: repeated or hallucinated speech
+QUIET = "quiet"
+CLIPPING = "clipping"
+GAPS = "gaps"           # Mostly silence between the first and last voiced frame
+
+def speakable_chars(text: str) -> int:
+    """Characters that take time to say (Han, letters, digits); punctuation doesn't."""
+    return sum(c.isalnum() for c in text)
+
+def clip_metrics(audio: np.ndarray, sr: int) -> Dict[str, float]:
+    """Duration, speech span, speech RMS, clipping and silence ratios of a raw model clip, from 10 ms frame RMS."""
+    seconds = audio.size / sr if sr else 0.0
+    if audio.size == 0: return {"seconds": 0.0, "speech_seconds": 0.0, "rms_db": -120.0, "clip_ratio": 0.0, "silence_ratio": 1.0}
+    rms = frame_rms(audio, sr)
+    voiced = rms >= _db_to_amp(AUDIO_SILENCE_THRESHOLD_DB)
+    first_last = np.flatnonzero(voiced)[[0, -1]] if voiced.any() else None
+    if first_last is None:
+        speech_seconds, silence_ratio, speech_rms = 0.0, 1.0, 0.0
+    else:
+        span = voiced[first_last[0]:first_last[1] + 1]
+        speech_seconds = span.size * FRAME_MS / 1000
+        silence_ratio = 1.0 - float(np.count_nonzero(span)) / span.size
+        speech_rms = float(np.sqrt(np.mean(np.square(rms[voiced]))))
+    return {
+        "seconds": round(seconds, 3),
+        "speech_seconds": round(speech_seconds, 3),
+        "rms_db": round(20 * np.log10(max(speech_rms, 1e-6)), 1),
+        "clip_ratio": round(float(np.count_nonzero(np.abs(audio) >= QA_CLIP_LEVEL)) / audio.size, 5),
+        "silence_ratio": round(silence_ratio, 3),
+    }
+
+def clip_issues(metrics: Dict[str, float], chars: int) -> List[str]:
+    """What looks wrong with a clip of `chars` speakable characters (empty when it passes)."""
+    if metrics["speech_seconds"] == 0: return [SILENT]
+    issues = []
+    if chars >= QA_MIN_CHARS: # Short interjections vary too much in length to judge
+        per_char = metrics["speech_seconds"] / chars
+        if per_char < QA_MIN_SECONDS_PER_CHAR: issues.append(TRUNCATED)
+        if per_char > QA_MAX_SECONDS_PER_CHAR: issues.append(TOO_LONG)
+    if metrics["rms_db"] < QA_MIN_SPEECH_RMS_DB: issues.append(QUIET)
+    if metrics["clip_ratio"] > QA_MAX_CLIP_RATIO: issues.append(CLIPPING)
+    if metrics["silence_ratio"] > QA_MAX_SILENCE_RATIO: issues.append(GAPS)
+    return issues
+
+def assess_clip(audio: np.ndarray, sr: int, text: str, invalid: bool = False) -> Tuple[List[str], Dict[str, float]]:
+    """(issues, metrics) for one generated clip of `text`."""
+    metrics = clip_metrics(audio, sr)
+    metrics["seconds_per_char"] = round(metrics["speech_seconds"] / max(1, speakable_chars(text)), 3)
+    return ([INVALID] if invalid else clip_issues(metrics, speakable_chars(text))), metrics
+
+# --- REPORT ---
+def chapter_report(chapter_number: int, rows: List[Dict]) -> Dict:
+    """
+    Summary of a chapter's synthesis from the queue's rows (TTSJobQueue.chapter_quality): lines re-synthesized,
+    lines still suspect after the last take, permanently failed lines, and the clip metrics across the chapter.
+    """
+    measured = [row for row in rows if row["metrics"]]
+    suspect = [row for row in rows if row["issues"] and row["status"] == "done"]
+    counts: Dict[str, int] = {}
+    for row in suspect:
+        for issue in row["issues"]: counts[issue] = counts.get(issue, 0) + 1
+    column = lambda key: np.array([row["metrics"][key] for row in measured], dtype=np.float64)
+    summary = {}
+    if measured:
+        for key in ("seconds_per_char", "rms_db", "clip_ratio", "silence_ratio"):
+            values = column(key)
+            summary[key] = {"median": round(float(np.median(values)), 3), "max": round(float(values.max()), 3)}
+    return {
+        "chapter": chapter_number,
+        "lines": len(rows),
+        "measured": len(measured),
+        "resynthesized": sum(1 for row in measured if row["attempts"] > 1),
+        "issues": counts,
+        "suspect": [{k: row[k] for k in ("line", "text", "issues", "attempts", "metrics")} for row in suspect],
+        "failed": [{"line": row["line"], "text": row["text"], "error": row["error"]} for row in rows if row["status"] == "failed"],
+        "metrics": summary,
+    }
+
+def write_chapter_report(quality_dir: Path, report: Dict) -> Path:
+    path = Path(quality_dir) / f"ch_{report['chapter']:04d}.json"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+    tmp_path.write_text(json.dumps(report, ensure_ascii=False, indent=1), encoding='utf-8')
+    os.replace(tmp_path, path)
+    return path
+
+def format_chapter_report(report: Dict) -> str:
+    issues = ", ".join(f"{issue} {count}" for issue, count in sorted(report["issues"].items(), key=lambda item: -item[1]))
+    return (f"{report['measured']} clips checked, {report['resynthesized']} re-synthesized, "
+            f"{len(report['suspect'])} still suspect{f' ({issues})' if issues else ''}, {len(report['failed'])} failed")
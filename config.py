@@ -1,4 +1,6 @@
+import os
 import random
+import functools
 import hashlib # NEW
 from pathlib import Path
 import genanki
@@ -6,17 +8,127 @@ from rich.console import Console
 
 console = Console()
 
+@functools.lru_cache(maxsize=4096)
 def get_deterministic_id(text: str) -> int:
     """Generates a consistent integer ID based on a string (e.g., Novel Name)."""
-    return int(hashlib.sha256(text.encode('utf-8')).hexdigest(), 16) % (1 << 31)
+    # Same value as int(hexdigest, 16) % 2**31: the low 31 bits live in the digest's last 4 bytes
+    return int.from_bytes(hashlib.sha256(text.encode('utf-8')).digest()[-4:], "big") & 0x7FFFFFFF
 
 # --- FILE PATHS & AI ---
 NOVELS_ROOT_DIR = Path("./Novels")
 LLM_MODEL = "qwen2.5:14b-instruct-q5_K_M"
+OLLAMA_HOST = os.environ.get("OLLAMA_HOST", "http://127.0.0.1:11434")
+LLM_KEEP_ALIVE = "30m" # Keeps the model (and its prompt cache) resident between chunks; the audio stage unloads it explicitly
+
+# Optional two-tier mode: a small model drafts "draft" prompts and LLM_MODEL only redoes chunks the checks in llm_tiers.py flag.
+LLM_DRAFT_MODEL = os.environ.get("LLM_DRAFT_MODEL") or None # e.g. "qwen2.5:3b-instruct"; None = every prompt uses LLM_MODEL
+LLM_PROMPT_TIERS = {"json": "main", "natural": "draft", "literal": "draft", "emotion": "draft"}
+DRAFT_LENGTH_RATIO = (0.8, 12.0) # Accepted English chars per Han char of a drafted translation line
+DRAFT_MIN_SOURCE_CHARS = 4 # Shorter lines skip the length ratio check
+# Chapters whose text stage runs concurrently. Match the backend's parallel slots (OLLAMA_NUM_PARALLEL, or replicas behind OLLAMA_HOST).
+TEXT_STAGE_WORKERS = int(os.environ.get("TEXT_STAGE_WORKERS", "1"))
 TTS_MODEL = "Qwen/Qwen3-TTS-12Hz-1.7B-CustomVoice" 
 SPEAKER_VOICE = "Serena" 
 TARGET_LANGUAGE = "English"
 
+# --- TTS EXECUTION ---
+# GPU boxes use a single in-process model. Set TTS_DEVICE=cpu on GPU-less nodes to
+# run a pool of worker processes, each with its own CPU model copy.
+TTS_DEVICE = os.environ.get("TTS_DEVICE", "cuda:0")
+TTS_DTYPE = os.environ.get("TTS_DTYPE", "float16" if TTS_DEVICE.startswith("cuda") else "float32") # float32 | bfloat16 on CPU
+TTS_RELOAD_EVERY = 30 # Lines synthesized before the model is reloaded (0 disables)
+TTS_CPU_WORKERS = int(os.environ.get("TTS_CPU_WORKERS", "0")) # 0 = size the pool from RAM and cores
+TTS_CPU_THREADS = int(os.environ.get("TTS_CPU_THREADS", "0")) # Torch threads per worker, 0 = cores / workers
+TTS_WORKER_RAM_GB = float(os.environ.get("TTS_WORKER_RAM_GB", "8")) # Resident size of one CPU model copy
+TTS_BATCH_SIZE = int(os.environ.get("TTS_BATCH_SIZE", "4")) # Lines per generate call (same instruction, similar length)
+
+# --- AUDIO POST-PROCESSING & OPUS ENCODING ---
+OPUS_ENCODER = os.environ.get("OPUS_ENCODER", "auto") # auto | ffmpeg | soundfile (soundfile only honours the bitrate)
+OPUS_BITRATE_KBPS = 24 # Mono speech stays transparent well below libsndfile's ~35 kbps default
+OPUS_VBR = True
+OPUS_COMPLEXITY = 10 # 0-10, libopus encoder effort
+AUDIO_TRIM_SILENCE = True
+AUDIO_SILENCE_THRESHOLD_DB = -45.0 # Frames quieter than this (dBFS RMS) count as silence
+AUDIO_SILENCE_PAD_MS = 80 # Silence kept before/after speech so clips don't start abruptly
+AUDIO_TARGET_RMS_DB = -20.0 # Loudness target for the speech frames (None disables normalization)
+AUDIO_PEAK_CEILING_DB = -1.0
+AUDIO_TARGET_SAMPLE_RATE = None # e.g. 16000 to shrink clips further; None keeps the model rate
+FAILED_CLIP_SECONDS = 0.25 # Placeholder length when the model returns empty/NaN audio
+
+# --- AUDIO QUALITY GATE (clip_quality.py) ---
+# Every generated clip is measured before it is saved. Suspect clips are re-synthesized (the model samples,
+# so another take usually comes out right) until QA_MAX_TAKES; the last take is then kept and reported.
+QA_ENABLED = True
+QA_MAX_TAKES = 3 # Syntheses of a suspect line, counting the first
+QA_MIN_CHARS = 4 # Lines with fewer speakable characters skip the duration checks
+QA_MIN_SECONDS_PER_CHAR = 0.07 # Speech span per character; narration runs ~0.25 s (PLAN_HAN_PER_AUDIO_SECOND)
+QA_MAX_SECONDS_PER_CHAR = 0.9  # Above this the model is usually repeating itself or babbling
+QA_MIN_SPEECH_RMS_DB = -35.0
+QA_CLIP_LEVEL = 0.99 # |sample| at or above this counts as clipped
+QA_MAX_CLIP_RATIO = 0.001
+QA_MAX_SILENCE_RATIO = 0.5 # Share of silent frames between the first and last voiced frame
+
+# Fixed emotion vocabulary for TTS instructions. Free-form LLM tags are mapped onto it
+# so that a handful of instructions can be tokenized once and reused for every line.
+DEFAULT_EMOTION = "Calm narrative"
+EMOTION_VOCAB = [
+    "Calm narrative", "Suspenseful narrative", "Happy", "Excited", "Sad", "Crying",
+    "Angry shouting", "Cold and stern", "Whispering", "Fearful", "Anxious", "Surprised",
+    "Sarcastic laugh", "Laughing", "Gentle", "Serious", "Shy", "Proud",
+]
+
+# --- BOILERPLATE & DUPLICATES (boilerplate.py) ---
+BOILERPLATE_ACTION = os.environ.get("BOILERPLATE_ACTION", "drop") # drop | keep (kept lines are translated once, like any repeated line)
+BOILERPLATE_MIN_CHAPTERS = 5 # A line recurring in at least this many chapters...
+BOILERPLATE_MIN_SHARE = 0.3 # ...and this share of all chapters is boilerplate...
+BOILERPLATE_MIN_CHARS = 8 # ...if it is at least this long (short repeated dialogue is story text)
+BOILERPLATE_MARKER_MAX_CHARS = 40 # A URL or 月票-style appeal only makes a line boilerplate up to this length (longer lines are story text)
+
+# --- GLOSSARY (glossary_store.py) ---
+GLOSSARY_PROMPT_MAX_ENTRIES = 24 # Most relevant glossary entries sent with a chunk; the rest are left out of the prompt
+GLOSSARY_PRUNE_AFTER_CHAPTERS = 50 # --compact-glossary drops entities seen in only one chapter, at least this many chapters ago
+
+# --- SERVICE (server.py) ---
+SERVICE_HOST = os.environ.get("SERVICE_HOST", "127.0.0.1") # Local only by default: the API has no authentication
+SERVICE_PORT = int(os.environ.get("SERVICE_PORT", "8765"))
+
+# --- PLANNING (cli.py --plan) ---
+# Used until the novel has recorded its own LLM tokens and speeds in .cache/throughput.json / the TTS queue
+PLAN_INPUT_TOKENS_PER_HAN = 1.0 # Qwen tokenizer on Chinese prose
+PLAN_OUTPUT_TOKENS_PER_HAN = 1.5 # Natural + literal English, emotion tags and entity JSON per source character
+PLAN_CHARS_PER_TOKEN_EN = 4 # English system prompts
+PLAN_HAN_PER_AUDIO_SECOND = 4.0 # Narration speed of the Chinese voice
+PLAN_DEFAULT_TEXT_LINES_PER_SEC = 0.5
+PLAN_DEFAULT_TTS_LINES_PER_SEC = 0.25
+
+# --- EXPORT ---
+# Background threads used to write per-chapter .apkg files while the next chapter runs.
+ANKI_EXPORT_WORKERS = 2
+
+# --- TRANSLATION MEMORY ---
+TM_ENABLED = True
+TM_FILE_NAME = "translation_memory.sqlite" # Lives next to the novel folders, shared by all of them
+TM_SERVE_THRESHOLD = 0.95 # Bigram Jaccard similarity at which a stored translation is reused without the LLM
+TM_EXAMPLE_THRESHOLD = 0.6 # Weaker matches are passed to the LLM as examples
+TM_MAX_EXAMPLES = 5
+TM_MIN_FUZZY_CHARS = 6 # Shorter lines only ever match exactly
+TM_MINHASH_PERM = 64
+TM_LSH_BANDS = 16 # 16 bands x 4 rows: a line is a candidate with ~64% chance at Jaccard 0.5, ~89% at 0.6, >99% at 0.8
+
+# --- INGEST ---
+INGEST_SAMPLE_BYTES = 1024 * 1024 # Bytes read to guess the encoding of a raw novel
+INGEST_FALLBACK_ENCODING = "gb18030" # Superset of GBK/GB2312, used when the sample isn't valid UTF-8
+
+# --- GUI ---
+GUI_MAX_CHAPTER_CHOICES = 200 # Longer novels list every Nth chapter in the dropdown (any number can be typed)
+
+# --- GUI LOGGING ---
+GUI_LOG_POLL_MS = 100 # How often the GUI thread drains queued log output
+GUI_SCROLLBACK_LINES = 5000 # Lines kept in the on-screen log
+GUI_LOG_FILE = Path("./logs/gui.log") # Full history, rotated
+GUI_LOG_MAX_BYTES = 5 * 1024 * 1024
+GUI_LOG_BACKUPS = 5
+
 # --- ANKI SETUP ---
 # We use a fixed string so the Model ID never changes.
 MODEL_ID = get_deterministic_id("NixOS_Chinese_Novel_Model_V1")
@@ -0,0 +1,100 @@
+import os
+import re
+import json
+import threading
+from pathlib import Path
+from typing import Dict, Optional
+
+TITLES_FILE = "titles.json" # Chapter titles, next to the .xhtml files they belong to
+_titles_lock = threading.Lock()
+
+# Escapes the markup characters and drops the control characters XML 1.0 forbids. Most lines need
+# neither, and one regex scan is much cheaper than str.translate over non-ASCII text.
+_ESCAPE = str.maketrans({"&": "&amp;", "<": "&lt;", ">": "&gt;", **{c: None for c in range(32) if c not in (9, 10, 13)}})
+_NEEDS_ESCAPE = re.compile(r'[&<>\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+def escape_text(value) -> str:
+    value = str(value)
+    return value.translate(_ESCAPE) if _NEEDS_ESCAPE.search(value) else value
+
+# Templates are parsed once; rendering a line is a single format call on already-escaped values (src, cn, py, lit, nat).
+# The result is a complete EPUB 3 document, so the EPUB build can store it as-is.
+_HEAD = (
+    '<?xml version="1.0" encoding="utf-8"?>\n<!DOCTYPE html>\n'
+    '<html xmlns="http://www.w3.org/1999/xhtml" xmlns:epub="http://www.idpf.org/2007/ops" lang="en" xml:lang="en"><head><title>{title}</title>'
+    '<link rel="stylesheet" href="style/nav.css" type="text/css"/></head><body>\n<h1>{title}</h1>'
+).format
+_BLOCK_TEMPLATE = """
+        <div class="study-block">
+            <audio controls="controls" preload="none"><source src="{0}" type="audio/ogg"/></audio>
+            <p class="cn">{1}</p>
+            <p class="py">{2}</p>
+            <p class="lit">"{3}"</p>
+            <p class="en">{4}</p>
+        </div>"""
+_BLOCK = _BLOCK_TEMPLATE.format
+_BLOCK_NO_AUDIO = _BLOCK_TEMPLATE.replace('\n            <audio controls="controls" preload="none"><source src="{0}" type="audio/ogg"/></audio>', '').format
+_TAIL = "\n</body></html>"
+
+class ChapterXhtmlWriter:
+    """
+    Writes one chapter's EPUB XHTML a line at a time. The title is the first line's translation
+    (or `fallback_title` for an empty chapter). Like JsonArrayWriter, the file is assembled next to
+    the target and only replaces it on a clean close.
+    """
+    def __init__(self, path: Path, chapter_number: int, fallback_title: str):
+        self.path = Path(path)
+        self.tmp_path = self.path.with_name(self.path.name + ".tmp")
+        self.media_dir = f"media/ch_{chapter_number:04d}/"
+        self.fallback_title = fallback_title
+        self.title: Optional[str] = None
+        self._file = open(self.tmp_path, "w", encoding="utf-8")
+
+    def write(self, line: Dict, audio_filename: Optional[str]):
+        """Appends a line's study block; without an `audio_filename` (synthesis failed) it has no audio player."""
+        if self.title is None: self._head(line["nat"])
+        fields = (self.media_dir + (audio_filename or ""), line["cn"], line["py"], line["lit"], line["nat"])
+        if _NEEDS_ESCAPE.search("".join(map(str, fields))): fields = map(escape_text, fields) # One scan for the whole line
+        self._file.write((_BLOCK if audio_filename else _BLOCK_NO_AUDIO)(*fields))
+
+    def _head(self, title: str):
+        self.title = str(title)
+        self._file.write(_HEAD(title=escape_text(title)))
+
+    def close(self):
+        if self._file is None: return
+        if self.title is None: self._head(self.fallback_title)
+        self._file.write(_TAIL)
+        self._file.close()
+        self._file = None
+        os.replace(self.tmp_path, self.path)
+
+    def abort(self):
+        if self._file is None: return
+        self._file.close()
+        self._file = None
+        self.tmp_path.unlink(missing_ok=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        if exc_type is None: self.close()
+        else: self.abort()
+
+def read_titles(epub_dir: Path) -> Dict[str, str]:
+    try:
+        return json.loads((Path(epub_dir) / TITLES_FILE).read_text(encoding='utf-8'))
+    except (OSError, ValueError):
+        return {}
+
+def record_title(epub_dir: Path, file_name: str, title: str):
+    """Stores a chapter's title so the EPUB build never has to re-read the XHTML to find it."""
+    with _titles_lock:
+        titles = read_titles(epub_dir)
+        if titles.get(file_name) == title: return
+        titles[file_name] = title
+        path = Path(epub_dir) / TITLES_FILE
+        tmp_path = path.with_name(path.name + ".tmp")
+        tmp_path.write_text(json.dumps(titles, ensure_ascii=False, indent=1), encoding='utf-8')
+        os.replace(tmp_path, path)
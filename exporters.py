@@ -1,7 +1,60 @@
 from pathlib import Path
 from ebooklib import epub
 import os
+import json
 from utils import sanitize_filename  
+from anki_writer import write_apkg
+from epub_writer import read_titles
+from chapter_index import natural_key
+from utils import extract_chapter_number
+
+class MediaRegistry:
+    """Ordered, de-duplicated collection of media paths for the master Anki package.
+
+    Membership checks go through a set so registering tens of thousands of
+    audio files stays O(n) overall instead of O(n^2) with list lookups.
+    """
+    def __init__(self):
+        self._seen = set()
+        self._paths = []
+
+    def add(self, path) -> bool:
+        path = str(path)
+        if path in self._seen:
+            return False
+        self._seen.add(path)
+        self._paths.append(path)
+        return True
+
+    def extend(self, paths):
+        for path in paths:
+            self.add(path)
+
+    def __contains__(self, path) -> bool:
+        return str(path) in self._seen
+
+    def __len__(self) -> int:
+        return len(self._paths)
+
+    def __iter__(self):
+        return iter(self._paths)
+
+    def as_list(self) -> list:
+        return list(self._paths)
+
+def get_book_title(paths, novel_name):
+    """The novel's metadata.json (if any) and the file-safe book title used for the EPUB and master deck."""
+    meta = json.loads(paths["metadata"].read_text(encoding='utf-8')) if paths["metadata"].exists() else {}
+    return meta, sanitize_filename(meta.get("title", novel_name))
+
+def write_anki_package(decks, media_files, output_path: Path):
+    """Writes one or more AnkiChapter decks plus their media into a single .apkg file."""
+    return write_apkg(decks, media_files, output_path)
+
+class PrerenderedHtml(epub.EpubHtml):
+    """A chapter that is already a complete XHTML document (epub_writer): stored as-is instead of being parsed and rebuilt."""
+    def get_content(self, default=None):
+        return self.content
 
 def get_epub_css() -> epub.EpubItem:
     return epub.EpubItem(uid="style_nav", file_name="style/nav.css", media_type="text/css", content="""
@@ -70,15 +123,20 @@ def build_final_epub(novel_name: str, novel_dir: Path, metadata: dict):
     media_dir = novel_dir / "media"
     
     book_chapters = []
+    titles = read_titles(epub_dir) # Written alongside each chapter's XHTML
     
-    # Load and stitch XHTML Chapters
-    for xhtml_file in sorted(epub_dir.glob("*.xhtml")):
-        content = xhtml_file.read_text(encoding='utf-8')
-        title_match = content.split("<h1>")[1].split("</h1>")[0] if "<h1>" in content else xhtml_file.stem
-
-        ch = epub.EpubHtml(title=title_match, file_name=xhtml_file.name, lang='en')
-        ch.content = content
-        ch.add_item(epub_css)
+    # Load and stitch XHTML Chapters: unnumbered pages (front matter) first, then by chapter number (ch_999 < ch_1000)
+    for xhtml_file in sorted(epub_dir.glob("*.xhtml"), key=lambda path: (extract_chapter_number(path.name) is not None, natural_key(path.name))):
+        title = titles.get(xhtml_file.name)
+        if title is not None:
+            ch = PrerenderedHtml(title=title, file_name=xhtml_file.name, lang='en')
+            ch.content = xhtml_file.read_bytes()
+        else: # Chapters written before the title manifest existed
+            content = xhtml_file.read_text(encoding='utf-8')
+            title = content.split("<h1>")[1].split("</h1>")[0] if "<h1>" in content else xhtml_file.stem
+            ch = epub.EpubHtml(title=title, file_name=xhtml_file.name, lang='en')
+            ch.content = content
+            ch.add_item(epub_css)
         book.add_item(ch)
         book_chapters.append(ch)
 
@@ -95,4 +153,5 @@ def build_final_epub(novel_name: str, novel_dir: Path, metadata: dict):
     
     # --- FIXED: Sanitize the output file name while keeping the pretty book title ---
     safe_filename = sanitize_filename(book_title)
-    epub.write_epub(str(novel_dir / f"{safe_filename}.epub"), book)
+    # No chapter has page-break markers, so skip parsing every chapter to look for them
+    epub.write_epub(str(novel_dir / f"{safe_filename}.epub"), book, {"epub3_pages": False})
@@ -0,0 +1,197 @@
+import os
+import re
+import json
+import shutil
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, List, Tuple
+
+# Local Imports
+from config import GLOSSARY_PROMPT_MAX_ENTRIES, GLOSSARY_PRUNE_AFTER_CHAPTERS
+from utils import get_relevant_glossary, find_glossary_mentions, novel_paths
+from chapter_index import ChapterIndex
+
+CATEGORIES = ("characters", "places", "items", "skills")
+
+# --- ENTITY STATS ---
+# {"recorded": [chapter numbers], "entities": {category: {name: {"chapters", "mentions", "inside", "first", "last"}}}}
+# "mentions" are the entity's own occurrences; "inside" counts those that are only part of a longer glossary name.
+def empty_stats() -> Dict:
+    return {"recorded": [], "entities": {cat: {} for cat in CATEGORIES}}
+
+def load_stats(path: Path) -> Dict:
+    try:
+        stats = json.loads(Path(path).read_text(encoding='utf-8'))
+    except (OSError, ValueError):
+        return empty_stats()
+    for cat in CATEGORIES: stats.setdefault("entities", {}).setdefault(cat, {})
+    stats.setdefault("recorded", [])
+    return stats
+
+def save_stats(path: Path, stats: Dict):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+    tmp_path.write_text(json.dumps(stats, ensure_ascii=False), encoding='utf-8')
+    os.replace(tmp_path, path)
+
+def add_chapter_stats(stats: Dict, chapter_number: int, text: str, glossary: Dict):
+    """Folds one chapter's mentions of every glossary entity (names and aliases) into stats."""
+    counts: Dict[Tuple[str, str], List[int]] = {}
+    for _, cat, name, _, own, inside in find_glossary_mentions(text, glossary):
+        count = counts.setdefault((cat, name), [0, 0])
+        count[0] += own
+        count[1] += inside
+    for (cat, name), (own, inside) in counts.items():
+        seen = stats["entities"][cat].setdefault(name, {"chapters": 0, "mentions": 0, "inside": 0, "first": None, "last": None})
+        seen["inside"] += inside
+        if own <= 0: continue
+        seen["chapters"] += 1
+        seen["mentions"] += own
+        seen["first"] = chapter_number if seen["first"] is None else min(seen["first"], chapter_number)
+        seen["last"] = chapter_number if seen["last"] is None else max(seen["last"], chapter_number)
+    stats["recorded"].append(chapter_number)
+
+class GlossaryStore:
+    """
+    The novel's master glossary, shared by every text-stage thread. Reads and writes go through one lock
+    and each new entry gets a version number, so a chapter can ask which entities were added after it
+    translated a chunk (e.g. by a chapter running in parallel) and re-check that chunk.
+    """
+    def __init__(self, path: Path, stats_path: Path = None):
+        self.path = Path(path)
+        self.stats_path = Path(stats_path) if stats_path else None # Without one, frequencies are not tracked
+        self._lock = threading.RLock()
+        self._data = self._load()
+        self._stats = load_stats(self.stats_path) if self.stats_path else empty_stats()
+        self._added: List[Tuple[int, str, str]] = [] # (version, category, name) in the order entries arrived
+        self.version = 0
+
+    def _load(self) -> Dict:
+        glossary = {cat: {} for cat in CATEGORIES}
+        if not self.path.exists(): return glossary
+        try:
+            stored = json.loads(self.path.read_text(encoding='utf-8'))
+        except json.JSONDecodeError:
+            print("[!] Glossary file corrupted. Starting fresh.")
+            return glossary
+        # Lazy Migration: Ensure new keys (items, skills) exist in old files
+        for cat in CATEGORIES: stored.setdefault(cat, {})
+        return stored
+
+    def _save(self):
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        tmp_path.write_text(json.dumps(self._data, ensure_ascii=False, indent=4), encoding='utf-8')
+        os.replace(tmp_path, self.path)
+
+    def merge(self, new_entities: Dict) -> List[Tuple[str, str]]:
+        """Adds entities the LLM found that aren't in the glossary yet (existing entries always win). Returns the added (category, name)s."""
+        added = []
+        with self._lock:
+            for cat in CATEGORIES:
+                found = new_entities.get(cat) or {}
+                if not isinstance(found, dict): continue
+                aliases = {alias for data in self._data[cat].values() if isinstance(data, dict) for alias in data.get("aliases", ())}
+                for name, data in found.items():
+                    if name in self._data[cat] or name in aliases: continue # Variants folded in by compaction stay folded
+                    self._data[cat][name] = data
+                    self.version += 1
+                    self._added.append((self.version, cat, name))
+                    added.append((cat, name))
+            if added: self._save()
+        return added
+
+    def relevant(self, text: str, limit: int = GLOSSARY_PROMPT_MAX_ENTRIES) -> Tuple[Dict, int]:
+        """The (at most `limit` most relevant) entries mentioned in text, plus the glossary version they were taken from."""
+        with self._lock:
+            return get_relevant_glossary(text, self._data, self._stats["entities"], limit), self.version
+
+    def record_chapter(self, chapter_number: int, text: str):
+        """Counts a translated chapter's mentions into each entity's frequency and last-seen chapter (once per chapter)."""
+        with self._lock:
+            if self.stats_path is None or chapter_number in self._stats["recorded"]: return
+            add_chapter_stats(self._stats, chapter_number, text, self._data)
+            save_stats(self.stats_path, self._stats)
+
+    def added_since(self, version: int) -> List[Tuple[str, Dict]]:
+        """(name, entry) of every entity added after version, oldest first."""
+        with self._lock:
+            return [(name, self._data[cat][name]) for v, cat, name in self._added if v > version]
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {cat: dict(entries) for cat, entries in self._data.items()}
+
+# --- COMPACTION ---
+def _english_key(data) -> str:
+    english = data.get("english_name", "") if isinstance(data, dict) else ""
+    return re.sub(r'[^a-z0-9]', '', str(english).lower())
+
+def build_stats(chapters: Iterable[Tuple[int, str]], glossary: Dict) -> Dict:
+    stats = empty_stats()
+    for chapter_number, text in chapters:
+        add_chapter_stats(stats, chapter_number, text, glossary)
+    return stats
+
+def compact_glossary(glossary: Dict, stats: Dict, prune_after: int = GLOSSARY_PRUNE_AFTER_CHAPTERS) -> Tuple[Dict, Dict]:
+    """
+    Returns (compacted glossary, report). Per category, entries with the same English name are variants: the most
+    used one stays and the others become its "aliases". Entities that only ever occur inside a longer name (a bare
+    surname) are dropped, and so are ones seen in a single chapter at least `prune_after` chapters ago. Entities not
+    seen at all (e.g. imported from a prequel) are kept.
+    """
+    newest = max(stats["recorded"], default=0)
+    compacted = {cat: {} for cat in CATEGORIES}
+    report = {"before": 0, "after": 0, "merged": 0, "shadowed": 0, "one_off": 0}
+    for cat in CATEGORIES:
+        entries = glossary.get(cat) or {}
+        seen = stats["entities"].get(cat, {})
+        usage = lambda name, key: seen.get(name, {}).get(key) or 0
+        report["before"] += len(entries)
+
+        variants: Dict[str, List[str]] = {}
+        for name, data in entries.items():
+            variants.setdefault(_english_key(data) or "\0" + name, []).append(name) # No English name: never merged
+        for names in variants.values():
+            chapters, inside, last = (sum(usage(n, "chapters") for n in names), sum(usage(n, "inside") for n in names),
+                                      max(usage(n, "last") for n in names))
+            if chapters == 0 and inside > 0:
+                report["shadowed"] += len(names)
+                continue
+            if chapters == 1 and newest - last >= prune_after:
+                report["one_off"] += len(names)
+                continue
+            canonical = max(names, key=lambda n: (usage(n, "chapters"), usage(n, "mentions"), len(n))) # Ties: the earliest entry
+            data = entries[canonical]
+            aliases = [a for n in names for a in ([n] if n != canonical else []) + list(entries[n].get("aliases", []) if isinstance(entries[n], dict) else [])]
+            aliases = [a for a in dict.fromkeys(aliases) if a != canonical]
+            if aliases:
+                data = {**data, "aliases": aliases}
+                report["merged"] += len(names) - 1
+            compacted[cat][canonical] = data
+    report["after"] = sum(len(entries) for entries in compacted.values())
+    return compacted, report
+
+def compact_novel_glossary(novel_dir: Path, dry_run: bool = False) -> Dict:
+    """
+    Rebuilds the entity stats from every raw chapter, compacts the novel's glossary.json with them and stores both
+    (the previous glossary is kept as glossary.json.bak). Returns the compaction report.
+    """
+    paths = novel_paths(Path(novel_dir))
+    store = GlossaryStore(paths["glossary"])
+    glossary = store.snapshot()
+    index = ChapterIndex(paths["raw"], paths["chapter_index"]).refresh()
+    texts = lambda: ((e.chapter_number, index.path(e).read_text(encoding='utf-8')) for e in index.chapters())
+    compacted, report = compact_glossary(glossary, build_stats(texts(), glossary))
+    if dry_run: return report
+
+    if paths["glossary"].exists(): shutil.copy2(paths["glossary"], paths["glossary"].with_name(paths["glossary"].name + ".bak"))
+    tmp_path = paths["glossary"].with_name(paths["glossary"].name + ".tmp")
+    tmp_path.write_text(json.dumps(compacted, ensure_ascii=False, indent=4), encoding='utf-8')
+    os.replace(tmp_path, paths["glossary"])
+    save_stats(paths["glossary_stats"], build_stats(texts(), compacted)) # Counted again under the merged names
+    return report
+
+def format_compaction(report: Dict) -> str:
+    return (f"{report['before']} -> {report['after']} entries: {report['merged']} variants merged into aliases, "
+            f"{report['shadowed']} only found inside longer names, {report['one_off']} one-off entities pruned")
@@ -1,9 +1,10 @@
 import os
+import re
 import sys
 import json
 import shutil
+import queue
 import threading
-import re
 from pathlib import Path
 from tkinter import filedialog
 
@@ -11,9 +12,11 @@ import customtkinter as ctk
 from PIL import Image
 
 # Local Imports
-from config import NOVELS_ROOT_DIR
+from config import NOVELS_ROOT_DIR, GUI_MAX_CHAPTER_CHOICES, GUI_LOG_POLL_MS, GUI_SCROLLBACK_LINES, GUI_LOG_FILE, GUI_LOG_MAX_BYTES, GUI_LOG_BACKUPS
 from main import process_novel
-from utils import extract_chapter_number
+from chapter_index import ChapterIndex, sparse_chapter_choices
+from log_sink import LogSink, Scrollback, drain_queue, create_log_file
+from progress import bus, drain_events, ProgressState, LLM, TTS, RSS
 
 ctk.set_appearance_mode("Dark")
 ctk.set_default_color_theme("blue")
@@ -22,34 +25,13 @@ ctk.set_default_color_theme("blue")
 original_stdout = sys.stdout
 original_stderr = sys.stderr
 
-# Regex to find terminal color codes
-ansi_escape = re.compile(r'\x1B(?:[@-Z\\-_]|\[[0-?]*[ -/]*[@-~])')
-
-class TextRedirector:
-    def __init__(self, text_widget, original_stream):
-        self.text_widget = text_widget
-        self.original_stream = original_stream
-
-    def write(self, text):
-        # 1. Print to the actual Konsole immediately
-        self.original_stream.write(text)
-
-        # 2. Strip the ANSI color codes for the GUI
-        clean_text = ansi_escape.sub('', text)
-
-        # 3. THREAD SAFE GUI UPDATE: 
-        # Pass the update to the main UI thread using .after()
-        self.text_widget.after(0, self._update_gui, clean_text)
-
-    def _update_gui(self, text):
-        """Helper method that only runs on the Main UI Thread."""
-        self.text_widget.configure(state="normal")
-        self.text_widget.insert("end", text)
-        self.text_widget.see("end")
-        self.text_widget.configure(state="disabled")
-
-    def flush(self):
-        self.original_stream.flush()
+# Sparklines drawn under the progress bars: (ProgressState series, caption, format)
+SPARK_SERIES = [
+    ("lines_per_sec", "Lines/s", "{:.2f}"),
+    (LLM, "LLM tok/s", "{:.1f}"),
+    (TTS, "TTS RTF", "{:.2f}"),
+    (RSS, "RSS MB", "{:.0f}"),
+]
 
 class NovelApp(ctk.CTk):
     def __init__(self):
@@ -81,10 +63,10 @@ class NovelApp(ctk.CTk):
         self.novel_dropdown = ctk.CTkOptionMenu(self.sidebar, variable=self.novel_var, command=self.on_novel_change)
         self.novel_dropdown.grid(row=2, column=0, padx=20, pady=(5, 10), sticky="ew")
 
-        # Chapter Selection
+        # Chapter Selection (editable: long novels only list every Nth chapter, any number can be typed)
         ctk.CTkLabel(self.sidebar, text="Start From Chapter:").grid(row=3, column=0, padx=20, pady=(10, 0), sticky="w")
         self.chapter_var = ctk.StringVar()
-        self.chapter_dropdown = ctk.CTkOptionMenu(self.sidebar, variable=self.chapter_var)
+        self.chapter_dropdown = ctk.CTkComboBox(self.sidebar, variable=self.chapter_var)
         self.chapter_dropdown.grid(row=4, column=0, padx=20, pady=(5, 10), sticky="ew")
 
         # Action Buttons
@@ -106,16 +88,48 @@ class NovelApp(ctk.CTk):
 
         # --- TAB 1: LOGS ---
         self.tab_logs.grid_columnconfigure(0, weight=1)
-        self.tab_logs.grid_rowconfigure(0, weight=1)
-        
+        self.tab_logs.grid_rowconfigure(1, weight=1)
+
+        # Live dashboard fed by the progress bus (no filesystem polling)
+        self.dashboard = ctk.CTkFrame(self.tab_logs)
+        self.dashboard.grid(row=0, column=0, padx=10, pady=(10, 0), sticky="ew")
+        self.dashboard.grid_columnconfigure(1, weight=1)
+
+        self.chapter_label = ctk.CTkLabel(self.dashboard, text="Chapters: -", anchor="w", width=160)
+        self.chapter_label.grid(row=0, column=0, padx=10, pady=(8, 2), sticky="w")
+        self.chapter_bar = ctk.CTkProgressBar(self.dashboard)
+        self.chapter_bar.grid(row=0, column=1, padx=10, pady=(8, 2), sticky="ew")
+        self.chapter_bar.set(0)
+
+        self.line_label = ctk.CTkLabel(self.dashboard, text="Lines: -", anchor="w", width=160)
+        self.line_label.grid(row=1, column=0, padx=10, pady=2, sticky="w")
+        self.line_bar = ctk.CTkProgressBar(self.dashboard)
+        self.line_bar.grid(row=1, column=1, padx=10, pady=2, sticky="ew")
+        self.line_bar.set(0)
+
+        self.stats_label = ctk.CTkLabel(self.dashboard, text="Idle", anchor="w", font=("Ubuntu Mono", 13))
+        self.stats_label.grid(row=2, column=0, columnspan=2, padx=10, pady=2, sticky="w")
+
+        self.spark_canvas = ctk.CTkCanvas(self.dashboard, height=60, bg="#1e1e1e", highlightthickness=0)
+        self.spark_canvas.grid(row=3, column=0, columnspan=2, padx=10, pady=(2, 8), sticky="ew")
+
+        self.progress_state = ProgressState()
+        self.progress_events = bus.subscribe()
+        self.after(GUI_LOG_POLL_MS, self.drain_progress)
+
         # Upgraded to a proper monospaced terminal font with dark background
         self.log_textbox = ctk.CTkTextbox(self.tab_logs, font=("Ubuntu Mono", 13), fg_color="#1e1e1e", text_color="#d4d4d4")
-        self.log_textbox.grid(row=0, column=0, padx=10, pady=10, sticky="nsew")
+        self.log_textbox.grid(row=1, column=0, padx=10, pady=10, sticky="nsew")
         self.log_textbox.configure(state="disabled")
 
-        # Redirect standard outputs to BOTH Konsole and GUI
-        sys.stdout = TextRedirector(self.log_textbox, original_stdout)
-        sys.stderr = TextRedirector(self.log_textbox, original_stderr)
+        # Redirect standard outputs to BOTH Konsole and GUI.
+        # Writers only enqueue; the UI thread drains the queue every GUI_LOG_POLL_MS in a single insert.
+        self.log_queue = queue.SimpleQueue()
+        self.scrollback = Scrollback(GUI_SCROLLBACK_LINES)
+        self.log_file = create_log_file(GUI_LOG_FILE, GUI_LOG_MAX_BYTES, GUI_LOG_BACKUPS)
+        sys.stdout = LogSink(original_stdout, self.log_queue)
+        sys.stderr = LogSink(original_stderr, self.log_queue)
+        self.after(GUI_LOG_POLL_MS, self.drain_logs)
 
         # --- TAB 2: METADATA EDITOR ---
         self.tab_meta.grid_columnconfigure(1, weight=1)
@@ -165,6 +179,60 @@ class NovelApp(ctk.CTk):
         # Init
         self.load_novels()
 
+    # ==========================
+    # LOG VIEW
+    # ==========================
+    def drain_logs(self):
+        """Runs on the Main UI Thread: flushes all queued output into the textbox and the log file at once."""
+        text = drain_queue(self.log_queue)
+        if text:
+            self.log_file.info(text)
+            overflow = self.scrollback.add(text)
+            self.log_textbox.configure(state="normal")
+            self.log_textbox.insert("end", text)
+            if overflow:
+                self.log_textbox.delete("1.0", f"{overflow + 1}.0")
+            self.log_textbox.see("end")
+            self.log_textbox.configure(state="disabled")
+        self.after(GUI_LOG_POLL_MS, self.drain_logs)
+
+    def drain_progress(self):
+        """Runs on the Main UI Thread: folds queued progress events into the dashboard once per tick."""
+        events = drain_events(self.progress_events)
+        if events:
+            for event in events: self.progress_state.apply(event)
+            self.render_dashboard()
+        self.after(GUI_LOG_POLL_MS, self.drain_progress)
+
+    def render_dashboard(self):
+        state = self.progress_state
+        chapter = f"Ch {state.chapter:03d}" if state.chapter is not None else "-"
+        self.chapter_label.configure(text=f"Chapters: {state.chapters_done}/{state.chapters_total} ({chapter})")
+        self.chapter_bar.set(state.chapter_fraction())
+        self.line_label.configure(text=f"{state.stage.capitalize() or 'Lines'}: {state.lines_done}/{state.lines_total}")
+        self.line_bar.set(state.line_fraction())
+        self.stats_label.configure(text=state.summary())
+        self.draw_sparklines()
+
+    def draw_sparklines(self):
+        canvas = self.spark_canvas
+        canvas.delete("all")
+        width, height = max(canvas.winfo_width(), 200), int(canvas.cget("height"))
+        cell = width / len(SPARK_SERIES)
+        for i, (name, caption, fmt) in enumerate(SPARK_SERIES):
+            x0 = i * cell + 5
+            values = list(self.progress_state.history[name])
+            latest = fmt.format(values[-1]) if values else "-"
+            canvas.create_text(x0, 2, anchor="nw", text=f"{caption}: {latest}", fill="#d4d4d4", font=("Ubuntu Mono", 10))
+            if len(values) < 2: continue
+            low, high = min(values), max(values)
+            span = (high - low) or 1.0
+            step = (cell - 15) / (len(values) - 1)
+            points = []
+            for j, v in enumerate(values):
+                points += [x0 + j * step, height - 4 - (v - low) / span * (height - 22)]
+            canvas.create_line(*points, fill="#4ea1d3", width=2)
+
     # ==========================
     # LOGIC FUNCTIONS
     # ==========================
@@ -185,15 +253,13 @@ class NovelApp(ctk.CTk):
 
     def on_novel_change(self, novel_name):
         """Updates chapter list and loads metadata for the selected novel."""
-        # 1. Update Chapters
-        raw_dir = NOVELS_ROOT_DIR / novel_name / "01_Raw_Text"
+        # 1. Update Chapters (cached index, so only new or renamed files are looked at)
+        novel_dir = NOVELS_ROOT_DIR / novel_name
+        raw_dir = novel_dir / "01_Raw_Text"
         if raw_dir.exists():
-            files = sorted(raw_dir.glob("*.txt"))
-            chapters = []
-            for f in files:
-                ch_num = extract_chapter_number(f.name)
-                if ch_num is not None:
-                    chapters.append(f"Ch {ch_num:03d}")
+            index = ChapterIndex(raw_dir, novel_dir / ".cache" / "chapter_index.json").refresh()
+            numbers = [e.chapter_number for e in index.chapters()]
+            chapters = [f"Ch {n:03d}" for n in sparse_chapter_choices(numbers, GUI_MAX_CHAPTER_CHOICES)]
             if chapters:
                 self.chapter_dropdown.configure(values=chapters)
                 self.chapter_var.set(chapters[0])
@@ -319,7 +385,11 @@ class NovelApp(ctk.CTk):
         ch_str = self.chapter_var.get()
 
         if "No" in novel_name or "No" in ch_str: return
-        start_ch = int(ch_str.split(" ")[1])
+        ch_match = re.search(r'\d+', ch_str)
+        if not ch_match:
+            print(f"[!] '{ch_str}' is not a chapter number.")
+            return
+        start_ch = int(ch_match.group())
 
         self.start_btn.configure(state="disabled")
         self.stop_btn.configure(state="normal")
@@ -0,0 +1,189 @@
+import re
+import codecs
+from html.parser import HTMLParser
+from pathlib import Path
+from typing import Iterable, Iterator, Optional
+
+# Local Imports
+from config import INGEST_SAMPLE_BYTES, INGEST_FALLBACK_ENCODING
+
+# 第12章 / 第十二章 / 第一百零三回 / 第3节, optionally followed by a title
+CHAPTER_HEADING_PATTERN = re.compile(r'^第[0-9０-９零〇一二两三四五六七八九十百千万]+[章回节]')
+HEADING_MAX_CHARS = 50 # Longer lines starting with 第X章 are prose that mentions a chapter
+# Full-width spaces (novels indent paragraphs with 　　), no-break and zero-width spaces
+WIDE_SPACE_PATTERN = re.compile(r'[\u3000\u00a0\u2000-\u200b\ufeff\t ]+')
+
+BOMS = [
+    (codecs.BOM_UTF8, "utf-8-sig"),
+    (codecs.BOM_UTF16_LE, "utf-16"),
+    (codecs.BOM_UTF16_BE, "utf-16"),
+]
+
+def detect_encoding(path: Path, sample_bytes: int = INGEST_SAMPLE_BYTES) -> str:
+    """BOM first, then strict UTF-8 on a sample, else GB18030 (a superset of GBK and GB2312)."""
+    with open(path, "rb") as f:
+        sample = f.read(sample_bytes)
+    for bom, encoding in BOMS:
+        if sample.startswith(bom): return encoding
+    try:
+        # Incremental decoder: a multi-byte character cut off at the end of the sample is not an error.
+        codecs.getincrementaldecoder("utf-8")().decode(sample, final=False)
+        return "utf-8"
+    except UnicodeDecodeError:
+        return INGEST_FALLBACK_ENCODING
+
+def normalize_line(line: str) -> str:
+    """Strips indentation and trailing whitespace, folds runs of full-width/odd spaces to one ASCII space."""
+    return WIDE_SPACE_PATTERN.sub(" ", line).strip()
+
+def is_chapter_heading(line: str) -> bool:
+    return len(line) <= HEADING_MAX_CHARS and bool(CHAPTER_HEADING_PATTERN.match(line))
+
+class ChapterWriter:
+    """
+    Writes streamed lines straight into ch_NNNN.txt files (wider past 9999), opening the next file at each heading.
+    Text before the first heading goes to front_matter.txt, which the chapter index ignores.
+    Consecutive blank lines are collapsed.
+    """
+    def __init__(self, raw_dir: Path):
+        self.raw_dir = Path(raw_dir)
+        self.raw_dir.mkdir(parents=True, exist_ok=True)
+        self.chapters = 0
+        self.chars = 0
+        self._file = None
+        self._blank = True
+
+    def _open(self, name: str):
+        self.close()
+        self._file = open(self.raw_dir / name, "w", encoding="utf-8", newline="\n")
+        self._blank = True
+
+    def start_chapter(self):
+        self.chapters += 1
+        self._open(f"ch_{self.chapters:04d}.txt")
+
+    def write_line(self, line: str):
+        if is_chapter_heading(line):
+            self.start_chapter()
+        elif not line:
+            if self._blank or self._file is None: return
+            self._blank = True
+            self._file.write("\n")
+            return
+        elif self._file is None:
+            self._open("front_matter.txt")
+
+        self._file.write(line + "\n")
+        self.chars += len(line)
+        self._blank = False
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def split_lines(lines: Iterable[str], raw_dir: Path) -> dict:
+    with ChapterWriter(raw_dir) as writer:
+        for line in lines:
+            writer.write_line(normalize_line(line))
+    return {"chapters": writer.chapters, "chars": writer.chars}
+
+def ingest_text(source: Path, raw_dir: Path, encoding: Optional[str] = None) -> dict:
+    """Streams a single-file novel line by line into numbered chapter files. Memory use is one line."""
+    source = Path(source)
+    encoding = encoding or detect_encoding(source)
+    try:
+        with open(source, "r", encoding=encoding, newline=None) as f:
+            report = split_lines(f, raw_dir)
+    except UnicodeDecodeError:
+        if encoding != "utf-8": raise
+        # The sample looked like UTF-8 but the file isn't; start over (the chapter files get rewritten).
+        encoding = INGEST_FALLBACK_ENCODING
+        with open(source, "r", encoding=encoding, errors="replace", newline=None) as f:
+            report = split_lines(f, raw_dir)
+    report.update({"source": str(source), "encoding": encoding, "bytes": source.stat().st_size})
+    return report
+
+# ==========================
+# EPUB
+# ==========================
+class _TextExtractor(HTMLParser):
+    """Collects the text of an XHTML document, one line per block element."""
+    BLOCK_TAGS = {"p", "div", "br", "h1", "h2", "h3", "h4", "h5", "h6", "li", "tr", "section", "title"}
+    SKIP_TAGS = {"script", "style", "head"}
+
+    def __init__(self):
+        super().__init__()
+        self.lines = []
+        self._current = []
+        self._skip = 0
+
+    def _flush(self):
+        if self._current:
+            self.lines.append("".join(self._current))
+            self._current = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIP_TAGS: self._skip += 1
+        elif tag in self.BLOCK_TAGS: self._flush()
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIP_TAGS: self._skip = max(0, self._skip - 1)
+        elif tag in self.BLOCK_TAGS: self._flush()
+
+    def handle_data(self, data):
+        if not self._skip: self._current.append(data)
+
+    def close(self):
+        super().close()
+        self._flush()
+
+def html_to_lines(html: str) -> list:
+    parser = _TextExtractor()
+    parser.feed(html)
+    parser.close()
+    return parser.lines
+
+def iter_epub_documents(source: Path) -> Iterator[list]:
+    """Text lines of each spine document, in reading order."""
+    import ebooklib
+    from ebooklib import epub
+
+    book = epub.read_epub(str(source))
+    for item_id, _ in book.spine:
+        item = book.get_item_with_id(item_id)
+        if item is None or item.get_type() != ebooklib.ITEM_DOCUMENT: continue
+        yield html_to_lines(item.get_content().decode("utf-8", errors="replace"))
+
+def ingest_epub(source: Path, raw_dir: Path) -> dict:
+    """
+    Splits an EPUB on 第X章 headings like a txt. If the book has none, every
+    non-empty spine document becomes one chapter (its first line as the title).
+    """
+    source = Path(source)
+    documents = [[normalize_line(line) for line in doc] for doc in iter_epub_documents(source)]
+    documents = [[line for line in doc if line] for doc in documents]
+    has_headings = any(is_chapter_heading(line) for doc in documents for line in doc)
+
+    with ChapterWriter(raw_dir) as writer:
+        for doc in documents:
+            if not doc: continue
+            if not has_headings: writer.start_chapter()
+            for line in doc:
+                writer.write_line(line)
+    return {"chapters": writer.chapters, "chars": writer.chars, "source": str(source), "encoding": "epub", "bytes": source.stat().st_size}
+
+def ingest_source(source: Path, raw_dir: Path, encoding: Optional[str] = None) -> dict:
+    """Entry point for `cli.py --ingest`: dispatches on the file extension. Refuses to mix into existing chapters."""
+    source, raw_dir = Path(source), Path(raw_dir)
+    if raw_dir.exists() and any(raw_dir.glob("*.txt")):
+        raise FileExistsError(f"{raw_dir} already contains chapter files; move them away before ingesting.")
+    if source.suffix.lower() == ".epub":
+        return ingest_epub(source, raw_dir)
+    return ingest_text(source, raw_dir, encoding)
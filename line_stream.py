@@ -0,0 +1,99 @@
+import os
+import re
+import json
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, Optional
+
+STREAM_BUFFER_CHARS = 1 << 16
+_SKIP = re.compile(r'[\s,]*')
+
+def iter_json_array(path: Path, buffer_chars: int = STREAM_BUFFER_CHARS) -> Iterator:
+    """Yields the items of a top-level JSON array one at a time; memory use is one item plus the read buffer."""
+    decoder = json.JSONDecoder()
+    with open(path, "r", encoding="utf-8") as f:
+        buf, eof = f.read(buffer_chars), False
+        pos = _SKIP.match(buf).end()
+        if buf[pos:pos + 1] != "[": raise ValueError(f"{path} is not a JSON array")
+        pos += 1
+        while True:
+            pos = _SKIP.match(buf, pos).end()
+            if pos == len(buf) and not eof:
+                buf, pos = f.read(buffer_chars), 0
+                eof = not buf
+                continue
+            if buf[pos:pos + 1] == "]": return
+            try:
+                item, end = decoder.raw_decode(buf, pos)
+                if end == len(buf) and not eof: raise ValueError("item may continue in the next read")
+            except ValueError:
+                if eof: raise
+                more = f.read(buffer_chars)
+                eof = not more
+                buf, pos = buf[pos:] + more, 0
+                continue
+            pos = end
+            yield item
+
+class JsonArrayWriter:
+    """
+    Writes a JSON array one item at a time, formatted like json.dumps(items, indent=4).
+    The file is assembled next to the target and only replaces it on a clean close,
+    so readers never see a half-written chapter.
+    """
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.tmp_path = self.path.with_name(self.path.name + ".tmp")
+        self.count = 0
+        self._file = open(self.tmp_path, "w", encoding="utf-8")
+        self._file.write("[")
+
+    def write(self, item):
+        text = json.dumps(item, ensure_ascii=False, indent=4).replace("\n", "\n    ")
+        self._file.write(("," if self.count else "") + "\n    " + text)
+        self.count += 1
+
+    def close(self):
+        if self._file is None: return
+        self._file.write("\n]" if self.count else "]")
+        self._file.close()
+        self._file = None
+        os.replace(self.tmp_path, self.path)
+
+    def abort(self):
+        if self._file is None: return
+        self._file.close()
+        self._file = None
+        self.tmp_path.unlink(missing_ok=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        if exc_type is None: self.close()
+        else: self.abort()
+
+class ChapterLines:
+    """
+    Re-iterable, read-only view of a chapter's line dicts stored in one or more JSON array files.
+    Each pass streams from disk, so stages hand a chapter to each other without holding it in memory.
+    """
+    def __init__(self, *paths: Path, count: Optional[int] = None):
+        self.paths = [Path(p) for p in paths]
+        self._count = count
+
+    def __iter__(self) -> Iterator[Dict]:
+        for path in self.paths:
+            yield from iter_json_array(path)
+
+    def __len__(self) -> int:
+        if self._count is None: self._count = sum(1 for _ in self)
+        return self._count
+
+    def __bool__(self) -> bool:
+        return len(self) > 0
+
+def write_json_array(path: Path, items: Iterable) -> int:
+    with JsonArrayWriter(path) as writer:
+        for item in items:
+            writer.write(item)
+    return writer.count
@@ -0,0 +1,80 @@
+import re
+import threading
+from typing import Dict, List
+
+# Local Imports
+from config import LLM_MODEL, LLM_DRAFT_MODEL, LLM_PROMPT_TIERS, DRAFT_LENGTH_RATIO, DRAFT_MIN_SOURCE_CHARS, EMOTION_VOCAB
+from utils import call_llm, parse_numbered_output
+
+HAN_PATTERN = re.compile(r'[\u3400-\u9fff\uf900-\ufaff]')
+TRANSLATION_PROMPTS = ("natural", "literal")
+
+def model_for(prompt_name: str) -> str:
+    """Model that answers a prompt first: the draft model for "draft" prompts (if one is configured), else LLM_MODEL."""
+    if LLM_DRAFT_MODEL and LLM_PROMPT_TIERS.get(prompt_name, "main") == "draft":
+        return LLM_DRAFT_MODEL
+    return LLM_MODEL
+
+def check_draft(prompt_name: str, chunk_dict: Dict[int, str], parsed: Dict[int, str], sub_glossary: Dict = None) -> List[str]:
+    """
+    Cheap checks on a drafted chunk. Returns one reason per problem found (empty = accept the draft):
+    missing lines, Han characters left in a translation, English/Chinese length ratio outside
+    DRAFT_LENGTH_RATIO, glossary names not used, or emotion tags outside EMOTION_VOCAB.
+    """
+    flags = []
+    low, high = DRAFT_LENGTH_RATIO
+    names = [(cn, data.get("english_name", "")) for cat in (sub_glossary or {}).values() for cn, data in cat.items() if isinstance(data, dict)]
+
+    for idx, source in chunk_dict.items():
+        output = parsed.get(idx, "")
+        if not output:
+            flags.append(f"L{idx}: missing")
+            continue
+        if prompt_name == "emotion":
+            if output not in EMOTION_VOCAB: flags.append(f"L{idx}: unknown emotion '{output}'")
+            continue
+        if prompt_name not in TRANSLATION_PROMPTS: continue
+
+        if HAN_PATTERN.search(output):
+            flags.append(f"L{idx}: untranslated Han")
+        source_chars = len(HAN_PATTERN.findall(source))
+        if source_chars >= DRAFT_MIN_SOURCE_CHARS and not low <= len(output) / source_chars <= high:
+            flags.append(f"L{idx}: length ratio {len(output) / source_chars:.1f}")
+        for cn, en in names:
+            if en and cn in source and en.lower() not in output.lower():
+                flags.append(f"L{idx}: glossary '{en}' not used")
+    return flags
+
+class TierStats:
+    """Per-prompt counts of drafted and escalated chunks, for the chapter log and benchmarks."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.drafted = {}
+        self.escalated = {}
+
+    def record(self, prompt_name: str, escalated: bool):
+        with self._lock:
+            self.drafted[prompt_name] = self.drafted.get(prompt_name, 0) + 1
+            if escalated: self.escalated[prompt_name] = self.escalated.get(prompt_name, 0) + 1
+
+    def snapshot(self) -> Dict[str, tuple]:
+        with self._lock:
+            return {name: (count, self.escalated.get(name, 0)) for name, count in self.drafted.items()}
+
+TIER_STATS = TierStats()
+
+def request_lines(prompt_name: str, system_prompt: str, user_text: str, chunk_dict: Dict[int, str], sub_glossary: Dict = None, llm=call_llm) -> Dict[int, str]:
+    """
+    Runs one numbered-lines prompt for a chunk. Draft-tier prompts go to the small model first and
+    the chunk is only sent to LLM_MODEL when check_draft flags it; everything else is one LLM_MODEL call.
+    """
+    model = model_for(prompt_name)
+    parsed = parse_numbered_output(llm(system_prompt, user_text, model=model), len(chunk_dict))
+    if model == LLM_MODEL: return parsed
+
+    flags = check_draft(prompt_name, chunk_dict, parsed, sub_glossary)
+    TIER_STATS.record(prompt_name, escalated=bool(flags))
+    if not flags: return parsed
+
+    print(f"    [Draft] {prompt_name}: escalating chunk to {LLM_MODEL} ({'; '.join(flags[:3])}{'...' if len(flags) > 3 else ''})")
+    return parse_numbered_output(llm(system_prompt, user_text, model=LLM_MODEL), len(chunk_dict))
@@ -0,0 +1,76 @@
+import re
+import queue
+import logging
+from collections import deque
+from logging.handlers import RotatingFileHandler
+from pathlib import Path
+
+# Regex to find terminal color codes
+ansi_escape = re.compile(r'\x1B(?:[@-Z\\-_]|\[[0-?]*[ -/]*[@-~])')
+
+class LogSink:
+    """
+    Drop-in replacement for sys.stdout/sys.stderr. write() only tees to the original
+    stream and enqueues the text, so worker threads never touch Tk. The GUI thread
+    calls drain() on a timer and inserts everything that arrived in one go.
+    """
+    def __init__(self, original_stream, log_queue: queue.SimpleQueue):
+        self.original_stream = original_stream
+        self.log_queue = log_queue
+
+    def write(self, text):
+        # 1. Print to the actual Konsole immediately
+        self.original_stream.write(text)
+        # 2. Hand the text to the GUI thread (non-blocking)
+        self.log_queue.put(text)
+
+    def flush(self):
+        self.original_stream.flush()
+
+def drain_queue(log_queue: queue.SimpleQueue, max_chunks: int = 10000) -> str:
+    """Pops everything currently queued (up to max_chunks writes) as one ANSI-free string."""
+    chunks = []
+    try:
+        while len(chunks) < max_chunks:
+            chunks.append(log_queue.get_nowait())
+    except queue.Empty:
+        pass
+    return ansi_escape.sub('', "".join(chunks))
+
+class Scrollback:
+    """
+    Ring buffer of the last max_lines log lines. add() tells the caller how many lines
+    must be deleted from the top of the text widget to keep it in sync.
+    """
+    def __init__(self, max_lines: int):
+        self.max_lines = max_lines
+        self.lines = deque([""], maxlen=max_lines)
+        self.total_lines = 1
+
+    def add(self, text: str) -> int:
+        parts = text.split("\n")
+        self.lines[-1] += parts[0]
+        self.lines.extend(parts[1:])
+        self.total_lines += len(parts) - 1
+        overflow = self.total_lines - self.max_lines
+        if overflow > 0:
+            self.total_lines = self.max_lines
+            return overflow
+        return 0
+
+    def text(self) -> str:
+        return "\n".join(self.lines)
+
+def create_log_file(path: Path, max_bytes: int, backup_count: int) -> logging.Logger:
+    """Rotating file with the full, untrimmed log history. Chunks are written verbatim."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    logger = logging.getLogger(f"novel_log.{path.resolve()}")
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    if not logger.handlers:
+        handler = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8')
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        handler.terminator = ""
+        logger.addHandler(handler)
+    return logger
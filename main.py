@@ -1,333 +1,457 @@
 import os
 import json
 import time
-import gc
 import threading
-import torch
 import ollama
-import genanki
-import soundfile as sf
-import transformers
-import numpy as np
-import re
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 
 # Local Imports
-from config import LLM_MODEL, TTS_MODEL, SPEAKER_VOICE, ANKI_MODEL, get_deterministic_id
-from utils import Chapter, extract_chapter_number, chunk_text_into_numbered_lines, get_relevant_glossary, call_llm, parse_numbered_output, clean_for_tts, sanitize_filename, generate_pinyin
-from prompts import prompt_json, prompt_natural, prompt_literal, prompt_emotion
-from exporters import build_final_epub
-from qwen_tts import Qwen3TTSModel
+from config import LLM_MODEL, LLM_DRAFT_MODEL, OLLAMA_HOST, TTS_DEVICE, ANKI_EXPORT_WORKERS, TM_ENABLED, TM_SERVE_THRESHOLD, TM_EXAMPLE_THRESHOLD, TM_MAX_EXAMPLES, TEXT_STAGE_WORKERS
+from utils import Chapter, chunk_text_into_numbered_lines, call_llm, LLM_STATS, canonicalize_emotion, get_audio_filename, novel_paths
+from prompts import prompt_json, prompt_natural, prompt_literal, prompt_emotion, with_glossary, with_examples
+from exporters import build_final_epub, write_anki_package, MediaRegistry, get_book_title
+from tts_queue import TTSJobQueue
+from tts_engine import run_tts_worker, unload_resident_model
+from tts_pool import run_cpu_pool
+from progress import publish, STAGE, CHAPTER, LINE
+from chapter_index import ChapterIndex, shard_entries
+from llm_tiers import model_for, request_lines, TIER_STATS
+from translation_memory import TranslationMemory
+from pinyin_engine import GlossaryPinyin
+from line_stream import ChapterLines, JsonArrayWriter, write_json_array
+from glossary_store import GlossaryStore
+from anki_writer import AnkiChapter, IncrementalPackage
+from epub_writer import ChapterXhtmlWriter, record_title
+from planner import record_text_run, count_han
+from boilerplate import LineIndex, format_report, format_dropped, frozen_skip
+from clip_quality import chapter_report, write_chapter_report, format_chapter_report
 
 # --- HELPER: DIRECTORY SETUP ---
 def setup_directories(novel_dir):
-    paths = {
-        "raw": novel_dir / "01_Raw_Text",
-        "trans": novel_dir / "02_Translated",
-        "epub": novel_dir / "03_EPUB_Chapters",
-        "anki": novel_dir / "04_Anki_Chapters",
-        "media": novel_dir / "media",
-        "cache": novel_dir / ".cache",
-        "glossary": novel_dir / "glossary.json",
-        "metadata": novel_dir / "metadata.json"
-    }
+    paths = novel_paths(novel_dir)
     for p in paths.values():
         if p.suffix == "": # If it's a folder, create it
             p.mkdir(exist_ok=True)
     return paths
 
+def match_translation_memory(tm, chunk_dict):
+    """Splits a chunk's lines into ones served from memory (similarity >= TM_SERVE_THRESHOLD) and near-miss examples for the LLM."""
+    served, examples = {}, []
+    if tm is None: return served, examples
+    for idx, text in chunk_dict.items():
+        match = tm.lookup(text, TM_EXAMPLE_THRESHOLD)
+        if match is None: continue
+        if match.similarity >= TM_SERVE_THRESHOLD: served[idx] = match
+        elif len(examples) < TM_MAX_EXAMPLES: examples.append(match)
+    return served, examples
+
+def translate_lines(lines, glossary, examples=()):
+    """
+    Sends a set of {original_idx: text} lines to the LLM (renumbered 1..n) and returns
+    ({original_idx: (nat, lit, emo)}, glossary version the translations used).
+    New entities are merged into the shared GlossaryStore.
+    """
+    chunk_dict = {n: text for n, text in enumerate(lines.values(), 1)}
+    numbered_input = "\n".join([f"{idx}. {text}" for idx, text in chunk_dict.items()])
+
+    # Glossary discovery (the store keeps existing entries and saves the file under its lock)
+    try:
+        res_json = call_llm(prompt_json(), numbered_input, model=model_for("json"))
+        json_str = res_json[res_json.find('{'):res_json.rfind('}')+1]
+        glossary.merge(json.loads(json_str))
+    except Exception: pass
+
+    # LLM Translations
+    chunk_glossary, glossary_version = glossary.relevant(numbered_input)
+    chunk_input = with_glossary(numbered_input, chunk_glossary)
+    nat = request_lines("natural", prompt_natural(), with_examples(chunk_input, [(m.cn, m.nat) for m in examples]), chunk_dict, chunk_glossary, llm=call_llm)
+    lit = request_lines("literal", prompt_literal(), with_examples(chunk_input, [(m.cn, m.lit) for m in examples]), chunk_dict, chunk_glossary, llm=call_llm)
+    emo = request_lines("emotion", prompt_emotion(), numbered_input, chunk_dict, llm=call_llm)
+
+    return {orig_idx: (nat.get(n, ""), lit.get(n, ""), emo.get(n, "")) for n, orig_idx in enumerate(lines, 1)}, glossary_version
+
+def reconcile_late_entities(chunk_versions, glossary):
+    """
+    Re-checks finished chunks against entities that entered the glossary after the chunk was translated
+    (found later in the chapter or by a chapter running in parallel). Lines that mention such an entity
+    without using its English name are translated again. Returns the number of lines redone.
+    """
+    redone = 0
+    for chunk_file, version in chunk_versions.items():
+        late = [(cn, data.get("english_name", "")) for cn, data in glossary.added_since(version) if isinstance(data, dict)]
+        if not late: continue
+        lines = list(ChapterLines(chunk_file))
+        stale = {idx: line["cn"] for idx, line in enumerate(lines) if any(en and cn in line["cn"] and en.lower() not in line["nat"].lower() for cn, en in late)}
+        if not stale: continue
+        translated, _ = translate_lines(stale, glossary)
+        for idx, (nat, lit, emo) in translated.items():
+            lines[idx].update(nat=nat, lit=lit, emo=emo or lines[idx]["emo"])
+        write_json_array(chunk_file, lines)
+        redone += len(stale)
+    return redone
+
+def write_with_pinyin(source, target, glossary):
+    """
+    Streams a chapter's lines from source (re-iterable) into the JSON file target, filling every "py"
+    from one pinyin pass over the chapter with the glossary's readings for names. Returns the line count.
+    """
+    engine = GlossaryPinyin(glossary.snapshot())
+    if engine.rejected:
+        print(f"    [Pinyin] {len(engine.rejected)} glossary names have pinyin that doesn't fit their characters; using pypinyin for them.")
+    pinyin_lines = iter(engine.convert_lines([line["cn"] for line in source if "cn" in line]))
+    with JsonArrayWriter(target) as writer:
+        for line in source:
+            if "cn" in line: line["py"] = next(pinyin_lines)
+            writer.write(line)
+    return writer.count
+
 # --- STAGE 1: TEXT GENERATION ---
-def run_text_stage(chapter, paths, glossary, stop_event, redo_pinyin):
+def run_text_stage(chapter, paths, glossary, stop_event, redo_pinyin, tm=None, skip=frozenset()):
     print("\n--- STAGE 1: TEXT GENERATION ---")
+    publish(STAGE, label="text", chapter=chapter.chapter_number)
     
     consolidated_json = paths["trans"] / chapter.file_name.replace('.txt', '.json')
     chapter_cache_dir = paths["cache"] / f"ch_{chapter.chapter_number:04d}"
     chapter_cache_dir.mkdir(exist_ok=True)
-    chapter_lines = []
 
     # 1. Redo Pinyin Mode (Fast Path)
     if redo_pinyin and consolidated_json.exists():
         print(f"    [Pinyin] Re-generating Pinyin for {chapter.file_name}...")
-        data = json.loads(consolidated_json.read_text(encoding='utf-8'))
-        for line in data:
-            if "cn" in line: line["py"] = generate_pinyin(line["cn"])
-        consolidated_json.write_text(json.dumps(data, ensure_ascii=False, indent=4), encoding='utf-8')
-        return data # Return immediately
+        count = write_with_pinyin(ChapterLines(consolidated_json), consolidated_json, glossary)
+        return ChapterLines(consolidated_json, count=count) # Return immediately
 
     # 2. Load Existing Full Translation
     if consolidated_json.exists():
         print(f"    - Full chapter loaded from visible directory: {consolidated_json.name}")
-        return json.loads(consolidated_json.read_text(encoding='utf-8'))
+        data = ChapterLines(consolidated_json)
+        publish(LINE, stage="text", chapter=chapter.chapter_number, done=len(data), total=len(data))
+        return data
 
     # 3. Process Chunks (The Heavy Lifting)
-    chunks = chunk_text_into_numbered_lines(chapter.content)
+    unload_resident_model() # The LLM and a resident TTS model don't fit on one GPU together
+    text = chapter.load_content()
+    chunks = chunk_text_into_numbered_lines(text, skip=frozen_skip(chapter_cache_dir, text, skip))
     total_lines = sum(len(c) for c in chunks)
+    llm_before = LLM_STATS.thread_snapshot() # Other chapters may be calling the LLM from their own threads
+    text_start, llm_lines, llm_han = time.perf_counter(), 0, 0
+    tiers_before = TIER_STATS.snapshot()
+    served_count = 0
+    done_lines = 0
+    chunk_files = []
+    chunk_versions = {} # chunk file -> glossary version its translations used (chunks translated in this run)
+    publish(LINE, stage="text", chapter=chapter.chapter_number, done=0, total=total_lines)
 
     for i, chunk_dict in enumerate(chunks):
         if stop_event.is_set(): return []
         
         chunk_cache_file = chapter_cache_dir / f"chunk_{i:04d}.json"
+        chunk_files.append(chunk_cache_file)
         if chunk_cache_file.exists():
             print(f"    - Chunk {i+1}/{len(chunks)}: Loaded from hidden cache.")
-            chapter_lines.extend(json.loads(chunk_cache_file.read_text(encoding='utf-8')))
+            done_lines += len(ChapterLines(chunk_cache_file))
+            publish(LINE, stage="text", chapter=chapter.chapter_number, done=done_lines, total=total_lines)
             continue
 
-        print(f"    - Chunk {i+1}/{len(chunks)} ({len(chunk_dict)} lines): Sending to LLM...")
-        numbered_input = "\n".join([f"{idx}. {text}" for idx, text in chunk_dict.items()])
+        # Translation Memory: lines already translated (in this or a related novel) skip the LLM
+        served, examples = match_translation_memory(tm, chunk_dict)
+        pending = {idx: text for idx, text in chunk_dict.items() if idx not in served}
+        served_count += len(served)
+
+        translated = {}
+        if pending:
+            print(f"    - Chunk {i+1}/{len(chunks)} ({len(pending)} lines{f', {len(served)} from memory' if served else ''}): Sending to LLM...")
+            # Repeats inside the chunk go to the LLM once (repeats in later chunks are served by the memory)
+            first_idx = {}
+            for idx, text in pending.items(): first_idx.setdefault(text, idx)
+            unique, chunk_versions[chunk_cache_file] = translate_lines({idx: text for text, idx in first_idx.items()}, glossary, examples)
+            translated = {idx: unique[first_idx[text]] for idx, text in pending.items()}
+            llm_lines += len(first_idx)
+            llm_han += sum(count_han(text) for text in first_idx)
+        else:
+            print(f"    - Chunk {i+1}/{len(chunks)}: All {len(served)} lines served from translation memory.")
 
-        # --- UPDATED GLOSSARY LOGIC START ---
-        try:
-            res_json = call_llm(prompt_json(), numbered_input)
-            json_str = res_json[res_json.find('{'):res_json.rfind('}')+1]
-            new_entities = json.loads(json_str)
-            
-            glossary_changed = False
-            
-            # Iterate over all 4 categories: Characters, Places, Items, Skills
-            target_categories = ["characters", "places", "items", "skills"]
-            
-            for cat in target_categories:
-                # Get the entities the LLM found for this category (default to empty dict if none)
-                found_entities = new_entities.get(cat, {})
-                
-                for name, data in found_entities.items():
-                    # Strict Check: Only add if it doesn't exist in our Master Glossary
-                    # Note: We assume glossary[cat] exists because we initialize it in process_novel
-                    if name not in glossary[cat]:
-                        glossary[cat][name] = data
-                        glossary_changed = True
-                        # print(f"    [Glossary] Discovered new {cat[:-1]}: {name}")
-
-            if glossary_changed:
-                paths["glossary"].write_text(json.dumps(glossary, ensure_ascii=False, indent=4), encoding='utf-8')
-        except Exception: pass
-        # --- UPDATED GLOSSARY LOGIC END ---
-
-        # LLM Translations
-        chunk_glossary = get_relevant_glossary(numbered_input, glossary)
-        nat = parse_numbered_output(call_llm(prompt_natural(chunk_glossary), numbered_input), len(chunk_dict))
-        lit = parse_numbered_output(call_llm(prompt_literal(chunk_glossary), numbered_input), len(chunk_dict))
-        emo = parse_numbered_output(call_llm(prompt_emotion(), numbered_input), len(chunk_dict))
-        
         current_chunk_lines = []
         for idx, text in chunk_dict.items():
+            source = served.get(idx)
+            nat, lit, emo = (source.nat, source.lit, source.emo) if source else translated[idx]
             current_chunk_lines.append({
                 "cn": text,
-                "py": generate_pinyin(text), # Local Pinyin
-                "nat": nat.get(idx, ""),
-                "lit": lit.get(idx, ""),
-                "emo": emo.get(idx, "Calm narrative")
+                "py": "", # Filled for the whole chapter by write_with_pinyin
+                "nat": nat,
+                "lit": lit,
+                "emo": emo or "Calm narrative"
             })
+        if tm is not None:
+            tm.add_many([line for idx, line in zip(chunk_dict, current_chunk_lines) if idx in pending], chapter.novel_name)
         
-        chunk_cache_file.write_text(json.dumps(current_chunk_lines, ensure_ascii=False), encoding='utf-8')
-        chapter_lines.extend(current_chunk_lines)
+        write_json_array(chunk_cache_file, current_chunk_lines)
+        done_lines += len(current_chunk_lines)
+        publish(LINE, stage="text", chapter=chapter.chapter_number, done=done_lines, total=total_lines)
+
+    llm_after = LLM_STATS.thread_snapshot()
+    llm_calls = llm_after["calls"] - llm_before["calls"]
+    if llm_calls:
+        prompt_tokens = llm_after["prompt_eval_tokens"] - llm_before["prompt_eval_tokens"]
+        record_text_run(paths["throughput"], llm_lines, llm_han, time.perf_counter() - text_start, prompt_tokens, llm_after["eval_tokens"] - llm_before["eval_tokens"])
+        print(f"    [LLM] {llm_calls} calls, {prompt_tokens} prompt tokens evaluated ({prompt_tokens / llm_calls:.0f}/call after cache hits).")
+    if tm is not None: tm.flush_hits() # One write for the chapter's memory hits
+    if served_count:
+        print(f"    [TM] {served_count}/{total_lines} lines served from translation memory.")
+    for name, (drafted, escalated) in TIER_STATS.snapshot().items():
+        drafted -= tiers_before.get(name, (0, 0))[0]
+        escalated -= tiers_before.get(name, (0, 0))[1]
+        if drafted: print(f"    [Draft] {name}: {escalated}/{drafted} chunks escalated ({escalated / drafted:.0%}).")
+
+    if stop_event.is_set(): return []
+    redone = reconcile_late_entities(chunk_versions, glossary)
+    if redone: print(f"    [Glossary] Re-translated {redone} lines that mention entities added after their chunk was done.")
+
+    # 4. Cleanup and Save (chunks are streamed from the cache files, never joined in memory)
+    # Local Pinyin runs after the last chunk so names found late in the chapter get their glossary readings too.
+    chunk_lines = ChapterLines(*chunk_files, count=done_lines)
+    if done_lines != total_lines:
+        # Stale chunk cache (the raw text changed): use the lines for this run but don't save a master JSON
+        unsaved = chapter_cache_dir / "unsaved.json"
+        return ChapterLines(unsaved, count=write_with_pinyin(chunk_lines, unsaved, glossary))
+
+    print(f"\n    - Translation complete. Saving master JSON to: 02_Translated/{consolidated_json.name}")
+    write_with_pinyin(chunk_lines, consolidated_json, glossary)
+    glossary.record_chapter(chapter.chapter_number, text) # Frequencies rank the entries in later prompts
+    for chunk_file in chapter_cache_dir.glob("chunk_*.json"): chunk_file.unlink()
+    (chapter_cache_dir / "skip.json").unlink(missing_ok=True)
+    return ChapterLines(consolidated_json, count=done_lines)
+
+def run_parallel_text_stage(chapters, paths, glossary, stop_event, redo_pinyin, tm, workers, skip=frozenset()):
+    """
+    Runs the text stage for up to `workers` chapters at once (one thread each; the LLM calls are the
+    wait). The GlossaryStore serializes glossary updates and each chapter re-checks its chunks for
+    entities other chapters found meanwhile. Returns {chapter_number: lines}; a chapter that raised is
+    logged and left out, so the others still go on to the audio stage.
+    """
+    print(f"\n--- STAGE 1: TEXT GENERATION ({len(chapters)} chapters, {workers} at a time) ---")
+    results = {}
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="text_stage") as pool:
+        futures = {pool.submit(run_text_stage, chapter, paths, glossary, stop_event, redo_pinyin, tm, skip): chapter for chapter in chapters}
+        for future in as_completed(futures):
+            chapter = futures[future]
+            try:
+                results[chapter.chapter_number] = future.result()
+            except Exception as e:
+                print(f"[!] Text stage failed for {chapter.file_name}: {e}")
+    return results
 
-    # 4. Cleanup and Save
-    if not stop_event.is_set() and len(chapter_lines) == total_lines:
-        print(f"\n    - Translation complete. Saving master JSON to: 02_Translated/{consolidated_json.name}")
-        consolidated_json.write_text(json.dumps(chapter_lines, ensure_ascii=False, indent=4), encoding='utf-8')
-        for chunk_file in chapter_cache_dir.glob("chunk_*.json"): chunk_file.unlink()
+# --- STAGE 2: AUDIO & DECK GENERATION ---
+def unload_llm_models():
+    """Drops every model the text stage may have loaded from Ollama: LLM_MODEL and, when set, LLM_DRAFT_MODEL."""
+    client = ollama.Client(host=OLLAMA_HOST)
+    for model in dict.fromkeys(m for m in (LLM_MODEL, LLM_DRAFT_MODEL) if m):
+        client.generate(model=model, prompt="", keep_alive=0)
+
+def audio_is_complete(audio_path: Path) -> bool:
+    """write_opus only ever leaves whole files, so any non-empty clip is done (even a short failed-take placeholder)."""
+    return audio_path.exists() and audio_path.stat().st_size > 0
+
+def enqueue_audio_jobs(queue, chapter, chapter_lines, paths):
+    """Registers one synthesis job per line. Lines that already have audio on disk are stored as done."""
+    chapter_media_dir = paths["media"] / f"ch_{chapter.chapter_number:04d}"
+    chapter_media_dir.mkdir(exist_ok=True)
 
-    return chapter_lines
+    def jobs():
+        for line_idx, line in enumerate(chapter_lines):
+            audio_path = chapter_media_dir / get_audio_filename(chapter.chapter_number, line_idx)
+            yield (line_idx, line["cn"], canonicalize_emotion(line.get("emo", "")), str(audio_path), audio_is_complete(audio_path))
+    return queue.enqueue_chapter(chapter.chapter_number, jobs())
+
+def assemble_chapter_outputs(chapter, chapter_lines, novel_name, paths):
+    """
+    Cheap final step once every audio job of the chapter is done. Streams the lines once, writing the
+    English text and EPUB XHTML incrementally. Returns (AnkiChapter, media files); the Anki notes are
+    built from the same lines in bulk when a package is written.
+    """
+    chapter_media_dir = paths["media"] / f"ch_{chapter.chapter_number:04d}"
+    chapter_media_files, no_audio = [], set()
+    text_path = paths["trans"] / chapter.file_name
+    xhtml_file_name = chapter.file_name.replace('.txt', '.xhtml')
+    text_tmp = text_path.with_name(text_path.name + ".tmp")
+
+    with open(text_tmp, "w", encoding="utf-8") as text_out, ChapterXhtmlWriter(paths["epub"] / xhtml_file_name, chapter.chapter_number, chapter.file_name) as xhtml_out:
+        for line_idx, line in enumerate(chapter_lines):
+            audio_filename = get_audio_filename(chapter.chapter_number, line_idx)
+            audio_path = chapter_media_dir / audio_filename
+
+            # Collect Results (Lines that permanently failed synthesis have no file: exported without audio)
+            if audio_path.exists(): chapter_media_files.append(str(audio_path))
+            else: no_audio.add(line_idx)
+
+            # Write Text & HTML
+            text_out.write(line["nat"] + "\n")
+            xhtml_out.write(line, None if line_idx in no_audio else audio_filename)
+
+    os.replace(text_tmp, text_path)
+    record_title(paths["epub"], xhtml_file_name, xhtml_out.title)
+    if no_audio:
+        print(f"    [!] {len(no_audio)} lines of chapter {chapter.chapter_number} have no audio (synthesis failed); exported without it. "
+              f"Run --resynth to retry them.")
+    return AnkiChapter(novel_name, chapter.chapter_number, chapter_lines, frozenset(no_audio)), chapter_media_files
 
-# --- STAGE 2: AUDIO & DECK GENERATION ---
 def run_audio_stage(chapter, chapter_lines, novel_name, paths, stop_event, redo_pinyin):
+    """
+    Queues the chapter's lines, drains them with a local TTS worker and assembles the outputs.
+    Returns None when the chapter still has unfinished audio jobs (e.g. after a stop request).
+    """
     print("\n--- STAGE 2: AUDIO & COMPILATION ---")
-    transformers.logging.set_verbosity_error()
+    publish(STAGE, label="audio", chapter=chapter.chapter_number)
 
-    # VRAM Cleanup
     if not redo_pinyin:
-        print("\n[SYSTEM] Unloading LLM to free VRAM for Audio...")
-        ollama.generate(model=LLM_MODEL, prompt="", keep_alive=0)
-        time.sleep(1)
-
-    # Setup Anki Deck
-    safe_deck_title = sanitize_filename(novel_name).replace("_", " ")
-    chapter_deck_id = get_deterministic_id(f"{novel_name}_Ch_{chapter.chapter_number}")
-    chapter_deck = genanki.Deck(chapter_deck_id, f'{safe_deck_title}::Ch {chapter.chapter_number:03d}')
-    
-    chapter_media_dir = paths["media"] / f"ch_{chapter.chapter_number:04d}"
-    chapter_media_dir.mkdir(exist_ok=True)
-    
-    chapter_media_files = []
-    full_text_en = ""
-    epub_body = f"<h1>{chapter_lines[0]['nat'] if chapter_lines else chapter.file_name}</h1>\n"
-    
-    tts_model = None
-    audio_count = 0
-
-    for line_idx, line in enumerate(chapter_lines):
-        if stop_event.is_set(): break
-        
-        audio_filename = f"ch{chapter.chapter_number:02d}_L{line_idx:04d}.opus"
-        audio_path = chapter_media_dir / audio_filename
-        
-        # Audio Logic
-        skip_audio = audio_path.exists() and audio_path.stat().st_size > 1024
-        if not skip_audio: audio_path.unlink(missing_ok=True)
-
-        if not skip_audio and not redo_pinyin:
-            # Model Management
-            if tts_model and audio_count > 0 and audio_count % 30 == 0:
-                print(f"[SYSTEM] Auto-reloading TTS model...")
-                del tts_model
-                gc.collect()
-                torch.cuda.empty_cache()
-                tts_model = None
-            
-            if not tts_model:
-                print(f"[SYSTEM] Loading Qwen3-TTS ({TTS_MODEL})...")
-                tts_model = Qwen3TTSModel.from_pretrained(TTS_MODEL, device_map="cuda:0", dtype=torch.float16, attn_implementation="sdpa")
-
-            # Generation
-            raw_text = clean_for_tts(line["cn"]) or "标题"
-            emo_tag = re.sub(r'[^a-zA-Z0-9\s]', '', line.get("emo", "Calm narrative").strip())
-            if len(emo_tag.split()) > 6: emo_tag = "Calm narrative"
-            
-            print(f"    [Audio] L{line_idx+1}/{len(chapter_lines)}: [{emo_tag}] {raw_text[:40]}...")
-            
-            with torch.no_grad():
-                wavs, sr = tts_model.generate_custom_voice(text=raw_text, language="Chinese", speaker=SPEAKER_VOICE, instruct=emo_tag)
-            
-            # Save
-            if torch.is_tensor(wavs[0]):
-                audio_t = wavs[0]
-                if audio_t.numel() == 0 or torch.isnan(audio_t).any() or torch.isinf(audio_t).any():
-                    audio_data = np.zeros(int(sr * 1.0), dtype=np.float32)
+        with TTSJobQueue(paths["tts_queue"]) as queue:
+            enqueue_audio_jobs(queue, chapter, chapter_lines, paths)
+            queue.requeue_orphans()
+            pending = queue.pending_count(chapter.chapter_number)
+
+            if pending:
+                # VRAM Cleanup
+                print("\n[SYSTEM] Unloading LLM to free VRAM for Audio...")
+                unload_llm_models()
+                time.sleep(1)
+
+                print(f"    [Audio] {pending}/{len(chapter_lines)} lines queued for synthesis.")
+                if TTS_DEVICE == "cpu":
+                    run_cpu_pool(paths["tts_queue"], stop_event, chapter_number=chapter.chapter_number)
                 else:
-                    audio_data = audio_t.detach().cpu().to(torch.float32).contiguous().numpy().copy()
-            else:
-                audio_data = np.asarray(wavs[0], dtype=np.float32).copy()
-
-            sf.write(str(audio_path), audio_data, sr, format='OGG', subtype='OPUS')
-            del wavs, audio_data
-            gc.collect()
-            torch.cuda.empty_cache()
-            audio_count += 1
-
-        # Collect Results
-        chapter_media_files.append(str(audio_path))
-        
-        # Create Anki Note
-        guid = genanki.guid_for(f"{novel_name}_Ch_{chapter.chapter_number:03d}_L{line_idx:04d}")
-        note = genanki.Note(
-            model=ANKI_MODEL, guid=guid, 
-            fields=[line["cn"], line["py"], line["lit"], line["nat"], f"[sound:{audio_filename}]"], 
-            tags=[novel_name, f"Ch_{chapter.chapter_number:03d}"]
-        )
-        chapter_deck.add_note(note)
-
-        # Build HTML
-        full_text_en += line["nat"] + "\n"
-        epub_body += f"""
-        <div class="study-block">
-            <audio controls preload="none"><source src="media/ch_{chapter.chapter_number:04d}/{audio_filename}" type="audio/ogg"></audio>
-            <p class="cn">{line["cn"]}</p>
-            <p class="py">{line["py"]}</p>
-            <p class="lit">"{line["lit"]}"</p>
-            <p class="en">{line["nat"]}</p>
-        </div>"""
-
-    if tts_model: 
-        del tts_model
-        gc.collect()
-        torch.cuda.empty_cache()
-
-    return chapter_deck, chapter_media_files, full_text_en, epub_body
+                    run_tts_worker(queue, stop_event, chapter_number=chapter.chapter_number)
+
+            if not queue.is_chapter_done(chapter.chapter_number):
+                print(f"    [Audio] Chapter {chapter.chapter_number} paused with {queue.pending_count(chapter.chapter_number)} lines left in the queue.")
+                return None
+
+            report = chapter_report(chapter.chapter_number, queue.chapter_quality(chapter.chapter_number))
+            report_path = write_chapter_report(paths["quality"], report)
+            if report["measured"]: print(f"    [Audio QA] {format_chapter_report(report)} ({report_path.parent.name}/{report_path.name})")
+
+    return assemble_chapter_outputs(chapter, chapter_lines, novel_name, paths)
+
+def requeue_suspect_lines(novel_dir, start_chapter=None, end_chapter=None):
+    """Puts the lines the quality gate left suspect (or that failed) back in the queue and deletes their clips, so the next run redoes only them."""
+    paths = setup_directories(novel_dir)
+    with TTSJobQueue(paths["tts_queue"]) as queue:
+        requeued = queue.requeue_suspect(start_chapter, end_chapter)
+    for _, _, audio_path in requeued: Path(audio_path).unlink(missing_ok=True)
+    return requeued
+
+def drain_tts_queue(novel_dir, stop_event):
+    """Standalone TTS worker: synthesizes every pending job of a novel, so extra workers can share one queue."""
+    paths = setup_directories(novel_dir)
+    with TTSJobQueue(paths["tts_queue"]) as queue:
+        queue.requeue_orphans()
+        print(f"[TTS Worker] {queue.pending_count()} jobs pending for '{novel_dir.name}'.")
+        if TTS_DEVICE == "cpu":
+            done = run_cpu_pool(paths["tts_queue"], stop_event)
+        else:
+            done = run_tts_worker(queue, stop_event)
+    print(f"[TTS Worker] Finished {done} jobs.")
+    return done
 
 # --- STAGE 3: EXPORT ---
-def run_export_stage(chapter, chapter_deck, media_files, full_text, epub_html, paths, novel_name, all_chapter_decks, global_media_list):
+def run_export_stage(chapter, chapter_deck, media_files, paths, novel_name, all_chapter_decks, media_registry, export_pool):
     print(f"    [Export] Saving files for {chapter.file_name}...")
+    publish(STAGE, label="export", chapter=chapter.chapter_number)
     
     # 1. Update Master Lists
     all_chapter_decks.append(chapter_deck)
-    for m in media_files:
-        if m not in global_media_list: global_media_list.append(m)
+    media_registry.extend(media_files)
 
-    # 2. Export Single Chapter Anki
+    # 2. Export Single Chapter Anki (Background worker, doesn't block the next chapter)
     ch_apkg_path = paths["anki"] / f"Ch_{chapter.chapter_number:03d}.apkg"
-    ch_package = genanki.Package(chapter_deck)
-    ch_package.media_files = media_files
-    ch_package.write_to_file(str(ch_apkg_path))
-
-    # 3. Save Text & XHTML
-    (paths["trans"] / chapter.file_name).write_text(full_text, encoding='utf-8')
-    xhtml_path = paths["epub"] / chapter.file_name.replace('.txt', '.xhtml')
-    xhtml_path.write_text(f"<html><head><link rel='stylesheet' href='style/nav.css' type='text/css'/></head><body>{epub_html}</body></html>", encoding='utf-8')
-
-    # 4. Update Master Book Files
-    meta = json.loads(paths["metadata"].read_text(encoding='utf-8')) if paths["metadata"].exists() else {}
-    safe_title = sanitize_filename(meta.get("title", novel_name))
-    
+    apkg_future = export_pool.submit(write_anki_package, chapter_deck, list(media_files), ch_apkg_path)
+
+    # 3. Update Master Book. The chapter text and XHTML are already on disk; the master .apkg is written at the end of process_novel.
+    meta, safe_title = get_book_title(paths, novel_name)
     build_final_epub(safe_title, paths["raw"].parent, meta)
     
-    anki_package = genanki.Package(all_chapter_decks)
-    anki_package.media_files = global_media_list
-    anki_package.write_to_file(str(paths["raw"].parent / (safe_title + ".apkg")))
-    
     print(f"✓ {chapter.file_name} successfully finished and exported.")
+    return apkg_future
 
-# --- MAIN CONTROLLER ---
-def process_novel(novel_dir, start_chapter: int, stop_event: threading.Event, redo_pinyin: bool = False):
-    paths = setup_directories(novel_dir)
-    
-    # --- UPDATED GLOSSARY INITIALIZATION START ---
-    default_glossary = {
-        "characters": {}, 
-        "places": {}, 
-        "items": {}, 
-        "skills": {}
-    }
-
-    if paths["glossary"].exists():
+def run_master_deck_export(paths, novel_name, all_chapter_decks, media_registry, apkg_futures):
+    """Waits for the per-chapter .apkg workers, then appends this run's chapters to the master deck in one transaction."""
+    for future in apkg_futures:
         try:
-            glossary = json.loads(paths["glossary"].read_text(encoding='utf-8'))
-            # Lazy Migration: Ensure new keys (items, skills) exist in old files
-            for key in default_glossary:
-                if key not in glossary:
-                    glossary[key] = {}
-        except json.JSONDecodeError:
-            print("[!] Glossary file corrupted. Starting fresh.")
-            glossary = default_glossary
-    else:
-        glossary = default_glossary
-    # --- UPDATED GLOSSARY INITIALIZATION END ---
+            future.result()
+        except Exception as e:
+            print(f"[!] Chapter Anki export failed: {e}")
 
-    all_chapter_decks = []
-    global_media_list = []
-
-    # Load Chapters
-    all_files = sorted(paths["raw"].glob("*.txt"))
-    chapters = []
-    for f in all_files:
-        ch_num = extract_chapter_number(f.name)
-        if ch_num is not None and ch_num >= start_chapter:
-            chapters.append(Chapter(novel_dir.name, f.name, f.read_text(encoding='utf-8'), ch_num))
-
-    print(f"Loaded {len(chapters)} chapters for processing.")
+    if not all_chapter_decks: return
 
-    for chapter in chapters:
-        if stop_event.is_set(): break
-        print(f"\n{'='*50}\n>>> PROCESSING: {chapter.file_name}\n{'='*50}")
+    _, safe_title = get_book_title(paths, novel_name)
+    master_path = paths["raw"].parent / (safe_title + ".apkg")
+    print(f"    [Export] Adding {len(all_chapter_decks)} chapters ({len(media_registry)} media files) to the master deck...")
+    master = IncrementalPackage(paths["master_collection"], paths["master_media"])
+    master.add_chapters(all_chapter_decks, media_registry)
+    if not master.write(master_path): print(f"    [Export] Master deck rebuilt ({len(master.media_files)} media files).")
 
-        # Verification Check
-        json_path = paths["trans"] / chapter.file_name.replace('.txt', '.json')
-        apkg_path = paths["anki"] / f"Ch_{chapter.chapter_number:03d}.apkg"
-        
-        if json_path.exists() and apkg_path.exists() and not redo_pinyin:
-             pass 
-
-        # --- EXECUTE PIPELINE ---
-        
-        # 1. Text Stage
-        lines = run_text_stage(chapter, paths, glossary, stop_event, redo_pinyin)
-        if not lines or stop_event.is_set(): continue
+# --- MAIN CONTROLLER ---
+def process_novel(novel_dir, start_chapter: int, stop_event: threading.Event, redo_pinyin: bool = False, end_chapter: int = None, shard=None, chapter_numbers=None):
+    paths = setup_directories(novel_dir)
+    
+    glossary = GlossaryStore(paths["glossary"], paths["glossary_stats"]) # Shared by the text stage threads
 
-        # 2. Audio Stage
-        deck, media, text_en, html = run_audio_stage(chapter, lines, novel_dir.name, paths, stop_event, redo_pinyin)
-        if stop_event.is_set(): continue
+    all_chapter_decks = []
+    media_registry = MediaRegistry()
+    apkg_futures = []
+
+    # Index Chapters (numeric order; content is read when each chapter is reached)
+    index = ChapterIndex(paths["raw"], paths["chapter_index"]).refresh()
+    entries = index.chapters(start_chapter, end_chapter)
+    if shard is not None: entries = shard_entries(entries, *shard) # This machine's share of the range (see shards.merge_shards)
+    if chapter_numbers is not None: entries = [e for e in entries if e.chapter_number in chapter_numbers] # e.g. the chapters --resynth requeued
+    chapters = [Chapter(novel_dir.name, e.file_name, None, e.chapter_number, index.path(e)) for e in entries]
+
+    print(f"Loaded {len(chapters)} chapters for processing{f' (shard {shard[0]}/{shard[1]}: Ch {chapters[0].chapter_number}-{chapters[-1].chapter_number})' if shard and chapters else ''}.")
+
+    # Boilerplate and repeated lines are found across the whole novel, not just the selected chapters
+    line_index = LineIndex.for_novel(paths["raw"], index.chapters(), paths["line_index"])
+    skip = line_index.skip_set()
+    lines_report = line_index.report()
+    print(f"[Lines] {format_report(lines_report)}")
+    for line in format_dropped(lines_report): print(f"[Lines] {line}")
+
+    # Per-chapter .apkg files are written in the background; the master deck is written once at the end.
+    export_pool = ThreadPoolExecutor(max_workers=ANKI_EXPORT_WORKERS, thread_name_prefix="anki_export")
+    tm = TranslationMemory(paths["translation_memory"]) if TM_ENABLED else None
+    try:
+        # With several LLM slots the text stage runs ahead for every chapter first, K at a time
+        text_results = run_parallel_text_stage(chapters, paths, glossary, stop_event, redo_pinyin, tm, TEXT_STAGE_WORKERS, skip) if TEXT_STAGE_WORKERS > 1 and len(chapters) > 1 else None
+
+        for chapter_idx, chapter in enumerate(chapters):
+            if stop_event.is_set(): break
+            publish(CHAPTER, chapter=chapter.chapter_number, done=chapter_idx, total=len(chapters))
+            print(f"\n{'='*50}\n>>> PROCESSING: {chapter.file_name}\n{'='*50}")
+
+            # Verification Check
+            json_path = paths["trans"] / chapter.file_name.replace('.txt', '.json')
+            apkg_path = paths["anki"] / f"Ch_{chapter.chapter_number:03d}.apkg"
+            
+            if json_path.exists() and apkg_path.exists() and not redo_pinyin:
+                 pass 
 
-        # 3. Export Stage
-        run_export_stage(chapter, deck, media, text_en, html, paths, novel_dir.name, all_chapter_decks, global_media_list)
+            # --- EXECUTE PIPELINE ---
+            
+            # 1. Text Stage
+            lines = text_results.get(chapter.chapter_number) if text_results is not None else run_text_stage(chapter, paths, glossary, stop_event, redo_pinyin, tm, skip)
+            if not lines or stop_event.is_set(): continue
+
+            # 2. Audio Stage
+            audio_result = run_audio_stage(chapter, lines, novel_dir.name, paths, stop_event, redo_pinyin)
+            if audio_result is None or stop_event.is_set(): continue
+            deck, media = audio_result
+
+            # 3. Export Stage
+            apkg_futures.append(run_export_stage(chapter, deck, media, paths, novel_dir.name, all_chapter_decks, media_registry, export_pool))
+            publish(CHAPTER, chapter=chapter.chapter_number, done=chapter_idx + 1, total=len(chapters))
+    finally:
+        export_pool.shutdown(wait=True)
+        # 4. Master Deck (Appends every chapter exported in this run, even if a later chapter failed)
+        if all_chapter_decks: run_master_deck_export(paths, novel_dir.name, all_chapter_decks, media_registry, apkg_futures)
+        if tm is not None: tm.close()
 
     print(f"\n[✓] PIPELINE COMPLETED SUCCESSFULLY.")
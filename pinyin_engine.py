@@ -0,0 +1,124 @@
+import re
+import unicodedata
+from typing import Dict, List, Optional
+
+from pypinyin import pinyin, Style
+from pypinyin.core import Pinyin
+from pypinyin.constants import RE_HANS
+from pypinyin.converter import DefaultConverter
+from pypinyin.seg.simpleseg import seg as default_seg
+
+_SEPARATORS = re.compile(r"[\s\-'’·.,0-9]+")
+_COMBINING_TONES = re.compile(r'[\u0300\u0301\u0304\u030c]') # grave, acute, macron, caron (keeps the ü diaeresis)
+
+def strip_tones(syllable: str) -> str:
+    """'Lǚ' -> 'lü'. One output character per input character."""
+    return unicodedata.normalize("NFC", _COMBINING_TONES.sub("", unicodedata.normalize("NFD", syllable))).lower()
+
+def _readings(char: str) -> List[str]:
+    return pinyin(char, style=Style.TONE, heteronym=True, errors="ignore")[0] if char.strip() else []
+
+def split_name_pinyin(name: str, name_pinyin: str) -> Optional[List[str]]:
+    """
+    Aligns a glossary reading with the characters of its name: 'Shàn Yú', 'Shan Yu', 'shanyu' and
+    'Shan2 Yu2' all give ['Shàn', 'Yú'] for 单于. Toneless syllables take the tone of the matching
+    pypinyin reading of that character. Returns None if the reading doesn't fit the name.
+    """
+    spelled = unicodedata.normalize("NFC", _SEPARATORS.sub("", name_pinyin or "")).replace("v", "ü").replace("V", "Ü")
+    plain = strip_tones(spelled)
+    if not spelled or len(plain) != len(spelled): return None
+
+    def align(i: int, pos: int) -> Optional[List[str]]:
+        if i == len(name): return [] if pos == len(plain) else None
+        # Longest reading first, so 'xian' isn't read as 'xi' + 'an'
+        for reading in sorted(_readings(name[i]), key=len, reverse=True):
+            bare = strip_tones(reading)
+            if not plain.startswith(bare, pos): continue
+            rest = align(i + 1, pos + len(bare))
+            if rest is None: continue
+            given = spelled[pos:pos + len(bare)]
+            if strip_tones(given) == given.lower(): # No tone mark given: use pypinyin's, keep the glossary's capitalization
+                given = reading.capitalize() if given[:1].isupper() else reading
+            return [given] + rest
+        return None
+
+    return align(0, 0)
+
+class _PhraseConverter(DefaultConverter):
+    """
+    pypinyin converter that answers glossary names from the phrase dictionary and memoizes every
+    other Han word: a chapter reuses a few thousand words, so most segments skip pypinyin's lookups.
+    """
+    def __init__(self, phrases: Dict[str, List[str]]):
+        super().__init__()
+        self.phrases = phrases
+        self.cache: Dict[str, tuple] = {name: tuple(syllables) for name, syllables in phrases.items()}
+
+    def convert(self, words, style, heteronym, errors, strict, **kwargs):
+        if style != Style.TONE or heteronym:
+            if words in self.phrases: return [[s] for s in self.phrases[words]]
+            return super().convert(words, style, heteronym, errors, strict, **kwargs)
+        syllables = self.cache.get(words)
+        if syllables is None:
+            result = super().convert(words, style, heteronym, errors, strict, **kwargs)
+            if not RE_HANS.match(words): return result # Punctuation/Latin runs vary too much to be worth caching
+            syllables = self.cache[words] = tuple(item[0] for item in result)
+        return [[s] for s in syllables]
+
+class GlossaryPinyin(Pinyin):
+    """
+    Local pinyin with the glossary's readings for proper nouns. Names are cut out of the text by
+    forward longest match before pypinyin segments the rest, so 单于 reads Chányú as a title but
+    Shàn Yú when the glossary says so. convert_lines() handles a whole chapter in one pass.
+    """
+    def __init__(self, glossary: Dict = None):
+        self.phrases: Dict[str, List[str]] = {}
+        self.rejected: List[str] = [] # Glossary names whose pinyin couldn't be aligned (left to pypinyin)
+        for entries in (glossary or {}).values():
+            if not isinstance(entries, dict): continue
+            for name, data in entries.items():
+                # Single characters are left to pypinyin: a surname reading must not change every 单 in 简单
+                if not isinstance(data, dict) or len(name) < 2 or name in self.phrases: continue
+                syllables = split_name_pinyin(name, data.get("pinyin", ""))
+                if syllables: self.phrases[name] = syllables
+                elif data.get("pinyin"): self.rejected.append(name)
+        self.max_len = max(map(len, self.phrases), default=0)
+        self.first_chars = {name[0] for name in self.phrases}
+        super().__init__(converter=_PhraseConverter(self.phrases))
+
+    def pre_seg(self, hans, **kwargs):
+        if not self.phrases: return None # Default pypinyin segmentation
+        segments, start, i = [], 0, 0
+        while i < len(hans):
+            if hans[i] in self.first_chars:
+                for length in range(min(self.max_len, len(hans) - i), 0, -1):
+                    if hans[i:i + length] in self.phrases:
+                        if start < i: segments.extend(default_seg(hans[start:i]))
+                        segments.append(hans[i:i + length])
+                        i = start = i + length
+                        break
+                else:
+                    i += 1
+                continue
+            i += 1
+        if start < len(hans): segments.extend(default_seg(hans[start:]))
+        return segments
+
+    def convert(self, text: str) -> str:
+        return " ".join(item[0] for item in self.pinyin(text, style=Style.TONE))
+
+    def convert_lines(self, lines: List[str]) -> List[str]:
+        """Pinyin for every line from a single pypinyin call; same output as converting line by line."""
+        result, current = [], []
+        for (item,) in self.pinyin("\n".join(line.replace("\n", " ") for line in lines), style=Style.TONE):
+            if "\n" not in item:
+                current.append(item)
+                continue
+            parts = item.split("\n")
+            for part in parts[:-1]:
+                if part: current.append(part)
+                result.append(" ".join(current))
+                current = []
+            if parts[-1]: current.append(parts[-1])
+        result.append(" ".join(current))
+        return result if lines else []
@@ -0,0 +1,177 @@
+import os
+import re
+import json
+import sqlite3
+import threading
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional
+
+# Local Imports (kept light: planning must not load torch, the TTS engine or main)
+from config import (
+    PLAN_INPUT_TOKENS_PER_HAN, PLAN_OUTPUT_TOKENS_PER_HAN, PLAN_CHARS_PER_TOKEN_EN, PLAN_HAN_PER_AUDIO_SECOND,
+    PLAN_DEFAULT_TEXT_LINES_PER_SEC, PLAN_DEFAULT_TTS_LINES_PER_SEC, TEXT_STAGE_WORKERS,
+)
+from utils import chunk_text_into_numbered_lines, novel_paths
+from prompts import prompt_json, prompt_natural, prompt_literal, prompt_emotion
+from chapter_index import ChapterIndex, shard_entries
+from tts_queue import TTSJobQueue
+from boilerplate import LineIndex, format_report, format_dropped
+
+_HAN = re.compile(r'[㐀-䶿一-鿿豈-﫿]')
+_CHUNK_FILE = re.compile(r'^chunk_(\d+)\.json$')
+_record_lock = threading.Lock()
+
+def count_han(text: str) -> int:
+    return len(_HAN.findall(text))
+
+# --- RECORDED THROUGHPUT ---
+def read_json(path: Path) -> Dict:
+    try:
+        return json.loads(Path(path).read_text(encoding='utf-8'))
+    except (OSError, ValueError):
+        return {}
+
+def record_text_run(path: Path, lines: int, han: int, seconds: float, prompt_tokens: int, eval_tokens: int):
+    """Adds one text-stage run (lines sent to the LLM and what it cost) to the novel's running totals."""
+    if lines <= 0 or seconds <= 0: return
+    with _record_lock:
+        data = read_json(path)
+        text = data.setdefault("text", {})
+        for key, value in (("lines", lines), ("han", han), ("seconds", seconds), ("prompt_tokens", prompt_tokens), ("eval_tokens", eval_tokens)):
+            text[key] = text.get(key, 0) + value
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(path.name + ".tmp")
+        tmp_path.write_text(json.dumps(data), encoding='utf-8')
+        os.replace(tmp_path, path)
+
+# --- PLAN ---
+@dataclass
+class ChapterPlan:
+    chapter_number: int
+    lines: int
+    chunks: int
+    han: int
+    text_lines_done: int = 0 # Saved master JSON, or lines of the cached chunks
+    chunks_done: int = 0
+    audio_done: int = 0
+    exported: bool = False
+
+@dataclass
+class NovelPlan:
+    chapters: List[ChapterPlan] = field(default_factory=list)
+    input_tokens: float = 0 # Remaining work only
+    output_tokens: float = 0
+    audio_seconds: float = 0
+    text_lines_per_sec: float = PLAN_DEFAULT_TEXT_LINES_PER_SEC
+    tts_lines_per_sec: float = PLAN_DEFAULT_TTS_LINES_PER_SEC
+    text_rate_recorded: bool = False
+    tts_rate_recorded: bool = False
+    tokens_recorded: bool = False
+    master_media: int = 0
+    lines_report: Dict = field(default_factory=dict) # Boilerplate/duplicate savings across the whole novel
+
+    def total(self, attr: str) -> int:
+        return sum(getattr(c, attr) for c in self.chapters)
+
+    @property
+    def text_lines_left(self) -> int:
+        return sum(c.lines - c.text_lines_done for c in self.chapters)
+
+    @property
+    def audio_lines_left(self) -> int:
+        return sum(c.lines - c.audio_done for c in self.chapters)
+
+    @property
+    def text_seconds(self) -> float:
+        return self.text_lines_left / (self.text_lines_per_sec * max(1, TEXT_STAGE_WORKERS))
+
+    @property
+    def tts_seconds(self) -> float:
+        return self.audio_lines_left / self.tts_lines_per_sec
+
+def _count_files(directory: Path, pattern: re.Pattern = None, suffix: str = None) -> List[str]:
+    try:
+        with os.scandir(directory) as it:
+            return [e.name for e in it if (pattern is None or pattern.match(e.name)) and (suffix is None or e.name.endswith(suffix))]
+    except FileNotFoundError:
+        return []
+
+def plan_chapter(paths: Dict[str, Path], file_name: str, chapter_number: int, skip=frozenset()) -> ChapterPlan:
+    text = (paths["raw"] / file_name).read_text(encoding='utf-8')
+    chunks = chunk_text_into_numbered_lines(text, skip=skip)
+    chapter = ChapterPlan(chapter_number, sum(len(c) for c in chunks), len(chunks), sum(count_han(line) for chunk in chunks for line in chunk.values()))
+
+    if (paths["trans"] / file_name.replace('.txt', '.json')).exists():
+        chapter.text_lines_done, chapter.chunks_done = chapter.lines, chapter.chunks
+    else:
+        cached = {int(_CHUNK_FILE.match(name).group(1)) for name in _count_files(paths["cache"] / f"ch_{chapter_number:04d}", _CHUNK_FILE)}
+        done = [i for i in cached if i < len(chunks)]
+        chapter.chunks_done = len(done)
+        chapter.text_lines_done = sum(len(chunks[i]) for i in done)
+
+    chapter.audio_done = min(chapter.lines, len(_count_files(paths["media"] / f"ch_{chapter_number:04d}", suffix=".opus")))
+    chapter.exported = (paths["anki"] / f"Ch_{chapter_number:03d}.apkg").exists()
+    return chapter
+
+def plan_novel(novel_dir: Path, start_chapter: Optional[int] = None, end_chapter: Optional[int] = None, shard=None) -> NovelPlan:
+    """
+    Dry run over the raw chapters: sizes, what the caches already hold and the projected cost of the rest.
+    Reads only: the chapter and line indexes are built in memory when stale, and the TTS queue is opened read-only.
+    """
+    paths = novel_paths(Path(novel_dir))
+    plan = NovelPlan()
+    index = ChapterIndex(paths["raw"], paths["chapter_index"]).refresh(save=False)
+    line_index = LineIndex.for_novel(paths["raw"], index.chapters(), paths["line_index"], save=False)
+    skip, plan.lines_report = line_index.skip_set(), line_index.report()
+    entries = index.chapters(start_chapter, end_chapter)
+    if shard is not None: entries = shard_entries(entries, *shard)
+    plan.chapters = [plan_chapter(paths, e.file_name, e.chapter_number, skip) for e in entries]
+
+    # Tokens: the novel's own recorded ratios when there are any, else tokenizer rules of thumb
+    recorded = read_json(paths["throughput"]).get("text", {})
+    remaining_han = sum(c.han * (c.lines - c.text_lines_done) / c.lines for c in plan.chapters if c.lines)
+    if recorded.get("han"):
+        plan.tokens_recorded = True
+        plan.input_tokens = remaining_han * recorded["prompt_tokens"] / recorded["han"]
+        plan.output_tokens = remaining_han * recorded["eval_tokens"] / recorded["han"]
+    else:
+        system_tokens = sum(len(p()) for p in (prompt_json, prompt_natural, prompt_literal, prompt_emotion)) / PLAN_CHARS_PER_TOKEN_EN
+        remaining_chunks = sum(c.chunks - c.chunks_done for c in plan.chapters)
+        plan.input_tokens = remaining_chunks * system_tokens + 4 * remaining_han * PLAN_INPUT_TOKENS_PER_HAN # Every prompt sees the chunk
+        plan.output_tokens = remaining_han * PLAN_OUTPUT_TOKENS_PER_HAN
+    if recorded.get("seconds"):
+        plan.text_lines_per_sec, plan.text_rate_recorded = recorded["lines"] / recorded["seconds"], True
+
+    plan.audio_seconds = sum(c.han * (c.lines - c.audio_done) / c.lines for c in plan.chapters if c.lines) / PLAN_HAN_PER_AUDIO_SECOND
+    if paths["tts_queue"].exists():
+        try:
+            with TTSJobQueue(paths["tts_queue"], read_only=True) as queue:
+                rate = queue.throughput()
+        except sqlite3.Error: # Locked, or written by a version without completion times
+            rate = None
+        if rate: plan.tts_lines_per_sec, plan.tts_rate_recorded = rate, True
+
+    plan.master_media = len(read_json(paths["master_media"]).get("files", []))
+    return plan
+
+def _hours(seconds: float) -> str:
+    return f"{seconds / 3600:.1f} h"
+
+def format_plan(plan: NovelPlan) -> List[str]:
+    chapters = plan.chapters
+    source = lambda recorded: "recorded" if recorded else "default, nothing recorded yet"
+    return [
+        f"Chapters: {len(chapters)} | translated {sum(c.text_lines_done == c.lines for c in chapters)} | "
+        f"audio complete {sum(c.audio_done == c.lines for c in chapters)} | exported {sum(c.exported for c in chapters)} | master deck media {plan.master_media}",
+        f"Lines: {plan.total('lines'):,} ({plan.total('han'):,} Han characters) in {plan.total('chunks'):,} chunks",
+        f"Whole novel: {format_report(plan.lines_report)}",
+        *format_dropped(plan.lines_report),
+        f"Left to translate: {plan.text_lines_left:,} lines, {plan.total('chunks') - plan.total('chunks_done'):,} chunks",
+        f"LLM tokens left: ~{plan.input_tokens / 1e6:.2f}M in, ~{plan.output_tokens / 1e6:.2f}M out ({'recorded ratios' if plan.tokens_recorded else 'estimated'})",
+        f"Left to synthesize: {plan.audio_lines_left:,} lines, ~{_hours(plan.audio_seconds)} of audio",
+        f"Projected: text {_hours(plan.text_seconds)} at {plan.text_lines_per_sec:.2f} lines/s x {max(1, TEXT_STAGE_WORKERS)} ({source(plan.text_rate_recorded)}), "
+        f"audio {_hours(plan.tts_seconds)} at {plan.tts_lines_per_sec:.2f} lines/s ({source(plan.tts_rate_recorded)}), "
+        f"total {_hours(plan.text_seconds + plan.tts_seconds)}",
+    ]
@@ -0,0 +1,184 @@
+import os
+import sys
+import time
+import queue
+import threading
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Optional
+
+# Event kinds published by the pipeline
+STAGE = "stage"   # label: "text" | "audio" | "export"
+CHAPTER = "chapter" # done/total: chapters finished in this run
+LINE = "line"     # done/total: lines of the current chapter in the current stage
+LLM = "llm"       # value: generated tokens per second of one Ollama call
+PROMPT_EVAL = "prompt_eval" # value: prompt tokens Ollama had to evaluate (not served from its cache) for one call
+TTS = "tts"       # value: real-time factor of one TTS batch (synthesis seconds / audio seconds)
+MODEL = "model"   # label: "loading" | "loaded" | "unloaded"
+RSS = "rss"       # value: resident memory of the publishing process in MB
+VRAM = "vram"     # value: CUDA memory allocated by the publishing process in MB
+
+SPARK_CHARS = "▁▂▃▄▅▆▇█"
+
+@dataclass
+class ProgressEvent:
+    kind: str
+    stage: str = ""
+    chapter: Optional[int] = None
+    done: int = 0
+    total: int = 0
+    value: Optional[float] = None
+    label: str = ""
+    time: float = field(default_factory=time.time)
+
+class ProgressBus:
+    """
+    Fan-out of ProgressEvents to any number of subscriber queues. publish() never blocks,
+    so the pipeline threads pay one put() per subscriber. Anything with a put() method
+    (e.g. a multiprocessing queue) can subscribe.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = []
+
+    def subscribe(self, sink=None):
+        sink = sink if sink is not None else queue.SimpleQueue()
+        with self._lock:
+            self._subscribers.append(sink)
+        return sink
+
+    def unsubscribe(self, sink):
+        with self._lock:
+            if sink in self._subscribers: self._subscribers.remove(sink)
+
+    def publish(self, event: ProgressEvent):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for sink in subscribers:
+            try:
+                sink.put(event)
+            except Exception:
+                pass # A dead consumer must never stop the pipeline
+
+    @property
+    def active(self) -> bool:
+        return bool(self._subscribers)
+
+# Process-wide bus used by main.py, utils.py and the TTS workers
+bus = ProgressBus()
+
+def publish(kind: str, **fields):
+    if bus.active: bus.publish(ProgressEvent(kind, **fields))
+
+def drain_events(sink, max_events: int = 10000):
+    events = []
+    try:
+        while len(events) < max_events:
+            events.append(sink.get_nowait())
+    except queue.Empty:
+        pass
+    return events
+
+# ==========================
+# MEMORY SAMPLING
+# ==========================
+def get_rss_mb() -> Optional[float]:
+    """Resident set size of this process. Reads /proc on Linux, falls back to the peak RSS from resource."""
+    try:
+        with open("/proc/self/statm", encoding="utf-8") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024**2
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 1024**2 if sys.platform == "darwin" else peak / 1024
+    except (ImportError, OSError):
+        return None
+
+def get_vram_mb() -> Optional[float]:
+    """CUDA memory allocated by this process, only if torch is already loaded (never imports it)."""
+    torch = sys.modules.get("torch")
+    if torch is None or not torch.cuda.is_available(): return None
+    return torch.cuda.memory_allocated() / 1024**2
+
+def publish_memory(label: str = ""):
+    if not bus.active: return
+    rss = get_rss_mb()
+    if rss is not None: publish(RSS, value=rss, label=label)
+    vram = get_vram_mb()
+    if vram is not None: publish(VRAM, value=vram, label=label)
+
+# ==========================
+# CONSUMER SIDE
+# ==========================
+class ProgressState:
+    """Folds the event stream into what the dashboards display: current counts plus a short history per metric."""
+    SERIES = ("lines_per_sec", LLM, PROMPT_EVAL, TTS, RSS, VRAM)
+
+    def __init__(self, history: int = 60):
+        self.stage = ""
+        self.chapter = None
+        self.chapters_done = 0
+        self.chapters_total = 0
+        self.lines_done = 0
+        self.lines_total = 0
+        self.model_state = "unloaded"
+        self.latest = {}
+        self.history = {name: deque(maxlen=history) for name in self.SERIES}
+        self._last_line = None
+
+    def apply(self, event: ProgressEvent):
+        if event.kind == STAGE:
+            self.stage = event.label
+            self.chapter = event.chapter
+            self.lines_done, self.lines_total = 0, 0
+            self._last_line = None
+        elif event.kind == CHAPTER:
+            self.chapter = event.chapter
+            self.chapters_done, self.chapters_total = event.done, event.total
+        elif event.kind == LINE:
+            self._record_line_rate(event)
+            self.stage = event.stage or self.stage
+            self.chapter = event.chapter
+            self.lines_done, self.lines_total = event.done, event.total
+        elif event.kind == MODEL:
+            self.model_state = event.label
+        elif event.kind in self.history and event.value is not None:
+            self.latest[event.kind] = event.value
+            self.history[event.kind].append(event.value)
+
+    def _record_line_rate(self, event):
+        last = self._last_line
+        self._last_line = event
+        if last is None or (last.stage, last.chapter) != (event.stage, event.chapter): return
+        elapsed = event.time - last.time
+        if elapsed <= 0 or event.done <= last.done: return
+        rate = (event.done - last.done) / elapsed
+        self.latest["lines_per_sec"] = rate
+        self.history["lines_per_sec"].append(rate)
+
+    def line_fraction(self) -> float:
+        return self.lines_done / self.lines_total if self.lines_total else 0.0
+
+    def chapter_fraction(self) -> float:
+        return self.chapters_done / self.chapters_total if self.chapters_total else 0.0
+
+    def summary(self) -> str:
+        parts = []
+        if "lines_per_sec" in self.latest: parts.append(f"{self.latest['lines_per_sec']:.2f} lines/s")
+        if LLM in self.latest: parts.append(f"LLM {self.latest[LLM]:.1f} tok/s")
+        if TTS in self.latest: parts.append(f"RTF {self.latest[TTS]:.2f}")
+        if RSS in self.latest: parts.append(f"RSS {self.latest[RSS]:.0f} MB")
+        if VRAM in self.latest: parts.append(f"VRAM {self.latest[VRAM]:.0f} MB")
+        parts.append(f"TTS {self.model_state}")
+        return " | ".join(parts)
+
+def sparkline(values, width: int = 20) -> str:
+    """Unicode block sparkline of the last width values, scaled between their min and max."""
+    values = list(values)[-width:]
+    if not values: return ""
+    low, high = min(values), max(values)
+    if high == low: return SPARK_CHARS[len(SPARK_CHARS) // 2] * len(values)
+    scale = (len(SPARK_CHARS) - 1) / (high - low)
+    return "".join(SPARK_CHARS[int((v - low) * scale)] for v in values)
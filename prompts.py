@@ -1,6 +1,6 @@
 import json
 from typing import Dict
-from config import TARGET_LANGUAGE
+from config import TARGET_LANGUAGE, EMOTION_VOCAB
 
 def prompt_json():
     return """
@@ -29,27 +29,37 @@ def prompt_json():
     }
     """
 
-def prompt_natural(sub_glossary: Dict):
+# System prompts below are constant strings: the chunk and its glossary only ever appear in the
+# user message (see with_glossary), so the server can reuse the KV cache of the system prefix.
+
+def prompt_natural():
     return f"""Translate the NUMBERED Chinese lines to natural {TARGET_LANGUAGE}.
 Convert imperial to metric. 
-CRITICAL: Use these specific English names for these entities: {json.dumps(sub_glossary, ensure_ascii=False)}
+CRITICAL: If the message ends with a GLOSSARY, use its specific English names for those entities.
 You MUST output the exact same number of lines. Start each line with its number (e.g., "1. ")."""
 
-def prompt_literal(sub_glossary: Dict):
+def prompt_literal():
     return f"""Translate the NUMBERED Chinese lines to EXTREMELY LITERAL word-for-word English.
 Preserve Chinese grammar. 
-CRITICAL: Use these specific English names for these entities: {json.dumps(sub_glossary, ensure_ascii=False)}
+CRITICAL: If the message ends with a GLOSSARY, use its specific English names for those entities.
 You MUST output the exact same number of lines. Start each line with its number (e.g., "1. ")."""
 
-def prompt_pinyin(sub_glossary: Dict):
-    return f"""Transliterate the NUMBERED Chinese lines into Pinyin with tone marks.
-CRITICAL: Use these specific Pinyin spellings for these entities: {json.dumps(sub_glossary, ensure_ascii=False)}
-You MUST output the exact same number of lines. Start each line with its number (e.g., "1. ")."""
+def with_examples(user_text: str, examples) -> str:
+    """Appends earlier (Chinese, translation) pairs of similar lines from the translation memory as style/terminology examples."""
+    if not examples: return user_text
+    pairs = "\n".join(f"{cn} => {translation}" for cn, translation in examples)
+    return f"{user_text}\n\nEXAMPLES (earlier translations of similar lines, for consistency only; do not output them):\n{pairs}"
+
+def with_glossary(numbered_input: str, sub_glossary: Dict) -> str:
+    """User message for a chunk: the numbered lines, then the glossary entries it mentions (if any) as the variable tail."""
+    entries = {cat: names for cat, names in sub_glossary.items() if names}
+    if not entries: return numbered_input
+    return f"{numbered_input}\n\nGLOSSARY: {json.dumps(entries, ensure_ascii=False, sort_keys=True)}"
 
 def prompt_emotion():
     return f"""You are an audiobook director. Analyze the NUMBERED Chinese lines and determine the vocal emotion/style for each line.
 
 RULES:
-1. Output ONLY a 1-4 word instruction in English (e.g., "Calm narrative", "Angry shouting", "Whispering fearfully", "Sarcastic laugh").
+1. Output ONLY one instruction from this list, spelled exactly: {", ".join(EMOTION_VOCAB)}.
 2. If it is just description, use "Calm narrative" or "Suspenseful narrative".
 3. You MUST output the exact same number of lines. Start each line with its number (e.g., "1. ")."""
@@ -0,0 +1,245 @@
+import json
+import argparse
+import itertools
+import threading
+import time
+import traceback
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, List, Optional
+
+# Local Imports
+from config import NOVELS_ROOT_DIR, SERVICE_HOST, SERVICE_PORT, TTS_DEVICE
+from progress import bus, ProgressState
+
+MODES = ("full", "redo-pinyin", "tts", "plan")
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = "queued", "running", "done", "failed", "cancelled"
+
+@dataclass(eq=False) # Compared by identity, e.g. when unsubscribing from the bus
+class Job:
+    id: int
+    novel: str
+    mode: str = "full"
+    start: int = 1
+    end: Optional[int] = None
+    status: str = QUEUED
+    error: str = ""
+    result: List[str] = field(default_factory=list)
+    created: float = field(default_factory=time.time)
+    started: Optional[float] = None
+    finished: Optional[float] = None
+    stop_event: threading.Event = field(default_factory=threading.Event, repr=False)
+    progress: ProgressState = field(default_factory=ProgressState, repr=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def put(self, event):
+        """Progress bus sink: the running job folds the pipeline's events into its own state."""
+        with self._lock:
+            self.progress.apply(event)
+
+    def to_json(self) -> Dict:
+        with self._lock:
+            p = self.progress
+            return {
+                "id": self.id, "novel": self.novel, "mode": self.mode, "start": self.start, "end": self.end,
+                "status": self.status, "error": self.error, "result": self.result,
+                "created": self.created, "started": self.started, "finished": self.finished,
+                "progress": {"stage": p.stage, "chapter": p.chapter, "chapters_done": p.chapters_done, "chapters_total": p.chapters_total,
+                             "lines_done": p.lines_done, "lines_total": p.lines_total, "model": p.model_state, "summary": p.summary()},
+            }
+
+def run_job(job: Job, novels_root: Path):
+    """Runs one job in the worker thread. The pipeline (torch, TTS engine) is imported on the first job and then stays loaded."""
+    novel_dir = novels_root / job.novel
+    if job.mode == "plan":
+        from planner import plan_novel, format_plan
+        job.result = format_plan(plan_novel(novel_dir, job.start, job.end))
+    elif job.mode == "tts":
+        from main import drain_tts_queue
+        drain_tts_queue(novel_dir, job.stop_event)
+    else:
+        from main import process_novel
+        process_novel(novel_dir, job.start, job.stop_event, redo_pinyin=job.mode == "redo-pinyin", end_chapter=job.end)
+
+class JobService:
+    """
+    FIFO of pipeline jobs drained by one worker thread, so every job runs in the same long-lived process:
+    Python imports are paid once, not per invocation. On a GPU the TTS model also stays loaded across jobs
+    and chapters until the text stage needs the LLM (see tts_engine.unload_resident_model); the CPU pool
+    loads its own models in each worker process. Cancelling a running job sets its stop_event, which the
+    pipeline checks between chapters, chunks and audio batches.
+    """
+    def __init__(self, novels_root: Path = NOVELS_ROOT_DIR, runner=run_job, resident_tts: bool = True):
+        self.novels_root = Path(novels_root)
+        self.runner = runner
+        self.resident_tts = resident_tts
+        self._jobs: Dict[int, Job] = {}
+        self._queue: List[Job] = []
+        self._ids = itertools.count(1)
+        self._cond = threading.Condition()
+        self._closed = False
+        self._worker = threading.Thread(target=self._work, name="job_worker", daemon=True)
+
+    def start(self) -> "JobService":
+        self._worker.start()
+        return self
+
+    def close(self, timeout: float = None):
+        with self._cond:
+            self._closed = True
+            for job in self._jobs.values(): job.stop_event.set()
+            self._cond.notify_all()
+        self._worker.join(timeout)
+
+    def novels(self) -> List[str]:
+        if not self.novels_root.exists(): return []
+        return sorted(d.name for d in self.novels_root.iterdir() if d.is_dir() and (d / "01_Raw_Text").exists())
+
+    def submit(self, novel: str, mode: str = "full", start: int = 1, end: Optional[int] = None) -> Job:
+        if mode not in MODES: raise ValueError(f"mode must be one of {', '.join(MODES)}")
+        if novel not in self.novels(): raise ValueError(f"novel '{novel}' not found")
+        if end is not None and end < start: raise ValueError("end must not be before start")
+        with self._cond:
+            job = Job(next(self._ids), novel, mode, int(start), None if end is None else int(end))
+            self._jobs[job.id] = job
+            self._queue.append(job)
+            self._cond.notify_all()
+        return job
+
+    def get(self, job_id: int) -> Optional[Job]:
+        with self._cond:
+            return self._jobs.get(job_id)
+
+    def jobs(self) -> List[Job]:
+        with self._cond:
+            return list(self._jobs.values())
+
+    def cancel(self, job_id: int) -> Optional[Job]:
+        """Queued jobs are dropped; a running job is asked to stop at its next checkpoint."""
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is None: return None
+            if job.status == QUEUED:
+                self._queue.remove(job)
+                job.status, job.finished = CANCELLED, time.time()
+                self._cond.notify_all()
+            job.stop_event.set()
+            return job
+
+    def wait(self, job_id: int, timeout: float = None) -> Job:
+        """Blocks until the job has finished (any final status) or the timeout passes."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            job = self._jobs[job_id]
+            while job.status in (QUEUED, RUNNING):
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0: break
+                self._cond.wait(remaining)
+            return job
+
+    def _next(self) -> Optional[Job]:
+        with self._cond:
+            while not self._queue and not self._closed:
+                self._cond.wait()
+            if self._closed: return None
+            job = self._queue.pop(0)
+            job.status, job.started = RUNNING, time.time()
+            return job
+
+    def _work(self):
+        if self.resident_tts and TTS_DEVICE != "cpu": # The CPU pool's worker processes can't share it
+            # Keep the TTS model loaded between jobs (imported here: the HTTP side never needs torch)
+            from tts_engine import ResidentModel, set_model_loader
+            set_model_loader(ResidentModel())
+        while True:
+            job = self._next()
+            if job is None: return
+            bus.subscribe(job)
+            try:
+                self.runner(job, self.novels_root)
+                status = CANCELLED if job.stop_event.is_set() else DONE
+            except Exception as e:
+                traceback.print_exc()
+                job.error = f"{type(e).__name__}: {e}"
+                status = FAILED
+            finally:
+                bus.unsubscribe(job)
+            with self._cond:
+                job.status, job.finished = status, time.time()
+                self._cond.notify_all()
+
+class JobRequestHandler(BaseHTTPRequestHandler):
+    """
+    GET  /novels                 available novels
+    GET  /jobs, /jobs/<id>       job status and progress
+    POST /jobs                   {"novel": ..., "mode": "full|redo-pinyin|tts|plan", "start": 1, "end": null}
+    POST /jobs/<id>/cancel       cancel (also DELETE /jobs/<id>)
+    """
+    service: JobService = None # Set by make_server
+
+    def log_message(self, format, *args):
+        pass # Keep the pipeline log readable
+
+    def _send(self, status: int, body):
+        data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _route(self):
+        """Path segments, plus the job a /jobs/<id>... path names (None if there is no such job)."""
+        parts = [p for p in self.path.split("?")[0].split("/") if p]
+        job = self.service.get(int(parts[1])) if len(parts) >= 2 and parts[0] == "jobs" and parts[1].isdigit() else None
+        return parts, job
+
+    def do_GET(self):
+        parts, job = self._route()
+        if parts == ["novels"]: return self._send(200, {"novels": self.service.novels()})
+        if parts == ["jobs"]: return self._send(200, {"jobs": [j.to_json() for j in self.service.jobs()]})
+        if len(parts) == 2 and job is not None: return self._send(200, job.to_json())
+        self._send(404, {"error": "not found"})
+
+    def do_POST(self):
+        parts, job = self._route()
+        if parts == ["jobs"]:
+            try:
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+                job = self.service.submit(body.get("novel", ""), body.get("mode", "full"), body.get("start", 1), body.get("end"))
+            except (ValueError, TypeError, AttributeError) as e:
+                return self._send(400, {"error": str(e)})
+            return self._send(201, job.to_json())
+        if len(parts) == 3 and parts[2] == "cancel" and job is not None:
+            return self._send(200, self.service.cancel(job.id).to_json())
+        self._send(404, {"error": "not found"})
+
+    def do_DELETE(self):
+        parts, job = self._route()
+        if len(parts) == 2 and job is not None: return self._send(200, self.service.cancel(job.id).to_json())
+        self._send(404, {"error": "not found"})
+
+def make_server(service: JobService, host: str = SERVICE_HOST, port: int = SERVICE_PORT) -> ThreadingHTTPServer:
+    handler = type("BoundJobRequestHandler", (JobRequestHandler,), {"service": service})
+    return ThreadingHTTPServer((host, port), handler)
+
+def run_server():
+    parser = argparse.ArgumentParser(description="Local HTTP/JSON job API for the novel pipeline (one resident worker).")
+    parser.add_argument("--host", default=SERVICE_HOST)
+    parser.add_argument("--port", type=int, default=SERVICE_PORT)
+    args = parser.parse_args()
+
+    service = JobService().start()
+    server = make_server(service, args.host, args.port)
+    print(f"[Service] Listening on http://{args.host}:{server.server_address[1]} (novels in {NOVELS_ROOT_DIR})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n[Service] Stopping: cancelling the running job...")
+    finally:
+        server.server_close()
+        service.close()
+
+if __name__ == "__main__":
+    run_server()
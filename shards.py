@@ -0,0 +1,136 @@
+import os
+import json
+import shutil
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+# Local Imports (no torch: merging only copies files and rebuilds the exports)
+from utils import novel_paths, get_audio_filename
+from chapter_index import ChapterIndex
+from glossary_store import CATEGORIES
+from epub_writer import read_titles, record_title
+from line_stream import ChapterLines
+from anki_writer import AnkiChapter, IncrementalPackage
+from exporters import build_final_epub, get_book_title
+
+FILE_KINDS = ("json", "text", "xhtml", "apkg")
+
+def chapter_outputs(paths: Dict[str, Path], file_name: str, chapter_number: int) -> Dict[str, Path]:
+    """Everything the pipeline writes for one chapter, by kind (the media folder holds its audio)."""
+    return {
+        "json": paths["trans"] / file_name.replace('.txt', '.json'),
+        "text": paths["trans"] / file_name,
+        "xhtml": paths["epub"] / file_name.replace('.txt', '.xhtml'),
+        "apkg": paths["anki"] / f"Ch_{chapter_number:03d}.apkg",
+        "media": paths["media"] / f"ch_{chapter_number:04d}",
+    }
+
+def _clips(media_dir: Path) -> List[Path]:
+    return sorted(media_dir.glob("*.opus")) if media_dir.is_dir() else []
+
+def _anki_chapter(novel_name: str, number: int, outputs: Dict[str, Path]) -> AnkiChapter:
+    """A copied chapter's subdeck; lines without a clip (synthesis failed) get no sound."""
+    lines = ChapterLines(outputs["json"])
+    clips = {clip.name for clip in _clips(outputs["media"])}
+    return AnkiChapter(novel_name, number, lines, frozenset(idx for idx in range(len(lines)) if get_audio_filename(number, idx) not in clips))
+
+def _completeness(outputs: Dict[str, Path]):
+    """How far a copy of a chapter got: exported, assembled, audio clips, then the newest translation."""
+    return (outputs["apkg"].exists(), outputs["xhtml"].exists(), len(_clips(outputs["media"])), outputs["json"].stat().st_mtime_ns)
+
+def _copy_file(source: Path, target: Path):
+    tmp_path = target.with_name(target.name + ".tmp")
+    shutil.copy2(source, tmp_path)
+    os.replace(tmp_path, target)
+
+def _copy_chapter(source: Dict[str, Path], target: Dict[str, Path]):
+    """Replaces the target's outputs of a chapter with the source's. Target files the source lacks are stale and removed."""
+    for kind in FILE_KINDS:
+        if source[kind].exists():
+            target[kind].parent.mkdir(parents=True, exist_ok=True)
+            _copy_file(source[kind], target[kind])
+        else:
+            target[kind].unlink(missing_ok=True)
+    clips = {p.name for p in _clips(source["media"])}
+    for stale in _clips(target["media"]):
+        if stale.name not in clips: stale.unlink()
+    if clips: shutil.copytree(source["media"], target["media"], dirs_exist_ok=True)
+
+def merge_glossaries_by_vote(glossaries: List[Dict]) -> Tuple[Dict, List]:
+    """
+    One glossary from several: per entity, the value most sources agree on; ties go to the earliest
+    glossary in the list (the target's own). Returns the glossary and the (category, name) conflicts.
+    """
+    merged, conflicts = {cat: {} for cat in CATEGORIES}, []
+    for cat in CATEGORIES:
+        values: Dict[str, List] = {}
+        for glossary in glossaries:
+            entries = glossary.get(cat)
+            if not isinstance(entries, dict): continue
+            for name, data in entries.items(): values.setdefault(name, []).append(data)
+        for name, candidates in values.items():
+            votes = Counter(json.dumps(data, ensure_ascii=False, sort_keys=True) for data in candidates)
+            best = max(votes.values())
+            merged[cat][name] = next(data for data in candidates if votes[json.dumps(data, ensure_ascii=False, sort_keys=True)] == best)
+            if len(votes) > 1: conflicts.append((cat, name))
+    return merged, conflicts
+
+def _read_glossary(path: Path) -> Dict:
+    try:
+        return json.loads(path.read_text(encoding='utf-8'))
+    except (OSError, ValueError):
+        return {}
+
+def merge_shards(novel_dir: Path, shard_dirs: List[Path]) -> Dict:
+    """
+    Folds copies of this novel processed on other machines (--shard runs) into novel_dir. Per chapter, the most
+    complete copy wins (exported > assembled > more audio clips > newer translation); the glossaries are merged by
+    vote. The master deck and the EPUB are then brought up to date with the chapters that came in.
+    """
+    novel_dir = Path(novel_dir)
+    paths = novel_paths(novel_dir)
+    shard_paths = [novel_paths(Path(d)) for d in shard_dirs]
+    index = ChapterIndex(paths["raw"], paths["chapter_index"]).refresh()
+    report = {"chapters": 0, "copied": [], "conflicts": [], "glossary_entries": 0, "glossary_conflicts": []}
+    copied = [] # (chapter number, the target's outputs) of every chapter taken from a shard
+
+    for entry in index.chapters():
+        target = chapter_outputs(paths, entry.file_name, entry.chapter_number)
+        copies = [(p, chapter_outputs(p, entry.file_name, entry.chapter_number)) for p in [paths] + shard_paths]
+        copies = [(p, outputs) for p, outputs in copies if outputs["json"].exists()]
+        if not copies: continue
+        report["chapters"] += 1
+        if len({outputs["json"].read_bytes() for _, outputs in copies}) > 1: report["conflicts"].append(entry.chapter_number)
+        best_paths, best = max(copies, key=lambda copy: _completeness(copy[1]))
+        if best_paths is paths: continue
+
+        _copy_chapter(best, target)
+        title = read_titles(best_paths["epub"]).get(best["xhtml"].name)
+        if title is not None: record_title(paths["epub"], target["xhtml"].name, title)
+        copied.append((entry.chapter_number, target))
+
+    glossary, report["glossary_conflicts"] = merge_glossaries_by_vote([_read_glossary(p["glossary"]) for p in [paths] + shard_paths])
+    report["glossary_entries"] = sum(len(entries) for entries in glossary.values())
+    tmp_path = paths["glossary"].with_name(paths["glossary"].name + ".tmp")
+    tmp_path.write_text(json.dumps(glossary, ensure_ascii=False, indent=4), encoding='utf-8')
+    os.replace(tmp_path, paths["glossary"])
+
+    report["copied"] = [number for number, _ in copied]
+    if copied:
+        meta, safe_title = get_book_title(paths, novel_dir.name)
+        master = IncrementalPackage(paths["master_collection"], paths["master_media"])
+        master.add_chapters([_anki_chapter(novel_dir.name, number, outputs) for number, outputs in copied],
+                            [str(clip) for _, outputs in copied for clip in _clips(outputs["media"])])
+        master.write(novel_dir / (safe_title + ".apkg"))
+        build_final_epub(safe_title, novel_dir, meta)
+    return report
+
+def format_merge_report(report: Dict) -> List[str]:
+    lines = [f"Chapters: {report['chapters']} translated, {len(report['copied'])} taken from the shards, "
+             f"{len(report['conflicts'])} translated differently in more than one copy"]
+    if report["conflicts"]: lines.append(f"  Differing chapters (most complete copy kept): {', '.join(map(str, report['conflicts']))}")
+    lines.append(f"Glossary: {report['glossary_entries']} entries, {len(report['glossary_conflicts'])} conflicting")
+    if report["glossary_conflicts"]:
+        lines.append(f"  Decided by vote: {', '.join(name for _, name in report['glossary_conflicts'])}")
+    return lines
@@ -0,0 +1,167 @@
+import unittest
+import sys
+import json
+import shutil
+import sqlite3
+import hashlib
+import tempfile
+import zipfile
+from pathlib import Path
+from unittest.mock import patch
+
+# Add the parent directory to the path so we can import anki_writer.py
+sys.path.append(str(Path(__file__).parent.parent))
+
+import genanki
+from anki_writer import bulk_guids, chapter_guids, AnkiChapter, IncrementalPackage, write_apkg
+from config import ANKI_MODEL, get_deterministic_id
+from utils import get_audio_filename
+
+LINES = [{"cn": f"第{i}句。", "py": "dì jù", "lit": f"number {i} sentence", "nat": f"Sentence {i}.", "emo": "Calm narrative"} for i in range(30)]
+
+class PackageTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = Path(tempfile.mkdtemp())
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def read_package(self, path):
+        """(notes, cards, decks, model ids, media) of an .apkg, with the per-run IDs and timestamps left out."""
+        with zipfile.ZipFile(path) as apkg:
+            apkg.extract("collection.anki2", self.test_dir / path.stem)
+            media = json.loads(apkg.read("media"))
+            payloads = {name: apkg.read(str(idx)) for idx, name in media.items()}
+        conn = sqlite3.connect(str(self.test_dir / path.stem / "collection.anki2"))
+        notes = conn.execute("SELECT guid, mid, tags, flds, sfld FROM notes ORDER BY guid").fetchall()
+        cards = conn.execute("SELECT n.guid, c.did, c.ord FROM cards c JOIN notes n ON c.nid = n.id ORDER BY n.guid, c.ord").fetchall()
+        decks = {did: deck["name"] for did, deck in json.loads(conn.execute("SELECT decks FROM col").fetchone()[0]).items()}
+        models = set(json.loads(conn.execute("SELECT models FROM col").fetchone()[0]))
+        conn.close()
+        return notes, cards, decks, models, payloads
+
+class TestAnkiWriter(PackageTestCase):
+
+    def test_bulk_guids_match_genanki(self):
+        keys = [f"Novel_Ch_{c:03d}_L{i:04d}" for c in range(3) for i in range(500)] + ["", "林动", "a"]
+        self.assertEqual(bulk_guids(keys), [genanki.guid_for(key) for key in keys])
+        self.assertEqual(chapter_guids("Novel", 7, 10, 3), [genanki.guid_for(f"Novel_Ch_007_L{i:04d}") for i in (10, 11, 12)])
+        self.assertEqual(bulk_guids([]), [])
+
+    def test_deterministic_id_unchanged(self):
+        """Test that the cached ID keeps the value of the original full-digest formula."""
+        for seed in ("Novel_Ch_1", "Dictionary Deck", "林动_Ch_12"):
+            expected = int(hashlib.sha256(seed.encode('utf-8')).hexdigest(), 16) % (1 << 31)
+            self.assertEqual(get_deterministic_id(seed), expected)
+
+    def test_package_matches_genanki(self):
+        """Test that the direct SQLite writer produces the same notes, cards, decks and media as genanki.Package."""
+        audio = self.test_dir / get_audio_filename(2, 0)
+        audio.write_bytes(b"OggS fake")
+        chapters = [AnkiChapter("My_Novel", 2, LINES), AnkiChapter("My_Novel", 3, iter(LINES[:5]))]
+
+        decks = []
+        for chapter, lines in zip(chapters, (LINES, LINES[:5])):
+            deck = genanki.Deck(chapter.deck_id, chapter.deck_name)
+            for idx, line in enumerate(lines):
+                deck.add_note(genanki.Note(
+                    model=ANKI_MODEL, guid=genanki.guid_for(f"My_Novel_Ch_{chapter.chapter_number:03d}_L{idx:04d}"),
+                    fields=[line["cn"], line["py"], line["lit"], line["nat"], f"[sound:{get_audio_filename(chapter.chapter_number, idx)}]"],
+                    tags=["My_Novel", f"Ch_{chapter.chapter_number:03d}"]))
+            decks.append(deck)
+        package = genanki.Package(decks)
+        package.media_files = [str(audio)]
+        package.write_to_file(str(self.test_dir / "expected.apkg"))
+
+        write_apkg(chapters, [str(audio)], self.test_dir / "actual.apkg")
+        expected, actual = self.read_package(self.test_dir / "expected.apkg"), self.read_package(self.test_dir / "actual.apkg")
+        self.assertEqual(len(actual[0]), 35)
+        self.assertEqual(actual[0], expected[0])
+        self.assertEqual(actual[1], expected[1])
+        self.assertEqual(actual[2], expected[2])
+        self.assertEqual(actual[3], expected[3])
+        self.assertEqual(actual[4], {audio.name: b"OggS fake"})
+
+    def test_lines_without_audio_have_no_sound_tag(self):
+        """Test that lines whose synthesis failed get an empty Audio field rather than a tag pointing at a missing clip."""
+        write_apkg(AnkiChapter("Novel", 1, LINES[:3], frozenset({1})), [], self.test_dir / "partial.apkg")
+        notes = {flds.split("\x1f")[0]: flds.split("\x1f")[4] for _, _, _, flds, _ in self.read_package(self.test_dir / "partial.apkg")[0]}
+        self.assertEqual(notes, {"第0句。": f"[sound:{get_audio_filename(1, 0)}]", "第1句。": "", "第2句。": f"[sound:{get_audio_filename(1, 2)}]"})
+
+    def test_single_chapter_and_empty(self):
+        write_apkg(AnkiChapter("Novel", 1, []), [], self.test_dir / "empty.apkg")
+        notes, cards, decks, _, media = self.read_package(self.test_dir / "empty.apkg")
+        self.assertEqual((notes, cards, media), ([], [], {}))
+        self.assertEqual(decks[str(get_deterministic_id("Novel_Ch_1"))], "Novel::Ch 001")
+
+class TestIncrementalPackage(PackageTestCase):
+
+    def make_media(self, chapter_number, count):
+        paths = []
+        for idx in range(count):
+            path = self.test_dir / get_audio_filename(chapter_number, idx)
+            path.write_bytes(f"OggS {chapter_number} {idx}".encode())
+            paths.append(str(path))
+        return paths
+
+    def test_appends_new_chapters_in_place(self):
+        """Test that a second export only appends to the .apkg and ends up with the same contents as a full write."""
+        master = IncrementalPackage(self.test_dir / "master.anki2", self.test_dir / "master_media.json")
+        apkg = self.test_dir / "master.apkg"
+        first_media, second_media = self.make_media(1, 3), self.make_media(2, 2)
+
+        master.add_chapters([AnkiChapter("Novel", 1, LINES)], first_media)
+        self.assertFalse(master.write(apkg)) # Nothing to extend yet
+        with zipfile.ZipFile(apkg) as z:
+            first_offset = z.getinfo("0").header_offset
+            self.assertEqual(z.getinfo("0").compress_type, zipfile.ZIP_STORED)
+            self.assertEqual(z.getinfo("collection.anki2").compress_type, zipfile.ZIP_DEFLATED)
+
+        # A reopened package (next run) adds chapter 2 and re-exports chapter 1 with the same media
+        master = IncrementalPackage(self.test_dir / "master.anki2", self.test_dir / "master_media.json")
+        master.add_chapters([AnkiChapter("Novel", 2, LINES[:5]), AnkiChapter("Novel", 1, LINES)], second_media + first_media[:1])
+        self.assertTrue(master.write(apkg))
+        with zipfile.ZipFile(apkg) as z:
+            self.assertIsNone(z.testzip())
+            self.assertEqual(z.getinfo("0").header_offset, first_offset)
+            self.assertEqual(sorted(z.namelist()), sorted(["collection.anki2", "media", "0", "1", "2", "3", "4"]))
+
+        write_apkg([AnkiChapter("Novel", 1, LINES), AnkiChapter("Novel", 2, LINES[:5])], first_media + second_media, self.test_dir / "full.apkg")
+        actual, expected = self.read_package(apkg), self.read_package(self.test_dir / "full.apkg")
+        self.assertEqual(len(actual[0]), 35) # Chapter 1 was replaced, not duplicated
+        self.assertEqual(actual, expected)
+
+    def test_interrupted_append_keeps_the_old_package(self):
+        """Test that a crash while appending leaves the previous master .apkg intact and no temp file behind."""
+        master = IncrementalPackage(self.test_dir / "master.anki2", self.test_dir / "master_media.json")
+        apkg = self.test_dir / "master.apkg"
+        master.add_chapters([AnkiChapter("Novel", 1, LINES)], self.make_media(1, 3))
+        master.write(apkg)
+        before = apkg.read_bytes()
+
+        master.add_chapters([AnkiChapter("Novel", 2, LINES[:5])], self.make_media(2, 2))
+        with patch.object(zipfile.ZipFile, "writestr", side_effect=KeyboardInterrupt):
+            with self.assertRaises(KeyboardInterrupt):
+                master.write(apkg)
+        self.assertEqual(apkg.read_bytes(), before)
+        self.assertFalse(list(self.test_dir.glob("*.tmp")))
+        self.assertTrue(master.write(apkg)) # The next run appends as usual
+        self.assertEqual(len(self.read_package(apkg)[0]), 35)
+
+    def test_changed_media_or_foreign_zip_rewrites(self):
+        master = IncrementalPackage(self.test_dir / "master.anki2", self.test_dir / "master_media.json")
+        apkg = self.test_dir / "master.apkg"
+        media = self.make_media(1, 2)
+        write_apkg(AnkiChapter("Novel", 1, LINES), media, apkg) # Same layout, but not this collection's media manifest
+        master.add_chapters(AnkiChapter("Novel", 1, LINES), media[:1])
+        self.assertFalse(master.write(apkg))
+        self.assertTrue(master.write(apkg))
+
+        Path(media[0]).write_bytes(b"OggS re-synthesized")
+        master.add_chapters(AnkiChapter("Novel", 1, LINES), media[:1])
+        self.assertFalse(master.write(apkg))
+        self.assertEqual(self.read_package(apkg)[4], {Path(media[0]).name: b"OggS re-synthesized"})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+import unittest
+import sys
+import json
+import shutil
+import tempfile
+from pathlib import Path
+import numpy as np
+import soundfile as sf
+
+# Add the parent directory to the path so we can import audio_post.py
+sys.path.append(str(Path(__file__).parent.parent))
+
+from audio_post import trim_silence, normalize_loudness, resample, pick_opus_rate, process_clip, recompress_media, _bitrate_to_compression_level
+
+SR = 24000
+
+def padded_tone(lead=1.0, tone=1.0, tail=1.0, amplitude=0.1):
+    t = np.arange(int(SR * tone)) / SR
+    voice = (amplitude * np.sin(2 * np.pi * 220 * t)).astype(np.float32)
+    return np.concatenate([np.zeros(int(SR * lead), np.float32), voice, np.zeros(int(SR * tail), np.float32)])
+
+class TestAudioPostProcessing(unittest.TestCase):
+
+    def test_trim_keeps_speech_and_padding(self):
+        """Test that leading/trailing silence is cut down to the configured padding."""
+        trimmed = trim_silence(padded_tone(), SR, threshold_db=-45, pad_ms=80)
+        self.assertAlmostEqual(trimmed.size / SR, 1.0 + 0.16, delta=0.02)
+
+    def test_trim_leaves_silent_clip_alone(self):
+        """Test that an all-silent clip is not trimmed to nothing."""
+        silence = np.zeros(SR, dtype=np.float32)
+        self.assertEqual(trim_silence(silence, SR).size, SR)
+
+    def test_normalize_respects_peak_ceiling(self):
+        """Test that quiet speech is raised towards the target without clipping."""
+        quiet = padded_tone(amplitude=0.01)
+        louder = normalize_loudness(quiet, SR, target_rms_db=-20, peak_ceiling_db=-1)
+        self.assertGreater(np.max(np.abs(louder)), 0.05)
+        self.assertLessEqual(np.max(np.abs(louder)), 10 ** (-1 / 20) + 1e-6)
+
+    def test_resample_lengths(self):
+        """Test that resampling scales the sample count and opus rates are respected."""
+        audio = padded_tone()
+        self.assertEqual(resample(audio, SR, 16000).size, int(round(audio.size * 16000 / SR)))
+        self.assertEqual(pick_opus_rate(22050, target=None), 24000)
+        self.assertEqual(pick_opus_rate(24000, target=None), 24000)
+        _, out_sr = process_clip(audio, 22050)
+        self.assertIn(out_sr, (16000, 24000, 48000))
+
+    def test_bitrate_mapping(self):
+        """Test the libsndfile compression-level mapping at its end points."""
+        self.assertEqual(_bitrate_to_compression_level(256), 0.0)
+        self.assertEqual(_bitrate_to_compression_level(6), 1.0)
+        self.assertEqual(_bitrate_to_compression_level(1000), 0.0)
+
+class TestRecompressReport(unittest.TestCase):
+    def setUp(self):
+        self.media_dir = Path(tempfile.mkdtemp()) / "media"
+        (self.media_dir / "ch_0001").mkdir(parents=True)
+        for i in range(3):
+            sf.write(str(self.media_dir / "ch_0001" / f"ch01_L{i:04d}.opus"), padded_tone(), SR, format='OGG', subtype='OPUS')
+
+    def tearDown(self):
+        shutil.rmtree(self.media_dir.parent, ignore_errors=True)
+
+    def test_report_counts_bytes_saved(self):
+        """Test that padded clips shrink and the corpus report records the savings."""
+        report = recompress_media(self.media_dir)
+        self.assertEqual(report["files"], 3)
+        self.assertGreater(report["bytes_saved"], 0)
+        self.assertLess(report["seconds_after"], report["seconds_before"])
+        saved = json.loads((self.media_dir / "encoding_report.json").read_text(encoding='utf-8'))
+        self.assertEqual(saved["bytes_saved"], report["bytes_saved"])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,120 @@
+import unittest
+import sys
+import shutil
+import tempfile
+import threading
+from pathlib import Path
+from unittest.mock import patch
+
+# Add the parent directory to the path so we can import boilerplate.py
+sys.path.append(str(Path(__file__).parent.parent))
+
+from boilerplate import LineIndex, is_boilerplate_text, frozen_skip, format_dropped
+from utils import chunk_text_into_numbered_lines
+
+WATERMARK = "本书首发于起点中文网，请支持正版阅读"
+APPEAL = "月底了，求月票！"
+DIALOGUE = "“嗯。”"
+
+def chapter_text(n):
+    return "\n".join([f"第{n}章", f"林动第{n}次走进了青阳镇。", DIALOGUE, "------", WATERMARK, f"他看着第{n}座山。", DIALOGUE])
+
+def fake_llm(system_prompt, user_text, model=None):
+    lines = [line for line in user_text.split("\n\n")[0].split("\n") if ". " in line]
+    if "JSON" in system_prompt: return "{}"
+    if "audiobook director" in system_prompt: return "\n".join(f"{n}. Calm narrative" for n in range(1, len(lines) + 1))
+    return "\n".join(f"{n}. Line {n}." for n in range(1, len(lines) + 1))
+
+class TestBoilerplate(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = Path(tempfile.mkdtemp())
+        self.texts = [chapter_text(n) for n in range(1, 11)]
+        self.texts[3] += "\n" + APPEAL
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def test_patterns(self):
+        for line in ("请访问 www.example.com 阅读", APPEAL, "PS：明天加更", "作者有话说：谢谢大家", "＊＊＊", "------"):
+            self.assertTrue(is_boilerplate_text(line), line)
+        for line in ("……", "林动笑了笑。", DIALOGUE, "宗门大比的魁首能拿到一张推荐票，凭着这张推荐票，林动便能进入道宗修炼，这是青阳镇多少年来都没有过的机缘。"):
+            self.assertFalse(is_boilerplate_text(line), line) # A long story line that mentions 推荐票 is kept
+
+    def test_recurring_long_lines_are_boilerplate_short_dialogue_is_kept(self):
+        index = LineIndex.build(self.texts)
+        self.assertEqual(index.chapters, 10)
+        self.assertEqual(index.repeated[DIALOGUE], (10, 20, 10)) # Twice in the one chunk of each chapter
+        self.assertEqual(index.boilerplate(), {WATERMARK, "------", APPEAL})
+        self.assertEqual(LineIndex.build(self.texts[:2]).boilerplate(), {"------"}) # Too few chapters to call the watermark boilerplate
+        self.assertEqual(index.skip_set("keep"), set())
+
+        chunks = chunk_text_into_numbered_lines(self.texts[3], skip=index.skip_set("drop"))
+        kept = [line for chunk in chunks for line in chunk.values()]
+        self.assertEqual(kept, ["第4章", "林动第4次走进了青阳镇。", DIALOGUE, "他看着第4座山。", DIALOGUE])
+        self.assertEqual(list(chunks[0]), [1, 2, 3, 4, 5]) # Indices stay contiguous
+
+    def test_report(self):
+        index = LineIndex.build(self.texts)
+        report = index.report("drop", tm=True)
+        self.assertEqual((report["boilerplate_lines"], report["dropped"], report["duplicate_lines"]), (3, 21, 19))
+        self.assertEqual(report["lines_saved"], 40)
+        kept = index.report("keep", tm=True)
+        self.assertEqual((kept["dropped"], kept["duplicate_lines"]), (0, 19 + 9 + 9))
+        self.assertGreater(report["tokens_saved"], kept["tokens_saved"])
+        self.assertEqual(report["dropped_lines"], [("------", 10), (WATERMARK, 10), (APPEAL, 1)])
+        self.assertEqual(format_dropped(report, limit=2)[-1], "  ... and 1 more")
+
+        # Without the translation memory only repeats inside a chunk are sent once
+        self.assertEqual(index.report("drop", tm=False)["duplicate_lines"], 10)
+        self.assertEqual(index.report("keep", tm=False)["duplicate_lines"], 10)
+
+    def test_skip_set_is_frozen_per_chapter(self):
+        """Test that a chapter keeps the skip set it started with when later chapters change the boilerplate."""
+        skip = LineIndex.build(self.texts).skip_set("drop")
+        self.assertEqual(frozen_skip(self.test_dir, self.texts[3], skip), {WATERMARK, "------", APPEAL})
+        self.assertEqual(frozen_skip(self.test_dir, self.texts[3], {"------"}), {WATERMARK, "------", APPEAL})
+        (self.test_dir / "ch_0001").mkdir()
+        self.assertEqual(frozen_skip(self.test_dir / "ch_0001", self.texts[0], skip), {WATERMARK, "------"}) # Only the chapter's own lines
+
+    def test_index_is_cached_until_a_chapter_changes(self):
+        from chapter_index import ChapterIndex
+        raw = self.test_dir / "01_Raw_Text"
+        raw.mkdir()
+        for n, text in enumerate(self.texts, 1):
+            (raw / f"ch_{n:03d}.txt").write_text(text, encoding='utf-8')
+        cache = self.test_dir / ".cache" / "line_index.json"
+        entries = lambda: ChapterIndex(raw, self.test_dir / ".cache" / "chapter_index.json").refresh().chapters()
+
+        first = LineIndex.for_novel(raw, entries(), cache)
+        with patch.object(LineIndex, "build", side_effect=AssertionError("rebuilt")):
+            cached = LineIndex.for_novel(raw, entries(), cache)
+        self.assertEqual(cached.boilerplate(), first.boilerplate())
+        self.assertEqual(cached.repeated, first.repeated)
+
+        (raw / "ch_011.txt").write_text(chapter_text(11), encoding='utf-8')
+        self.assertEqual(LineIndex.for_novel(raw, entries(), cache).chapters, 11)
+
+    def test_text_stage_drops_boilerplate_and_sends_repeats_once(self):
+        from main import setup_directories, run_text_stage
+        from glossary_store import GlossaryStore
+        from utils import Chapter
+        novel_dir = self.test_dir / "Novel"
+        (novel_dir / "01_Raw_Text").mkdir(parents=True)
+        raw_file = novel_dir / "01_Raw_Text" / "ch_004.txt"
+        raw_file.write_text(self.texts[3], encoding='utf-8')
+        paths = setup_directories(novel_dir)
+        chapter = Chapter("Novel", "ch_004.txt", None, 4, raw_file)
+
+        with patch("main.call_llm", side_effect=fake_llm) as llm:
+            lines = run_text_stage(chapter, paths, GlossaryStore(paths["glossary"]), threading.Event(), False, None, LineIndex.build(self.texts).skip_set("drop"))
+        self.assertEqual([line["cn"] for line in lines], ["第4章", "林动第4次走进了青阳镇。", DIALOGUE, "他看着第4座山。", DIALOGUE])
+        sent = [c.args[1] for c in llm.call_args_list if "JSON" not in c.args[0]]
+        self.assertTrue(sent)
+        for user_text in sent:
+            self.assertNotIn(WATERMARK, user_text)
+            self.assertEqual(user_text.count(DIALOGUE), 1)
+        self.assertFalse((paths["cache"] / "ch_0004" / "skip.json").exists()) # Deleted with the chunks once the chapter is saved
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+import unittest
+import sys
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+# Add the parent directory to the path so we can import chapter_index.py
+sys.path.append(str(Path(__file__).parent.parent))
+
+from chapter_index import ChapterIndex, natural_key, sparse_chapter_choices
+from utils import Chapter, extract_chapter_number
+
+class TestChapterNumbers(unittest.TestCase):
+
+    def test_extract_chapter_number(self):
+        """Test the supported file name shapes and that anything else is rejected instead of raising."""
+        self.assertEqual(extract_chapter_number("ch_001.txt"), 1)
+        self.assertEqual(extract_chapter_number("ch_1000.txt"), 1000)
+        self.assertEqual(extract_chapter_number("ch_12_title.txt"), 12)
+        self.assertIsNone(extract_chapter_number("notes.txt"))
+        self.assertIsNone(extract_chapter_number("ch_abc.txt"))
+        self.assertIsNone(extract_chapter_number("ch_12abc.txt"))
+
+    def test_natural_key(self):
+        """Test that unpadded numbers sort numerically."""
+        names = ["ch_1000.txt", "ch_200.txt", "ch_2.txt", "ch_10.txt"]
+        self.assertEqual(sorted(names, key=natural_key), ["ch_2.txt", "ch_10.txt", "ch_200.txt", "ch_1000.txt"])
+
+    def test_sparse_choices_keep_ends(self):
+        """Test that long chapter lists are thinned out for the dropdown but keep the first and last chapter."""
+        numbers = list(range(1, 5001))
+        choices = sparse_chapter_choices(numbers, 200)
+        self.assertEqual(len(choices), 200)
+        self.assertEqual((choices[0], choices[-1]), (1, 5000))
+        self.assertEqual(sparse_chapter_choices([1, 2, 3], 200), [1, 2, 3])
+
+class TestChapterIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = Path(tempfile.mkdtemp())
+        self.raw_dir = self.test_dir / "01_Raw_Text"
+        self.raw_dir.mkdir()
+        self.cache_path = self.test_dir / ".cache" / "chapter_index.json"
+        for n in (1000, 200, 2, 10):
+            (self.raw_dir / f"ch_{n}.txt").write_text(f"第{n}章", encoding='utf-8')
+        (self.raw_dir / "readme.md").write_text("not a chapter", encoding='utf-8')
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def bump_dir_mtime(self):
+        # Some filesystems have coarse mtimes; make sure the change is visible.
+        st = self.raw_dir.stat()
+        os.utime(self.raw_dir, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+
+    def test_numeric_order_and_start(self):
+        """Test that chapters come back in numeric order and start_chapter filters them."""
+        index = ChapterIndex(self.raw_dir, self.cache_path).refresh()
+        self.assertEqual([e.chapter_number for e in index.chapters()], [2, 10, 200, 1000])
+        self.assertEqual([e.file_name for e in index.chapters(start_chapter=11)], ["ch_200.txt", "ch_1000.txt"])
+
+    def test_cached_index_skips_scan(self):
+        """Test that an unchanged folder is served from the cache file without listing it."""
+        ChapterIndex(self.raw_dir, self.cache_path).refresh()
+        index = ChapterIndex(self.raw_dir, self.cache_path).refresh()
+        self.assertFalse(index.scanned)
+        self.assertEqual(len(index.chapters()), 4)
+
+    def test_incremental_refresh(self):
+        """Test that added and removed files show up on the next refresh."""
+        index = ChapterIndex(self.raw_dir, self.cache_path).refresh()
+        (self.raw_dir / "ch_3.txt").write_text("第3章", encoding='utf-8')
+        (self.raw_dir / "ch_1000.txt").unlink()
+        self.bump_dir_mtime()
+
+        index.refresh()
+        self.assertTrue(index.scanned)
+        self.assertEqual([e.chapter_number for e in index.chapters()], [2, 3, 10, 200])
+
+    def test_file_edited_in_place_is_restated(self):
+        """Test that a chapter rewritten without touching the folder's mtime gets its new size without a scan."""
+        ChapterIndex(self.raw_dir, self.cache_path).refresh()
+        st = self.raw_dir.stat()
+        (self.raw_dir / "ch_2.txt").write_text("第2章\n" + "林动走了。" * 100, encoding='utf-8')
+        os.utime(self.raw_dir, ns=(st.st_atime_ns, st.st_mtime_ns))
+
+        index = ChapterIndex(self.raw_dir, self.cache_path).refresh()
+        self.assertFalse(index.scanned)
+        self.assertEqual(index.chapters()[0].size, (self.raw_dir / "ch_2.txt").stat().st_size)
+        self.assertEqual(ChapterIndex(self.raw_dir, self.cache_path).entries, index.entries) # Saved
+
+    def test_content_is_lazy(self):
+        """Test that a Chapter built from the index only reads its file when asked."""
+        index = ChapterIndex(self.raw_dir, self.cache_path).refresh()
+        entry = index.chapters()[0]
+        chapter = Chapter("novel", entry.file_name, None, entry.chapter_number, index.path(entry))
+        self.assertIsNone(chapter.content)
+        self.assertEqual(chapter.load_content(), "第2章")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+import unittest
+import sys
+import json
+import shutil
+import tempfile
+import threading
+from pathlib import Path
+import numpy as np
+
+# Add the parent directory to the path so we can import clip_quality.py
+sys.path.append(str(Path(__file__).parent.parent))
+
+from clip_quality import assess_clip, chapter_report, write_chapter_report, INVALID, SILENT, TRUNCATED, TOO_LONG, CLIPPING, GAPS
+from tts_queue import TTSJobQueue
+from tts_engine import run_tts_worker
+
+SR = 24000
+
+def speech(seconds, amplitude=0.1, gap=0.0):
+    """A tone standing in for speech, optionally with a silent gap in the middle."""
+    t = np.arange(int(SR * seconds / 2)) / SR
+    half = (amplitude * np.sin(2 * np.pi * 220 * t)).astype(np.float32)
+    return np.concatenate([half, np.zeros(int(SR * gap), np.float32), half])
+
+class StubTTSModel:
+    """Returns speech of a normal length for the text, except that the first take of a line with 坏 babbles on."""
+    def __init__(self):
+        self.takes = {}
+
+    def generate_custom_voice(self, text, language, speaker, instruct):
+        texts = text if isinstance(text, list) else [text]
+        wavs = []
+        for line in texts:
+            self.takes[line] = self.takes.get(line, 0) + 1
+            wavs.append(speech(20.0 if "坏" in line and self.takes[line] == 1 else 0.25 * len(line)))
+        return wavs, SR
+
+class TestClipMetrics(unittest.TestCase):
+
+    def test_normal_clip_passes(self):
+        issues, metrics = assess_clip(speech(2.0), SR, "林动深吸了一口气，走进大殿。")
+        self.assertEqual(issues, [])
+        self.assertAlmostEqual(metrics["speech_seconds"], 2.0, delta=0.02)
+        self.assertAlmostEqual(metrics["seconds_per_char"], 2.0 / 12, delta=0.01) # Punctuation is not counted
+
+    def test_bad_clips_are_flagged(self):
+        text = "林动深吸了一口气，走进大殿。"
+        self.assertEqual(assess_clip(speech(0.3), SR, text)[0], [TRUNCATED])
+        self.assertEqual(assess_clip(speech(15.0), SR, text)[0], [TOO_LONG])
+        self.assertEqual(assess_clip(np.clip(speech(2.0, amplitude=2.0), -1, 1), SR, text)[0], [CLIPPING])
+        self.assertEqual(assess_clip(speech(1.0, gap=3.0), SR, text)[0], [GAPS])
+        self.assertEqual(assess_clip(np.zeros(SR, np.float32), SR, text)[0], [SILENT])
+        self.assertEqual(assess_clip(np.zeros(10, np.float32), SR, text, invalid=True)[0], [INVALID])
+        self.assertEqual(assess_clip(speech(0.05), SR, "嗯。")[0], []) # Too short to judge by length
+
+class TestResynthesisQueue(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = Path(tempfile.mkdtemp())
+        self.queue = TTSJobQueue(self.test_dir / "queue.sqlite")
+        lines = ["林动走进了大殿。", "这个坏人笑了起来。", "小貂跳上了肩膀。"]
+        self.paths = [self.test_dir / f"ch01_L{i:04d}.opus" for i in range(len(lines))]
+        self.queue.enqueue_chapter(1, [(i, text, "Calm narrative", str(path), False) for i, (text, path) in enumerate(zip(lines, self.paths))])
+
+    def tearDown(self):
+        self.queue.close()
+        shutil.rmtree(self.test_dir)
+
+    def test_suspect_take_is_redone_and_reported(self):
+        """Test that only the babbling line is synthesized again, and the report records it."""
+        model = StubTTSModel()
+        done = run_tts_worker(self.queue, threading.Event(), chapter_number=1, model_loader=lambda: model, batch_size=2)
+        self.assertEqual(done, 4) # Three lines plus one retake
+        self.assertEqual(sorted(model.takes.values()), [1, 1, 2])
+        self.assertTrue(all(path.exists() for path in self.paths))
+        self.assertTrue(self.queue.is_chapter_done(1))
+
+        report = chapter_report(1, self.queue.chapter_quality(1))
+        self.assertEqual((report["measured"], report["resynthesized"], report["suspect"], report["failed"]), (3, 1, [], []))
+        path = write_chapter_report(self.test_dir / "quality", report)
+        self.assertEqual(json.loads(path.read_text(encoding='utf-8'))["chapter"], 1)
+
+    def test_last_take_is_kept_then_requeued_on_demand(self):
+        """Test that a line still suspect after every take is kept, reported, and handed back by requeue_suspect."""
+        class AlwaysBabbling(StubTTSModel):
+            def generate_custom_voice(self, text, language, speaker, instruct):
+                return [speech(20.0) for _ in (text if isinstance(text, list) else [text])], SR
+        run_tts_worker(self.queue, threading.Event(), chapter_number=1, model_loader=AlwaysBabbling, batch_size=4)
+        self.assertTrue(self.queue.is_chapter_done(1))
+        report = chapter_report(1, self.queue.chapter_quality(1))
+        self.assertEqual(report["issues"], {TOO_LONG: 3})
+        self.assertEqual([row["attempts"] for row in report["suspect"]], [3, 3, 3])
+
+        requeued = self.queue.requeue_suspect(1, 1)
+        self.assertEqual([line for _, line, _ in requeued], [0, 1, 2])
+        self.assertEqual(self.queue.requeue_suspect(), [])
+        self.assertEqual(self.queue.pending_count(1), 3)
+        self.assertEqual(self.queue.claim("w", chapter=1).attempts, 1)
+
+if __name__ == '__main__':
+    unittest.main()
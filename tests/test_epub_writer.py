@@ -0,0 +1,95 @@
+import unittest
+import sys
+import shutil
+import tempfile
+import xml.etree.ElementTree as ET
+from pathlib import Path
+from ebooklib import epub
+
+# Add the parent directory to the path so we can import epub_writer.py
+sys.path.append(str(Path(__file__).parent.parent))
+
+from epub_writer import ChapterXhtmlWriter, escape_text, read_titles, record_title
+from exporters import build_final_epub
+
+XHTML = "{http://www.w3.org/1999/xhtml}"
+LINES = [
+    {"cn": "第一章 <序>", "py": "dì yī zhāng", "lit": "Chapter 1 <Preface>", "nat": "Chapter 1: Cats & <Dogs>"},
+    {"cn": "他说：“R&D”", "py": "tā shuō", "lit": "He said \"R&D\"", "nat": "He said: 1 < 2 & 3 > 2\x0b"},
+]
+
+class TestEpubWriter(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = Path(tempfile.mkdtemp())
+        self.epub_dir = self.test_dir / "03_EPUB_Chapters"
+        self.epub_dir.mkdir()
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def write_chapter(self, name, lines, number=1):
+        with ChapterXhtmlWriter(self.epub_dir / name, number, "ch_fallback.txt") as writer:
+            for idx, line in enumerate(lines):
+                writer.write(line, f"ch{number:02d}_L{idx:04d}.opus")
+        record_title(self.epub_dir, name, writer.title)
+        return writer
+
+    def test_escaping(self):
+        self.assertEqual(escape_text("a < b & c > d"), "a &lt; b &amp; c &gt; d")
+        self.assertEqual(escape_text("tab\tok\x00\x1f"), "tab\tok")
+        self.assertEqual(escape_text(3), "3")
+
+    def test_output_is_well_formed_xhtml(self):
+        writer = self.write_chapter("ch_001.xhtml", LINES)
+        self.assertEqual(writer.title, LINES[0]["nat"])
+        root = ET.parse(self.epub_dir / "ch_001.xhtml").getroot()
+        self.assertEqual(root.find(f"{XHTML}body/{XHTML}h1").text, "Chapter 1: Cats & <Dogs>")
+        blocks = root.findall(f"{XHTML}body/{XHTML}div")
+        self.assertEqual(len(blocks), 2)
+        self.assertEqual([p.text for p in blocks[1].findall(f"{XHTML}p")], ["他说：“R&D”", "tā shuō", '"He said "R&D""', "He said: 1 < 2 & 3 > 2"])
+        self.assertEqual(blocks[1].find(f"{XHTML}audio/{XHTML}source").get("src"), "media/ch_0001/ch01_L0001.opus")
+        self.assertFalse(list(self.epub_dir.glob("*.tmp")))
+
+    def test_line_without_audio_has_no_player(self):
+        with ChapterXhtmlWriter(self.epub_dir / "ch_004.xhtml", 4, "ch_fallback.txt") as writer:
+            writer.write(LINES[0], "ch04_L0000.opus")
+            writer.write(LINES[1], None) # Synthesis failed
+        blocks = ET.parse(self.epub_dir / "ch_004.xhtml").getroot().findall(f"{XHTML}body/{XHTML}div")
+        self.assertIsNotNone(blocks[0].find(f"{XHTML}audio"))
+        self.assertIsNone(blocks[1].find(f"{XHTML}audio"))
+        self.assertEqual(len(blocks[1].findall(f"{XHTML}p")), 4)
+
+    def test_empty_chapter_and_failed_write(self):
+        self.assertEqual(self.write_chapter("ch_002.xhtml", [], 2).title, "ch_fallback.txt")
+        with self.assertRaises(KeyError):
+            self.write_chapter("ch_003.xhtml", [{"nat": "x"}], 3)
+        self.assertFalse((self.epub_dir / "ch_003.xhtml").exists())
+        self.assertFalse(list(self.epub_dir.glob("*.tmp")))
+        self.assertEqual(read_titles(self.epub_dir), {"ch_002.xhtml": "ch_fallback.txt"})
+
+    def test_epub_uses_title_manifest(self):
+        """Test that the book's table of contents comes from the manifest, with older chapters still parsed from <h1>."""
+        self.write_chapter("ch_001.xhtml", LINES)
+        (self.epub_dir / "ch_000.xhtml").write_text("<html><body><h1>Legacy</h1><p>old</p></body></html>", encoding='utf-8')
+        build_final_epub("Book", self.test_dir, {"title": "Book & Co"})
+
+        book = epub.read_epub(str(next(self.test_dir.glob("*.epub"))))
+        self.assertEqual([item.title for item in book.toc], ["Legacy", "Chapter 1: Cats & <Dogs>"])
+        chapter = book.get_item_with_href("ch_001.xhtml")
+        self.assertEqual(chapter.content, (self.epub_dir / "ch_001.xhtml").read_bytes()) # Stored as written
+        self.assertIn("1 &lt; 2 &amp; 3", chapter.get_content().decode("utf-8"))
+        self.assertIn(b"<p>old</p>", book.get_item_with_href("ch_000.xhtml").content)
+
+    def test_epub_orders_chapters_by_number(self):
+        """Test that chapter 1000 follows chapter 999 (not chapter 100) and front matter comes first."""
+        for number in (2, 100, 101, 999, 1000):
+            self.write_chapter(f"ch_{number:03d}.xhtml", [dict(LINES[1], nat=f"Chapter {number}")], number)
+        self.write_chapter("front_matter.xhtml", [dict(LINES[1], nat="Preface")], 0)
+        build_final_epub("Book", self.test_dir, {"title": "Book"})
+
+        book = epub.read_epub(str(next(self.test_dir.glob("*.epub"))))
+        self.assertEqual([item.title for item in book.toc], ["Preface", "Chapter 2", "Chapter 100", "Chapter 101", "Chapter 999", "Chapter 1000"])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,28 @@
+import unittest
+import sys
+from pathlib import Path
+
+# Add the parent directory to the path so we can import exporters.py
+sys.path.append(str(Path(__file__).parent.parent))
+
+from exporters import MediaRegistry
+
+class TestMediaRegistry(unittest.TestCase):
+
+    def test_deduplicates_and_keeps_order(self):
+        """Test that repeated paths are only registered once, in first-seen order."""
+        registry = MediaRegistry()
+        registry.extend(["media/ch_0001/a.opus", "media/ch_0001/b.opus", "media/ch_0001/a.opus"])
+        registry.add(Path("media/ch_0002/c.opus"))
+        self.assertEqual(registry.as_list(), ["media/ch_0001/a.opus", "media/ch_0001/b.opus", str(Path("media/ch_0002/c.opus"))])
+        self.assertEqual(len(registry), 3)
+
+    def test_membership_accepts_paths(self):
+        """Test that Path and str lookups agree."""
+        registry = MediaRegistry()
+        self.assertTrue(registry.add(Path("media/x.opus")))
+        self.assertFalse(registry.add(str(Path("media/x.opus"))))
+        self.assertIn(Path("media/x.opus"), registry)
+
+if __name__ == '__main__':
+    unittest.main()
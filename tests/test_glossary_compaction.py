@@ -0,0 +1,99 @@
+import unittest
+import sys
+import json
+import shutil
+import tempfile
+from pathlib import Path
+
+# Add the parent directory to the path so we can import glossary_store.py
+sys.path.append(str(Path(__file__).parent.parent))
+
+from glossary_store import GlossaryStore, build_stats, compact_glossary, compact_novel_glossary
+from utils import get_relevant_glossary
+
+GLOSSARY = {
+    "characters": {
+        "林动": {"english_name": "Lin Dong"},
+        "林": {"english_name": "Lin"},
+        "林東": {"english_name": "Lin Dong"},
+        "小貂": {"english_name": "Little Marten"},
+        "路人甲": {"english_name": "Passerby"},
+    },
+    "places": {"青阳镇": {"english_name": "Qingyang Town"}},
+    "items": {},
+    "skills": {"通背拳": {"english_name": "Connecting Back Fist"}},
+}
+
+class TestRelevantGlossary(unittest.TestCase):
+
+    def test_shadowed_names_and_aliases(self):
+        """Test that a name only found inside a longer one is left out and aliases are keyed by the form used."""
+        glossary = {"characters": {"林动": {"english_name": "Lin Dong", "aliases": ["林東"]}, "林": {"english_name": "Lin"}}}
+        relevant = get_relevant_glossary("林東看着林动。", glossary)
+        self.assertEqual(relevant["characters"], {"林动": {"english_name": "Lin Dong"}, "林東": {"english_name": "Lin Dong"}})
+        self.assertIn("林", get_relevant_glossary("林家的人来了。", glossary)["characters"])
+
+    def test_limit_keeps_most_relevant(self):
+        text = "林动和小貂在青阳镇。林动笑了。"
+        stats = {"places": {"青阳镇": {"chapters": 40, "last": 90}}, "characters": {"小貂": {"chapters": 2, "last": 3}}}
+        relevant = get_relevant_glossary(text, GLOSSARY, stats, limit=2)
+        self.assertEqual(sum(len(entries) for entries in relevant.values()), 2)
+        self.assertIn("林动", relevant["characters"]) # Two mentions
+        self.assertIn("青阳镇", relevant["places"]) # Seen in more chapters than 小貂
+
+class TestGlossaryStats(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = Path(tempfile.mkdtemp())
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def test_record_chapter_once_and_alias_merge(self):
+        path, stats_path = self.test_dir / "glossary.json", self.test_dir / ".cache" / "glossary_stats.json"
+        path.write_text(json.dumps({"characters": {"林动": {"english_name": "Lin Dong", "aliases": ["林東"]}}}), encoding='utf-8')
+        store = GlossaryStore(path, stats_path)
+        store.record_chapter(3, "林动走了。林東回来了。")
+        store.record_chapter(3, "林动走了。")
+        store.record_chapter(7, "林动。")
+
+        seen = GlossaryStore(path, stats_path)._stats["entities"]["characters"]["林动"]
+        self.assertEqual((seen["chapters"], seen["mentions"], seen["first"], seen["last"]), (2, 3, 3, 7))
+        self.assertEqual(store.merge({"characters": {"林東": {"english_name": "Lin Dong"}}}), []) # Already an alias
+
+    def test_compaction(self):
+        """Test that variants merge into the most used name and shadowed and stale one-off entries are pruned."""
+        chapters = [(1, "林动遇见了路人甲。"), (2, "林東出拳。"), (60, "林动。林東说话。")]
+        chapters += [(n, "林动和小貂。") for n in range(3, 6)] + [(70, "林東施展通背拳。")]
+        compacted, report = compact_glossary(GLOSSARY, build_stats(chapters, GLOSSARY))
+
+        characters = compacted["characters"]
+        self.assertEqual(characters["林动"], {"english_name": "Lin Dong", "aliases": ["林東"]})
+        self.assertNotIn("林", characters)    # Only ever part of 林动
+        self.assertNotIn("路人甲", characters) # Seen once, 69 chapters ago
+        self.assertIn("小貂", characters)
+        self.assertIn("青阳镇", compacted["places"]) # Never seen: kept
+        self.assertIn("通背拳", compacted["skills"]) # Seen once, recently
+        self.assertEqual(report, {"before": 7, "after": 4, "merged": 1, "shadowed": 1, "one_off": 1})
+
+    def test_compact_novel_glossary(self):
+        novel_dir = self.test_dir / "Novel"
+        raw = novel_dir / "01_Raw_Text"
+        raw.mkdir(parents=True)
+        for n in range(1, 4): (raw / f"ch_{n:03d}.txt").write_text(f"第{n}章\n林动走进青阳镇。", encoding='utf-8')
+        glossary_path = novel_dir / "glossary.json"
+        glossary_path.write_text(json.dumps(GLOSSARY, ensure_ascii=False), encoding='utf-8')
+
+        report = compact_novel_glossary(novel_dir, dry_run=True)
+        self.assertEqual(report["merged"], 1)
+        self.assertEqual(json.loads(glossary_path.read_text(encoding='utf-8')), GLOSSARY)
+
+        compact_novel_glossary(novel_dir)
+        self.assertEqual(json.loads((novel_dir / "glossary.json.bak").read_text(encoding='utf-8')), GLOSSARY)
+        self.assertIn("aliases", json.loads(glossary_path.read_text(encoding='utf-8'))["characters"]["林动"])
+        stats = json.loads((novel_dir / ".cache" / "glossary_stats.json").read_text(encoding='utf-8'))
+        self.assertEqual(stats["recorded"], [1, 2, 3])
+        self.assertEqual(stats["entities"]["places"]["青阳镇"]["chapters"], 3)
+
+if __name__ == '__main__':
+    unittest.main()
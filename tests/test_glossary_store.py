@@ -0,0 +1,152 @@
+import unittest
+import sys
+import json
+import shutil
+import tempfile
+import threading
+from pathlib import Path
+from unittest.mock import patch
+
+# Add the parent directory to the path so we can import glossary_store.py
+sys.path.append(str(Path(__file__).parent.parent))
+
+from glossary_store import GlossaryStore, CATEGORIES
+from line_stream import ChapterLines, write_json_array
+from utils import Chapter
+
+class TestGlossaryStore(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = Path(tempfile.mkdtemp())
+        self.path = self.test_dir / "glossary.json"
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def test_merge_keeps_existing_and_versions(self):
+        """Test that existing entries win, new ones get versions and the file is saved."""
+        self.path.write_text(json.dumps({"characters": {"林动": {"english_name": "Lin Dong"}}}), encoding='utf-8')
+        store = GlossaryStore(self.path)
+        self.assertEqual(set(store.snapshot()), set(CATEGORIES)) # Old files gain the missing categories
+
+        added = store.merge({"characters": {"林动": {"english_name": "Forest Move"}, "小貂": {"english_name": "Little Marten"}}, "bogus": {"x": {}}})
+        self.assertEqual(added, [("characters", "小貂")])
+        self.assertEqual(store.version, 1)
+        self.assertEqual(store.added_since(0), [("小貂", {"english_name": "Little Marten"})])
+        self.assertEqual(store.added_since(1), [])
+
+        saved = json.loads(self.path.read_text(encoding='utf-8'))
+        self.assertEqual(saved["characters"]["林动"]["english_name"], "Lin Dong")
+        self.assertIn("小貂", saved["characters"])
+
+    def test_relevant_reports_version(self):
+        store = GlossaryStore(self.path)
+        store.merge({"places": {"青阳镇": {"english_name": "Qingyang Town"}}})
+        relevant, version = store.relevant("他走进了青阳镇。")
+        self.assertEqual(relevant["places"], {"青阳镇": {"english_name": "Qingyang Town"}})
+        self.assertEqual(version, 1)
+
+    def test_corrupted_file_starts_fresh(self):
+        self.path.write_text("{not json", encoding='utf-8')
+        self.assertEqual(GlossaryStore(self.path).snapshot(), {cat: {} for cat in CATEGORIES})
+
+    def test_concurrent_merges(self):
+        """Test that merges from many threads all land, with unique versions and a valid file."""
+        store = GlossaryStore(self.path)
+        def worker(t):
+            for i in range(50):
+                store.merge({"items": {f"物{t}_{i}": {"english_name": f"Item {t} {i}"}}})
+        threads = [threading.Thread(target=worker, args=(t,)) for t in range(8)]
+        for thread in threads: thread.start()
+        for thread in threads: thread.join()
+        self.assertEqual(store.version, 400)
+        self.assertEqual(len(json.loads(self.path.read_text(encoding='utf-8'))["items"]), 400)
+
+def fake_llm(system_prompt, user_text, model=None):
+    """Translates every numbered line as 'Lin Dong' if the glossary tail names him, else with a wrong name."""
+    lines = [line for line in user_text.split("\n\n")[0].split("\n") if ". " in line]
+    if "JSON" in system_prompt: return "{}"
+    if "audiobook director" in system_prompt: return "\n".join(f"{n}. Calm narrative" for n in range(1, len(lines) + 1))
+    name = "Lin Dong" if "Lin Dong" in user_text else "Forest Move"
+    return "\n".join(f"{n}. {name} walks." for n in range(1, len(lines) + 1))
+
+class TestParallelTextStage(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = Path(tempfile.mkdtemp())
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def test_reconcile_redoes_lines_missing_late_names(self):
+        """Test that a chunk translated before an entity was known is re-translated only where the name is missing."""
+        from main import reconcile_late_entities
+        store = GlossaryStore(self.test_dir / "glossary.json")
+        chunk = self.test_dir / "chunk_0000.json"
+        write_json_array(chunk, [
+            {"cn": "林动走了。", "py": "", "nat": "Forest Move walks.", "lit": "x", "emo": "Calm narrative"},
+            {"cn": "天黑了。", "py": "", "nat": "It got dark.", "lit": "x", "emo": "Calm narrative"},
+        ])
+        store.merge({"characters": {"林动": {"english_name": "Lin Dong"}}})
+
+        with patch("main.call_llm", side_effect=fake_llm) as llm:
+            self.assertEqual(reconcile_late_entities({chunk: 0}, store), 1)
+            self.assertEqual(reconcile_late_entities({chunk: 1}, store), 0) # Nothing newer than version 1
+        lines = list(ChapterLines(chunk))
+        self.assertEqual(lines[0]["nat"], "Lin Dong walks.")
+        self.assertEqual(lines[1]["nat"], "It got dark.")
+        self.assertEqual(llm.call_count, 4) # json + natural + literal + emotion for the one stale line
+
+    def test_chapters_run_concurrently(self):
+        """Test that K chapters translate at the same time and all come back complete."""
+        from main import setup_directories, run_parallel_text_stage
+        novel_dir = self.test_dir / "Novel"
+        (novel_dir / "01_Raw_Text").mkdir(parents=True)
+        paths = setup_directories(novel_dir)
+        chapters = []
+        for n in range(1, 5):
+            path = paths["raw"] / f"ch_{n:03d}.txt"
+            path.write_text("林动走了。\n天黑了。", encoding='utf-8')
+            chapters.append(Chapter("Novel", path.name, None, n, path))
+
+        active, peak, lock = [0], [0], threading.Lock()
+        overlap = threading.Event() # Set once two chapters are inside an LLM call at the same time
+        def slow_llm(*args, **kwargs):
+            with lock:
+                active[0] += 1
+                peak[0] = max(peak[0], active[0])
+                if peak[0] >= 2: overlap.set()
+            try:
+                overlap.wait(timeout=5)
+                return fake_llm(*args, **kwargs)
+            finally:
+                with lock: active[0] -= 1
+
+        with patch("main.call_llm", side_effect=slow_llm):
+            results = run_parallel_text_stage(chapters, paths, GlossaryStore(paths["glossary"]), threading.Event(), False, None, workers=2)
+        self.assertEqual(sorted(results), [1, 2, 3, 4])
+        self.assertTrue(all(len(lines) == 2 for lines in results.values()))
+        self.assertGreaterEqual(peak[0], 2)
+
+    def test_failed_chapter_is_skipped(self):
+        """Test that one chapter raising in the parallel text stage leaves the other chapters' results in place."""
+        from main import setup_directories, run_parallel_text_stage
+        novel_dir = self.test_dir / "Novel"
+        (novel_dir / "01_Raw_Text").mkdir(parents=True)
+        paths = setup_directories(novel_dir)
+        chapters = []
+        for n in range(1, 4):
+            path = paths["raw"] / f"ch_{n:03d}.txt"
+            path.write_text("林动走了。\n天黑了。" if n != 2 else "坏掉的章节。", encoding='utf-8')
+            chapters.append(Chapter("Novel", path.name, None, n, path))
+
+        def flaky_llm(system_prompt, user_text, model=None):
+            if "坏掉" in user_text: raise ConnectionError("LLM connection reset")
+            return fake_llm(system_prompt, user_text, model)
+
+        with patch("main.call_llm", side_effect=flaky_llm):
+            results = run_parallel_text_stage(chapters, paths, GlossaryStore(paths["glossary"]), threading.Event(), False, None, workers=2)
+        self.assertEqual(sorted(results), [1, 3])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,115 @@
+import unittest
+import sys
+import shutil
+import tempfile
+from pathlib import Path
+from ebooklib import epub
+
+# Add the parent directory to the path so we can import ingest.py
+sys.path.append(str(Path(__file__).parent.parent))
+
+from ingest import detect_encoding, ingest_source, ingest_text, normalize_line, is_chapter_heading
+from chapter_index import ChapterIndex
+
+NOVEL = "书名：测试\n\n第一章　开始\n\n　　他走了进来。\n\n\n\n　　“你好。”\n第2章 继续\n　　她笑了。\n第一百零三回 结局\n　　完。\n"
+
+class TestIngestText(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = Path(tempfile.mkdtemp())
+        self.raw_dir = self.test_dir / "Novel" / "01_Raw_Text"
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def write_source(self, text, encoding, name="novel.txt"):
+        path = self.test_dir / name
+        path.write_bytes(text.encode(encoding))
+        return path
+
+    def test_detects_common_encodings(self):
+        """Test BOM, UTF-8 and GBK/GB18030 detection."""
+        self.assertEqual(detect_encoding(self.write_source(NOVEL, "utf-8")), "utf-8")
+        self.assertEqual(detect_encoding(self.write_source(NOVEL, "utf-8-sig")), "utf-8-sig")
+        self.assertEqual(detect_encoding(self.write_source(NOVEL, "utf-16")), "utf-16")
+        self.assertEqual(detect_encoding(self.write_source(NOVEL, "gbk")), "gb18030")
+
+    def test_splits_gbk_novel_on_headings(self):
+        """Test that a GBK file becomes numbered UTF-8 chapters with normalized whitespace."""
+        report = ingest_source(self.write_source(NOVEL, "gbk"), self.raw_dir)
+        self.assertEqual(report["chapters"], 3)
+        self.assertEqual(report["encoding"], "gb18030")
+
+        files = sorted(p.name for p in self.raw_dir.iterdir())
+        self.assertEqual(files, ["ch_0001.txt", "ch_0002.txt", "ch_0003.txt", "front_matter.txt"])
+        self.assertEqual((self.raw_dir / "ch_0001.txt").read_text(encoding='utf-8'), "第一章 开始\n\n他走了进来。\n\n“你好。”\n")
+        self.assertEqual((self.raw_dir / "ch_0003.txt").read_text(encoding='utf-8'), "第一百零三回 结局\n完。\n")
+
+        index = ChapterIndex(self.raw_dir, self.test_dir / "index.json").refresh()
+        self.assertEqual([e.chapter_number for e in index.chapters()], [1, 2, 3])
+
+    def test_falls_back_when_utf8_guess_breaks_later(self):
+        """Test that GBK text after an ASCII-only sample triggers a GB18030 re-run instead of a crash."""
+        source = self.write_source("x" * 64 + "\n" + NOVEL, "gbk")
+        report = ingest_text(source, self.raw_dir, encoding=detect_encoding(source, sample_bytes=16))
+        self.assertEqual(report["encoding"], "gb18030")
+        self.assertEqual(report["chapters"], 3)
+
+    def test_refuses_existing_chapters(self):
+        """Test that ingesting never mixes a new book into existing chapter files."""
+        self.raw_dir.mkdir(parents=True)
+        (self.raw_dir / "ch_0001.txt").write_text("old", encoding='utf-8')
+        with self.assertRaises(FileExistsError):
+            ingest_source(self.write_source(NOVEL, "utf-8"), self.raw_dir)
+
+    def test_heading_and_whitespace_rules(self):
+        """Test the heading regex limits and full-width whitespace folding."""
+        self.assertTrue(is_chapter_heading("第12章 标题"))
+        self.assertTrue(is_chapter_heading("第１２章"))
+        self.assertFalse(is_chapter_heading("他翻到第三章"))
+        self.assertFalse(is_chapter_heading("第三章" + "说" * 60))
+        self.assertEqual(normalize_line("　　他　　说： 好。​\r\n"), "他 说： 好。")
+
+class TestIngestEpub(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = Path(tempfile.mkdtemp())
+        self.raw_dir = self.test_dir / "01_Raw_Text"
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def make_epub(self, bodies):
+        book = epub.EpubBook()
+        book.set_identifier("test")
+        book.set_title("Test")
+        book.set_language("zh")
+        chapters = []
+        for i, body in enumerate(bodies):
+            item = epub.EpubHtml(title=f"c{i}", file_name=f"c{i}.xhtml", lang="zh")
+            item.content = f"<html><body>{body}</body></html>"
+            book.add_item(item)
+            chapters.append(item)
+        book.spine = chapters
+        book.add_item(epub.EpubNcx())
+        book.add_item(epub.EpubNav())
+        path = self.test_dir / "book.epub"
+        epub.write_epub(str(path), book)
+        return path
+
+    def test_epub_without_headings_uses_documents(self):
+        """Test that each spine document becomes a chapter when the book has no 第X章 lines."""
+        path = self.make_epub(["<h1>序</h1><p>　　开始。</p>", "<h2>风起</h2><p>他来了。</p><p>她走了。</p>"])
+        report = ingest_source(path, self.raw_dir)
+        self.assertEqual(report["chapters"], 2)
+        self.assertEqual((self.raw_dir / "ch_0002.txt").read_text(encoding='utf-8'), "风起\n他来了。\n她走了。\n")
+
+    def test_epub_with_headings_splits_on_them(self):
+        """Test that heading lines win over document boundaries."""
+        path = self.make_epub(["<p>第一章 开始</p><p>甲。</p><p>第二章 继续</p><p>乙。</p>"])
+        report = ingest_source(path, self.raw_dir)
+        self.assertEqual(report["chapters"], 2)
+        self.assertEqual((self.raw_dir / "ch_0002.txt").read_text(encoding='utf-8'), "第二章 继续\n乙。\n")
+
+if __name__ == '__main__':
+    unittest.main()
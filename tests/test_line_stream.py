@@ -0,0 +1,68 @@
+import unittest
+import json
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+
+# Add the parent directory to the path so we can import line_stream.py
+sys.path.append(str(Path(__file__).parent.parent))
+
+from line_stream import iter_json_array, write_json_array, JsonArrayWriter, ChapterLines
+
+LINES = [{"cn": "你好" * i, "py": "nǐ hǎo", "nat": f"Hello {i}", "lit": "you good", "emo": "Calm narrative", "tags": [i, None, {"x": "]"}]} for i in range(200)]
+
+class TestLineStream(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = Path(tempfile.mkdtemp())
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def test_writer_matches_json_dumps(self):
+        """Test that the incremental writer produces the same file as json.dumps(indent=4)."""
+        path = self.test_dir / "ch.json"
+        self.assertEqual(write_json_array(path, iter(LINES)), len(LINES))
+        self.assertEqual(path.read_text(encoding='utf-8'), json.dumps(LINES, ensure_ascii=False, indent=4))
+        write_json_array(path, [])
+        self.assertEqual(json.loads(path.read_text(encoding='utf-8')), [])
+
+    def test_reader_with_tiny_buffer(self):
+        """Test that items split across reads are reassembled, including compact and pretty files."""
+        pretty, compact = self.test_dir / "pretty.json", self.test_dir / "compact.json"
+        write_json_array(pretty, LINES)
+        compact.write_text(json.dumps(LINES, ensure_ascii=False), encoding='utf-8')
+        for path in (pretty, compact):
+            self.assertEqual(list(iter_json_array(path, buffer_chars=5)), LINES)
+
+    def test_reader_rejects_truncated_file(self):
+        path = self.test_dir / "broken.json"
+        path.write_text(json.dumps(LINES, ensure_ascii=False)[:-30], encoding='utf-8')
+        with self.assertRaises(ValueError):
+            list(iter_json_array(path, buffer_chars=64))
+
+    def test_failed_write_keeps_previous_file(self):
+        """Test that an exception while streaming leaves the old file in place and no temp file behind."""
+        path = self.test_dir / "ch.json"
+        write_json_array(path, LINES[:3])
+        with self.assertRaises(RuntimeError):
+            with JsonArrayWriter(path) as writer:
+                writer.write(LINES[5])
+                raise RuntimeError("stopped")
+        self.assertEqual(list(iter_json_array(path)), LINES[:3])
+        self.assertEqual([p.name for p in self.test_dir.iterdir()], ["ch.json"])
+
+    def test_chapter_lines_chains_files(self):
+        """Test that a view over several files iterates them in order and can be iterated twice."""
+        first, second = self.test_dir / "a.json", self.test_dir / "b.json"
+        write_json_array(first, LINES[:50])
+        write_json_array(second, LINES[50:])
+        lines = ChapterLines(first, second)
+        self.assertEqual(len(lines), len(LINES))
+        self.assertEqual(list(lines), LINES)
+        self.assertEqual([line["nat"] for line in lines][-1], LINES[-1]["nat"])
+        self.assertFalse(ChapterLines(first, count=0))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+import unittest
+import sys
+from pathlib import Path
+from unittest.mock import patch
+
+# Add the parent directory to the path so we can import llm_tiers.py
+sys.path.append(str(Path(__file__).parent.parent))
+
+import llm_tiers
+from llm_tiers import check_draft, request_lines, model_for, TIER_STATS
+from config import LLM_MODEL
+
+CHUNK = {1: "林动走进了青阳镇的大门。", 2: "天色已晚。"}
+GLOSSARY = {"characters": {"林动": {"english_name": "Lin Dong"}}, "places": {"青阳镇": {"english_name": "Qingyang Town"}}}
+
+class FakeLLM:
+    """Records calls and answers per model from a dict of canned outputs."""
+    def __init__(self, outputs):
+        self.outputs = outputs
+        self.models = []
+
+    def __call__(self, system_prompt, user_text, model=None):
+        self.models.append(model)
+        return self.outputs[model]
+
+class TestDraftChecks(unittest.TestCase):
+
+    def test_good_draft_passes(self):
+        """Test that a complete translation using the glossary names is accepted."""
+        parsed = {1: "Lin Dong walked through the gate of Qingyang Town.", 2: "It was late."}
+        self.assertEqual(check_draft("natural", CHUNK, parsed, GLOSSARY), [])
+
+    def test_flags_each_problem(self):
+        """Test missing lines, leftover Han, wrong glossary names and length outliers."""
+        parsed = {1: "Lin Dong walked through the gate of 青阳镇.", 2: ""}
+        flags = check_draft("natural", CHUNK, parsed, GLOSSARY)
+        self.assertTrue(any("missing" in f for f in flags))
+        self.assertTrue(any("untranslated Han" in f for f in flags))
+        self.assertTrue(any("Qingyang Town" in f for f in flags))
+
+        parsed = {1: "Lin Dong, Qingyang Town" + " and so on" * 20, 2: "It was late."}
+        self.assertTrue(any("length ratio" in f for f in check_draft("literal", CHUNK, parsed, GLOSSARY)))
+
+    def test_emotion_tags_must_be_in_vocab(self):
+        """Test that drafted emotion tags are checked against EMOTION_VOCAB."""
+        self.assertEqual(check_draft("emotion", CHUNK, {1: "Calm narrative", 2: "Happy"}), [])
+        self.assertEqual(len(check_draft("emotion", CHUNK, {1: "calm-ish", 2: "Happy"})), 1)
+
+class TestTieredRequests(unittest.TestCase):
+
+    def test_single_tier_without_draft_model(self):
+        """Test that every prompt goes straight to LLM_MODEL when no draft model is configured."""
+        llm = FakeLLM({LLM_MODEL: "1. a\n2. b"})
+        with patch.object(llm_tiers, "LLM_DRAFT_MODEL", None):
+            self.assertEqual(model_for("natural"), LLM_MODEL)
+            self.assertEqual(request_lines("natural", "sys", "user", CHUNK, GLOSSARY, llm=llm), {1: "a", 2: "b"})
+        self.assertEqual(llm.models, [LLM_MODEL])
+
+    def test_accepted_draft_skips_big_model(self):
+        """Test that a clean draft is used as-is."""
+        llm = FakeLLM({"small": "1. Lin Dong walked through the gate of Qingyang Town.\n2. It was late."})
+        before = TIER_STATS.snapshot().get("natural", (0, 0))
+        with patch.object(llm_tiers, "LLM_DRAFT_MODEL", "small"):
+            request_lines("natural", "sys", "user", CHUNK, GLOSSARY, llm=llm)
+            self.assertEqual(model_for("json"), LLM_MODEL) # json stays on the main tier by default
+        self.assertEqual(llm.models, ["small"])
+        self.assertEqual(TIER_STATS.snapshot()["natural"], (before[0] + 1, before[1]))
+
+    def test_flagged_draft_escalates(self):
+        """Test that a flagged chunk is redone by LLM_MODEL and its answer wins."""
+        llm = FakeLLM({"small": "1. 林动 walked in.\n2. It was late.", LLM_MODEL: "1. Lin Dong walked into Qingyang Town.\n2. Night fell."})
+        before = TIER_STATS.snapshot().get("natural", (0, 0))
+        with patch.object(llm_tiers, "LLM_DRAFT_MODEL", "small"):
+            result = request_lines("natural", "sys", "user", CHUNK, GLOSSARY, llm=llm)
+        self.assertEqual(llm.models, ["small", LLM_MODEL])
+        self.assertEqual(result[2], "Night fell.")
+        self.assertEqual(TIER_STATS.snapshot()["natural"], (before[0] + 1, before[1] + 1))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+import unittest
+import sys
+import io
+import queue
+import shutil
+import tempfile
+from pathlib import Path
+
+# Add the parent directory to the path so we can import log_sink.py
+sys.path.append(str(Path(__file__).parent.parent))
+
+from log_sink import LogSink, Scrollback, drain_queue, create_log_file
+
+class TestLogSink(unittest.TestCase):
+
+    def test_write_tees_and_enqueues(self):
+        """Test that writes reach the original stream and the queue, without touching any widget."""
+        original = io.StringIO()
+        log_queue = queue.SimpleQueue()
+        sink = LogSink(original, log_queue)
+        sink.write("hello ")
+        sink.write("world\n")
+        sink.flush()
+        self.assertEqual(original.getvalue(), "hello world\n")
+        self.assertEqual(drain_queue(log_queue), "hello world\n")
+        self.assertTrue(log_queue.empty())
+
+    def test_drain_strips_ansi_and_caps_chunks(self):
+        """Test that a drain joins queued writes, removes color codes and respects max_chunks."""
+        log_queue = queue.SimpleQueue()
+        for i in range(5):
+            log_queue.put(f"\x1b[32mline {i}\x1b[0m\n")
+        self.assertEqual(drain_queue(log_queue, max_chunks=3), "line 0\nline 1\nline 2\n")
+        self.assertEqual(drain_queue(log_queue), "line 3\nline 4\n")
+        self.assertEqual(drain_queue(log_queue), "")
+
+class TestScrollback(unittest.TestCase):
+
+    def test_overflow_matches_widget_lines(self):
+        """Test that add() reports how many top lines to drop so only max_lines remain."""
+        scrollback = Scrollback(max_lines=3)
+        self.assertEqual(scrollback.add("a\nb"), 0)
+        self.assertEqual(scrollback.add("c\n"), 0)
+        self.assertEqual(scrollback.text(), "a\nbc\n")
+        self.assertEqual(scrollback.add("d\ne\n"), 2)
+        self.assertEqual(scrollback.text(), "d\ne\n")
+
+class TestLogFile(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = Path(tempfile.mkdtemp())
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def test_writes_chunks_verbatim(self):
+        """Test that the rotating log file gets the text exactly as drained."""
+        path = self.test_dir / "logs" / "gui.log"
+        logger = create_log_file(path, max_bytes=1024, backup_count=2)
+        logger.info("first\n")
+        logger.info("second\n")
+        for handler in logger.handlers: handler.flush()
+        self.assertEqual(path.read_text(encoding='utf-8'), "first\nsecond\n")
+        for handler in list(logger.handlers):
+            handler.close()
+            logger.removeHandler(handler)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+import unittest
+import random
+import sys
+from pathlib import Path
+
+# Add the parent directory to the path so we can import pinyin_engine.py
+sys.path.append(str(Path(__file__).parent.parent))
+
+from pinyin_engine import GlossaryPinyin, split_name_pinyin, strip_tones
+from utils import generate_pinyin
+
+GLOSSARY = {
+    "characters": {
+        "单于": {"pinyin": "Shàn Yú", "english_name": "Shan Yu"},
+        "曾阿牛": {"pinyin": "Zeng Aniu", "english_name": "Zeng Aniu"},
+        "林动": {"pinyin": "Lin X", "english_name": "Lin Dong"}, # Doesn't fit the characters
+        "单": {"pinyin": "Shàn", "english_name": "Shan"}, # Single character: never overrides
+    },
+    "places": {"单于城": {"pinyin": "Chányú Chéng", "english_name": "Chanyu City"}},
+}
+
+class TestNameAlignment(unittest.TestCase):
+
+    def test_spellings(self):
+        """Test that spaced, joined, numbered and toneless readings all align to one syllable per character."""
+        for spelling in ("Shàn Yú", "Shan Yu", "Shan2 Yu2"):
+            self.assertEqual(split_name_pinyin("单于", spelling), ["Shàn", "Yú"], spelling)
+        self.assertEqual(split_name_pinyin("单于", "Shanyu"), ["Shàn", "yú"])
+        self.assertEqual(split_name_pinyin("西安", "Xian"), ["Xī", "ān"])
+        self.assertEqual(split_name_pinyin("绿", "Lv"), ["Lǜ"])
+
+    def test_mismatch(self):
+        """Test that a reading that doesn't fit the characters is rejected."""
+        self.assertIsNone(split_name_pinyin("林动", "Lin X"))
+        self.assertIsNone(split_name_pinyin("林动", ""))
+
+    def test_strip_tones(self):
+        self.assertEqual(strip_tones("Lǚ Xiǎo"), "lü xiao")
+
+class TestGlossaryPinyin(unittest.TestCase):
+
+    def setUp(self):
+        self.engine = GlossaryPinyin(GLOSSARY)
+
+    def test_names_use_glossary(self):
+        """Test that glossary names override pypinyin while the rest of the line is unchanged."""
+        self.assertEqual(generate_pinyin("单于来了"), "chán yú lái le")
+        self.assertEqual(self.engine.convert("单于来了"), "Shàn Yú lái le")
+        self.assertEqual(self.engine.convert("曾阿牛说"), "Zēng Ā niú shuō")
+
+    def test_longest_match(self):
+        """Test that the longest glossary name wins over a shorter one it contains."""
+        self.assertEqual(self.engine.convert("单于城"), "Chán yú Chéng")
+
+    def test_rejected_and_single_chars(self):
+        """Test that unusable readings are reported and single-character entries don't touch other words."""
+        self.assertEqual(self.engine.rejected, ["林动"])
+        self.assertEqual(self.engine.convert("简单"), generate_pinyin("简单"))
+
+    def test_chapter_matches_line_by_line(self):
+        """Test that one whole-chapter call gives the same pinyin as converting each line."""
+        rng = random.Random(7)
+        alphabet = "天地人你我他说走看来去的了是在不有长乐单于曾阿牛城行重，。“”！？ abc12"
+        lines = ["".join(rng.choice(alphabet) for _ in range(rng.randint(0, 30))) for _ in range(500)]
+        self.assertEqual(self.engine.convert_lines(lines), [self.engine.convert(line) for line in lines])
+        self.assertEqual(GlossaryPinyin().convert_lines(lines), [generate_pinyin(line) for line in lines])
+        self.assertEqual(self.engine.convert_lines([]), [])
+
+if __name__ == '__main__':
+    unittest.main()
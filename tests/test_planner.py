@@ -0,0 +1,98 @@
+import unittest
+import os
+import sys
+import shutil
+import subprocess
+import tempfile
+from pathlib import Path
+
+# Add the parent directory to the path so we can import planner.py
+sys.path.append(str(Path(__file__).parent.parent))
+
+from planner import plan_novel, format_plan, record_text_run, count_han
+from utils import chunk_text_into_numbered_lines, novel_paths
+
+ROOT = Path(__file__).parent.parent
+CHAPTER_TEXT = "\n".join(f"林动走进了青阳镇，第{i}次看见那座山。" for i in range(60))
+
+class TestPlanner(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = Path(tempfile.mkdtemp())
+        self.novel_dir = self.test_dir / "Novels" / "Test_Novel"
+        self.paths = novel_paths(self.novel_dir)
+        for key in ("raw", "trans", "anki", "cache"):
+            self.paths[key].mkdir(parents=True)
+        for n in range(1, 4):
+            (self.paths["raw"] / f"ch_{n:03d}.txt").write_text(CHAPTER_TEXT, encoding='utf-8')
+        self.chunks = chunk_text_into_numbered_lines(CHAPTER_TEXT)
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def test_counts_work_and_cache_state(self):
+        """Test that finished, partly cached and untouched chapters are told apart."""
+        (self.paths["trans"] / "ch_001.json").write_text("[]", encoding='utf-8')
+        (self.paths["anki"] / "Ch_001.apkg").write_bytes(b"")
+        media = self.paths["media"] / "ch_0001"
+        media.mkdir(parents=True)
+        for idx in range(60): (media / f"ch01_L{idx:04d}.opus").write_bytes(b"x")
+        partial = self.paths["cache"] / "ch_0002"
+        partial.mkdir()
+        (partial / "chunk_0000.json").write_text("[]", encoding='utf-8')
+        (partial / "chunk_0099.json").write_text("[]", encoding='utf-8') # Stale, beyond the current chunking
+
+        plan = plan_novel(self.novel_dir)
+        first, second, third = plan.chapters
+        self.assertEqual([c.lines for c in plan.chapters], [60, 60, 60])
+        self.assertEqual(first.chunks, len(self.chunks))
+        self.assertEqual(first.han, count_han(CHAPTER_TEXT))
+        self.assertEqual((first.text_lines_done, first.audio_done, first.exported), (60, 60, True))
+        self.assertEqual((second.chunks_done, second.text_lines_done), (1, len(self.chunks[0])))
+        self.assertEqual((third.text_lines_done, third.audio_done), (0, 0))
+        self.assertEqual(plan.text_lines_left, 120 - len(self.chunks[0]))
+        self.assertEqual(plan.audio_lines_left, 120)
+        self.assertGreater(plan.input_tokens, plan.output_tokens)
+        self.assertFalse(plan.text_rate_recorded or plan.tts_rate_recorded or plan.tokens_recorded)
+        self.assertEqual([c.chapter_number for c in plan_novel(self.novel_dir, start_chapter=3).chapters], [3])
+        self.assertIn("Chapters: 3 | translated 1 | audio complete 1 | exported 1", format_plan(plan)[0])
+
+    def test_uses_recorded_throughput(self):
+        record_text_run(self.paths["throughput"], lines=100, han=2000, seconds=50, prompt_tokens=9000, eval_tokens=4000)
+        record_text_run(self.paths["throughput"], lines=100, han=2000, seconds=50, prompt_tokens=9000, eval_tokens=4000)
+        plan = plan_novel(self.novel_dir)
+        han = count_han(CHAPTER_TEXT) * 3
+        self.assertTrue(plan.tokens_recorded and plan.text_rate_recorded)
+        self.assertAlmostEqual(plan.text_lines_per_sec, 2.0)
+        self.assertAlmostEqual(plan.input_tokens, han * 4.5)
+        self.assertAlmostEqual(plan.output_tokens, han * 2.0)
+
+    def test_plan_writes_nothing(self):
+        """Test that planning a fresh novel, and one with a TTS queue, leaves every file as it was."""
+        from tts_queue import TTSJobQueue
+        snapshot = lambda: {path: path.stat().st_mtime_ns for path in self.test_dir.rglob("*")}
+        before = snapshot()
+        plan_novel(self.novel_dir)
+        self.assertEqual(snapshot(), before)
+
+        with TTSJobQueue(self.paths["tts_queue"]) as queue:
+            queue.enqueue_chapter(1, [(0, "林动。", "Calm narrative", str(self.test_dir / "a.opus"), False)])
+        before = snapshot()
+        plan_novel(self.novel_dir)
+        self.assertEqual(snapshot(), before)
+
+    def test_cli_plan_loads_no_models(self):
+        """Test that `cli.py --plan` neither imports torch nor the pipeline (main)."""
+        script = (
+            "import sys, runpy\n"
+            "sys.argv = ['cli.py', 'Test_Novel', '--plan']\n"
+            f"runpy.run_path({str(ROOT / 'cli.py')!r}, run_name='__main__')\n"
+            "assert 'torch' not in sys.modules and 'main' not in sys.modules and 'tts_engine' not in sys.modules, 'models loaded'\n"
+        )
+        result = subprocess.run([sys.executable, "-c", script], cwd=self.test_dir, capture_output=True, text=True, encoding='utf-8',
+                                env={**os.environ, "PYTHONPATH": str(ROOT), "PYTHONIOENCODING": "utf-8"})
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertIn("Lines: 180", result.stdout)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+import unittest
+import sys
+import threading
+from pathlib import Path
+
+# Add the parent directory to the path so we can import progress.py
+sys.path.append(str(Path(__file__).parent.parent))
+
+from progress import ProgressBus, ProgressEvent, ProgressState, drain_events, get_rss_mb, sparkline, STAGE, CHAPTER, LINE, LLM, MODEL
+
+class TestProgressBus(unittest.TestCase):
+
+    def test_fan_out_to_every_subscriber(self):
+        """Test that each subscriber gets its own copy of the stream, in order."""
+        bus = ProgressBus()
+        first, second = bus.subscribe(), bus.subscribe()
+        bus.publish(ProgressEvent(STAGE, label="text"))
+        bus.publish(ProgressEvent(LINE, done=1, total=2))
+        self.assertEqual([e.kind for e in drain_events(first)], [STAGE, LINE])
+        self.assertEqual(len(drain_events(second)), 2)
+
+        bus.unsubscribe(first)
+        bus.publish(ProgressEvent(LINE, done=2, total=2))
+        self.assertEqual(drain_events(first), [])
+        self.assertEqual(len(drain_events(second)), 1)
+
+    def test_publish_from_threads(self):
+        """Test that concurrent publishers don't lose events."""
+        bus = ProgressBus()
+        sink = bus.subscribe()
+        threads = [threading.Thread(target=lambda: [bus.publish(ProgressEvent(LINE)) for _ in range(500)]) for _ in range(4)]
+        for t in threads: t.start()
+        for t in threads: t.join()
+        self.assertEqual(len(drain_events(sink)), 2000)
+
+    def test_broken_subscriber_is_ignored(self):
+        """Test that a failing consumer never raises into the pipeline."""
+        class Broken:
+            def put(self, event): raise OSError("pipe closed")
+        bus = ProgressBus()
+        bus.subscribe(Broken())
+        healthy = bus.subscribe()
+        bus.publish(ProgressEvent(STAGE))
+        self.assertEqual(len(drain_events(healthy)), 1)
+
+class TestProgressState(unittest.TestCase):
+
+    def test_folds_counts_and_rates(self):
+        """Test that line events become a fraction and a lines/s series."""
+        state = ProgressState()
+        state.apply(ProgressEvent(CHAPTER, chapter=3, done=1, total=4))
+        state.apply(ProgressEvent(STAGE, label="audio", chapter=3))
+        state.apply(ProgressEvent(LINE, stage="audio", chapter=3, done=10, total=40, time=100.0))
+        state.apply(ProgressEvent(LINE, stage="audio", chapter=3, done=30, total=40, time=110.0))
+        state.apply(ProgressEvent(LLM, value=42.0))
+        state.apply(ProgressEvent(MODEL, label="loaded"))
+
+        self.assertEqual(state.chapter_fraction(), 0.25)
+        self.assertEqual(state.line_fraction(), 0.75)
+        self.assertAlmostEqual(state.latest["lines_per_sec"], 2.0)
+        self.assertEqual(list(state.history[LLM]), [42.0])
+        self.assertIn("2.00 lines/s", state.summary())
+        self.assertIn("TTS loaded", state.summary())
+
+    def test_rate_resets_between_stages(self):
+        """Test that a new stage's counter doesn't produce a bogus rate against the old one."""
+        state = ProgressState()
+        state.apply(ProgressEvent(LINE, stage="text", chapter=1, done=5, total=10, time=0.0))
+        state.apply(ProgressEvent(STAGE, label="audio", chapter=1))
+        state.apply(ProgressEvent(LINE, stage="audio", chapter=1, done=8, total=10, time=1.0))
+        self.assertEqual(len(state.history["lines_per_sec"]), 0)
+
+class TestHelpers(unittest.TestCase):
+
+    def test_sparkline(self):
+        """Test that the sparkline spans the block range and keeps only the last width values."""
+        self.assertEqual(sparkline([0, 1, 2, 3, 4, 5, 6, 7]), "▁▂▃▄▅▆▇█")
+        self.assertEqual(len(sparkline(range(100), width=10)), 10)
+        self.assertEqual(sparkline([]), "")
+
+    def test_rss_is_reported(self):
+        """Test that the process memory reading works on this platform."""
+        self.assertGreater(get_rss_mb(), 1.0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,132 @@
+import unittest
+import sys
+import json
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from pathlib import Path
+import ollama
+from unittest import mock
+
+# Add the parent directory to the path so we can import utils.py and prompts.py
+sys.path.append(str(Path(__file__).parent.parent))
+
+import utils
+from utils import call_llm, get_relevant_glossary, set_llm_client, LLM_STATS
+from prompts import prompt_natural, prompt_literal, with_glossary
+
+class FakeOllamaHandler(BaseHTTPRequestHandler):
+    """Answers /api/chat like Ollama and simulates its prefix cache: only the characters after the longest common prefix count as evaluated."""
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        request = json.loads(body)
+        server = self.server
+        if self.path == "/api/generate": # Only used to unload models
+            server.generates.append(request)
+            return self.reply({"model": request["model"], "created_at": "2024-01-01T00:00:00Z", "done": True, "response": ""})
+        server.requests.append((body, request))
+
+        rendered = "".join(f"<{m['role']}>{m['content']}" for m in request["messages"])
+        cached = max((len(_common_prefix(rendered, old)) for old in server.cache), default=0)
+        server.cache = (server.cache + [rendered])[-4:] # A few server slots
+
+        lines = request["messages"][-1]["content"].split("\n\nGLOSSARY")[0].count("\n") + 1
+        reply = {
+            "model": request["model"], "created_at": "2024-01-01T00:00:00Z", "done": True,
+            "message": {"role": "assistant", "content": "\n".join(f"{i}. ok" for i in range(1, lines + 1))},
+            "prompt_eval_count": len(rendered) - cached, "eval_count": 10, "eval_duration": 10**8,
+        }
+        self.reply(reply)
+
+    def reply(self, reply):
+        payload = json.dumps(reply).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+def _common_prefix(a, b):
+    n = 0
+    for x, y in zip(a, b):
+        if x != y: break
+        n += 1
+    return a[:n]
+
+GLOSSARY = {
+    "characters": {"林动": {"english_name": "Lin Dong"}, "小貂": {"english_name": "Little Marten"}},
+    "places": {"青阳镇": {"english_name": "Qingyang Town"}},
+    "items": {}, "skills": {},
+}
+CHUNKS = ["1. 林动走进了青阳镇。\n2. 天色已晚。", "1. 小貂跳了出来。\n2. 林动笑了。"]
+
+class TestPromptPrefixCache(unittest.TestCase):
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), FakeOllamaHandler)
+        self.server.requests, self.server.cache, self.server.generates = [], [], []
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.previous_client = utils._llm_client
+        set_llm_client(ollama.Client(host=f"http://127.0.0.1:{self.server.server_port}"))
+
+    def tearDown(self):
+        set_llm_client(self.previous_client)
+        self.server.shutdown()
+        self.server.server_close()
+
+    def translate(self, chunk):
+        user_text = with_glossary(chunk, get_relevant_glossary(chunk, GLOSSARY))
+        call_llm(prompt_natural(), user_text)
+        call_llm(prompt_literal(), user_text)
+
+    def test_system_prefix_is_byte_identical_across_chunks(self):
+        """Test that chunks with different glossaries send the exact same bytes up to the end of the system message."""
+        for chunk in CHUNKS: self.translate(chunk)
+        natural = [req for _, req in self.server.requests if req["messages"][0]["content"] == prompt_natural()]
+        self.assertEqual(len(natural), 2)
+
+        prefixes = []
+        for body, request in self.server.requests[0::2]:
+            system = json.dumps(request["messages"][0]["content"], ensure_ascii=False)[1:-1].encode("utf-8")
+            end = body.find(system) + len(system)
+            self.assertGreater(end, len(system))
+            prefixes.append(body[:end])
+        self.assertEqual(prefixes[0], prefixes[1])
+
+        # The variable parts only live in the user message, with the glossary last.
+        user = natural[1]["messages"][1]["content"]
+        self.assertTrue(user.startswith(CHUNKS[1]))
+        self.assertIn("Little Marten", user.split("GLOSSARY:")[1])
+        self.assertNotIn("Qingyang Town", user)
+
+    def test_keep_alive_and_prompt_eval_stats(self):
+        """Test that calls pin the model with keep_alive and later chunks evaluate fewer prompt tokens."""
+        before = LLM_STATS.snapshot()
+        self.translate(CHUNKS[0])
+        first = LLM_STATS.snapshot()["prompt_eval_tokens"] - before["prompt_eval_tokens"]
+        self.translate(CHUNKS[1])
+        second = LLM_STATS.snapshot()["prompt_eval_tokens"] - before["prompt_eval_tokens"] - first
+
+        self.assertTrue(all(req.get("keep_alive") for _, req in self.server.requests))
+        self.assertLess(second, first)
+        self.assertEqual(LLM_STATS.snapshot()["calls"] - before["calls"], 4)
+
+    def test_audio_stage_unloads_every_text_model(self):
+        """Test that the main and the draft model are both unloaded with keep_alive=0 before synthesis."""
+        import main
+        host = f"http://127.0.0.1:{self.server.server_port}"
+        with mock.patch.object(main, "OLLAMA_HOST", host), mock.patch.object(main, "LLM_MODEL", "main-model"), \
+             mock.patch.object(main, "LLM_DRAFT_MODEL", "draft-model"):
+            main.unload_llm_models()
+        self.assertEqual([(req["model"], req["keep_alive"]) for req in self.server.generates], [("main-model", 0), ("draft-model", 0)])
+
+        self.server.generates.clear()
+        with mock.patch.object(main, "OLLAMA_HOST", host), mock.patch.object(main, "LLM_MODEL", "main-model"), \
+             mock.patch.object(main, "LLM_DRAFT_MODEL", ""):
+            main.unload_llm_models()
+        self.assertEqual([req["model"] for req in self.server.generates], ["main-model"])
+
+if __name__ == '__main__':
+    unittest.main()
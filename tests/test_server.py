@@ -0,0 +1,149 @@
+import unittest
+import sys
+import json
+import time
+import types
+import shutil
+import tempfile
+import threading
+import importlib.machinery
+import urllib.request
+import urllib.error
+from pathlib import Path
+from unittest.mock import patch
+import numpy as np
+
+# Fake the Flash Attention module (as in test_pipeline_mock.py) so qwen_tts imports without it
+mock_flash = types.ModuleType("flash_attn")
+mock_flash.__spec__ = importlib.machinery.ModuleSpec(name="flash_attn", loader=None)
+sys.modules.setdefault("flash_attn", mock_flash)
+
+# Add the parent directory to the path so we can import server.py
+sys.path.append(str(Path(__file__).parent.parent))
+
+from server import JobService, make_server, DONE, CANCELLED
+
+def fake_llm(system_prompt, user_text, model=None):
+    lines = [line for line in user_text.split("\n\n")[0].split("\n") if ". " in line]
+    if "JSON" in system_prompt: return "{}"
+    if "audiobook director" in system_prompt: return "\n".join(f"{n}. Calm narrative" for n in range(1, len(lines) + 1))
+    return "\n".join(f"{n}. Line {n}." for n in range(1, len(lines) + 1))
+
+def fake_generate(text, **kwargs):
+    count = len(text) if isinstance(text, list) else 1
+    return [np.full(24000, 0.1, dtype=np.float32) for _ in range(count)], 24000
+
+class TestJobServer(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = Path(tempfile.mkdtemp())
+        self.root = self.test_dir / "Novels"
+        for novel in ("Novel_A", "Novel_Slow"):
+            raw = self.root / novel / "01_Raw_Text"
+            raw.mkdir(parents=True)
+            for n in (1, 2):
+                (raw / f"ch_{n:03d}.txt").write_text(f"第{n}章。\n林动走了。", encoding='utf-8')
+
+        self.patches = [patch("main.call_llm", side_effect=self.llm), patch("main.ollama"), patch("qwen_tts.Qwen3TTSModel")]
+        self.mock_llm, _, self.tts_class = [p.start() for p in self.patches]
+        self.tts_class.from_pretrained.return_value.generate_custom_voice.side_effect = fake_generate
+        self.slow_started, self.slow_job = threading.Event(), None
+        self.tts_loaded_during_llm = [] # Whether the resident TTS model was in memory at each LLM call
+
+        self.service = JobService(self.root).start()
+        self.server = make_server(self.service, "127.0.0.1", 0)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.service.close(timeout=10)
+        for p in self.patches: p.stop()
+        from tts_engine import set_model_loader, load_tts_model
+        set_model_loader(load_tts_model)
+        shutil.rmtree(self.test_dir)
+
+    def llm(self, system_prompt, user_text, model=None):
+        import tts_engine
+        loader = tts_engine._model_loader
+        self.tts_loaded_during_llm.append(isinstance(loader, tts_engine.ResidentModel) and loader.model is not None)
+        if self.slow_job is not None and "林动" in user_text:
+            # Novel_Slow blocks inside the LLM until its job is cancelled
+            self.slow_started.set()
+            while not self.slow_job.stop_event.wait(0.05): pass
+        return fake_llm(system_prompt, user_text, model)
+
+    def request(self, method, path, body=None):
+        data = json.dumps(body).encode() if body is not None else None
+        req = urllib.request.Request(self.url + path, data=data, method=method, headers={"Content-Type": "application/json"})
+        try:
+            with urllib.request.urlopen(req, timeout=10) as resp:
+                return resp.status, json.loads(resp.read())
+        except urllib.error.HTTPError as e:
+            return e.code, json.loads(e.read())
+
+    def wait_for(self, job_id, timeout=60):
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            status, job = self.request("GET", f"/jobs/{job_id}")
+            if job["status"] not in ("queued", "running"): return job
+            time.sleep(0.05)
+        self.fail(f"job {job_id} did not finish")
+
+    def test_jobs_run_end_to_end_with_resident_model(self):
+        """
+        Test that queued jobs run one after another in the worker, the TTS model is unloaded before every LLM call,
+        and audio that needs no LLM reuses the resident model.
+        """
+        self.assertEqual(self.request("GET", "/novels"), (200, {"novels": ["Novel_A", "Novel_Slow"]}))
+        status, first = self.request("POST", "/jobs", {"novel": "Novel_A", "start": 1, "end": 1})
+        self.assertEqual(status, 201)
+        _, second = self.request("POST", "/jobs", {"novel": "Novel_A", "start": 2})
+        _, plan = self.request("POST", "/jobs", {"novel": "Novel_A", "mode": "plan"})
+
+        self.assertEqual(self.wait_for(first["id"])["status"], DONE)
+        novel_dir = self.root / "Novel_A"
+        self.assertTrue((novel_dir / "02_Translated" / "ch_001.json").exists())
+        self.assertTrue((novel_dir / "04_Anki_Chapters" / "Ch_001.apkg").exists())
+
+        finished = self.wait_for(second["id"])
+        self.assertEqual(finished["status"], DONE)
+        self.assertEqual(finished["progress"]["chapters_done"], 1)
+        self.assertTrue((novel_dir / "media" / "ch_0002" / "ch02_L0001.opus").exists())
+        self.assertEqual(self.tts_class.from_pretrained.call_count, 2) # Unloaded for chapter 2's LLM calls
+        self.assertTrue(self.tts_loaded_during_llm)
+        self.assertFalse(any(self.tts_loaded_during_llm))
+
+        result = self.wait_for(plan["id"])["result"]
+        self.assertIn("translated 2", result[0])
+
+        # Chapter 2 is translated: redoing its audio needs no LLM, so the model loaded for it is still resident
+        for clip in (novel_dir / "media" / "ch_0002").glob("*.opus"): clip.unlink()
+        _, redo = self.request("POST", "/jobs", {"novel": "Novel_A", "start": 2})
+        self.assertEqual(self.wait_for(redo["id"])["status"], DONE)
+        self.assertEqual(self.tts_class.from_pretrained.call_count, 2)
+        self.assertEqual(len(self.request("GET", "/jobs")[1]["jobs"]), 4)
+
+    def test_cancel_running_and_queued(self):
+        _, slow = self.request("POST", "/jobs", {"novel": "Novel_Slow"})
+        self.slow_job = self.service.get(slow["id"])
+        _, queued = self.request("POST", "/jobs", {"novel": "Novel_A"})
+        self.assertTrue(self.slow_started.wait(30))
+
+        status, cancelled = self.request("POST", f"/jobs/{queued['id']}/cancel")
+        self.assertEqual((status, cancelled["status"]), (200, CANCELLED))
+        self.assertEqual(self.request("DELETE", f"/jobs/{slow['id']}")[0], 200)
+        self.assertEqual(self.wait_for(slow["id"])["status"], CANCELLED)
+        self.assertFalse((self.root / "Novel_Slow" / "02_Translated" / "ch_001.json").exists())
+        self.assertFalse((self.root / "Novel_A" / "02_Translated").exists()) # The cancelled queued job never ran
+
+    def test_rejects_bad_requests(self):
+        self.assertEqual(self.request("POST", "/jobs", {"novel": "Missing"})[0], 400)
+        self.assertEqual(self.request("POST", "/jobs", {"novel": "Novel_A", "mode": "fast"})[0], 400)
+        self.assertEqual(self.request("POST", "/jobs", {"novel": "Novel_A", "start": 5, "end": 2})[0], 400)
+        self.assertEqual(self.request("GET", "/jobs/99")[0], 404)
+        self.assertEqual(self.request("POST", "/jobs/99/cancel")[0], 404)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,117 @@
+import unittest
+import sys
+import json
+import shutil
+import sqlite3
+import tempfile
+import zipfile
+from pathlib import Path
+
+# Add the parent directory to the path so we can import shards.py
+sys.path.append(str(Path(__file__).parent.parent))
+
+from chapter_index import ChapterEntry, shard_entries
+from shards import merge_shards, merge_glossaries_by_vote, format_merge_report
+from utils import novel_paths, get_audio_filename
+from line_stream import write_json_array
+from epub_writer import ChapterXhtmlWriter, record_title, read_titles
+from anki_writer import AnkiChapter, write_apkg
+
+def make_chapter(paths, number, label, exported=True):
+    """Writes a chapter's outputs like the pipeline does: JSON, text, XHTML (+ title), audio and, if exported, its .apkg."""
+    for key in ("trans", "epub", "anki"): paths[key].mkdir(parents=True, exist_ok=True)
+    lines = [{"cn": f"第{number}章第{i}句。", "py": "jù", "lit": f"{label} literal {i}", "nat": f"{label} chapter {number} line {i}.", "emo": "Calm narrative"} for i in range(3)]
+    name = f"ch_{number:03d}"
+    write_json_array(paths["trans"] / f"{name}.json", lines)
+    (paths["trans"] / f"{name}.txt").write_text("\n".join(line["nat"] for line in lines), encoding='utf-8')
+    media = paths["media"] / f"ch_{number:04d}"
+    media.mkdir(parents=True, exist_ok=True)
+    with ChapterXhtmlWriter(paths["epub"] / f"{name}.xhtml", number, f"{name}.txt") as writer:
+        for idx, line in enumerate(lines):
+            (media / get_audio_filename(number, idx)).write_bytes(b"OggS " + label.encode())
+            writer.write(line, get_audio_filename(number, idx))
+    record_title(paths["epub"], f"{name}.xhtml", writer.title)
+    if exported: write_apkg(AnkiChapter(paths["raw"].parent.name, number, lines), [str(p) for p in sorted(media.iterdir())], paths["anki"] / f"Ch_{number:03d}.apkg")
+
+class TestSharding(unittest.TestCase):
+
+    def test_shards_partition_by_size(self):
+        entries = [ChapterEntry(f"ch_{n:03d}.txt", n, 0, size) for n, size in enumerate([100] * 6 + [600] + [100] * 6, 1)]
+        parts = [shard_entries(entries, i, 3) for i in (1, 2, 3)]
+        self.assertEqual([e for part in parts for e in part], entries) # Contiguous, in order, each chapter once
+        self.assertEqual([[e.chapter_number for e in part] for part in parts], [[1, 2, 3, 4, 5, 6], [7], [8, 9, 10, 11, 12, 13]])
+        self.assertEqual(shard_entries(entries, 2, 3), parts[1])
+        self.assertEqual(sum(len(shard_entries(entries[:2], i, 5)) for i in range(1, 6)), 2) # More machines than chapters
+        with self.assertRaises(ValueError):
+            shard_entries(entries, 4, 3)
+
+    def test_cli_arguments(self):
+        import argparse
+        from cli import chapter_range, shard_spec
+        self.assertEqual(chapter_range("100-250"), (100, 250))
+        self.assertEqual(chapter_range("100-"), (100, None))
+        self.assertEqual(chapter_range("-250"), (1, 250))
+        self.assertEqual(shard_spec("2/3"), (2, 3))
+        for bad in ("250-100", "100", "a-b"):
+            with self.assertRaises(argparse.ArgumentTypeError): chapter_range(bad)
+        for bad in ("0/2", "3/2", "2", "a/b"):
+            with self.assertRaises(argparse.ArgumentTypeError): shard_spec(bad)
+
+    def test_glossary_vote(self):
+        a, b = {"name": "Lin Dong"}, {"name": "Lin Tung"}
+        merged, conflicts = merge_glossaries_by_vote([{"characters": {"林动": a}}, {"characters": {"林动": b}}, {"characters": {"林动": b, "青阳镇": a}}])
+        self.assertEqual(merged["characters"], {"林动": b, "青阳镇": a})
+        self.assertEqual(conflicts, [("characters", "林动")])
+        self.assertEqual(merge_glossaries_by_vote([{"characters": {"林动": a}}, {"characters": {"林动": b}}])[0]["characters"]["林动"], a) # Tie: the target's
+
+class TestMerge(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = Path(tempfile.mkdtemp())
+        self.novel_dir = self.test_dir / "Novels" / "Novel"
+        self.shard_dir = self.test_dir / "from_gpu_box" / "Novel"
+        self.paths, self.shard = novel_paths(self.novel_dir), novel_paths(self.shard_dir)
+        for paths in (self.paths, self.shard):
+            paths["raw"].mkdir(parents=True)
+            for n in range(1, 5): (paths["raw"] / f"ch_{n:03d}.txt").write_text(f"第{n}章", encoding='utf-8')
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def test_merge_takes_the_most_complete_copy(self):
+        for n in (1, 2): make_chapter(self.paths, n, "cpu")
+        make_chapter(self.shard, 2, "gpu", exported=False) # Translated differently, not finished
+        for n in (3, 4): make_chapter(self.shard, n, "gpu")
+        (self.paths["media"] / "ch_0003").mkdir()
+        (self.paths["media"] / "ch_0003" / "stale.opus").write_bytes(b"old")
+        self.paths["glossary"].write_text(json.dumps({"characters": {"林动": {"name": "Lin Dong"}}}), encoding='utf-8')
+        self.shard["glossary"].write_text(json.dumps({"characters": {"林动": {"name": "Lin Tung"}, "岩": {"name": "Yan"}}}), encoding='utf-8')
+
+        report = merge_shards(self.novel_dir, [self.shard_dir])
+        self.assertEqual((report["chapters"], report["copied"], report["conflicts"]), (4, [3, 4], [2]))
+        self.assertIn("cpu chapter 2", (self.paths["trans"] / "ch_002.txt").read_text(encoding='utf-8'))
+        self.assertIn("gpu chapter 3", (self.paths["trans"] / "ch_003.txt").read_text(encoding='utf-8'))
+        self.assertEqual(sorted(p.name for p in (self.paths["media"] / "ch_0003").iterdir()), [get_audio_filename(3, i) for i in range(3)])
+        self.assertTrue((self.paths["anki"] / "Ch_004.apkg").exists())
+        self.assertEqual(read_titles(self.paths["epub"])["ch_004.xhtml"], "gpu chapter 4 line 0.")
+
+        glossary = json.loads(self.paths["glossary"].read_text(encoding='utf-8'))
+        self.assertEqual(glossary["characters"], {"林动": {"name": "Lin Dong"}, "岩": {"name": "Yan"}})
+        self.assertEqual(report["glossary_conflicts"], [("characters", "林动")])
+        self.assertIn("Decided by vote: 林动", "\n".join(format_merge_report(report)))
+
+        # The master deck gains the merged chapters and the EPUB is rebuilt
+        with zipfile.ZipFile(self.novel_dir / "Novel.apkg") as apkg:
+            apkg.extract("collection.anki2", self.test_dir)
+            self.assertEqual(len(json.loads(apkg.read("media"))), 6)
+        conn = sqlite3.connect(str(self.test_dir / "collection.anki2"))
+        self.assertEqual(conn.execute("SELECT COUNT(*) FROM notes").fetchone()[0], 6)
+        conn.close()
+        self.assertTrue((self.novel_dir / "Novel.epub").exists())
+
+        # Merging the same shard again changes nothing
+        again = merge_shards(self.novel_dir, [self.shard_dir])
+        self.assertEqual((again["copied"], again["conflicts"]), ([], [2]))
+
+if __name__ == '__main__':
+    unittest.main()
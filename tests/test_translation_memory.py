@@ -0,0 +1,123 @@
+import unittest
+import sys
+import json
+import shutil
+import tempfile
+import threading
+from pathlib import Path
+from unittest.mock import patch
+
+# Add the parent directory to the path so we can import translation_memory.py
+sys.path.append(str(Path(__file__).parent.parent))
+
+from translation_memory import TranslationMemory, normalize_sentence, merge_glossaries, import_glossary
+from utils import Chapter
+
+LINE = {"cn": "林动深吸了一口气，缓缓走进了青阳镇的大门。", "nat": "Lin Dong took a deep breath and walked into Qingyang Town.", "lit": "Lin Dong deeply inhaled one breath...", "emo": "Calm narrative"}
+
+class TestTranslationMemory(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = Path(tempfile.mkdtemp())
+        self.tm = TranslationMemory(self.test_dir / "tm.sqlite")
+
+    def tearDown(self):
+        self.tm.close()
+        shutil.rmtree(self.test_dir)
+
+    def test_exact_match_is_normalized(self):
+        """Test that whitespace and full-width/half-width differences still hit the same entry."""
+        self.tm.add_many([dict(LINE, cn="“走吧！” 他说 ")], novel="Book1")
+        match = self.tm.lookup("“走吧!”他说", 1.0)
+        self.assertIsNotNone(match)
+        self.assertEqual(match.similarity, 1.0)
+        self.assertEqual(normalize_sentence("ＡＢ　c"), "abc")
+
+    def test_near_match_through_lsh(self):
+        """Test that a one-character edit is found as a near match and an unrelated line is not."""
+        self.tm.add_many([LINE], novel="Book1")
+        near = self.tm.lookup("林动深吸了一口气，慢慢走进了青阳镇的大门。", 0.6)
+        self.assertIsNotNone(near)
+        self.assertGreater(near.similarity, 0.6)
+        self.assertLess(near.similarity, 1.0)
+        self.assertEqual(near.nat, LINE["nat"])
+        self.assertIsNone(self.tm.lookup("天空中飘着大雪，远处传来了钟声。", 0.6))
+
+    def test_short_lines_only_match_exactly(self):
+        """Test that short lines never get fuzzy matches (one character changes their meaning)."""
+        self.tm.add_many([dict(LINE, cn="他笑了。")])
+        self.assertIsNone(self.tm.lookup("她笑了。", 0.5))
+        self.assertIsNotNone(self.tm.lookup("他笑了。", 0.5))
+
+    def test_first_translation_is_kept(self):
+        """Test that re-adding a sentence doesn't overwrite it and isn't counted."""
+        self.assertEqual(self.tm.add_many([LINE, LINE]), 1)
+        self.assertEqual(self.tm.add_many([dict(LINE, nat="Something else")]), 0)
+        self.assertEqual(self.tm.lookup(LINE["cn"], 1.0).nat, LINE["nat"])
+
+    def test_hits_are_written_in_one_flush(self):
+        """Test that lookups only count hits in memory and flush_hits (or close) writes them at once."""
+        self.tm.add_many([LINE])
+        stored_hits = lambda: self.tm._conn.execute("SELECT hits FROM segments").fetchone()[0]
+        for _ in range(3): self.tm.lookup(LINE["cn"], 1.0)
+        self.assertEqual(stored_hits(), 0)
+        self.assertEqual(self.tm.flush_hits(), 1)
+        self.assertEqual(stored_hits(), 3)
+        self.assertEqual(self.tm.flush_hits(), 0)
+
+        self.tm.lookup(LINE["cn"], 1.0)
+        self.tm.close()
+        self.tm = TranslationMemory(self.test_dir / "tm.sqlite")
+        self.assertEqual(stored_hits(), 4)
+        self.assertEqual(len(self.tm), 1)
+
+class TestGlossaryImport(unittest.TestCase):
+
+    def test_merge_keeps_existing_entries(self):
+        """Test that imported entries fill gaps without overriding the target's names."""
+        target = {"characters": {"林动": {"english_name": "Lin Dong"}}}
+        source = {"characters": {"林动": {"english_name": "Forest Move"}, "小貂": {"english_name": "Little Marten"}}, "places": {"青阳镇": {"english_name": "Qingyang Town"}}}
+        self.assertEqual(merge_glossaries(target, source), 2)
+        self.assertEqual(target["characters"]["林动"]["english_name"], "Lin Dong")
+        self.assertIn("青阳镇", target["places"])
+
+    def test_import_between_files(self):
+        """Test importing a sequel's glossary from another novel's glossary.json."""
+        test_dir = Path(tempfile.mkdtemp())
+        try:
+            source = test_dir / "a.json"
+            source.write_text(json.dumps({"characters": {"林动": {"english_name": "Lin Dong"}}}, ensure_ascii=False), encoding='utf-8')
+            target = test_dir / "b.json"
+            self.assertEqual(import_glossary(target, source), 1)
+            self.assertIn("林动", json.loads(target.read_text(encoding='utf-8'))["characters"])
+        finally:
+            shutil.rmtree(test_dir)
+
+class TestTextStageMemory(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = Path(tempfile.mkdtemp())
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def test_known_lines_skip_the_llm(self):
+        """Test that a chapter whose lines are all in memory is assembled without any LLM call."""
+        from main import setup_directories, run_text_stage
+        from glossary_store import GlossaryStore
+        novel_dir = self.test_dir / "Sequel"
+        (novel_dir / "01_Raw_Text").mkdir(parents=True)
+        (novel_dir / "01_Raw_Text" / "ch_001.txt").write_text(LINE["cn"], encoding='utf-8')
+        paths = setup_directories(novel_dir)
+        glossary = GlossaryStore(paths["glossary"])
+
+        with TranslationMemory(paths["translation_memory"]) as tm, patch("main.call_llm", side_effect=AssertionError("LLM called")):
+            tm.add_many([LINE], novel="Book1")
+            chapter = Chapter("Sequel", "ch_001.txt", None, 1, novel_dir / "01_Raw_Text" / "ch_001.txt")
+            lines = run_text_stage(chapter, paths, glossary, threading.Event(), False, tm)
+        first = next(iter(lines))
+        self.assertEqual(first["nat"], LINE["nat"])
+        self.assertTrue(first["py"])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+import unittest
+import sys
+import time
+import shutil
+import tempfile
+import threading
+import multiprocessing as mp
+from functools import partial
+from pathlib import Path
+import numpy as np
+
+# Add the parent directory to the path so we can import tts_pool.py
+sys.path.append(str(Path(__file__).parent.parent))
+
+from tts_queue import TTSJobQueue
+from tts_pool import run_cpu_pool, recommend_worker_count, resolve_pool_size
+from progress import bus, drain_events, LINE, TTS
+
+class StubTTSModel:
+    """Stands in for Qwen3-TTS: sleeps like a model would, then returns one second of tone."""
+    def __init__(self, delay):
+        self.delay = delay
+
+    def generate_custom_voice(self, text, language, speaker, instruct):
+        texts = text if isinstance(text, list) else [text]
+        time.sleep(self.delay * len(texts))
+        t = np.arange(24000, dtype=np.float32) / 24000
+        noise = np.random.default_rng(0).standard_normal(24000).astype(np.float32)
+        return [0.3 * np.sin(2 * np.pi * 220 * t) + 0.05 * noise for _ in texts], 24000
+
+def load_stub_model(delay=0.0, barrier=None):
+    # Line the workers up after start-up so the measurement covers synthesis, not process spawn.
+    if barrier is not None: barrier.wait(timeout=120)
+    return StubTTSModel(delay)
+
+class TestCPUPoolSizing(unittest.TestCase):
+
+    def test_ram_limits_worker_count(self):
+        """Test that the pool never holds more model copies than fit in memory."""
+        self.assertEqual(recommend_worker_count(worker_ram_gb=8, cpu_count=32, available_ram_gb=34), 4)
+
+    def test_cores_limit_worker_count(self):
+        """Test that each worker keeps at least a couple of threads."""
+        self.assertEqual(recommend_worker_count(worker_ram_gb=8, cpu_count=8, available_ram_gb=512), 4)
+        self.assertEqual(recommend_worker_count(worker_ram_gb=8, cpu_count=1, available_ram_gb=1), 1)
+
+    def test_threads_split_between_workers(self):
+        """Test that an explicit worker count divides the cores between them."""
+        self.assertEqual(resolve_pool_size(workers=4, threads=0, cpu_count=16), (4, 4))
+        self.assertEqual(resolve_pool_size(workers=3, threads=2, cpu_count=16), (3, 2))
+
+class TestCPUPool(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = Path(tempfile.mkdtemp())
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def run_pool(self, workers, line_count=6, delay=1.0):
+        run_dir = self.tmp_dir / f"workers_{workers}"
+        run_dir.mkdir()
+        queue_path = run_dir / "tts_queue.sqlite"
+        with TTSJobQueue(queue_path) as queue:
+            queue.enqueue_chapter(1, [(i, f"这是第{i}行。", "Calm narrative", str(run_dir / f"L{i:04d}.opus"), False) for i in range(line_count)])
+
+        barrier = mp.get_context("spawn").Barrier(workers)
+        done = run_cpu_pool(queue_path, threading.Event(), chapter_number=1, workers=workers, threads=1, batch_size=1, model_loader=partial(load_stub_model, delay, barrier))
+
+        with TTSJobQueue(queue_path) as queue:
+            self.assertTrue(queue.is_chapter_done(1))
+            throughput = queue.throughput(1)
+        self.assertEqual(done, line_count)
+        self.assertEqual(len(list(run_dir.glob("*.opus"))), line_count)
+        return throughput
+
+    def test_pool_writes_every_line_and_scales(self):
+        """Test that lines are spread across workers and throughput grows with the pool size."""
+        single = self.run_pool(workers=1)
+        triple = self.run_pool(workers=3)
+        self.assertGreater(triple / single, 1.8)
+
+    def test_worker_progress_reaches_parent_bus(self):
+        """Test that progress events published inside spawned workers are republished in the parent."""
+        events = bus.subscribe()
+        try:
+            self.run_pool(workers=2, line_count=4, delay=0.0)
+        finally:
+            bus.unsubscribe(events)
+        received = drain_events(events)
+        lines = [e for e in received if e.kind == LINE]
+        self.assertEqual(max(e.done for e in lines), 4)
+        self.assertTrue(all(e.total == 4 and e.stage == "audio" for e in lines))
+        self.assertTrue(any(e.kind == TTS for e in received))
+
+if __name__ == '__main__':
+    unittest.main()
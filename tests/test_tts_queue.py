@@ -0,0 +1,82 @@
+import unittest
+import sys
+import shutil
+import tempfile
+from pathlib import Path
+
+# Add the parent directory to the path so we can import tts_queue.py
+sys.path.append(str(Path(__file__).parent.parent))
+
+from tts_queue import TTSJobQueue, MAX_ATTEMPTS
+
+class TestTTSJobQueue(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = Path(tempfile.mkdtemp())
+        self.db_path = self.tmp_dir / "tts_queue.sqlite"
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def make_jobs(self, count, done=()):
+        return [(i, f"第{i}行", "Calm narrative", str(self.tmp_dir / f"L{i:04d}.opus"), i in done) for i in range(count)]
+
+    def test_claims_pending_lines_in_order(self):
+        """Test that existing audio is skipped and the rest is handed out line by line."""
+        with TTSJobQueue(self.db_path) as queue:
+            queue.enqueue_chapter(1, self.make_jobs(3, done={0}))
+            first = queue.claim("w1", chapter=1)
+            second = queue.claim("w1", chapter=1)
+            self.assertEqual((first.line_idx, second.line_idx), (1, 2))
+            self.assertIsNone(queue.claim("w1", chapter=1))
+            self.assertFalse(queue.is_chapter_done(1))
+
+            queue.complete(first)
+            queue.complete(second)
+            self.assertTrue(queue.is_chapter_done(1))
+            self.assertEqual(queue.pending_count(1), 0)
+
+    def test_batches_share_instruction_and_sort_by_length(self):
+        """Test that batch claims group one emotion and hand out shortest lines first."""
+        jobs = [
+            (0, "一二三四五六", "Happy", str(self.tmp_dir / "L0.opus"), False),
+            (1, "一", "Calm narrative", str(self.tmp_dir / "L1.opus"), False),
+            (2, "一二三", "Happy", str(self.tmp_dir / "L2.opus"), False),
+            (3, "一二", "Happy", str(self.tmp_dir / "L3.opus"), False),
+        ]
+        with TTSJobQueue(self.db_path) as queue:
+            queue.enqueue_chapter(1, jobs)
+            first = queue.claim_batch("w1", chapter=1, max_jobs=4)
+            second = queue.claim_batch("w1", chapter=1, max_jobs=4)
+            self.assertEqual([job.line_idx for job in first], [1])
+            self.assertEqual([job.line_idx for job in second], [3, 2, 0])
+
+    def test_progress_survives_restart(self):
+        """Test that a crashed claim is handed out again once its lease expires."""
+        with TTSJobQueue(self.db_path) as queue:
+            queue.enqueue_chapter(1, self.make_jobs(2))
+            queue.complete(queue.claim("w1", chapter=1))
+            queue.claim("crashed-worker", chapter=1)
+
+        with TTSJobQueue(self.db_path, lease_seconds=-1) as queue:
+            job = queue.claim("w2", chapter=1)
+            self.assertEqual(job.line_idx, 1)
+            self.assertEqual(queue.chapter_counts(1), {"done": 1, "running": 1})
+
+    def test_requeue_keeps_done_state(self):
+        """Test that re-enqueueing a chapter does not redo finished lines unless their file vanished."""
+        with TTSJobQueue(self.db_path) as queue:
+            queue.enqueue_chapter(1, self.make_jobs(2, done={0, 1}))
+            queue.enqueue_chapter(1, self.make_jobs(2, done={0}))
+            self.assertEqual(queue.chapter_counts(1), {"done": 1, "pending": 1})
+
+    def test_failed_jobs_stop_after_max_attempts(self):
+        """Test that a line which keeps failing is parked instead of blocking the chapter forever."""
+        with TTSJobQueue(self.db_path) as queue:
+            queue.enqueue_chapter(1, self.make_jobs(1))
+            for _ in range(MAX_ATTEMPTS):
+                queue.fail(queue.claim("w1", chapter=1), "boom")
+            self.assertIsNone(queue.claim("w1", chapter=1))
+            self.assertTrue(queue.is_chapter_done(1))
+
+if __name__ == '__main__':
+    unittest.main()
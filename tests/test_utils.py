@@ -1,11 +1,14 @@
 import unittest
 import sys
+import re
+import random
 from pathlib import Path
 
 # Add the parent directory to the path so we can import utils.py
 sys.path.append(str(Path(__file__).parent.parent))
 
-from utils import sanitize_filename
+from utils import sanitize_filename, canonicalize_emotion, clean_for_tts, EMOTION_KEYWORDS
+from config import EMOTION_VOCAB, DEFAULT_EMOTION
 
 class TestFilenameSanitization(unittest.TestCase):
 
@@ -32,5 +35,84 @@ class TestFilenameSanitization(unittest.TestCase):
         expected = "Villainous_Saintess_Vol_1_(Updated)"
         self.assertEqual(sanitize_filename(input_title), expected)
 
+class TestEmotionCanonicalization(unittest.TestCase):
+
+    def test_vocabulary_is_fixed_point(self):
+        """Test that every canonical tag maps to itself, whatever its case or punctuation."""
+        for tag in EMOTION_VOCAB:
+            self.assertEqual(canonicalize_emotion(tag), tag)
+            self.assertEqual(canonicalize_emotion(f" {tag.upper()}. "), tag)
+
+    def test_free_form_tags_are_mapped(self):
+        """Test that typical LLM variations land on the closest vocabulary entry."""
+        self.assertEqual(canonicalize_emotion("Whispering fearfully"), "Whispering")
+        self.assertEqual(canonicalize_emotion("Furious, yelling!"), "Angry shouting")
+        self.assertEqual(canonicalize_emotion("Mocking sneer"), "Sarcastic laugh")
+        self.assertEqual(canonicalize_emotion("Tense and mysterious"), "Suspenseful narrative")
+
+    def test_negations_and_mixed_tags(self):
+        """Test that stems only match at word starts, negated keywords are ignored and the first keyword in the tag wins."""
+        self.assertEqual(canonicalize_emotion("Unhappy"), "Sad")
+        self.assertEqual(canonicalize_emotion("Displeased"), "Cold and stern")
+        self.assertEqual(canonicalize_emotion("Not afraid"), "Calm narrative")
+        self.assertEqual(canonicalize_emotion("Not afraid, determined"), "Serious")
+        self.assertEqual(canonicalize_emotion("Cold laugh"), "Sarcastic laugh")
+        self.assertEqual(canonicalize_emotion("Laughing coldly"), "Sarcastic laugh")
+        self.assertEqual(canonicalize_emotion("Sneer"), "Sarcastic laugh")
+        self.assertEqual(canonicalize_emotion("Sad and angry"), "Sad")
+        self.assertEqual(canonicalize_emotion("Angry and sad"), "Angry shouting")
+
+    def test_unknown_tags_fall_back(self):
+        """Test that empty or unrecognised tags use the default narration style."""
+        self.assertEqual(canonicalize_emotion(""), "Calm narrative")
+        self.assertEqual(canonicalize_emotion("平静"), "Calm narrative")
+        self.assertEqual(canonicalize_emotion("Blue"), "Calm narrative")
+
+# Straightforward implementations, one re call per rule, kept as the reference the precompiled versions must match
+# (the heading pattern's inline flag is moved to the front, which is what it meant and what Python 3.11+ requires)
+def reference_clean_for_tts(text):
+    text = re.sub(r'(?i)^(chapter|ch\.?)\s*\d+\s*[-—:]?\s*', '', text)
+    text = re.sub(r'[“”（）《》【】\-—]', '', text)
+    text = re.sub(r'？+', '？', text)
+    text = re.sub(r'！+', '！', text)
+    text = re.sub(r'…+', '…', text)
+    text = re.sub(r'\.+', '.', text)
+    return text.strip()
+
+def reference_canonicalize_emotion(tag):
+    clean = " ".join(re.sub(r'[^a-zA-Z0-9\s]', '', tag or "").lower().split())
+    lookup = {t.lower(): t for t in EMOTION_VOCAB}
+    if clean in lookup: return lookup[clean]
+    clean = re.sub(r'\b(?:not|never|without) \w+', '', clean)
+    hits = [(match.start(), rank) for rank, (_, stems) in enumerate(EMOTION_KEYWORDS) for match in [re.search(rf'\b(?:{stems})', clean)] if match]
+    return EMOTION_KEYWORDS[min(hits)[1]][0] if hits else DEFAULT_EMOTION
+
+def reference_sanitize_filename(text):
+    return re.sub(r'[<>:"/\\|?*]', '', text.replace(" ", "_"))
+
+def random_texts(tokens, count=3000, seed=0):
+    rng = random.Random(seed)
+    return ["".join(rng.choice(tokens) for _ in range(rng.randint(0, 12))) for _ in range(count)]
+
+class TestTextNormalizationMatchesReference(unittest.TestCase):
+    """Property tests: on random mixes of the characters each rule cares about, the output equals the reference."""
+
+    def test_clean_for_tts(self):
+        tokens = ["Chapter", "CHAPTER", "chapter", "Ch.", "ch", "cH", "Chap", "12", "3", "١", " ", "\t", "\u3000", "-", "—", ":", "：",
+                  "“", "”", "（", "）", "《", "》", "【", "】", "？", "！", "…", ".", "?", "!", "林动", "说", "A", "x"]
+        for text in random_texts(tokens) + ["Chapter 12 - 林动", "ch.3:“好？？”", "  ……！！..  ", "", "第一章"]:
+            self.assertEqual(clean_for_tts(text), reference_clean_for_tts(text), repr(text))
+
+    def test_canonicalize_emotion(self):
+        tokens = [tag for tag in EMOTION_VOCAB] + ["whisper", "ANGRY", "sob", "mock", "tense", "Blue", "平静", " ", ",", ".", "!", "-",
+                                                   "\n", "\u3000", "3", "é", "_", "un", "dis", "not ", "never ", "cold", "laugh", "ly", "and "]
+        for tag in random_texts(tokens, count=2000) + [None, ""]:
+            self.assertEqual(canonicalize_emotion(tag), reference_canonicalize_emotion(tag), repr(tag))
+
+    def test_sanitize_filename(self):
+        tokens = list('<>:"/\\|?* _.') + ["Saintess", "林动", "Vol 1", "\t", "\u3000", "(", ")"]
+        for text in random_texts(tokens):
+            self.assertEqual(sanitize_filename(text), reference_sanitize_filename(text), repr(text))
+
 if __name__ == '__main__':
     unittest.main()
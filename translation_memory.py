@@ -0,0 +1,205 @@
+import re
+import json
+import zlib
+import sqlite3
+import threading
+import unicodedata
+from collections import Counter
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+# Local Imports
+from config import TM_MINHASH_PERM, TM_LSH_BANDS, TM_MIN_FUZZY_CHARS
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS segments (
+    key     TEXT PRIMARY KEY,
+    cn      TEXT NOT NULL,
+    nat     TEXT NOT NULL,
+    lit     TEXT NOT NULL,
+    emo     TEXT NOT NULL,
+    novel   TEXT,
+    hits    INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS lsh (
+    band    INTEGER NOT NULL,
+    bucket  INTEGER NOT NULL,
+    key     TEXT    NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_lsh_bucket ON lsh (band, bucket);
+"""
+
+_SPACE_PATTERN = re.compile(r'\s+')
+_MERSENNE = (1 << 61) - 1
+
+def normalize_sentence(text: str) -> str:
+    """Memory key: NFKC (full-width punctuation/digits folded), no whitespace, lower-case Latin."""
+    return _SPACE_PATTERN.sub("", unicodedata.normalize("NFKC", text)).lower()
+
+def shingles(key: str, n: int = 2) -> set:
+    """Character n-grams; Chinese has no word boundaries, so bigrams carry most of the signal."""
+    if len(key) < n: return {key}
+    return {key[i:i + n] for i in range(len(key) - n + 1)}
+
+def jaccard(a: set, b: set) -> float:
+    return len(a & b) / len(a | b) if a or b else 1.0
+
+class MinHasher:
+    """MinHash signatures with num_perm universal hash functions, vectorized over all shingles of a sentence."""
+    def __init__(self, num_perm: int = TM_MINHASH_PERM, bands: int = TM_LSH_BANDS, seed: int = 1):
+        if num_perm % bands: raise ValueError("num_perm must be a multiple of bands")
+        rng = np.random.default_rng(seed)
+        self.a = rng.integers(1, _MERSENNE, size=num_perm, dtype=np.uint64)
+        self.b = rng.integers(0, _MERSENNE, size=num_perm, dtype=np.uint64)
+        self.bands = bands
+        self.rows = num_perm // bands
+
+    def signature(self, grams: set) -> np.ndarray:
+        base = np.fromiter((zlib.crc32(g.encode("utf-8")) for g in grams), dtype=np.uint64, count=len(grams))
+        # (a*x + b) mod p on 32-bit inputs; the uint64 product wraps, which is fine for hashing.
+        hashed = (base[:, None] * self.a[None, :] + self.b[None, :]) % np.uint64(_MERSENNE)
+        return hashed.min(axis=0)
+
+    def band_buckets(self, signature: np.ndarray) -> List[int]:
+        return [zlib.crc32(signature[i * self.rows:(i + 1) * self.rows].tobytes()) for i in range(self.bands)]
+
+@dataclass
+class MemoryMatch:
+    cn: str
+    nat: str
+    lit: str
+    emo: str
+    similarity: float
+    novel: Optional[str] = None
+
+class TranslationMemory:
+    """
+    Shared sentence store for every novel: exact lookups by normalized sentence, near matches
+    through MinHash LSH buckets verified with the exact bigram Jaccard similarity. Exact-match hit
+    counts are kept in memory and written by flush_hits() (each chapter) and close(), so lookups never write.
+    """
+    def __init__(self, db_path: Path):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.hasher = MinHasher()
+        self._lock = threading.Lock()
+        self._hits = Counter() # key -> exact hits not yet written
+        self._conn = sqlite3.connect(str(self.db_path), timeout=30, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+
+    def flush_hits(self) -> int:
+        """Adds the pending hit counts to the store in one transaction. Returns the number of sentences updated."""
+        with self._lock:
+            hits, self._hits = self._hits, Counter()
+            if not hits: return 0
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.executemany("UPDATE segments SET hits = hits + ? WHERE key = ?", [(n, key) for key, n in hits.items()])
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                self._hits.update(hits)
+                raise
+        return len(hits)
+
+    def close(self):
+        self.flush_hits()
+        with self._lock:
+            self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM segments").fetchone()[0]
+
+    def add_many(self, lines: Iterable[Dict], novel: str = None) -> int:
+        """Stores translated lines ({"cn", "nat", "lit", "emo"}). Sentences already in memory keep their first translation."""
+        rows = {}
+        for line in lines:
+            key = normalize_sentence(line.get("cn", ""))
+            if key and line.get("nat") and key not in rows:
+                rows[key] = (key, line["cn"], line["nat"], line.get("lit", ""), line.get("emo", ""), novel)
+        if not rows: return 0
+
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                keys = list(rows)
+                for i in range(0, len(keys), 500):
+                    batch = keys[i:i + 500]
+                    for (key,) in self._conn.execute(f"SELECT key FROM segments WHERE key IN ({','.join('?' * len(batch))})", batch):
+                        del rows[key]
+                self._conn.executemany("INSERT INTO segments (key, cn, nat, lit, emo, novel) VALUES (?, ?, ?, ?, ?, ?)", rows.values())
+                self._conn.executemany("INSERT INTO lsh (band, bucket, key) VALUES (?, ?, ?)", self._lsh_rows(rows))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return len(rows)
+
+    def _lsh_rows(self, keys):
+        for key in keys:
+            if len(key) < TM_MIN_FUZZY_CHARS: continue
+            buckets = self.hasher.band_buckets(self.hasher.signature(shingles(key)))
+            yield from ((band, bucket, key) for band, bucket in enumerate(buckets))
+
+    def lookup(self, cn: str, min_similarity: float) -> Optional[MemoryMatch]:
+        """Best stored sentence with bigram Jaccard >= min_similarity (1.0 for an exact normalized match)."""
+        key = normalize_sentence(cn)
+        if not key: return None
+        with self._lock:
+            row = self._conn.execute("SELECT cn, nat, lit, emo, novel FROM segments WHERE key = ?", (key,)).fetchone()
+            if row:
+                self._hits[key] += 1
+                return MemoryMatch(row[0], row[1], row[2], row[3], 1.0, row[4])
+        if min_similarity >= 1.0 or len(key) < TM_MIN_FUZZY_CHARS: return None
+
+        grams = shingles(key)
+        buckets = self.hasher.band_buckets(self.hasher.signature(grams))
+        where = " OR ".join("(band = ? AND bucket = ?)" for _ in buckets)
+        params = [v for pair in enumerate(buckets) for v in pair]
+        with self._lock:
+            candidates = self._conn.execute(
+                f"SELECT cn, nat, lit, emo, novel, key FROM segments WHERE key IN (SELECT DISTINCT key FROM lsh WHERE {where})", params
+            ).fetchall()
+
+        best = None
+        for cand_cn, nat, lit, emo, novel, cand_key in candidates:
+            similarity = jaccard(grams, shingles(cand_key))
+            if similarity >= min_similarity and (best is None or similarity > best.similarity):
+                best = MemoryMatch(cand_cn, nat, lit, emo, similarity, novel)
+        return best
+
+# ==========================
+# GLOSSARY SHARING
+# ==========================
+def merge_glossaries(target: Dict, source: Dict, overwrite: bool = False) -> int:
+    """Copies source entries into target per category (existing target entries win unless overwrite). Returns entries added or replaced."""
+    changed = 0
+    for category, entries in source.items():
+        if not isinstance(entries, dict): continue
+        bucket = target.setdefault(category, {})
+        for name, data in entries.items():
+            if overwrite or name not in bucket:
+                if bucket.get(name) != data: changed += 1
+                bucket[name] = data
+    return changed
+
+def import_glossary(target_path: Path, source_path: Path, overwrite: bool = False) -> int:
+    """Merges another novel's glossary.json into this novel's (e.g. for a sequel)."""
+    target_path, source_path = Path(target_path), Path(source_path)
+    source = json.loads(source_path.read_text(encoding='utf-8'))
+    target = json.loads(target_path.read_text(encoding='utf-8')) if target_path.exists() else {}
+    changed = merge_glossaries(target, source, overwrite)
+    target_path.write_text(json.dumps(target, ensure_ascii=False, indent=4), encoding='utf-8')
+    return changed
@@ -0,0 +1,221 @@
+import gc
+import time
+import threading
+import torch
+import numpy as np
+from pathlib import Path
+
+# Local Imports
+from config import TTS_MODEL, SPEAKER_VOICE, TTS_DEVICE, TTS_DTYPE, TTS_RELOAD_EVERY, TTS_BATCH_SIZE, EMOTION_VOCAB, FAILED_CLIP_SECONDS, QA_ENABLED, QA_MAX_TAKES
+from utils import clean_for_tts, canonicalize_emotion
+from audio_post import process_clip, write_opus
+from clip_quality import assess_clip
+from tts_queue import default_worker_id
+from progress import bus, publish, publish_memory, TTS, LINE, MODEL
+
+TORCH_DTYPES = {
+    "float16": torch.float16,
+    "bfloat16": torch.bfloat16,
+    "float32": torch.float32,
+}
+
+def load_tts_model(device: str = None, dtype: str = None):
+    """Loads Qwen3-TTS on the given device ("cuda:0", "cpu", ...) with a dtype name from TORCH_DTYPES."""
+    # Imported here so CPU pool workers only pay for qwen_tts once they actually load a model.
+    from qwen_tts import Qwen3TTSModel
+    import transformers
+    transformers.logging.set_verbosity_error()
+
+    device = device or TTS_DEVICE
+    dtype = dtype or TTS_DTYPE
+    print(f"[SYSTEM] Loading Qwen3-TTS ({TTS_MODEL}) on {device} as {dtype}...")
+    return Qwen3TTSModel.from_pretrained(TTS_MODEL, device_map=device, dtype=TORCH_DTYPES[dtype], attn_implementation="sdpa")
+
+def release_tts_memory(full: bool = True):
+    """Returns cached VRAM to the driver. A full gc pass (~0.1 s with torch loaded) is reserved for model reloads."""
+    if full: gc.collect()
+    if torch.cuda.is_available():
+        torch.cuda.empty_cache()
+
+class ResidentModel:
+    """
+    Model loader that keeps what it loaded between run_tts_worker calls, so a long-lived process
+    (server.py) pays the model load once instead of once per chapter. unload() frees it again.
+    """
+    def __init__(self, loader=load_tts_model):
+        self._loader = loader
+        self._lock = threading.Lock()
+        self.model = None
+        self.loads = 0
+
+    def __call__(self):
+        with self._lock:
+            if self.model is None:
+                self.model = self._loader()
+                InstructCache(self.model)
+                self.loads += 1
+            return self.model
+
+    def unload(self):
+        with self._lock:
+            self.model = None
+        release_tts_memory()
+
+_model_loader = load_tts_model
+
+def set_model_loader(loader):
+    """Swaps the loader run_tts_worker uses by default (e.g. a ResidentModel in the service worker)."""
+    global _model_loader
+    _model_loader = loader
+
+def unload_resident_model():
+    """Frees a resident TTS model before the LLM needs the GPU (the text stage calls this). No-op otherwise."""
+    if isinstance(_model_loader, ResidentModel) and _model_loader.model is not None:
+        print("[SYSTEM] Unloading the resident TTS model to free VRAM for the LLM...")
+        _model_loader.unload()
+
+class InstructCache:
+    """
+    Caches the tokenized instruction prompt for each emotion tag on a Qwen3-TTS model.
+    generate_custom_voice re-tokenizes the instruction on every call; with a fixed
+    emotion vocabulary those few prompts are tokenized once up front and reused.
+    Models without the tokenizer hooks (e.g. stubs) are left untouched.
+    """
+    def __init__(self, tts_model, instructions=EMOTION_VOCAB):
+        self.hits = 0
+        self.cache = {}
+        self.enabled = hasattr(tts_model, "_tokenize_texts") and hasattr(tts_model, "_build_instruct_text")
+        if not self.enabled: return
+
+        self._tokenize = tts_model._tokenize_texts
+        for instruction in instructions:
+            prompt = tts_model._build_instruct_text(instruction)
+            self.cache[prompt] = self._tokenize([prompt])[0]
+        tts_model._tokenize_texts = self._tokenize_texts
+
+    def _tokenize_texts(self, texts):
+        if len(texts) == 1 and texts[0] in self.cache:
+            self.hits += 1
+            return [self.cache[texts[0]]]
+        return self._tokenize(texts)
+
+def _to_audio_array(wav, sr):
+    """(audio, invalid): empty or NaN/Inf output is replaced by FAILED_CLIP_SECONDS of silence."""
+    if torch.is_tensor(wav):
+        if wav.numel() == 0 or torch.isnan(wav).any() or torch.isinf(wav).any():
+            return np.zeros(int(sr * FAILED_CLIP_SECONDS), dtype=np.float32), True
+        return wav.detach().cpu().to(torch.float32).contiguous().numpy().reshape(-1).copy(), False
+    audio_data = np.asarray(wav, dtype=np.float32).reshape(-1).copy()
+    if audio_data.size == 0 or not np.isfinite(audio_data).all():
+        return np.zeros(int(sr * FAILED_CLIP_SECONDS), dtype=np.float32), True
+    return audio_data, False
+
+def synthesize_batch(tts_model, jobs):
+    """
+    Runs Qwen3-TTS once for a batch of queued lines (same instruction, similar length) and writes their opus files.
+    Each clip goes through the quality gate first: the job gets its issues and metrics, and a suspect take that
+    has takes left is not written but marked for retry (see TTSJobQueue.complete_batch).
+    Returns the seconds of audio written.
+    """
+    texts = [clean_for_tts(job.text) or "标题" for job in jobs]
+    instructs = [canonicalize_emotion(job.emo) for job in jobs]
+
+    for job, raw_text, emo_tag in zip(jobs, texts, instructs):
+        print(f"    [Audio] Ch{job.chapter} L{job.line_idx+1}: [{emo_tag}] {raw_text[:40]}...")
+
+    with torch.no_grad():
+        if len(jobs) == 1:
+            wavs, sr = tts_model.generate_custom_voice(text=texts[0], language="Chinese", speaker=SPEAKER_VOICE, instruct=instructs[0])
+        else:
+            wavs, sr = tts_model.generate_custom_voice(text=texts, language="Chinese", speaker=SPEAKER_VOICE, instruct=instructs)
+
+    # Save
+    audio_seconds = 0.0
+    for job, text, wav in zip(jobs, texts, wavs):
+        raw_audio, invalid = _to_audio_array(wav, sr)
+        audio_path = Path(job.audio_path)
+        audio_path.unlink(missing_ok=True)
+        if QA_ENABLED:
+            job.issues, job.metrics = assess_clip(raw_audio, sr, text, invalid)
+            job.retry = bool(job.issues) and job.attempts < QA_MAX_TAKES
+            if job.issues: print(f"    [Audio QA] Ch{job.chapter} L{job.line_idx+1} take {job.attempts}: {', '.join(job.issues)}{' -> re-synthesizing' if job.retry else ''}")
+            if job.retry: continue
+        audio_data, out_sr = process_clip(raw_audio, sr)
+        del raw_audio
+        write_opus(audio_path, audio_data, out_sr)
+        audio_seconds += audio_data.size / out_sr
+        del audio_data
+    del wavs
+    return audio_seconds
+
+def synthesize_job(tts_model, job):
+    """Runs Qwen3-TTS for one queued line and writes the opus file."""
+    return synthesize_batch(tts_model, [job])
+
+def publish_batch_progress(queue, jobs, elapsed, audio_seconds, worker_id=""):
+    """Reports the batch's real-time factor, the chapter's audio progress and this worker's memory."""
+    if not bus.active: return
+    if audio_seconds > 0: publish(TTS, value=elapsed / audio_seconds, chapter=jobs[0].chapter, label=worker_id)
+    counts = queue.chapter_counts(jobs[0].chapter)
+    finished = counts.get('done', 0) + counts.get('failed', 0)
+    publish(LINE, stage="audio", chapter=jobs[0].chapter, done=finished, total=sum(counts.values()))
+    publish_memory(label=worker_id)
+
+def run_tts_worker(queue, stop_event, chapter_number=None, worker_id=None, model_loader=None, batch_size=TTS_BATCH_SIZE):
+    """
+    Pulls synthesis jobs from the queue until it is drained (or only a given chapter, if set).
+    Jobs arrive grouped by instruction and sorted by length, batch_size lines per generate call.
+    Safe to run from several processes against the same queue.
+    """
+    worker_id = worker_id or default_worker_id()
+    model_loader = model_loader or _model_loader
+    resident = isinstance(model_loader, ResidentModel) # Its model outlives this worker
+    tts_model = None
+    audio_count = 0
+    reloaded_at = 0
+
+    try:
+        while not stop_event.is_set():
+            jobs = queue.claim_batch(worker_id, chapter=chapter_number, max_jobs=max(1, batch_size))
+            if not jobs:
+                # Other workers may still hold claims on this chapter; wait for them (or their lease to expire).
+                if queue.pending_count(chapter_number) == 0: break
+                time.sleep(1)
+                continue
+
+            # Model Management
+            if tts_model and TTS_RELOAD_EVERY and audio_count - reloaded_at >= TTS_RELOAD_EVERY:
+                print(f"[SYSTEM] Auto-reloading TTS model...")
+                del tts_model
+                if resident: model_loader.unload()
+                else: release_tts_memory()
+                tts_model = None
+                reloaded_at = audio_count
+                publish(MODEL, label="unloaded")
+
+            if not tts_model:
+                publish(MODEL, label="loading")
+                tts_model = model_loader()
+                if not resident: InstructCache(tts_model)
+                publish(MODEL, label="loaded")
+
+            try:
+                started = time.perf_counter()
+                audio_seconds = synthesize_batch(tts_model, jobs)
+            except Exception as e:
+                print(f"    [!] Audio failed for Ch{jobs[0].chapter} L{', '.join(str(job.line_idx+1) for job in jobs)}: {e}")
+                for job in jobs: queue.fail(job, str(e))
+                continue
+            finally:
+                release_tts_memory(full=False)
+
+            queue.complete_batch(jobs)
+            audio_count += len(jobs)
+            publish_batch_progress(queue, jobs, time.perf_counter() - started, audio_seconds, worker_id)
+    finally:
+        if tts_model and not resident:
+            del tts_model
+            release_tts_memory()
+            publish(MODEL, label="unloaded")
+
+    return audio_count
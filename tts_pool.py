@@ -0,0 +1,108 @@
+import os
+import multiprocessing as mp
+from queue import Empty
+from functools import partial
+from pathlib import Path
+
+# Local Imports
+from config import TTS_CPU_WORKERS, TTS_CPU_THREADS, TTS_WORKER_RAM_GB, TTS_DTYPE, TTS_BATCH_SIZE
+from tts_queue import TTSJobQueue
+from tts_engine import load_tts_model, run_tts_worker
+from progress import bus, drain_events
+
+CPU_DTYPES = ("float32", "bfloat16")
+RAM_RESERVE_GB = 2.0 # Left free for the OS, Ollama's CPU buffers and the parent process
+MIN_THREADS_PER_WORKER = 2
+
+def get_available_ram_gb():
+    """Reads MemAvailable on Linux, falls back to total physical memory elsewhere. None if unknown."""
+    try:
+        with open("/proc/meminfo", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) / 1024**2
+    except OSError:
+        pass
+    try:
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES") / 1024**3
+    except (AttributeError, ValueError, OSError):
+        return None
+
+def recommend_worker_count(worker_ram_gb: float = TTS_WORKER_RAM_GB, cpu_count: int = None, available_ram_gb: float = None) -> int:
+    """Largest pool that fits both in RAM (one model copy per worker) and in the cores (a few threads each)."""
+    cpu_count = cpu_count or os.cpu_count() or 1
+    if available_ram_gb is None:
+        available_ram_gb = get_available_ram_gb()
+
+    by_cpu = max(1, cpu_count // MIN_THREADS_PER_WORKER)
+    if available_ram_gb is None:
+        return by_cpu
+    by_ram = int((available_ram_gb - RAM_RESERVE_GB) // worker_ram_gb)
+    return max(1, min(by_cpu, by_ram))
+
+def resolve_pool_size(workers: int = TTS_CPU_WORKERS, threads: int = TTS_CPU_THREADS, cpu_count: int = None):
+    """Returns (workers, threads_per_worker), filling in 0 values from the machine's cores and RAM."""
+    cpu_count = cpu_count or os.cpu_count() or 1
+    workers = workers or recommend_worker_count(cpu_count=cpu_count)
+    threads = threads or max(1, cpu_count // workers)
+    return workers, threads
+
+def _pool_worker_main(queue_path, chapter_number, threads, batch_size, model_loader, stop_flag, results, events=None):
+    """Entry point of one spawned worker: pins its thread count, then drains the shared queue."""
+    # Progress events go back to the parent, which republishes them on its own bus.
+    if events is not None: bus.subscribe(events)
+    import torch
+    torch.set_num_threads(threads)
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        pass
+
+    with TTSJobQueue(queue_path) as queue:
+        done = run_tts_worker(queue, stop_flag, chapter_number=chapter_number, model_loader=model_loader, batch_size=batch_size)
+    results.put(done)
+
+def run_cpu_pool(queue_path: Path, stop_event, chapter_number=None, workers: int = 0, threads: int = 0, dtype: str = None, model_loader=None, batch_size: int = TTS_BATCH_SIZE) -> int:
+    """
+    Launches N spawned processes that each load their own CPU model copy and pull
+    lines from the persistent TTS queue. Audio lands in the usual per-line opus files.
+    Returns the number of lines synthesized across all workers.
+    """
+    workers, threads = resolve_pool_size(workers or TTS_CPU_WORKERS, threads or TTS_CPU_THREADS)
+    if model_loader is None:
+        dtype = dtype or (TTS_DTYPE if TTS_DTYPE in CPU_DTYPES else "float32")
+        model_loader = partial(load_tts_model, device="cpu", dtype=dtype)
+
+    print(f"[SYSTEM] Starting CPU TTS pool: {workers} workers x {threads} threads.")
+    ctx = mp.get_context("spawn")
+    stop_flag = ctx.Event()
+    results = ctx.Queue()
+    events = ctx.Queue() if bus.active else None
+    procs = [
+        ctx.Process(target=_pool_worker_main, args=(str(queue_path), chapter_number, threads, batch_size, model_loader, stop_flag, results, events), name=f"tts_cpu_{i}", daemon=True)
+        for i in range(workers)
+    ]
+    for p in procs: p.start()
+
+    total = 0
+    finished = 0
+    while finished < len(procs):
+        if stop_event.is_set(): stop_flag.set()
+        if events is not None:
+            for event in drain_events(events): bus.publish(event)
+        try:
+            total += results.get(timeout=0.5)
+            finished += 1
+        except Empty:
+            # Nothing reported yet; stop waiting on workers that died without reporting.
+            if not any(p.is_alive() for p in procs) and results.empty(): break
+
+    for p in procs:
+        # Keep emptying the event pipe: a worker can't exit while its queue still holds unsent data.
+        while events is not None and p.is_alive():
+            for event in drain_events(events): bus.publish(event)
+            p.join(timeout=0.1)
+        p.join()
+    if events is not None:
+        for event in drain_events(events): bus.publish(event)
+    return total
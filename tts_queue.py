@@ -0,0 +1,276 @@
+import os
+import json
+import time
+import platform
+import sqlite3
+import threading
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Jobs claimed longer ago than this are assumed to belong to a crashed worker.
+DEFAULT_LEASE_SECONDS = 600
+MAX_ATTEMPTS = 3
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    chapter     INTEGER NOT NULL,
+    line_idx    INTEGER NOT NULL,
+    text        TEXT    NOT NULL,
+    emo         TEXT    NOT NULL,
+    audio_path  TEXT    NOT NULL,
+    status      TEXT    NOT NULL DEFAULT 'pending',
+    attempts    INTEGER NOT NULL DEFAULT 0,
+    worker      TEXT,
+    claimed_at  REAL,
+    completed_at REAL,
+    error       TEXT,
+    issues      TEXT,
+    metrics     TEXT,
+    PRIMARY KEY (chapter, line_idx)
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_claim ON jobs (status, chapter, emo);
+"""
+
+@dataclass
+class TTSJob:
+    chapter: int
+    line_idx: int
+    text: str
+    emo: str
+    audio_path: str
+    attempts: int = 0
+    issues: List[str] = field(default_factory=list) # Set by the quality gate (clip_quality.py) after synthesis
+    metrics: Optional[Dict] = None
+    retry: bool = False # Suspect take: complete_batch hands the line back for another one
+
+class TTSJobQueue:
+    """
+    Persistent (chapter, line) synthesis queue backed by SQLite.
+    Every job survives crashes: workers claim jobs atomically, and claims that
+    outlive their lease are handed back out, so several worker processes can
+    drain the same novel concurrently.
+    """
+    def __init__(self, db_path: Path, lease_seconds: int = DEFAULT_LEASE_SECONDS, read_only: bool = False):
+        self.db_path = Path(db_path)
+        self.lease_seconds = lease_seconds
+        self._lock = threading.Lock()
+        if read_only: # For reports: opens an existing queue as is (no schema, migration or journal mode change)
+            # Without a -wal file everything is in the database file, and immutable keeps SQLite from creating one
+            mode = "mode=ro" if self.db_path.with_name(self.db_path.name + "-wal").exists() else "immutable=1"
+            self._conn = sqlite3.connect(f"{self.db_path.resolve().as_uri()}?{mode}", uri=True, timeout=30, isolation_level=None, check_same_thread=False)
+            return
+        self._conn = sqlite3.connect(str(self.db_path), timeout=30, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self._migrate()
+
+    def _migrate(self):
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        if "completed_at" not in columns:
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN completed_at REAL")
+        for column in ("issues", "metrics"):
+            if column not in columns: self._conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} TEXT")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # --- PRODUCER SIDE ---
+    def enqueue_chapter(self, chapter: int, jobs: Iterable[Tuple[int, str, str, str, bool]]) -> int:
+        """
+        Registers every line of a chapter. Each job is (line_idx, text, emo, audio_path, already_done).
+        Lines whose audio already exists are stored as done; lines marked done whose file vanished go back to pending.
+        """
+        count = 0
+        def rows():
+            nonlocal count
+            for idx, text, emo, path, done in jobs:
+                count += 1
+                yield (chapter, idx, text, emo, str(path), 'done' if done else 'pending')
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.executemany("""
+                    INSERT INTO jobs (chapter, line_idx, text, emo, audio_path, status) VALUES (?, ?, ?, ?, ?, ?)
+                    ON CONFLICT (chapter, line_idx) DO UPDATE SET
+                        text = excluded.text, emo = excluded.emo, audio_path = excluded.audio_path,
+                        status = CASE
+                            WHEN excluded.status = 'done' THEN 'done'
+                            WHEN jobs.status = 'done' THEN 'pending'
+                            ELSE jobs.status END
+                """, rows())
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return count
+
+    # --- WORKER SIDE ---
+    def claim(self, worker_id: str, chapter: Optional[int] = None) -> Optional[TTSJob]:
+        """Atomically hands the next pending (or lease-expired) job to a worker."""
+        jobs = self.claim_batch(worker_id, chapter=chapter, max_jobs=1)
+        return jobs[0] if jobs else None
+
+    def claim_batch(self, worker_id: str, chapter: Optional[int] = None, max_jobs: int = 1) -> List[TTSJob]:
+        """
+        Atomically claims up to max_jobs jobs that share one instruction, shortest text first.
+        Chapters still drain in order, but within a chapter lines are grouped by emotion and
+        length so batched generation pads as little as possible.
+        """
+        now = time.time()
+        where = "(status = 'pending' OR (status = 'running' AND claimed_at < ?))"
+        params = [now - self.lease_seconds]
+        if chapter is not None:
+            where += " AND chapter = ?"
+            params.append(chapter)
+
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                head = self._conn.execute(
+                    f"SELECT chapter, emo FROM jobs WHERE {where} ORDER BY chapter, emo, length(text), line_idx LIMIT 1", params
+                ).fetchone()
+                if head is None:
+                    self._conn.execute("COMMIT")
+                    return []
+                rows = self._conn.execute(
+                    f"SELECT chapter, line_idx, text, emo, audio_path, attempts FROM jobs WHERE {where} AND chapter = ? AND emo = ? "
+                    "ORDER BY length(text), line_idx LIMIT ?",
+                    params + [head[0], head[1], max_jobs]
+                ).fetchall()
+                self._conn.executemany(
+                    "UPDATE jobs SET status = 'running', worker = ?, claimed_at = ?, attempts = attempts + 1 WHERE chapter = ? AND line_idx = ?",
+                    [(worker_id, now, row[0], row[1]) for row in rows]
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return [TTSJob(row[0], row[1], row[2], row[3], row[4], row[5] + 1) for row in rows]
+
+    def complete(self, job: TTSJob):
+        self.complete_batch([job])
+
+    def complete_batch(self, jobs: List[TTSJob]):
+        """Marks the jobs done with their quality results; jobs flagged for retry go back to pending instead."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            self._conn.executemany(
+                "UPDATE jobs SET status = ?, error = NULL, completed_at = ?, issues = ?, metrics = ? WHERE chapter = ? AND line_idx = ?",
+                [('pending' if job.retry else 'done', now, ",".join(job.issues) or None,
+                  json.dumps(job.metrics) if job.metrics is not None else None, job.chapter, job.line_idx) for job in jobs]
+            )
+            self._conn.execute("COMMIT")
+
+    def fail(self, job: TTSJob, error: str):
+        """Returns the job to the queue, or parks it as failed after MAX_ATTEMPTS."""
+        status = 'failed' if job.attempts >= MAX_ATTEMPTS else 'pending'
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, error = ? WHERE chapter = ? AND line_idx = ?",
+                (status, error[:500], job.chapter, job.line_idx)
+            )
+
+    def release(self, job: TTSJob):
+        """Hands an unfinished claim back without counting it as an attempt (e.g. on shutdown)."""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = 'pending', attempts = MAX(attempts - 1, 0) WHERE chapter = ? AND line_idx = ? AND status = 'running'",
+                (job.chapter, job.line_idx)
+            )
+
+    def requeue_orphans(self) -> int:
+        """Puts back jobs claimed by workers on this machine whose process no longer exists (e.g. after a crash)."""
+        host = platform.node()
+        with self._lock:
+            rows = self._conn.execute("SELECT DISTINCT worker FROM jobs WHERE status = 'running' AND worker LIKE ?", (f"{host}:%",)).fetchall()
+            dead = [w for (w,) in rows if not _process_alive(w)]
+            for worker in dead:
+                self._conn.execute("UPDATE jobs SET status = 'pending' WHERE status = 'running' AND worker = ?", (worker,))
+        return len(dead)
+
+    def requeue_suspect(self, start_chapter: Optional[int] = None, end_chapter: Optional[int] = None) -> List[Tuple[int, int, str]]:
+        """
+        Hands every line the quality gate left suspect, or that failed for good, back to the queue with fresh attempts.
+        Returns their (chapter, line_idx, audio_path); the caller removes the files so enqueue_chapter keeps them pending.
+        """
+        where = "(status = 'failed' OR (status = 'done' AND issues IS NOT NULL)) AND chapter >= ? AND chapter <= ?"
+        params = (start_chapter if start_chapter is not None else -1, end_chapter if end_chapter is not None else 2**62)
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            rows = self._conn.execute(f"SELECT chapter, line_idx, audio_path FROM jobs WHERE {where} ORDER BY chapter, line_idx", params).fetchall()
+            self._conn.execute(f"UPDATE jobs SET status = 'pending', attempts = 0, error = NULL, issues = NULL WHERE {where}", params)
+            self._conn.execute("COMMIT")
+        return rows
+
+    # --- STATUS ---
+    def chapter_quality(self, chapter: int) -> List[Dict]:
+        """Every line of a chapter with its status, takes and the quality gate's issues and metrics (None when not measured)."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT line_idx, text, status, attempts, issues, metrics, error FROM jobs WHERE chapter = ? ORDER BY line_idx", (chapter,)
+            ).fetchall()
+        return [{"line": idx + 1, "text": text, "status": status, "attempts": attempts, "issues": issues.split(",") if issues else [],
+                 "metrics": json.loads(metrics) if metrics else None, "error": error}
+                for idx, text, status, attempts, issues, metrics, error in rows]
+
+    def chapter_counts(self, chapter: int) -> Dict[str, int]:
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM jobs WHERE chapter = ? GROUP BY status", (chapter,)).fetchall()
+        return dict(rows)
+
+    def is_chapter_done(self, chapter: int) -> bool:
+        counts = self.chapter_counts(chapter)
+        return bool(counts) and set(counts) <= {'done', 'failed'}
+
+    def pending_count(self, chapter: Optional[int] = None) -> int:
+        query = "SELECT COUNT(*) FROM jobs WHERE status IN ('pending', 'running')"
+        params = []
+        if chapter is not None:
+            query += " AND chapter = ?"
+            params.append(chapter)
+        with self._lock:
+            return self._conn.execute(query, params).fetchone()[0]
+
+    def throughput(self, chapter: Optional[int] = None) -> Optional[float]:
+        """Lines per second between the first claim and the last completion of jobs synthesized through the queue."""
+        query = "SELECT COUNT(*), MIN(claimed_at), MAX(completed_at) FROM jobs WHERE status = 'done' AND completed_at IS NOT NULL"
+        params = []
+        if chapter is not None:
+            query += " AND chapter = ?"
+            params.append(chapter)
+        with self._lock:
+            count, start, end = self._conn.execute(query, params).fetchone()
+        if not count or end is None or end <= start:
+            return None
+        return count / (end - start)
+
+def default_worker_id() -> str:
+    return f"{platform.node()}:{os.getpid()}:{threading.get_ident()}"
+
+def _process_alive(worker_id: str) -> bool:
+    try:
+        pid = int(worker_id.split(":")[1])
+    except (IndexError, ValueError):
+        return False
+    if pid == os.getpid():
+        return True
+    if os.name == "nt":
+        # os.kill(pid, 0) would send CTRL_C_EVENT on Windows; fall back to the lease timeout there.
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
@@ -1,23 +1,59 @@
 import re
+import functools
+import threading
 import ollama
 from dataclasses import dataclass
+from pathlib import Path
 from typing import Optional, Dict, List
-from config import LLM_MODEL
+from config import LLM_MODEL, OLLAMA_HOST, LLM_KEEP_ALIVE, EMOTION_VOCAB, DEFAULT_EMOTION, TM_FILE_NAME
+from progress import publish, publish_memory, LLM, PROMPT_EVAL
 from pypinyin import pinyin, Style 
 
+# "ch_001.txt", "ch_12_title.txt" -> the number right after the first underscore
+CHAPTER_NUMBER_PATTERN = re.compile(r'^[^_.]*_(\d+)(?:[_.]|$)')
+
 @dataclass
 class Chapter:
     novel_name: str
     file_name: str
-    content: str
+    content: Optional[str] = None
     chapter_number: Optional[int] = None
+    path: Optional[Path] = None
+
+    def load_content(self) -> str:
+        """Returns the chapter text, reading it from disk only when the chapter is actually processed."""
+        if self.content is not None: return self.content
+        return self.path.read_text(encoding='utf-8')
+
+def novel_paths(novel_dir: Path) -> Dict[str, Path]:
+    """Where each stage keeps its files inside a novel folder (nothing is created; see main.setup_directories)."""
+    return {
+        "raw": novel_dir / "01_Raw_Text",
+        "trans": novel_dir / "02_Translated",
+        "epub": novel_dir / "03_EPUB_Chapters",
+        "anki": novel_dir / "04_Anki_Chapters",
+        "media": novel_dir / "media",
+        "cache": novel_dir / ".cache",
+        "tts_queue": novel_dir / ".cache" / "tts_queue.sqlite",
+        "chapter_index": novel_dir / ".cache" / "chapter_index.json",
+        "master_collection": novel_dir / ".cache" / "master_collection.anki2", # Working copy of the master deck
+        "master_media": novel_dir / ".cache" / "master_media.json",
+        "throughput": novel_dir / ".cache" / "throughput.json", # Recorded text-stage speed, read by --plan
+        "line_index": novel_dir / ".cache" / "line_index.json", # Repeated and boilerplate lines across the novel
+        "translation_memory": novel_dir.parent / TM_FILE_NAME, # Shared by every novel in the same root
+        "glossary": novel_dir / "glossary.json",
+        "glossary_stats": novel_dir / ".cache" / "glossary_stats.json", # Per-entity frequency and last-seen chapter
+        "quality": novel_dir / "05_Audio_Quality", # Per-chapter clip quality reports
+        "metadata": novel_dir / "metadata.json"
+    }
 
 def extract_chapter_number(file_name: str) -> Optional[int]:
-    try: return int(file_name.split('.')[0].split('_')[1])
-    except: return None
+    match = CHAPTER_NUMBER_PATTERN.match(file_name)
+    return int(match.group(1)) if match else None
 
-def chunk_text_into_numbered_lines(text: str, max_chars=400) -> List[Dict[int, str]]:
-    raw_lines = [line.strip() for line in text.splitlines() if line.strip()]
+def chunk_text_into_numbered_lines(text: str, max_chars=400, skip=frozenset()) -> List[Dict[int, str]]:
+    """Non-empty lines in numbered chunks of about max_chars; lines in skip (e.g. boilerplate) are left out."""
+    raw_lines = [line.strip() for line in text.splitlines() if line.strip() and line.strip() not in skip]
     chunks, current_chunk = [], {}
     current_length, line_idx = 0, 1
     for line in raw_lines:
@@ -30,11 +66,34 @@ def chunk_text_into_numbered_lines(text: str, max_chars=400) -> List[Dict[int, s
     if current_chunk: chunks.append(current_chunk)
     return chunks
 
-def get_relevant_glossary(text: str, master_glossary: dict) -> dict:
+def find_glossary_mentions(text: str, master_glossary: dict) -> List[tuple]:
+    """
+    (form, category, name, data, own, inside) for every glossary name or alias in text. `own` counts the
+    occurrences that are not part of a longer glossary name (林 inside 林动), `inside` the ones that are.
+    """
+    found = []
+    for category in ("characters", "places", "items", "skills"):
+        for cn_name, data in master_glossary.get(category, {}).items():
+            aliases = data.get("aliases", ()) if isinstance(data, dict) else ()
+            for form in (cn_name, *aliases):
+                if form and form in text: found.append((form, category, cn_name, data))
+
+    forms = {form for form, *_ in found}
+    mentions = []
+    for form, category, cn_name, data in found:
+        total = text.count(form)
+        inside = min(total, sum(text.count(longer) * longer.count(form) for longer in forms if form in longer and longer != form))
+        mentions.append((form, category, cn_name, data, total - inside, inside))
+    return mentions
+
+def get_relevant_glossary(text: str, master_glossary: dict, stats: dict = None, limit: int = None) -> dict:
     """
     Scans the master glossary and returns a mini-glossary 
     containing only the entities found in the current text chunk.
     Supports: characters, places, items, skills.
+    Entries are keyed by the form the text uses (a name or one of its aliases); names that only occur
+    inside a longer glossary name are left out. With a limit, the most relevant entries are kept: most
+    mentions in the text, then most chapters seen and most recently seen (stats, see GlossaryStore).
     """
     relevant = {
         "characters": {},
@@ -43,55 +102,157 @@ def get_relevant_glossary(text: str, master_glossary: dict) -> dict:
         "skills": {}
     }
 
-    # Iterate through all 4 categories
-    categories = ["characters", "places", "items", "skills"]
-    
-    for category in categories:
-        # Check if the category exists in the master file (backward compatibility)
-        if category in master_glossary:
-            for cn_name, data in master_glossary[category].items():
-                if cn_name in text:
-                    relevant[category][cn_name] = data
-    
+    stats = stats or {}
+    ranked = []
+    for form, category, cn_name, data, own, _ in find_glossary_mentions(text, master_glossary):
+        if own <= 0: continue
+        seen = stats.get(category, {}).get(cn_name, {})
+        ranked.append(((own, seen.get("chapters", 0), seen.get("last") or 0), form, category, data))
+    if limit is not None and len(ranked) > limit:
+        ranked = sorted(ranked, key=lambda entry: entry[0], reverse=True)[:limit]
+
+    for _, form, category, data in ranked:
+        if isinstance(data, dict) and "aliases" in data: data = {k: v for k, v in data.items() if k != "aliases"}
+        relevant[category][form] = data
     return relevant
 
-def call_llm(system_prompt: str, user_text: str) -> str:
-    response = ollama.chat(model=LLM_MODEL, messages=[
+class LLMStats:
+    """
+    Running totals of Ollama's per-call token counts. prompt_eval_tokens excludes prompt tokens served from the server's cache.
+    Each thread also keeps its own totals, so a chapter running beside others can measure just its calls.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.calls = 0
+        self.prompt_eval_tokens = 0
+        self.eval_tokens = 0
+
+    def record(self, prompt_eval_count: int, eval_count: int):
+        with self._lock:
+            self.calls += 1
+            self.prompt_eval_tokens += prompt_eval_count or 0
+            self.eval_tokens += eval_count or 0
+        totals = self._local.__dict__.setdefault("totals", [0, 0, 0])
+        totals[0] += 1
+        totals[1] += prompt_eval_count or 0
+        totals[2] += eval_count or 0
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            return {"calls": self.calls, "prompt_eval_tokens": self.prompt_eval_tokens, "eval_tokens": self.eval_tokens}
+
+    def thread_snapshot(self) -> Dict[str, int]:
+        """Totals of the calls made from the current thread."""
+        calls, prompt_eval_tokens, eval_tokens = self._local.__dict__.get("totals", (0, 0, 0))
+        return {"calls": calls, "prompt_eval_tokens": prompt_eval_tokens, "eval_tokens": eval_tokens}
+
+LLM_STATS = LLMStats()
+_llm_client = None
+
+def get_llm_client() -> ollama.Client:
+    global _llm_client
+    if _llm_client is None:
+        _llm_client = ollama.Client(host=OLLAMA_HOST)
+    return _llm_client
+
+def set_llm_client(client):
+    """Swaps the Ollama client (e.g. for another host or a test server)."""
+    global _llm_client
+    _llm_client = client
+
+def call_llm(system_prompt: str, user_text: str, model: str = LLM_MODEL) -> str:
+    response = get_llm_client().chat(model=model, messages=[
         {'role': 'system', 'content': system_prompt},
         {'role': 'user', 'content': user_text}
-    ])
+    ], keep_alive=LLM_KEEP_ALIVE)
+    # Ollama reports generation stats in nanoseconds
+    prompt_eval_count = response.get('prompt_eval_count')
+    eval_count, eval_duration = response.get('eval_count'), response.get('eval_duration')
+    LLM_STATS.record(prompt_eval_count, eval_count)
+    if prompt_eval_count is not None: publish(PROMPT_EVAL, value=prompt_eval_count)
+    if eval_count and eval_duration:
+        publish(LLM, value=eval_count / (eval_duration / 1e9))
+        publish_memory()
     return response['message']['content'].strip()
 
+_NUMBERED_LINE = re.compile(r'^(\d+)[\.\:]\s*(.*)')
+
 def parse_numbered_output(llm_output: str, expected_count: int) -> Dict[int, str]:
     results = {i: "" for i in range(1, expected_count + 1)}
-    pattern = re.compile(r'^(\d+)[\.\:]\s*(.*)')
     for line in llm_output.splitlines():
-        match = pattern.match(line.strip())
+        match = _NUMBERED_LINE.match(line.strip())
         if match:
             idx = int(match.group(1))
             if 1 <= idx <= expected_count: results[idx] = match.group(2).strip()
     return results
 
+# --- TEXT NORMALIZATION ---
+# Patterns and tables are built once at import, and each line gets one deletion pass plus only the
+# passes it needs. (On Chinese text a regex deletion is cheaper than str.translate.)
+_TTS_HEADING = re.compile(r'^(?:chapter|ch\.?)\s*\d+\s*[-—:]?\s*', re.IGNORECASE) # "Chapter 12 - ", "ch.3:"
+_TTS_DROP = re.compile(r'[“”（）《》【】\-—]')
+_TTS_RUNS = re.compile(r'([？！….])\1+') # "？？？" -> "？", "……" -> "…", "..." -> "."
+_first_group = lambda match: match.group(1) # Much cheaper per call than the r'\1' template
+_TAG_JUNK = re.compile(r'[^a-zA-Z0-9\s]')
+_FILENAME_TABLE = str.maketrans({" ": "_", **{c: None for c in '<>:"/\\|?*'}})
+
 def clean_for_tts(text: str) -> str:
     """Sanitizes text to prevent TTS hallucinations on short/mixed-language lines."""
-    text = re.sub(r'^(?i)(chapter|ch\.?)\s*\d+\s*[-—:]?\s*', '', text)
-    text = re.sub(r'[“”（）《》【】\-—]', '', text)
-    text = re.sub(r'？+', '？', text)
-    text = re.sub(r'！+', '！', text)
-    text = re.sub(r'…+', '…', text)
-    text = re.sub(r'\.+', '.', text)
+    if text[:2].lower() == "ch": text = _TTS_HEADING.sub('', text, count=1)
+    text = _TTS_DROP.sub('', text)
+    if "？？" in text or "！！" in text or "……" in text or ".." in text: text = _TTS_RUNS.sub(_first_group, text)
     return text.strip()
 
+# Keyword stems, matched at the start of a word so that un-/dis- words ("unhappy", "displeased") only hit their own stems.
+# The keyword that comes first in the tag decides the canonical emotion; on a tie, the earlier rule wins.
+EMOTION_KEYWORDS = [
+    ("Crying", r"cry|sob|tear"),
+    ("Angry shouting", r"angr|furious|rage|shout|yell|scold|roar"),
+    ("Whispering", r"whisper|murmur|hush"),
+    ("Sarcastic laugh", r"sarcas|mock|sneer|taunt|contempt|disdain|scorn|cold(?:ly)? (?:laugh|chuckl|smil)|(?:laugh|chuckl|smil)\w* coldly"),
+    ("Laughing", r"laugh|chuckl|giggl"),
+    ("Fearful", r"fear|afraid|scared|terrif|trembl|horrif"),
+    ("Anxious", r"anxious|nervous|worr|urgent|panic|hurried"),
+    ("Surprised", r"surpris|shock|astonish|amaz|startl"),
+    ("Sad", r"sad|unhapp|sorrow|grief|griev|melanchol|mourn|despair"),
+    ("Excited", r"excit|eager|enthusias|thrill"),
+    ("Happy", r"happ|joy|cheer|delight|pleas|warm"),
+    ("Cold and stern", r"cold|stern|icy|harsh|threat|menac|displeas"),
+    ("Gentle", r"gentl|tender|kind|sooth|affection|soft"),
+    ("Shy", r"shy|embarrass|bashful|timid"),
+    ("Proud", r"proud|arrogan|smug|confident"),
+    ("Serious", r"serious|solemn|grave|firm|determin"),
+    ("Suspenseful narrative", r"suspens|tense|myster|ominous"),
+]
+_EMOTION_LOOKUP = {tag.lower(): tag for tag in EMOTION_VOCAB}
+_EMOTION_RULES = [(tag, re.compile(rf"\b(?:{stems})")) for tag, stems in EMOTION_KEYWORDS]
+_EMOTION_NEGATED = re.compile(r"\b(?:not|never|without) \w+") # "not afraid" says nothing about fear
+
+@functools.lru_cache(maxsize=4096) # The LLM repeats a small set of tags
+def canonicalize_emotion(tag: str) -> str:
+    """Maps a free-form emotion/style tag from the LLM onto the fixed EMOTION_VOCAB."""
+    clean = " ".join(_TAG_JUNK.sub('', tag or "").lower().split())
+    if clean in _EMOTION_LOOKUP:
+        return _EMOTION_LOOKUP[clean]
+    clean = _EMOTION_NEGATED.sub('', clean)
+    best, best_start = DEFAULT_EMOTION, len(clean)
+    for canonical, pattern in _EMOTION_RULES:
+        match = pattern.search(clean)
+        if match and match.start() < best_start:
+            best, best_start = canonical, match.start()
+    return best
+
 def sanitize_filename(text: str) -> str:
     """
     Converts spaces to underscores and removes illegal file system characters.
     Ensures compatibility across Windows, macOS, and Linux.
     """
-    # 1. Replace spaces with underscores
-    safe_text = text.replace(" ", "_")
-    # 2. Remove illegal characters (< > : " / \ | ? *)
-    safe_text = re.sub(r'[<>:"/\\|?*]', '', safe_text)
-    return safe_text
+    # Spaces become underscores and illegal characters (< > : " / \ | ? *) are removed, in one pass
+    return text.translate(_FILENAME_TABLE)
+
+def get_audio_filename(chapter_number: int, line_idx: int) -> str:
+    return f"ch{chapter_number:02d}_L{line_idx:04d}.opus"
 
 def generate_pinyin(text: str) -> str:
     """